@@ -1,11 +1,17 @@
 import os
 import time
+import asyncio
 import json
 import socket
-import csv
+import random
 import io
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, NamedTuple, Optional
 import requests
+from requests.adapters import HTTPAdapter
+from flux_csv import AnnotatedCSVParser, CHUNK_SIZE, parse_time
+import wire
 
 # =========================
 # 0) 환경설정 (필요 시 수정)
@@ -19,6 +25,40 @@ QUERY_URL = f"{BASE}/api/v2/query?org={ORG}"
 PI_HOST = os.getenv("PI_HOST", "192.168.43.6") #Raspberry Pi IP
 PI_PORT = int(os.getenv("PI_PORT", "6000")) #Raspberry Pi PORT
 
+# 호출별 마감 시간(초): 백엔드가 느려도 이벤트 루프가 이보다 오래 기다리지 않는다
+QUERY_DEADLINE = float(os.getenv("INFLUX_QUERY_DEADLINE", "2.0"))
+PI_SEND_DEADLINE = float(os.getenv("PI_SEND_DEADLINE", "1.0"))
+
+# Pi 장기 연결: 값이 같아도 KEEPALIVE 초마다 재전송, 재연결은 지수 백오프
+PI_KEEPALIVE_SEC = float(os.getenv("PI_KEEPALIVE_SEC", "5.0"))
+PI_BACKOFF_MIN = 0.5
+PI_BACKOFF_MAX = 30.0
+
+# Pi 쪽 ramp: 슬루 적용된 PWM 을 매초 보내는 대신 목표값과 변화율(%/s)만 보내고 Pi 가 잘게 나눠 ramp 한다.
+# 목표가 SETPOINT_DEADBAND(%) 미만으로 바뀌면 keepalive 때까지 보내지 않는다 (0 으로/에서의 변화는 항상 전송).
+# 기존 pi.py 는 {"pwm"} 만 읽으므로 기본은 꺼 둔다. 모든 Pi 를 새 pi.py 로 바꾼 뒤 PI_EDGE_RAMP=1 로 켠다.
+PI_EDGE_RAMP = os.getenv("PI_EDGE_RAMP", "0") == "1"
+SETPOINT_DEADBAND = float(os.getenv("PI_SETPOINT_DEADBAND", "3"))
+
+# Pi 로컬 제어: 켜면 틱마다 목표값 대신 컨트롤러 정책(모드, 임계값, min_duty, slew ...)을 보내고
+# Pi 가 자기 센서로 직접 FanController 를 돌린다 (wire v2 를 고른 Pi 만, 나머지는 기존처럼 목표값 전송).
+# 정책은 바뀔 때와 keepalive 마다 보내며, Pi 는 PI_POLICY_LEASE 초 동안 서버 소식이 없으면 안전 정책으로 바꾼다.
+PI_LOCAL_POLICY = os.getenv("PI_LOCAL_POLICY", "0") == "1"
+PI_POLICY_LEASE = float(os.getenv("PI_POLICY_LEASE", "15"))
+
+# 제어 프로토콜: "auto" 면 연결마다 이진 프레임(wire.py)을 협상하고, 답이 없으면 기존 JSON 으로 보낸다.
+# "json" 이면 협상하지 않는다. PI_WIRE_TIMEOUT 초 안에 답이 없으면 예전 Pi 에이전트로 보고
+# JSON 으로 새로 연결해 {"pwm"} 만 보낸다 (프로세스가 살아 있는 동안 그 Pi 는 다시 협상하지 않음).
+PI_WIRE = os.getenv("PI_WIRE", "auto")
+PI_WIRE_TIMEOUT = float(os.getenv("PI_WIRE_TIMEOUT", "0.5"))
+
+# 제어 주기(초) 기본값. 컨트롤러별로는 FanController.period (설정 JSON 의 "period") 로 바꾼다.
+# 서버는 scheduler.FixedRateScheduler 로 이 주기의 고정 격자에 맞춰 step 을 호출한다.
+TICK_PERIOD = float(os.getenv("FAN_TICK_PERIOD", "1.0"))
+
+# 튜닝된 컨트롤러 설정(JSON, sweep.py 출력). 지정하면 서버가 시작할 때 이 값으로 FanController 를 만든다.
+CONTROLLER_CONFIG = os.getenv("FAN_CONTROLLER_CONFIG")
+
 # =========================
 # 1) Influx 쿼리
 # =========================
@@ -40,6 +80,27 @@ from(bucket: "{BUCKET}")
   |> limit(n: 1)
 '''
 
+# Keep-alive 연결을 재사용하는 HTTP 세션 (매 쿼리마다 새 TCP 연결을 맺지 않음)
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+
+def _query_records(query: str, parser: AnnotatedCSVParser, timeout: float = 3):
+    """
+    쿼리 응답을 통째로 받지 않고 청크 단위로 읽으며 파싱한다.
+    (레코드 목록, 단계별 시간) 반환. influx_query 는 응답 헤더까지, csv_parse 는 본문 수신+파싱 시간.
+    """
+    t0 = time.perf_counter()
+    with _session.post(QUERY_URL, headers=headers, data=query, timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        t1 = time.perf_counter()
+        records = list(parser.records_from_chunks(r.iter_content(CHUNK_SIZE)))
+    return records, {"influx_query": t1 - t0, "csv_parse": time.perf_counter() - t1}
+
+# 증분 조회 설정: 새 값이 없을 때만 한 단계씩 창(window)을 넓힌다 (초 단위, 최대 7일)
+MEASUREMENTS = ("cpu_temperature", "gpu_temperature", "model_result")
+WINDOW_STEPS = (10, 60, 600, 3600, 6 * 3600, 86400, 7 * 86400)
+
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
 
@@ -51,6 +112,7 @@ class FanController:
     t_off: float = 20.0
     last_pwm: int = 0
     last_ts_ms: int = 0
+    last_target: int = 0  # 마지막 step 의 목표값 (게이트 적용 후, 슬루 적용 전)
     
     # 상태 관리 변수 추가 
     mode: str = "auto"  # "auto", "manual", "range"
@@ -60,16 +122,48 @@ class FanController:
     cpu_thresh: int = 40
     gpu_thresh: int = 40
 
+    # auto 공식 상수: pwm = pwm_base + pwm_gain * clamp(max(cpu, gpu) / temp_scale, 0, 1)
+    temp_scale: float = 60.0  # 이 온도(°C)에서 최대 출력
+    pwm_base: float = 30.0
+    pwm_gain: float = 88.0
+
+    # 제어 주기(초): 서버 스케줄러가 이 간격으로 step 을 부른다 (step 자체는 now_ms 간격으로 slew 계산)
+    period: float = TICK_PERIOD
+
+    # predict 모드: predict_horizon 초 뒤 예측 온도가 predict_setpoint(°C) 를 넘지 않게 하는 PWM (thermal_model.py)
+    predict_setpoint: float = 55.0
+    predict_horizon: float = 30.0
+    # 이 온도(°C) 이상이면 모델 출력과 상관없이 100% (모델이 틀려도 과열되지 않도록)
+    predict_max_temp: float = 65.0
+    # 열 모델 (thermal_model.ThermalModel). 없거나 아직 학습 전이면 predict 모드는 auto 공식으로 동작
+    predictor: Optional[object] = field(default=None, repr=False, compare=False)
+
+    # 현재 시각(epoch 초)을 돌려주는 함수. 재생/테스트에서 가짜 시계를 넣어 실제 시간을 기다리지 않는다.
+    clock: Callable[[], float] = field(default=time.time, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.predict_horizon > 0:
+            raise ValueError(f"predict_horizon 은 0보다 커야 합니다: {self.predict_horizon}")
+
     def _target_by_formula(self, cpu_temp: float, gpu_temp: float, model_result: int) -> int:
-        f_cpu = clamp(cpu_temp / 60.0, 0.0, 1.0)
-        f_gpu = clamp(gpu_temp / 60.0, 0.0, 1.0)
+        f_cpu = clamp(cpu_temp / self.temp_scale, 0.0, 1.0)
+        f_gpu = clamp(gpu_temp / self.temp_scale, 0.0, 1.0)
         f_model = 1.0 if model_result > 0 else 0.0
-        pwm = 30.0 + (88.0 * max(f_cpu, f_gpu) * (1-f_model))
+        pwm = self.pwm_base + (self.pwm_gain * max(f_cpu, f_gpu) * (1-f_model))
         return int(round(clamp(pwm, 0.0, 100.0)))
 
+    def _target_predicted(self, cpu_temp: float, gpu_temp: float, model_result: int, now_ms: int) -> int:
+        if self.predictor is not None:
+            pwm = self.predictor.target(max(cpu_temp, gpu_temp), self.last_pwm, model_result, now_ms,
+                                        self.predict_setpoint, self.predict_horizon)
+            if pwm is not None:
+                return int(round(clamp(pwm, 0.0, 100.0)))
+        return self._target_by_formula(cpu_temp, gpu_temp, model_result)
+
     # step 함수 단순화: 내부 상태(mode)를 보고 알아서 결정하도록 변경
-    def step(self, cpu_temp: float, gpu_temp: float, model_result: int) -> int:
-        
+    def step(self, cpu_temp: float, gpu_temp: float, model_result: int, now_ms: Optional[int] = None) -> int:
+        now = int(self.clock() * 1000) if now_ms is None else int(now_ms)
+
         if self.mode == "manual":
             # 프론트에서 준 manual_target 그대로 사용
             target = clamp(self.manual_target, 0, 100)
@@ -82,6 +176,12 @@ class FanController:
                 self.gpu_thresh,
             )
 
+        elif self.mode == "predict":
+            # 열 모델로 온도 상승을 미리 보고 PWM 을 정한다 (model_result 는 부하 신호로 바로 반영)
+            target = self._target_predicted(cpu_temp, gpu_temp, model_result, now)
+            if max(cpu_temp, gpu_temp) >= self.predict_max_temp:
+                target = 100
+
         else:  # "auto"
             target = self._target_by_formula(cpu_temp, gpu_temp, model_result)
 
@@ -89,12 +189,16 @@ class FanController:
         T = max(cpu_temp, gpu_temp)
         gate_on = (self.last_pwm == 0 and T >= self.t_on) or (self.last_pwm > 0 and T >= self.t_off)
         
-        # 팬이 꺼져있는데 켜질 온도가 아니면 0 유지 (단, 수동모드면 무시하고 돔)
+        # 팬이 꺼져있는데 켜질 온도가 아니면 0 유지 (단, 수동모드면 무시하고 돔, predict 는 모델이 켤 시점을 정함)
         if self.mode in ("auto", "range") and not gate_on:
             target = 0
+        elif self.mode == "predict" and (target > 0 or gate_on):
+            # predict 는 게이트보다 먼저 켤 수는 있지만, 켜져 있어야 할 온도에서 끄거나 min_duty 아래로 돌리지는 않는다
+            target = max(target, self.min_duty)
+
+        self.last_target = int(target)
 
         # PWM 변화량 제한 (Slew Rate)
-        now = int(time.time() * 1000)
         dt = 1.0 if self.last_ts_ms == 0 else max(0.001, (now - self.last_ts_ms) / 1000.0)
         max_delta = int(round(self.slew_per_sec * dt))
         delta = max(-max_delta, min(max_delta, target - self.last_pwm))
@@ -120,32 +224,434 @@ class FanController:
         
         return pwm
 
+# 서버가 Pi 로컬 제어 루프로 보내는 정책 필드 (FanController 의 설정값, 상태(last_*)는 제외)
+# Pi 로컬 루프가 돌릴 수 있는 모드 (predict 는 서버의 이력/열 모델이 필요하므로 정책 대신 목표값을 보낸다)
+LOCAL_POLICY_MODES = ("auto", "manual", "range")
+POLICY_FIELDS = ("mode", "manual_target", "cpu_thresh", "gpu_thresh", "min_duty", "slew_per_sec",
+                 "t_on", "t_off", "temp_scale", "pwm_base", "pwm_gain")
+
+def controller_policy(ctl: FanController, lease: float = PI_POLICY_LEASE) -> dict:
+    """컨트롤러 설정을 Pi 로 보낼 정책 dict 로 ("lease": 이 시간 안에 다시 소식이 없으면 Pi 는 안전 정책)"""
+    return dict({k: getattr(ctl, k) for k in POLICY_FIELDS}, lease=lease)
+
+def load_controller_config(path: Optional[str] = CONTROLLER_CONFIG) -> dict:
+    """
+    {"controller": {"min_duty": 35, ...}} 형식 JSON 을 FanController 인자로 읽는다.
+    경로가 없으면 빈 dict (기본값 사용). 알 수 없는 필드는 무시한다.
+    """
+    if not path:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        conf = json.load(f)
+    conf = conf.get("controller", conf)
+    known = set(FanController.__dataclass_fields__) - {"clock", "predictor", "last_pwm", "last_ts_ms", "last_target"}
+    return {k: v for k, v in conf.items() if k in known}
+
+class Sample(NamedTuple):
+    value: Optional[float]
+    ts: float  # 해당 값의 _time (epoch 초)
+
+
+class IncrementalReader:
+    """
+    측정값별로 마지막으로 본 _time(커서)을 기억하고, 최근 짧은 구간만 조회한다.
+    새 값이 안 들어온 측정값이 있으면 다음 조회 때 창을 한 단계 넓히고,
+    모두 갱신되면 다시 가장 짧은 창으로 돌아간다.
+    창은 가장 오래된 커서보다 더 과거로는 넓히지 않는다 (그 이전 값은 이미 본 값).
+    아직 커서가 없는 측정값이 있으면(시작 직후) 가장 넓은 창으로 조회한다 (마지막 기록이 오래되었어도 찾도록).
+
+    group_tag 를 주면(예: "device") 태그 값별로 묶은 한 번의 쿼리로 여러 장치를 읽고,
+    샘플 키는 (태그 값, 측정값) 이 된다. 이때 기다릴 장치 목록은 expect() 로 지정한다.
+    filter_group=True 면 expect() 한 태그 값만 조회한다 (샤드 워커가 자기 장치만 읽을 때).
+    """
+
+    def __init__(self, measurements=MEASUREMENTS, bucket: str = BUCKET, steps=WINDOW_STEPS,
+                 group_tag: Optional[str] = None, filter_group: bool = False):
+        self.measurements = tuple(measurements)
+        self.bucket = bucket
+        self.steps = tuple(steps)
+        self.group_tag = group_tag
+        self.filter_group = filter_group and group_tag is not None
+        self.tag_values = set()
+        self.step_idx = 0
+        self.samples = {}  # measurement 또는 (tag, measurement) -> Sample
+        self.expected = set() if group_tag else set(self.measurements)
+        self.last_timings = {}  # 마지막 조회의 단계별 소요 시간(초): influx_query, csv_parse
+        # 필요한 열만 뽑는 스트리밍 파서: (_measurement, _time, _value[, group_tag])
+        columns = ("_measurement", "_time", "_value") + ((group_tag,) if group_tag else ())
+        self.parser = AnnotatedCSVParser(columns, fallback={"_time": parse_time, "_value": float})
+
+    def expect(self, tag_values):
+        """group_tag 모드에서 매 조회마다 갱신을 기대하는 태그 값(장치) 목록"""
+        self.tag_values = set(tag_values)
+        self.expected = {(t, m) for t in self.tag_values for m in self.measurements}
+
+    def window(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        if not self.expected or not all(k in self.samples for k in self.expected):
+            return self.steps[-1]
+        oldest = min(self.samples[k].ts for k in self.expected)
+        return min(self.steps[self.step_idx], max(self.steps[0], int(now - oldest) + self.steps[0]))
+
+    def build_query(self, now: Optional[float] = None) -> str:
+        cond = " or\n                       ".join(f'r._measurement == "{m}"' for m in self.measurements)
+        group = f'"{self.group_tag}", "_measurement"' if self.group_tag else '"_measurement"'
+        tags = ""
+        if self.filter_group:
+            values = ", ".join(json.dumps(t) for t in sorted(self.tag_values))
+            tags = f'\n  |> filter(fn: (r) => contains(value: r.{self.group_tag}, set: [{values}]))'
+        return f'''
+from(bucket: "{self.bucket}")
+  |> range(start: -{self.window(now)}s)
+  |> filter(fn: (r) => {cond})
+  |> filter(fn: (r) => r._field == "value"){tags}
+  |> group(columns: [{group}])
+  |> last()
+'''
+
+    def ingest_records(self, records) -> dict:
+        """파싱된 레코드를 반영하고 창 크기를 조정한 뒤 최신 샘플을 돌려준다."""
+        fresh = set()
+        group = self.group_tag is not None
+        for rec in records:
+            m, ts, v = rec[0], rec[1], rec[2]
+            if m not in self.measurements or ts is None:
+                continue
+            if group:
+                if not rec[3] or (self.filter_group and rec[3] not in self.tag_values):
+                    continue
+                key = (rec[3], m)
+            else:
+                key = m
+            prev = self.samples.get(key)
+            if prev is not None and ts <= prev.ts:
+                continue
+            self.samples[key] = Sample(float(v) if v is not None else None, ts)
+            fresh.add(key)
+
+        if self.expected <= fresh:
+            self.step_idx = 0
+        else:
+            self.step_idx = min(self.step_idx + 1, len(self.steps) - 1)
+        return dict(self.samples)
+
+    def ingest(self, csv_text: str) -> dict:
+        """쿼리 응답(CSV 문자열)을 반영한다. 주석(annotated) 유무와 관계없이 처리."""
+        return self.ingest_records(self.parser.records(io.StringIO(csv_text)))
+
+    def read(self) -> dict:
+        records, self.last_timings = _query_records(self.build_query(), self.parser)
+        return self.ingest_records(records)
+
+    async def async_read(self, deadline: float = QUERY_DEADLINE) -> dict:
+        """
+        HTTP 요청과 스트리밍 파싱은 워커 스레드에서, 결과 반영은 이벤트 루프에서 한다.
+        마감 시간을 넘기면 asyncio.TimeoutError 를 던지고 상태는 바뀌지 않는다.
+        """
+        query = self.build_query()
+        records, timings = await asyncio.wait_for(
+            asyncio.to_thread(_query_records, query, self.parser, deadline), deadline)
+        self.last_timings = timings
+        return self.ingest_records(records)
+
+
+_reader = IncrementalReader()
+
+def read_latest_samples():
+    """측정값별 (값, 타임스탬프) 반환. 호출 측에서 값의 나이를 판단할 수 있다."""
+    return _reader.read()
+
 def read_latest_values():
-    r = requests.post(QUERY_URL, headers=headers, data=flux, timeout=3)
-    r.raise_for_status()
-    csv_text = r.text.strip()
-    reader = csv.DictReader(io.StringIO(csv_text))
-    latest_values = {}
-    for row in reader:
-        m = row.get("_measurement")
-        if not m:
-            continue
-        try:
-            v = float(row["_value"]) if row["_value"] is not None else None
-        except:
-            v = None
-        latest_values[m] = v
-    return latest_values
+    return {m: s.value for m, s in read_latest_samples().items()}
+
+def last_read_timings() -> dict:
+    """마지막 조회의 단계별 소요 시간(초): influx_query, csv_parse"""
+    return _reader.last_timings
+
+async def async_read_latest_samples(deadline: float = QUERY_DEADLINE):
+    return await _reader.async_read(deadline)
+
+async def async_read_latest_values(deadline: float = QUERY_DEADLINE):
+    samples = await async_read_latest_samples(deadline)
+    return {m: s.value for m, s in samples.items()}
+
+# 시작 값을 무작위로 해서 재시작/샤드 워커마다 seq 가 겹치지 않게 한다 (추적 키는 (seq, 보낸 시각 ms))
+_seq = random.getrandbits(32)
+def next_seq() -> int:
+    """Pi 로 보내는 명령의 일련번호 (32bit 순환)"""
+    global _seq
+    _seq = (_seq + 1) & 0xFFFFFFFF
+    return _seq
+
+def encode_command(pwm_value: int, seq: Optional[int] = None, ts_ms: Optional[int] = None) -> bytes:
+    """줄 단위(newline-delimited) JSON 명령 프레임 (seq/ts: 추적 키, Pi 가 적용 기록에 그대로 남긴다)"""
+    return (json.dumps({"pwm": int(pwm_value), "seq": next_seq() if seq is None else seq,
+                        "ts": wire.now_ms() if ts_ms is None else ts_ms}) + "\n").encode()
+
+def encode_setpoint(target: int, ramp: float, seq: Optional[int] = None, ts_ms: Optional[int] = None) -> bytes:
+    """Pi 쪽 ramp 명령: 목표 PWM(%) 과 변화율(%/s)"""
+    return (json.dumps({"target": int(target), "ramp": float(ramp), "seq": next_seq() if seq is None else seq,
+                        "ts": wire.now_ms() if ts_ms is None else ts_ms}) + "\n").encode()
 
-_seq = 0
 def send_to_pi(pwm_value: int):    
-    payload = json.dumps({"pwm": int(pwm_value)}).encode() # JSON 포맷으로 변경
+    payload = encode_command(pwm_value)
     try:
         with socket.create_connection((PI_HOST, PI_PORT), timeout=2) as s:
             s.sendall(payload)
     except Exception as e:
         print(f"[Network] Pi 전송 실패: {e}")
 
+async def _send_payload(payload: bytes, host: str, port: int):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(payload)
+        await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def async_send_to_pi(pwm_value: int, deadline: float = PI_SEND_DEADLINE):
+    """send_to_pi 의 비동기 버전. 연결+전송 전체에 마감 시간을 적용한다."""
+    payload = encode_command(pwm_value)
+    try:
+        await asyncio.wait_for(_send_payload(payload, PI_HOST, PI_PORT), deadline)
+    except asyncio.TimeoutError:
+        print(f"[Network] Pi 전송 시간 초과 ({deadline}s)")
+    except Exception as e:
+        print(f"[Network] Pi 전송 실패: {e}")
+
+class PiLink:
+    """
+    Pi 와의 장기 TCP 연결 관리자.
+    - 연결마다 이진 프레임(wire.py)을 협상하고, 예전 에이전트면 줄 단위 JSON 으로 보낸다
+      (hello 답이 PI_WIRE_TIMEOUT 안에 없으면 그 연결을 버리고 JSON 으로 다시 연결, 이후로도 예전 에이전트로 취급)
+    - 이진 모드에서는 연결 하나로 여러 팬(fan 번호)을 제어하고, ACK 의 seq 로 왕복 시간을 잰다
+    - 값이 바뀌었을 때만 전송하고, 같은 값은 keepalive 주기마다 재전송 (팬별로 따로)
+    - send_setpoint 는 목표값/변화율만 보내고 ramp 는 Pi 가 수행한다 (목표가 바뀔 때만 전송)
+    - 연결이 끊기면 다음 전송 시 재연결하며, 실패가 이어지면 지수 백오프로 시도 간격을 늘린다
+      (백오프 중에는 연결을 시도하지 않고 바로 반환하므로 제어 루프를 지연시키지 않음)
+    """
+
+    def __init__(self, host: str = PI_HOST, port: int = PI_PORT,
+                 keepalive: float = PI_KEEPALIVE_SEC, deadline: float = PI_SEND_DEADLINE,
+                 clock: Callable[[], float] = time.monotonic, protocol: str = PI_WIRE):
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.deadline = deadline
+        self.clock = clock        # keepalive/백오프 기준 시계 (재생 시험에서 가짜 시계 주입)
+        self.protocol = protocol  # "auto" | "json"
+        self.wire = 0             # 협상된 이진 프로토콜 버전 (0 = JSON)
+        self.legacy = False       # hello 에 답하지 않은 예전 에이전트 ({"pwm"} 만 보낸다)
+        self.backoff = PI_BACKOFF_MIN
+        self.next_attempt = 0.0   # time.monotonic() 기준
+        self.sent = {}            # fan -> (마지막으로 보낸 값, 보낸 시각)
+        self.reconnects = 0       # 첫 연결 이후 다시 연결한 횟수
+        self.frames_sent = 0      # 실제로 보낸 명령 수
+        self.bytes_sent = 0
+        self.acked = 0            # 받은 ACK 수 (이진 모드)
+        self.nacked = 0           # 결과 코드가 ACK_OK 가 아닌 ACK 수
+        self.rtts = deque(maxlen=256)  # 최근 ACK 왕복 시간(초)
+        self.on_ack = None        # 왕복 시간(초)을 받는 콜백 (계측용)
+        self.on_send = None       # 보낸 명령마다 (fan, seq, 보낸 시각 ms, 목표, 변화율) 을 받는 콜백 (명령 추적용)
+        self._inflight = {}       # seq -> 보낸 시각 (perf_counter)
+        self._connected_once = False
+        self._connect_lock = asyncio.Lock()  # 팬 여러 개가 한 연결을 공유할 때 동시 재연결 방지
+        self._reader = None
+        self._writer = None
+        self._ack_task = None
+
+    @property
+    def connected(self) -> bool:
+        return (self._writer is not None and not self._writer.is_closing()
+                and not self._reader.at_eof())
+
+    @property
+    def last_sent(self):
+        """팬 0 에 마지막으로 보낸 값 (단일 팬 장치용)"""
+        return self.sent.get(0, (None, 0.0))[0]
+
+    def _drop(self):
+        if self._ack_task is not None:
+            self._ack_task.cancel()
+            self._ack_task = None
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        self._inflight.clear()
+
+    async def _negotiate(self) -> Optional[int]:
+        """hello 를 보내고 PI_WIRE_TIMEOUT 안에 온 답으로 버전을 정한다 (답이 없으면 None)"""
+        self._writer.write(wire.hello())
+        await self._writer.drain()
+        try:
+            line = await asyncio.wait_for(self._reader.readline(), PI_WIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        return wire.parse_hello_reply(line)
+
+    async def _open(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.deadline)
+        sock = self._writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    async def _connect(self) -> bool:
+        now = self.clock()
+        if now < self.next_attempt:
+            return False
+        try:
+            await self._open()
+            self.wire = 0
+            if self.protocol != "json" and not self.legacy:
+                version = await self._negotiate()
+                if version is None:
+                    # 답이 늦었을 뿐인 새 에이전트는 이미 이진 프레임으로 바뀌었을 수 있으므로, 이 연결에 JSON 을
+                    # 보내지 않고 새로 연결한다. 이후 재연결도 협상 없이 JSON
+                    print(f"[Network] {self.host}:{self.port} hello 답 없음 ({PI_WIRE_TIMEOUT}s) -> JSON 으로 재연결")
+                    self.legacy = True
+                    self._drop()
+                    await self._open()
+                else:
+                    self.wire = version
+        except (OSError, asyncio.TimeoutError) as e:
+            self._drop()
+            self.next_attempt = now + self.backoff
+            print(f"[Network] Pi 연결 실패: {e or 'timeout'} ({self.backoff:.1f}s 후 재시도)")
+            self.backoff = min(self.backoff * 2, PI_BACKOFF_MAX)
+            return False
+
+        if self.wire:
+            self._ack_task = asyncio.create_task(self._read_acks(self._reader))
+        self.backoff = PI_BACKOFF_MIN
+        if self._connected_once:
+            self.reconnects += 1
+        self._connected_once = True
+        self.sent.clear()  # 새 연결에서는 현재 값을 즉시 다시 보낸다
+        print(f"[Network] Pi 연결됨: {self.host}:{self.port} ({f'wire v{self.wire}' if self.wire else 'JSON'})")
+        return True
+
+    async def _read_acks(self, reader):
+        buf = b""
+        while True:
+            data = await reader.read(64 * 1024)
+            if not data:
+                return
+            frames, buf = wire.split(buf + data)
+            now = time.perf_counter()
+            for f in frames:
+                if f.kind != wire.ACK:
+                    continue
+                self.acked += 1
+                if f.flags != wire.ACK_OK:
+                    self.nacked += 1
+                sent_at = self._inflight.pop(f.seq, None)
+                if sent_at is not None:
+                    self.rtts.append(now - sent_at)
+                    if self.on_ack is not None:
+                        self.on_ack(now - sent_at)
+
+    def _fresh(self, fan: int) -> bool:
+        return self.clock() - self.sent.get(fan, (None, 0.0))[1] < self.keepalive
+
+    async def send(self, pwm_value: int, fan: int = 0) -> bool:
+        """전송(또는 생략)에 성공하면 True, 연결 불가/실패면 False"""
+        pwm_value = int(pwm_value)
+        if pwm_value == self.sent.get(fan, (None,))[0] and self._fresh(fan):
+            return True
+        return await self._send(fan, pwm_value, pwm_value, None)
+
+    async def send_setpoint(self, target: int, ramp: float, deadband: float = SETPOINT_DEADBAND,
+                            fan: int = 0, pwm: Optional[int] = None) -> bool:
+        """
+        목표값이 deadband 이상 바뀌었거나(0 은 항상), 변화율이 바뀌었거나, keepalive 가 지났을 때만 전송.
+        예전 에이전트(legacy)는 {"pwm"} 만 읽으므로 대신 pwm(서버에서 슬루한 현재 값, 없으면 target)을 send 로 보낸다.
+        """
+        if not self.connected and not await self._ensure_connected():
+            return False
+        if self.legacy:
+            return await self.send(target if pwm is None else pwm, fan)
+        key = (int(target), float(ramp))
+        last = self.sent.get(fan, (None,))[0]
+        if (isinstance(last, tuple) and last[1] == key[1]
+                and (key[0] == last[0] or abs(key[0] - last[0]) < deadband)
+                and (key[0] == 0) == (last[0] == 0)
+                and self._fresh(fan)):
+            return True
+        return await self._send(fan, key, *key)
+
+    async def send_policy(self, policy: dict, target: int, ramp: float, deadband: float = SETPOINT_DEADBAND,
+                          fan: int = 0, pwm: Optional[int] = None) -> bool:
+        """
+        로컬 제어 정책 전송: 바뀌었거나 keepalive 가 지났을 때만 (keepalive 가 Pi 쪽 lease 를 갱신).
+        Pi 가 wire v2 를 고르지 않았거나(예전 에이전트, 로컬 제어 꺼짐) Pi 가 돌릴 수 없는 모드(predict)면
+        기존처럼 목표값/변화율을 보낸다 (Pi 는 그동안 override 로 서버 값을 따른다).
+        """
+        if not self.connected and not await self._ensure_connected():
+            return False
+        if self.wire < wire.POLICY_VERSION or policy.get("mode") not in LOCAL_POLICY_MODES:
+            return await self.send_setpoint(target, ramp, deadband, fan, pwm)
+        key = ("policy", tuple(sorted(policy.items())))
+        if key == self.sent.get(fan, (None,))[0] and self._fresh(fan):
+            return True
+        return await self._send(fan, key, policy, None)
+
+    def _encode(self, fan: int, target, ramp, seq: int, ts_ms: int) -> bytes:
+        if isinstance(target, dict):
+            return wire.pack_policy(fan, seq, target, ts_ms)
+        if self.wire:
+            self._inflight[seq] = time.perf_counter()
+            if len(self._inflight) > 1024:  # ACK 를 잃은 seq 가 쌓이지 않도록
+                self._inflight.pop(next(iter(self._inflight)))
+            return wire.pack_setpoint(fan, seq, target, ramp, ts_ms)
+        return encode_command(target, seq, ts_ms) if ramp is None else encode_setpoint(target, ramp, seq, ts_ms)
+
+    async def _ensure_connected(self) -> bool:
+        async with self._connect_lock:
+            if not self.connected:
+                self._drop()
+                return await self._connect()
+        return True
+
+    async def _send(self, fan: int, key, target, ramp) -> bool:
+        now = self.clock()
+        if not self.connected and not await self._ensure_connected():
+            return False
+        if fan and not self.wire:
+            print(f"[Network] 팬 {fan}: JSON 프로토콜은 팬 0 만 지원합니다 ({self.host}:{self.port})")
+            return False
+
+        writer = self._writer
+        if writer is None:  # 같은 연결을 쓰는 다른 팬의 전송이 실패해 끊긴 경우
+            return False
+        seq, ts_ms = next_seq(), wire.now_ms()
+        frame = self._encode(fan, target, ramp, seq, ts_ms)
+        try:
+            writer.write(frame)
+            await asyncio.wait_for(writer.drain(), self.deadline)
+        except (OSError, asyncio.TimeoutError) as e:
+            print(f"[Network] Pi 전송 실패: {e or 'timeout'}")
+            self._drop()
+            return False
+
+        self.sent[fan] = (key, now)
+        self.frames_sent += 1
+        self.bytes_sent += len(frame)
+        if self.on_send is not None and not isinstance(target, dict):  # 정책은 명령 추적 대상이 아님
+            self.on_send(fan, seq, ts_ms, target, ramp)
+        return True
+
+    async def close(self):
+        if self._writer is not None:
+            writer = self._writer
+            self._drop()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
 if __name__ == "__main__":
     print("이 파일은 라이브러리입니다. process_control_command.py를 실행하세요.")
 
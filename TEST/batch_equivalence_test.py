@@ -0,0 +1,84 @@
+import os
+import sys
+import random
+import argparse
+
+import numpy as np
+
+# BatchFanController.step 과 FanController.step 의 결과가 정확히 같은지 확인하는 무작위 속성 검사
+#   python TEST/batch_equivalence_test.py [--cases 300] [--seed 0]
+# 매 케이스마다 무작위 파라미터/상태/입력열을 만들고, 경계값(임계 온도, 60도 배수 등)을
+# 섞어 넣은 뒤 스칼라 구현과 벡터 구현의 PWM 을 매 스텝 비교한다.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from FANCONTROLL_PY import FanController
+from fan_batch import BatchFanController
+
+def random_controller(rnd):
+    return FanController(
+        min_duty=rnd.choice([0, 10, 30, 50, 100, 120]),
+        slew_per_sec=rnd.choice([0, 1, 5, 25, 40, 100]),
+        t_on=rnd.choice([20.0, 25.0, 30.5, 40.0]),
+        t_off=rnd.choice([15.0, 20.0, 25.0, 39.5]),
+        last_pwm=rnd.randint(0, 100) if rnd.random() < 0.7 else 0,
+        last_ts_ms=rnd.choice([0, 1_700_000_000_000 - rnd.randint(0, 5000)]),
+        mode=rnd.choice(["auto", "manual", "range"]),
+        manual_target=rnd.randint(-20, 130),
+        cpu_thresh=rnd.choice([30, 40, 55, 60]),
+        gpu_thresh=rnd.choice([30, 40, 55, 60]),
+        temp_scale=rnd.choice([60.0, 60.0, 45.0, 72.5]),
+        pwm_base=rnd.choice([30.0, 30.0, 0.0, 22.5]),
+        pwm_gain=rnd.choice([88.0, 88.0, 70.0, 100.0]),
+    )
+
+def random_temp(rnd, ctl):
+    edges = [0.0, ctl.t_on, ctl.t_off, float(ctl.cpu_thresh), float(ctl.gpu_thresh), 30.0,
+             ctl.temp_scale, ctl.temp_scale / 2, 90.0]
+    if rnd.random() < 0.3:
+        return rnd.choice(edges)
+    return round(rnd.uniform(-10.0, 120.0), rnd.choice([0, 1, 2, 6]))
+
+def check_case(rnd, case):
+    n = rnd.randint(1, 16)
+    ctls = [random_controller(rnd) for _ in range(n)]
+    batch = BatchFanController.from_controllers(ctls)
+    now = 1_700_000_000_000
+    for step in range(rnd.randint(1, 40)):
+        now += rnd.choice([0, 1, 250, 999, 1000, 1001, 1500, 3000])
+        cpu = [random_temp(rnd, c) for c in ctls]
+        gpu = [random_temp(rnd, c) for c in ctls]
+        model = [rnd.choice([0, 0, 1, 2]) for _ in ctls]
+        expected = [c.step(cpu[i], gpu[i], model[i], now_ms=now) for i, c in enumerate(ctls)]
+        got = batch.step(np.array(cpu), np.array(gpu), np.array(model), now_ms=now)
+        if list(map(int, batch.last_target)) != [c.last_target for c in ctls]:
+            print(f"[실패] case={case} step={step}: last_target 불일치")
+            return False
+        if list(map(int, got)) != expected:
+            i = next(i for i in range(n) if int(got[i]) != expected[i])
+            print(f"[실패] case={case} step={step} fan={i}: scalar={expected[i]} batch={int(got[i])}")
+            print(f"  입력 cpu={cpu[i]} gpu={gpu[i]} model={model[i]} now={now}")
+            print(f"  컨트롤러 {ctls[i]}")
+            return False
+    return True
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cases", type=int, default=300)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    rnd = random.Random(args.seed)
+    for case in range(args.cases):
+        if not check_case(rnd, case):
+            sys.exit(1)
+    print(f"[통과] {args.cases}개 케이스에서 스칼라/벡터 결과 일치 (seed={args.seed})")
+    # predict 는 장치별 열 모델이 필요해 벡터화하지 않는다: KeyError 대신 분명한 오류
+    for make in (lambda: BatchFanController(2, mode="predict"),
+                 lambda: BatchFanController.from_controllers([FanController(), FanController(mode="predict")])):
+        try:
+            make()
+            sys.exit("[실패] predict 모드를 벡터 엔진이 받아들임")
+        except ValueError:
+            pass
+    print("[통과] predict 모드는 벡터 엔진에서 ValueError 로 거절")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+# 팬 1대당 step 비용: 스칼라 FanController.step 반복 vs BatchFanController.step
+#   python TEST/bench_batch_step.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from FANCONTROLL_PY import FanController
+from fan_batch import BatchFanController, MODE_NAMES
+
+SIZES = (10, 1_000, 100_000)
+MIN_TIME = 0.5  # 크기별 최소 측정 시간(초)
+
+def make_inputs(n, rng):
+    cpu = rng.uniform(20, 80, n)
+    gpu = rng.uniform(20, 80, n)
+    model = rng.integers(0, 2, n)
+    return cpu, gpu, model
+
+def bench_scalar(n, rng):
+    modes = rng.integers(0, 3, n)
+    ctls = [FanController(mode=MODE_NAMES[int(m)]) for m in modes]
+    cpu, gpu, model = (a.tolist() for a in make_inputs(n, rng))
+    now = 1_700_000_000_000
+    steps = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < MIN_TIME:
+        now += 1000
+        for i, c in enumerate(ctls):
+            c.step(cpu[i], gpu[i], model[i], now_ms=now)
+        steps += 1
+    return (time.perf_counter() - t0) / (steps * n)
+
+def bench_batch(n, rng):
+    batch = BatchFanController(n)
+    batch.mode[:] = rng.integers(0, 3, n)
+    cpu, gpu, model = make_inputs(n, rng)
+    now = 1_700_000_000_000
+    steps = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < MIN_TIME:
+        now += 1000
+        batch.step(cpu, gpu, model, now_ms=now)
+        steps += 1
+    return (time.perf_counter() - t0) / (steps * n)
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'N':>8} | {'scalar ns/fan':>14} | {'batch ns/fan':>13} | {'speedup':>7}")
+    for n in SIZES:
+        s = bench_scalar(n, rng) * 1e9
+        b = bench_batch(n, rng) * 1e9
+        print(f"{n:>8} | {s:>14.1f} | {b:>13.1f} | {s / b:>6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import statistics
+
+# 상태 방송: 구독자 1000명을 붙인 채로 1초 제어 틱이 밀리지 않는지 확인
+#   python TEST/bench_broadcast.py [--clients 1000] [--seconds 10]
+# 서버(이 프로세스)는 실제 handle_connection/control_tick 을 쓰고, 구독 클라이언트는 별도 프로세스에서 돈다.
+# 마지막으로 느린 구독자(send 가 오래 걸리는 가짜 웹소켓)가 최신 상태로 합쳐 받는지도 확인한다.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+def merge(base, diff):
+    for k, v in diff.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            merge(base[k], v)
+        else:
+            base[k] = v
+    return base
+
+# ---------- 클라이언트 프로세스 ----------
+async def run_clients(port, n):
+    from websockets.asyncio.client import connect
+
+    frames = [0] * n
+    states = [{} for _ in range(n)]
+
+    async def client(i):
+        async with connect(f"ws://127.0.0.1:{port}", max_queue=None) as ws:
+            await ws.send(json.dumps({"subscribe": True}))
+            async for msg in ws:
+                m = json.loads(msg)
+                if m.get("type") == "state":
+                    frames[i] += 1
+                    merge(states[i], m["data"])
+                    if states[i].get("bench_done"):
+                        break
+
+    conns = []
+    for i in range(n):
+        conns.append(asyncio.create_task(client(i)))
+        if i % 100 == 99:
+            await asyncio.sleep(0.05)  # 접속 폭주로 accept 대기열이 넘치지 않도록
+    await asyncio.gather(*conns, return_exceptions=True)
+    distinct = {json.dumps(st, sort_keys=True) for st in states}
+    print(json.dumps({"frames": frames, "states": [json.loads(st) for st in distinct]}))
+
+# ---------- 서버 ----------
+class _Sink(asyncio.Protocol):
+    def data_received(self, data):
+        pass
+
+async def run_server(pcc, n, seconds):
+    import websockets
+
+    loop = asyncio.get_running_loop()
+    sink = await loop.create_server(_Sink, "127.0.0.1", 0)
+    pcc.pi_link = pcc.PiLink("127.0.0.1", sink.sockets[0].getsockname()[1])
+    ws_server = await websockets.serve(pcc.handle_connection, "127.0.0.1", 0)
+    port = ws_server.sockets[0].getsockname()[1]
+    bc_task = asyncio.create_task(pcc.broadcaster.run())
+
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--role", "clients", "--port", str(port),
+        "--clients", str(n), stdout=subprocess.PIPE)
+
+    t_start = time.perf_counter()
+    while len(pcc.broadcaster.subscribers) < n and time.perf_counter() - t_start < 60:
+        await asyncio.sleep(0.05)
+    print(f"[접속] 구독자 {len(pcc.broadcaster.subscribers)}명 ({time.perf_counter() - t_start:.1f}s)")
+
+    # 1초 제어 틱 (온도가 계속 바뀜) + 틱 사이 잦은 상태 변경(방송 합치기 확인용)
+    lateness, tick_cost = [], []
+    cpu0 = time.process_time()
+    t_wall = time.perf_counter()
+    next_tick = loop.time() + 1.0
+
+    async def churn():
+        # 틱 사이 50ms 마다 온도 갱신 -> 방송은 BROADCAST_MAX_RATE 로 합쳐짐
+        j = 0
+        while True:
+            pcc.broadcaster.update({"cpu": 40 + j % 30})
+            j += 1
+            await asyncio.sleep(0.05)
+    churn_task = asyncio.create_task(churn())
+
+    for k in range(int(seconds)):
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+        lateness.append((loop.time() - next_tick) * 1000)
+        next_tick += 1.0
+        t0 = time.perf_counter()
+        await pcc.control_tick({"cpu_temperature": 40 + k % 30, "gpu_temperature": 45 + k % 20,
+                                "model_result": k % 2})
+        tick_cost.append((time.perf_counter() - t0) * 1000)
+    churn_task.cancel()
+    busy = (time.process_time() - cpu0) / (time.perf_counter() - t_wall)
+    pcc.broadcaster.update({"bench_done": True})  # 클라이언트 종료 신호 (마지막 프레임)
+
+    out, _ = await proc.communicate()
+    result = json.loads(out.decode().strip().splitlines()[-1])
+    frames = result["frames"]
+    print(f"[틱] {len(lateness)}회  지연 median={statistics.median(lateness):.1f} ms  "
+          f"max={max(lateness):.1f} ms  control_tick max={max(tick_cost):.2f} ms")
+    print(f"[방송] 프레임 {pcc.broadcaster.frames}개, 클라이언트당 수신 median={statistics.median(frames)} "
+          f"min={min(frames)}  서버 CPU 사용률 {busy * 100:.0f}% (1코어 기준, 클라이언트 프로세스와 코어 공유)")
+    same = result["states"] == [pcc.broadcaster.state]
+    print(f"[일치] 모든 클라이언트가 diff 로 재구성한 상태 == 서버 상태: {same}")
+
+    bc_task.cancel()
+    ws_server.close()
+    sink.close()
+    await pcc.pi_link.close()
+    return max(lateness) < 250 and same  # 1초 틱을 놓치지 않을 여유
+
+# ---------- 느린 구독자 ----------
+class SlowWebSocket:
+    def __init__(self, delay):
+        self.delay = delay
+        self.state = {}
+        self.received = 0
+
+    async def send(self, text):
+        await asyncio.sleep(self.delay)
+        self.received += 1
+        merge(self.state, json.loads(text)["data"])
+
+async def run_slow(pcc):
+    from broadcast import StateBroadcaster
+
+    bc = StateBroadcaster(max_rate=50, queue_size=4)
+    fast, slow = SlowWebSocket(0), SlowWebSocket(0.5)
+    bc.subscribe(fast)
+    bc.subscribe(slow)
+    task = asyncio.create_task(bc.run())
+    for i in range(100):
+        bc.update({"pwm": i, "cpu": 30 + i % 7})
+        await asyncio.sleep(0.02)
+    await asyncio.sleep(3.0)
+    sub = bc.subscribers[slow]
+    ok = slow.state == bc.state == fast.state
+    print(f"[느린 구독자] 방송 {bc.frames}개, 빠른 쪽 수신 {fast.received}, 느린 쪽 수신 {slow.received} "
+          f"(합쳐진 프레임 {sub.dropped})  최종 상태 일치: {ok}")
+    task.cancel()
+    total = bc.dropped()
+    for s in list(bc.subscribers):
+        bc.unsubscribe(s)
+    # 카운터(fan_ws_frames_coalesced_total)는 구독자가 끊겨도 줄지 않아야 한다
+    return ok and sub.dropped > 0 and bc.dropped() == total
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--role", default="server", choices=("server", "clients"))
+    ap.add_argument("--port", type=int)
+    ap.add_argument("--clients", type=int, default=1000)
+    ap.add_argument("--seconds", type=int, default=10, help="제어 틱 횟수(초)")
+    args = ap.parse_args()
+
+    if args.role == "clients":
+        asyncio.run(run_clients(args.port, args.clients))
+        return
+
+    import logging
+    import process_control_command as pcc
+    logging.disable(logging.CRITICAL)
+    pcc.print = lambda *a, **k: None  # 접속/수신마다 찍는 [Web] 로그는 숨김
+
+    ok = asyncio.run(run_server(pcc, args.clients, args.seconds))
+    ok = asyncio.run(run_slow(pcc)) and ok
+    print("[통과]" if ok else "[실패]")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+import numpy as np
+
+# 서버 -> Pi 명령 수 비교: 기록된(합성) 온도로 FanController 를 돌리며 PiLink 로 루프백 수신기에 보낸다
+#   python TEST/bench_edge_ramp.py [--hours 6]
+#   legacy   : 틱(1초)마다 {"pwm"} 전송 (예전 send_to_pi)
+#   change   : PiLink.send — 슬루가 적용된 PWM 이 바뀔 때만 (+ keepalive)
+#   setpoint : PiLink.send_setpoint — 목표값/변화율만, deadband 미만 변화는 생략 (ramp 는 Pi 가 수행)
+# keepalive(PI_KEEPALIVE_SEC) 재전송이 명령 수의 하한이다 (5초면 720/h).
+# "오차" 는 Pi 가 받은 목표로 ramp 했을 때의 PWM 과 서버가 계산한 PWM 의 차이(평균/최대, %p)
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+import FANCONTROLL_PY as fc
+from FANCONTROLL_PY import FanController, PiLink
+from replay import Trace
+from replay_test import synthetic_trace
+
+fc.print = lambda *a, **k: None
+
+def smooth_trace(n, seed=0):
+    """센서 노이즈를 이동 평균하고 model_result 가 드물게(구간 단위로) 바뀌는 기록"""
+    t = synthetic_trace(n, seed)
+    k = np.ones(30) / 30
+    model = np.repeat(np.random.default_rng(seed).random(n // 900 + 1) < 0.1, 900)[:n].astype(np.int64)
+    return Trace(t.ts, np.round(np.convolve(t.cpu, k, "same"), 2), np.round(np.convolve(t.gpu, k, "same"), 2), model)
+
+async def run_trace(trace, port, deadbands, keepalive):
+    ctl = FanController()
+    pwm, target = [], []
+    for ts, c, g, m in zip(trace.ts.tolist(), trace.cpu.tolist(), trace.gpu.tolist(), trace.model.tolist()):
+        pwm.append(ctl.step(c, g, m, now_ms=int(ts * 1000)))
+        target.append(ctl.last_target)
+    ramp = float(ctl.slew_per_sec)
+
+    now = [0.0]
+    results = {"legacy": (len(trace), 0.0, 0)}
+    link = PiLink("127.0.0.1", port, keepalive=keepalive, clock=lambda: now[0])
+    for ts, p in zip(trace.ts.tolist(), pwm):
+        now[0] = ts
+        await link.send(p)
+    results["change"] = (link.frames_sent, 0.0, 0)
+    await link.close()
+
+    for db in deadbands:
+        link = PiLink("127.0.0.1", port, keepalive=keepalive, clock=lambda: now[0])
+        edge, cur, err = None, 0.0, []
+        for ts, p, tg in zip(trace.ts.tolist(), pwm, target):
+            now[0] = ts
+            await link.send_setpoint(tg, ramp, deadband=db)
+            edge = link.last_sent[0]
+            cur = edge if abs(edge - cur) <= ramp else cur + np.sign(edge - cur) * ramp
+            err.append(abs(cur - p))
+        results[f"setpoint db={db:g}"] = (link.frames_sent, float(np.mean(err)), float(np.max(err)))
+        await link.close()
+    return results
+
+async def main(args):
+    async def sink(reader, writer):
+        while await reader.readline():
+            pass
+        writer.close()
+    server = await asyncio.start_server(sink, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    n = int(args.hours * 3600)
+    for name, trace in (("노이즈 많음", synthetic_trace(n)), ("평활", smooth_trace(n))):
+        print(f"[{name}] {n:,} 틱 ({args.hours:g}h, 1Hz), keepalive {args.keepalive:g}s")
+        res = await run_trace(trace, port, args.deadband, args.keepalive)
+        legacy = res["legacy"][0]
+        for mode, (frames, mean_err, max_err) in res.items():
+            print(f"  {mode:<16} {frames:>7,} 명령 ({frames / args.hours:8,.0f}/h, 기존 대비 {frames / legacy * 100:5.1f}%)  "
+                  f"오차 평균 {mean_err:.2f} / 최대 {max_err:.0f} %p")
+    server.close()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hours", type=float, default=6)
+    ap.add_argument("--keepalive", type=float, default=fc.PI_KEEPALIVE_SEC)
+    ap.add_argument("--deadband", type=float, nargs="*", default=[0, 3, 5])
+    asyncio.run(main(ap.parse_args()))
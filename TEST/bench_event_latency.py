@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import argparse
+import threading
+import statistics
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 센서 이벤트 -> Pi 명령 전송까지의 지연: 폴링(InfluxDB) 모드 vs push(ingest) 모드
+#   python TEST/bench_event_latency.py [--trials 10]
+# 온도를 10도(팬 정지) -> 50도(팬 가동)로 바꾼 순간부터, Pi 대역(TCP 싱크)이 pwm > 0 명령을
+# 받을 때까지의 시간을 잰다. 이벤트 시점은 제어 주기와 무관하도록 무작위로 띄운다.
+COOL, HOT = 10.0, 50.0
+state = {"cpu_temperature": COOL, "gpu_temperature": COOL, "model_result": 0}
+
+class FakeInflux(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        rows = [",result,table,_time,_value,_field,_measurement"]
+        rows += [f",_result,{i},{now},{v},value,{m}" for i, (m, v) in enumerate(state.items())]
+        body = ("\r\n".join(rows) + "\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+async def measure(pcc, mode, trials):
+    commands = []  # (도착 시각, pwm)
+
+    async def sink(reader, writer):
+        while line := await reader.readline():
+            m = json.loads(line)
+            commands.append((time.perf_counter(), m.get("pwm", m.get("target"))))  # Pi ramp 모드면 target
+
+    server = await asyncio.start_server(sink, "127.0.0.1", 0)
+    pcc.pi_link = pcc.PiLink("127.0.0.1", server.sockets[0].getsockname()[1], keepalive=0.5)
+    pcc.global_ctl = pcc.FanController()
+    pcc.feed = pcc.SensorFeed()
+
+    tasks = [asyncio.create_task(pcc.automation_loop())]
+    producer = None
+    if mode == "push":
+        ingest = await pcc.feed.serve("127.0.0.1", 0)
+        tasks.append(asyncio.create_task(pcc.push_control_loop()))
+        _, producer = await asyncio.open_connection("127.0.0.1", ingest.sockets[0].getsockname()[1])
+
+        async def keep_pushing():
+            # 실제 생산자처럼 1초마다 현재 값을 보낸다 (push 가 살아있는 동안 폴링은 쉼)
+            while True:
+                producer.write((json.dumps(state) + "\n").encode())
+                await asyncio.sleep(1.0)
+        tasks.append(asyncio.create_task(keep_pushing()))
+
+    latencies = []
+    await asyncio.sleep(1.5)
+    for _ in range(trials):
+        await asyncio.sleep(random.uniform(0, 1.0))
+        t_event = time.perf_counter()
+        state["cpu_temperature"] = state["gpu_temperature"] = HOT
+        if producer is not None:
+            producer.write((json.dumps(state) + "\n").encode())
+        while not any(t >= t_event and pwm > 0 for t, pwm in commands):
+            await asyncio.sleep(0.001)
+        t_cmd = next(t for t, pwm in commands if t >= t_event and pwm > 0)
+        latencies.append((t_cmd - t_event) * 1000)
+
+        # 다시 식혀서 팬이 0 으로 돌아올 때까지 대기
+        state["cpu_temperature"] = state["gpu_temperature"] = COOL
+        if producer is not None:
+            producer.write((json.dumps(state) + "\n").encode())
+        while not commands or commands[-1][1] != 0:
+            await asyncio.sleep(0.05)
+
+    for t in tasks:
+        t.cancel()
+    if producer is not None:
+        producer.close()
+        ingest.close()
+    await pcc.pi_link.close()
+    await asyncio.sleep(0.1)  # 싱크/ingest 핸들러가 EOF 를 받고 끝나도록 대기
+    server.close()
+    return latencies
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--trials", type=int, default=10)
+    args = ap.parse_args()
+
+    influx = ThreadingHTTPServer(("127.0.0.1", 0), FakeInflux)
+    influx.daemon_threads = True
+    threading.Thread(target=influx.serve_forever, daemon=True).start()
+    os.environ["INFLUX_URL_BASE"] = f"http://127.0.0.1:{influx.server_address[1]}"
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    import process_control_command as pcc
+
+    results = {}
+    for mode in ("poll", "push"):
+        results[mode] = sorted(asyncio.run(measure(pcc, mode, args.trials)))
+    print()
+    for mode, lat in results.items():
+        print(f"[{mode:>4}] 센서 이벤트 -> 명령 전송: median={statistics.median(lat):7.1f} ms  "
+              f"p95={lat[int(len(lat) * 0.95) - 1]:7.1f} ms  max={lat[-1]:7.1f} ms  (n={len(lat)})")
+
+if __name__ == "__main__":
+    main()
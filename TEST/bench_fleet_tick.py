@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import threading
+import statistics
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 플릿 모드 틱 시간 측정: N대의 가상 장치 (기본 1000대)
+#   python TEST/bench_fleet_tick.py [장치 수] [틱 수]
+# InfluxDB 대역은 매 요청마다 장치별 최신 cpu/gpu/model_result 를 CSV 로 돌려주고,
+# 모든 Pi 연결은 로컬 TCP 싱크 하나로 모인다 (장치당 연결 1개).
+N_DEVICES = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+TICKS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+MEASUREMENTS = ("cpu_temperature", "gpu_temperature", "model_result")
+
+class FakeInflux(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        lines = [",result,table,_time,_value,_field,_measurement,device"]
+        table = 0
+        for i in range(N_DEVICES):
+            for m in MEASUREMENTS:
+                v = random.randint(0, 1) if m == "model_result" else round(random.uniform(25, 70), 2)
+                lines.append(f",_result,{table},{now},{v},value,{m},dev{i:05d}")
+                table += 1
+        body = ("\r\n".join(lines) + "\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+async def run(fleet_mod):
+    import wire
+    received = 0
+
+    async def sink(reader, writer):
+        # 협상에는 JSON 유지(0)로 바로 답한다. 답하지 않는 예전 에이전트면 첫 연결에 PI_WIRE_TIMEOUT 이 더해진다.
+        nonlocal received
+        while line := await reader.readline():
+            if wire.parse_hello(line) is not None:
+                writer.write(wire.hello_reply(0))
+                continue
+            received += 1
+
+    server = await asyncio.start_server(sink, "127.0.0.1", 0, backlog=N_DEVICES)
+    port = server.sockets[0].getsockname()[1]
+
+    fleet = fleet_mod.Fleet()
+    for i in range(N_DEVICES):
+        fleet.add(f"dev{i:05d}", "127.0.0.1", port, groups=(f"rack{i // 20:03d}",))
+
+    durations = []
+    for _ in range(TICKS):
+        t0 = time.perf_counter()
+        await fleet.tick()
+        durations.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.05)
+
+    await asyncio.gather(*(d.link.close() for d in fleet.devices.values()))
+    await asyncio.sleep(0.2)
+    server.close()
+    return durations, received
+
+def main():
+    influx = ThreadingHTTPServer(("127.0.0.1", 0), FakeInflux)
+    influx.daemon_threads = True
+    threading.Thread(target=influx.serve_forever, daemon=True).start()
+    os.environ["INFLUX_URL_BASE"] = f"http://127.0.0.1:{influx.server_address[1]}"
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    import fleet as fleet_mod
+
+    durations, received = asyncio.run(run(fleet_mod))
+    # 첫 틱은 장치별 TCP 연결 수립 비용을 포함하므로 따로 표시
+    steady = sorted(durations[1:])
+    print(f"[Fleet] 장치 {N_DEVICES}대, 틱 {len(durations)}회, Pi 수신 명령 {received}개")
+    print(f"  첫 틱(연결 수립 포함): {durations[0]*1000:.1f} ms")
+    print(f"  이후 틱: median={statistics.median(steady)*1000:.1f} ms  "
+          f"p95={steady[int(len(steady)*0.95)-1]*1000:.1f} ms  max={steady[-1]*1000:.1f} ms")
+    if max(durations) >= 1.0:
+        print("[실패] 틱 시간이 1초 주기를 넘었습니다.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import csv
+import io
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+
+# Flux annotated CSV 파싱: 스트리밍 파서(flux_csv) vs 응답 전체를 읽은 뒤 csv.DictReader
+#   python TEST/bench_flux_csv.py [--rows 1000000]
+# 히스토리 쿼리처럼 큰 응답을 가정하고, 처리 속도(rows/s)와 파싱 중 최대 메모리(tracemalloc)를 비교한다.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+from flux_csv import AnnotatedCSVParser, CHUNK_SIZE, parse_time
+
+TABLE_ROWS = 10_000  # 표 블록 하나의 행 수 (블록마다 주석/헤더 반복)
+MEASUREMENTS = ("cpu_temperature", "gpu_temperature", "model_result")
+
+def gen_chunks(rows, annotated=True):
+    """
+    응답 본문을 네트워크처럼 CHUNK_SIZE 바이트 조각으로 흘려보낸다 (전체를 만들지 않음).
+    annotated=False 면 서버 기본 응답처럼 주석 없이 헤더 한 줄만 둔다.
+    """
+    buf = []
+    size = 0
+    for start in range(0, rows, TABLE_ROWS):
+        t = start // TABLE_ROWS
+        m = MEASUREMENTS[t % len(MEASUREMENTS)]
+        dt = "long" if m == "model_result" else "double"
+        lines = []
+        if annotated:
+            lines += [f"#datatype,string,long,dateTime:RFC3339,{dt},string,string\r\n",
+                      "#group,false,false,false,false,true,true\r\n",
+                      "#default,_result,,,,,\r\n"]
+        if annotated or start == 0:
+            lines.append(",result,table,_time,_value,_field,_measurement\r\n")
+        for i in range(start, min(start + TABLE_ROWS, rows)):
+            v = i % 2 if dt == "long" else 30 + (i % 500) / 10
+            lines.append(f",,{t},2026-10-17T{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}.5Z,"
+                         f"{v},value,{m}\r\n")
+        if annotated:
+            lines.append("\r\n")
+        for line in lines:
+            b = line.encode()
+            buf.append(b)
+            size += len(b)
+            if size >= CHUNK_SIZE:
+                data = b"".join(buf)
+                yield data[:CHUNK_SIZE]
+                buf, size = [data[CHUNK_SIZE:]], len(data) - CHUNK_SIZE
+    if size:
+        yield b"".join(buf)
+
+def run_streaming(rows):
+    """청크를 받는 대로 파싱해 미리 할당한 배열(시각, 값)에 채운다"""
+    parser = AnnotatedCSVParser(("_time", "_value"), fallback={"_time": parse_time, "_value": float})
+    ts = np.empty(rows)
+    vals = np.empty(rows)
+    return parser.fill(parser.records_from_chunks(gen_chunks(rows)), (ts, vals))
+
+def run_dictreader(rows):
+    """기존 방식: 본문 전체를 받아(r.text) DictReader 로 읽는다 (DictReader 는 주석을 못 읽으므로 기본 응답)"""
+    text = b"".join(gen_chunks(rows, annotated=False)).decode()
+    out = []
+    for row in csv.DictReader(io.StringIO(text)):
+        out.append((parse_time(row["_time"]), float(row["_value"])))
+    return len(out)
+
+def measure(fn, rows):
+    t0 = time.perf_counter()
+    n = fn(rows)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return n, elapsed, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=300_000)
+    args = ap.parse_args()
+
+    total = sum(len(c) for c in gen_chunks(args.rows))
+    print(f"[입력] {args.rows:,} 행, 응답 {total / 1e6:.1f} MB ({TABLE_ROWS:,} 행마다 표 블록)")
+    for name, fn in (("stream", run_streaming), ("dictreader", run_dictreader)):
+        n, elapsed, peak = measure(fn, args.rows)
+        print(f"[{name:>10}] {n:,} 행  {n / elapsed:>10,.0f} rows/s  최대 메모리 {peak / 1e6:7.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+# 이력 링 버퍼 부하 시험: 1,000대 x 1시간(1Hz) 메모리, 추가/조회 시간, 필터별 PWM 흔들림
+#   python TEST/bench_history.py [--devices 1000] [--rows 3600]
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+from FANCONTROLL_PY import FanController
+from history import DeviceHistory, memory_per_device
+from replay_test import synthetic_trace
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def fleet_memory(devices, rows):
+    before = rss_mb()
+    hists = [DeviceHistory(size=rows) for _ in range(devices)]
+    rng = np.random.default_rng(0)
+    cpu = (50 + rng.normal(0, 2, rows)).tolist()
+    t0 = time.perf_counter()
+    for t in range(rows):
+        c = cpu[t]
+        for h in hists:
+            h.push(t, c, c + 5, 0)
+            h.record_pwm(40)
+    fill = time.perf_counter() - t0
+    after = rss_mb()
+    print(f"[메모리] {devices:,}대 x {rows:,}행: 계산 {memory_per_device(rows) * devices / 1e6:.1f} MB, "
+          f"RSS 증가 {after - before:.1f} MB (장치당 {(after - before) * 1024 / devices:.1f} KB)")
+    print(f"[추가] push+record_pwm {devices * rows:,}회 {fill:.1f}s -> {fill / (devices * rows) * 1e6:.2f} µs/행, "
+          f"1,000대 틱 하나 {fill / rows * 1000:.2f} ms")
+
+    h = hists[0]
+    for seconds, points in ((600, 600), (rows, 1000)):
+        t0 = time.perf_counter()
+        for _ in range(100):
+            body = json.dumps({"status": "ok", "history": h.window(seconds, max_points=points)})
+        print(f"[조회] 최근 {seconds}s (최대 {points}점): {(time.perf_counter() - t0) * 10:.2f} ms, "
+              f"응답 {len(body) / 1024:.0f} KB (InfluxDB 조회 없음)")
+
+def jitter(hours):
+    trace = synthetic_trace(int(hours * 3600))
+    print(f"[필터] 합성 트레이스 {hours:g}h, 기본 FanController")
+    for name, kw in (("none", {}), ("ema a=0.3", {"filter": "ema", "alpha": 0.3}),
+                     ("ema a=0.1", {"filter": "ema", "alpha": 0.1}), ("median 5", {"filter": "median", "window": 5})):
+        h = DeviceHistory(size=3600, **kw)
+        ctl = FanController()
+        pwm = []
+        for ts, c, g, m in zip(trace.ts.tolist(), trace.cpu.tolist(), trace.gpu.tolist(), trace.model.tolist()):
+            c, g = h.push(ts, c, g, m)
+            pwm.append(ctl.step(c, g, m, now_ms=int(ts * 1000)))
+        p = np.array(pwm)
+        print(f"  {name:<10} PWM 변경 {np.count_nonzero(np.diff(p)) / hours:7,.0f}/h  "
+              f"|ΔPWM| 평균 {np.abs(np.diff(p)).mean():.2f}  평균 duty {p.mean():.1f}%")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=1000)
+    ap.add_argument("--rows", type=int, default=3600)
+    ap.add_argument("--hours", type=float, default=6)
+    args = ap.parse_args()
+    fleet_memory(args.devices, args.rows)
+    jitter(args.hours)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+import requests
+
+# 기존 7일 스캔 쿼리(flux)와 증분 조회(IncrementalReader)의 쿼리 시간/전송 바이트 비교
+# 사용 예:
+#   INFLUX_BUCKET=TEMPER_BENCH python TEST/bench_influx_query.py --seed
+#   INFLUX_BUCKET=TEMPER_BENCH python TEST/bench_influx_query.py --runs 20
+# (--seed 는 7일치 1Hz 합성 데이터를 버킷에 기록한다. 벤치 전용 버킷을 사용할 것)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import FANCONTROLL_PY as fc
+
+WRITE_URL = f"{fc.BASE}/api/v2/write?org={fc.ORG}&bucket={fc.BUCKET}&precision=s"
+SEED_DAYS = 7
+BATCH = 5000
+
+def seed(days=SEED_DAYS, period=1):
+    """cpu/gpu/model_result 측정값을 days 일 동안 period 초 간격으로 기록"""
+    now = int(time.time())
+    start = now - days * 86400
+    write_headers = {"Authorization": f"Token {fc.TOKEN}", "Content-Type": "text/plain; charset=utf-8"}
+    lines = []
+    total = 0
+    with requests.Session() as s:
+        for t in range(start, now, period):
+            lines.append(f"cpu_temperature value={45 + 10 * random.random():.2f} {t}")
+            lines.append(f"gpu_temperature value={50 + 15 * random.random():.2f} {t}")
+            if t % 10 == 0:
+                lines.append(f"model_result value={random.randint(0, 1)} {t}")
+            if len(lines) >= BATCH:
+                s.post(WRITE_URL, headers=write_headers, data="\n".join(lines), timeout=30).raise_for_status()
+                total += len(lines)
+                lines = []
+        if lines:
+            s.post(WRITE_URL, headers=write_headers, data="\n".join(lines), timeout=30).raise_for_status()
+            total += len(lines)
+    print(f"[Seed] {total} points 기록 완료 ({days}일)")
+
+def run_query(session, query):
+    t0 = time.perf_counter()
+    r = session.post(fc.QUERY_URL, headers=fc.headers, data=query, timeout=60)
+    r.raise_for_status()
+    return time.perf_counter() - t0, len(r.content), r.text
+
+def bench(runs):
+    reader = fc.IncrementalReader()
+    results = {"legacy(-7d)": [], "incremental": []}
+    sizes = {"legacy(-7d)": [], "incremental": []}
+    with requests.Session() as s:
+        for _ in range(runs):
+            dt, n, _ = run_query(s, fc.flux)
+            results["legacy(-7d)"].append(dt)
+            sizes["legacy(-7d)"].append(n)
+
+            dt, n, text = run_query(s, reader.build_query())
+            reader.ingest(text)
+            results["incremental"].append(dt)
+            sizes["incremental"].append(n)
+            time.sleep(1.0)  # 실제 제어 주기와 동일하게 1초 간격
+
+    for name in results:
+        ts = sorted(results[name])
+        print(f"{name:>12}: median={statistics.median(ts)*1000:8.1f} ms  "
+              f"p95={ts[int(len(ts)*0.95)-1]*1000:8.1f} ms  "
+              f"bytes={statistics.mean(sizes[name]):10.0f}")
+    print(f"[Reader] 최종 창 크기: {reader.window()} s, 샘플: {reader.samples}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seed", action="store_true", help="7일치 합성 데이터 기록 후 종료")
+    ap.add_argument("--runs", type=int, default=10)
+    args = ap.parse_args()
+    if args.seed:
+        seed()
+        return
+    bench(args.runs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+
+# Pi 에이전트(pi.py FanAgent) 부하 시험: 하드웨어 없이 PI_SIMULATION=1 로 실행
+#   python TEST/bench_pi_agent.py [--commands 200000] [--conns 4]
+# 명령 생성기는 별도 프로세스에서 돌고, 이 프로세스(에이전트)의 CPU 시간/메모리만 잰다.
+# 기존 구현은 수신한 줄마다 GPIO 에 썼으므로 "기존 쓰기 수" = 수신 명령 수 이다.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+os.environ["PI_SIMULATION"] = "1"
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+# ---------- 명령 생성기 (별도 프로세스) ----------
+def run_client(port, conns, commands, rate):
+    socks = [socket.create_connection(("127.0.0.1", port)) for _ in range(conns)]
+    per = commands // conns
+    if rate:
+        # 일정 속도: 연결을 돌아가며 초당 rate 개
+        for i in range(commands):
+            socks[i % conns].sendall(json.dumps({"pwm": i % 101, "seq": i}).encode() + b"\n")
+            time.sleep(1.0 / rate)
+    else:
+        # 폭주: 연결마다 per 개를 한 번에
+        for k, s in enumerate(socks):
+            s.sendall(b"".join(json.dumps({"pwm": (i * 7 + k) % 101, "seq": i}).encode() + b"\n"
+                               for i in range(per)))
+    for s in socks:
+        s.close()
+
+# ---------- 에이전트 ----------
+async def scenario(pi, name, conns, commands, rate=0):
+    writes = []
+    agent = pi.FanAgent(write=writes.append, write_interval=pi.GPIO_WRITE_INTERVAL)
+    writer_task = asyncio.create_task(agent.run_writer())
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.abspath(__file__), "--role", "client", "--port", str(port),
+        "--conns", str(conns), "--commands", str(commands), "--rate", str(rate))
+    peak = [rss_mb()]
+
+    async def sample_rss():
+        while True:
+            await asyncio.sleep(0.2)
+            peak[0] = max(peak[0], rss_mb())
+    sampler = asyncio.create_task(sample_rss())
+    await proc.wait()
+    while agent.connections:
+        await asyncio.sleep(0.01)
+    sampler.cancel()
+    peak = max(peak[0], rss_mb())
+    await asyncio.sleep(pi.GPIO_WRITE_INTERVAL * 2)  # 마지막 값이 쓰일 때까지
+    cpu, wall = time.process_time() - cpu0, time.perf_counter() - t0
+
+    n = agent.received
+    print(f"[{name}] 연결 {conns}, 명령 {n:,}개 / {wall:.2f}s  GPIO 쓰기 {agent.writes} (기존 방식 {n:,})  "
+          f"CPU {cpu * 1000:.0f} ms ({cpu / max(n, 1) * 1e6:.1f} µs/명령)  RSS 최대 {peak:.1f} MB")
+    assert writes and writes[-1] == agent.applied
+    assert all(a != b for a, b in zip(writes, writes[1:])), "같은 값을 연속으로 썼음"
+    assert agent.writes <= wall / pi.GPIO_WRITE_INTERVAL + 2
+    writer_task.cancel()
+    server.close()
+    return agent
+
+async def connection_cap(pi, attempts):
+    agent = pi.FanAgent(write=lambda v: None)
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    streams = [await asyncio.open_connection("127.0.0.1", port) for _ in range(attempts)]
+    await asyncio.sleep(0.2)
+    print(f"[상한] 연결 시도 {attempts}, 수락 {agent.connections}, 거절 {agent.rejected} "
+          f"(PI_MAX_CONNECTIONS={agent.max_connections})  RSS {rss_mb():.1f} MB")
+    assert agent.connections == agent.max_connections
+    for _, w in streams:
+        w.close()
+    await asyncio.sleep(0.1)
+    server.close()
+
+async def run(args):
+    import pi
+    pi.print = lambda *a, **k: None  # 연결/쓰기 로그 숨김
+    print(f"[시작] RSS {rss_mb():.1f} MB, GPIO 쓰기 간격 {pi.GPIO_WRITE_INTERVAL * 1000:.0f} ms")
+    await scenario(pi, "폭주", args.conns, args.commands)
+    await scenario(pi, "일정", 1, args.rate * 3, rate=args.rate)
+    await connection_cap(pi, 20)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--role", default="agent", choices=("agent", "client"))
+    ap.add_argument("--port", type=int)
+    ap.add_argument("--conns", type=int, default=4)
+    ap.add_argument("--commands", type=int, default=200_000)
+    ap.add_argument("--rate", type=int, default=200, help="일정 속도 시나리오의 초당 명령 수")
+    args = ap.parse_args()
+    if args.role == "client":
+        run_client(args.port, args.conns, args.commands, args.rate)
+    else:
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
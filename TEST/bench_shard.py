@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+# 샤드 워커 수에 따른 지속 처리량 측정 (shard.py)
+#   python TEST/bench_shard.py [--devices 2000] [--workers 1,2,4] [--seconds 15] [--period 0.05]
+# 워커 N 개를 실제 프로세스로 띄우고(InfluxDB 대역 + Pi 싱크는 이 프로세스), 제어 주기(FAN_TICK_PERIOD)를 짧게 줘
+# 요청 부하(장치 수 / 주기)가 처리 능력을 넘게 한 뒤, 예열 뒤 측정 구간 동안
+#   - 지속 처리량 = 실제로 끝난 장치-틱 수(지표 fan_device_ticks_total 의 구간 차분) / 경과 시간  [장치-틱/초]
+#     (늦은 틱은 스케줄러가 건너뛰므로, 이 값이 워커들이 계속 감당할 수 있는 양이다)
+#   - 그룹 틱 시간 p95, 워커 CPU 사용률 합 (/proc/<pid>/stat), 장치-틱당 CPU
+# 를 출력한다. 틱 시간에는 InfluxDB/Pi 대기가 섞여 있어 코어가 하나여도 워커를 나누면 대기가 겹쳐 처리량이 조금
+# 늘 수 있지만, 워커 수에 비례해 늘려면 코어가 워커 수 이상 있어야 한다.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shard import Supervisor
+from shard_test import start_influx, start_pi_sink, write_config
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK  # utime + stime
+
+
+def device_ticks(stats: dict) -> float:
+    return stats.get('fan_device_ticks_total{path="fleet"}', 0)
+
+
+async def measure(config, url, n_workers, warmup, seconds, period, tmp):
+    base = 21000 + random.randrange(0, 4000, 20)
+    env = dict(os.environ, INFLUX_URL_BASE=url, LOG_LEVEL="ERROR", PI_EDGE_RAMP="0", FAN_TICK_PERIOD=str(period))
+    sup = Supervisor(config, base_port=base, metrics_base_port=base + 10,
+                     snapshot_path=os.path.join(tmp, f"snap{n_workers}"), env=env,
+                     stdout=asyncio.subprocess.DEVNULL)
+    try:
+        await sup.start(n_workers)
+        await asyncio.sleep(warmup)
+        workers = list(sup.workers.values())
+        before = await sup.broadcast({"stats": True})
+        cpu0 = {w.id: cpu_seconds(w.pid) for w in workers}
+        t0 = time.perf_counter()
+        await asyncio.sleep(seconds)
+        after = await sup.broadcast({"stats": True})
+        wall = time.perf_counter() - t0
+        cpu = sum(cpu_seconds(w.pid) - cpu0[w.id] for w in workers)
+        done = sum(device_ticks(after[w.id]["stats"]) - device_ticks(before[w.id]["stats"]) for w in workers)
+        p95 = max((after[w.id]["stats"].get('fan_tick_seconds{path="fleet"}') or {}).get("p95_ms") or 0.0
+                  for w in workers)
+        return dict(sustained=done / wall, p95_ms=p95, cpu=cpu / wall, per_device_us=cpu / max(1, done) * 1e6)
+    finally:
+        await sup.stop()
+
+
+async def run(args):
+    pi_server, pi_port, counts = await start_pi_sink(backlog=args.devices)
+    with tempfile.TemporaryDirectory() as tmp:
+        config = os.path.join(tmp, "fleet.json")
+        ids = write_config(config, args.devices, pi_port, rack_size=20)
+        influx, url = start_influx(ids)
+        rows = []
+        for n in args.workers:
+            r = await measure(config, url, n, args.warmup, args.seconds, args.period, tmp)
+            rows.append((n, r))
+            print(f"  워커 {n}: 지속 {r['sustained']:8.0f} 장치-틱/s, 그룹 틱 p95 {r['p95_ms']:6.1f} ms, "
+                  f"워커 CPU {r['cpu']:.2f} 코어, 장치-틱당 CPU {r['per_device_us']:.1f} us")
+        influx.shutdown()
+    pi_server.close()
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--devices", type=int, default=2000)
+    ap.add_argument("--workers", default="1,2,4", help="쉼표로 구분한 워커 수 목록")
+    ap.add_argument("--warmup", type=float, default=5.0)
+    ap.add_argument("--seconds", type=float, default=15.0)
+    ap.add_argument("--period", type=float, default=0.05, help="제어 주기(초), 짧을수록 요청 부하가 큼")
+    args = ap.parse_args()
+    args.workers = [int(x) for x in args.workers.split(",")]
+    cores = len(os.sched_getaffinity(0))
+    offered = args.devices / args.period
+    print(f"[Bench] 장치 {args.devices}대, 사용 가능 코어 {cores}개, 요청 부하 {offered:,.0f} 장치-틱/s "
+          f"(주기 {args.period}s, 측정 {args.seconds:.0f}s, 예열 {args.warmup:.0f}s)")
+    rows = asyncio.run(run(args))
+    base = rows[0][1]["sustained"]
+    for n, r in rows:
+        note = " (요청 부하를 다 처리함: 주기를 줄여 다시 측정)" if r["sustained"] > 0.95 * offered else ""
+        print(f"[Bench] 워커 {n}: 지속 처리량 x{r['sustained'] / base:.2f} (워커 1 대비){note}")
+    if cores < max(args.workers):
+        print(f"[Bench] 코어가 {cores}개뿐이라 워커 {cores}개를 넘으면 같은 코어를 나눠 쓴다")
+
+if __name__ == "__main__":
+    main()
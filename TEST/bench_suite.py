@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import threading
+import contextlib
+import socketserver
+
+# 제어 서버 핫패스 마이크로 벤치마크 (네트워크 불필요, 루프백만 사용)
+#   python TEST/bench_suite.py --out bench_results.json
+#   python TEST/bench_suite.py --out new.json --compare bench_results.json
+# 결과는 JSON 으로 저장되며, --compare 로 이전 결과(다른 커밋)와 비교할 수 있다.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+FIXTURES = os.path.join(HERE, "fixtures")
+
+import FANCONTROLL_PY as fc
+import process_control_command as pcc
+
+MIN_TIME = 0.3   # 항목별 최소 측정 시간(초)
+ROUNDS = 15      # 측정 라운드 수 (라운드별 1회 평균을 표본으로 사용)
+
+
+def _summary(samples_ns, ops):
+    samples_ns = sorted(samples_ns)
+    return {
+        "ops": ops,
+        "median_ns": statistics.median(samples_ns),
+        "mean_ns": statistics.fmean(samples_ns),
+        "min_ns": samples_ns[0],
+        "p95_ns": samples_ns[max(0, int(len(samples_ns) * 0.95) - 1)],
+    }
+
+
+def _calibrate(fn):
+    """한 라운드가 MIN_TIME / ROUNDS 정도 걸리도록 반복 횟수를 정한다"""
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        if time.perf_counter() - t0 >= MIN_TIME / ROUNDS or n >= 1 << 22:
+            return n
+        n *= 2
+
+
+def bench(fn):
+    n = _calibrate(fn)
+    samples = []
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        samples.append((time.perf_counter_ns() - t0) / n)
+    return _summary(samples, n * ROUNDS)
+
+
+async def abench(fn, n):
+    """비동기 항목: 라운드마다 fn 을 n 번 await"""
+    samples = []
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            await fn()
+        samples.append((time.perf_counter_ns() - t0) / n)
+    return _summary(samples, n * ROUNDS)
+
+
+# ---------- 1) FanController.step (모드별) ----------
+def bench_step():
+    out = {}
+    for mode in ("auto", "manual", "range"):
+        ctl = fc.FanController(mode=mode, manual_target=60)
+        temps = [(20.0 + (i * 7) % 60, 25.0 + (i * 11) % 55, i % 2) for i in range(64)]
+        state = {"i": 0, "now": 1_700_000_000_000}
+
+        def run():
+            i = state["i"] = (state["i"] + 1) & 63
+            state["now"] += 1000
+            cpu, gpu, model = temps[i]
+            ctl.step(cpu, gpu, model, now_ms=state["now"])
+        out[f"step.{mode}"] = bench(run)
+    return out
+
+
+# ---------- 2) CSV 파싱 (기록된 Flux 응답 픽스처) ----------
+def bench_csv_parse():
+    out = {}
+    with open(os.path.join(FIXTURES, "latest_single.csv"), newline="") as f:
+        single = f.read()
+    with open(os.path.join(FIXTURES, "latest_fleet_200.csv"), newline="") as f:
+        fleet = f.read()
+    with open(os.path.join(FIXTURES, "latest_fleet_annotated.csv"), newline="") as f:
+        annotated = f.read()
+
+    def parse_single():
+        fc.IncrementalReader().ingest(single)
+
+    def parse_fleet():
+        fc.IncrementalReader(group_tag="device").ingest(fleet)
+
+    def parse_annotated():
+        fc.IncrementalReader(group_tag="device").ingest(annotated)
+
+    out["csv.latest_single"] = bench(parse_single)
+    out["csv.latest_fleet_200"] = bench(parse_fleet)
+    out["csv.latest_fleet_200"]["rows"] = fleet.count("\n") - 2
+    out["csv.latest_fleet_annotated"] = bench(parse_annotated)
+    return out
+
+
+# ---------- 3) Pi 전송 (루프백 싱크) ----------
+class _Sink(socketserver.BaseRequestHandler):
+    def handle(self):
+        while self.request.recv(65536):
+            pass
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    request_queue_size = 128  # 연결마다 새로 맺으므로 accept 대기열을 넉넉히
+    daemon_threads = True
+
+
+async def _bench_pilink():
+    async def sink(reader, writer):
+        while await reader.read(65536):
+            pass
+
+    server = await asyncio.start_server(sink, "127.0.0.1", 0)
+    link = fc.PiLink("127.0.0.1", server.sockets[0].getsockname()[1])
+    state = {"v": 0}
+
+    async def send_changed():
+        state["v"] = (state["v"] + 1) % 101
+        await link.send(state["v"])
+
+    async def send_unchanged():
+        await link.send(state["v"])
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        await link.send(0)
+        res = {"send.pilink_changed": await abench(send_changed, 2000),
+               "send.pilink_unchanged": await abench(send_unchanged, 20000)}
+        await link.close()
+    server.close()
+    return res
+
+
+def bench_send():
+    server = _SinkServer(("127.0.0.1", 0), _Sink)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fc.PI_HOST, fc.PI_PORT = server.server_address
+    out = {"send.send_to_pi_per_connection": bench(lambda: fc.send_to_pi(55))}
+    server.shutdown()
+    out.update(asyncio.run(_bench_pilink()))
+    return out
+
+
+# ---------- 4) 웹소켓 메시지 처리 (handle_connection) ----------
+class FakeWebSocket:
+    """handle_connection 이 사용하는 부분만 흉내 낸 웹소켓"""
+    remote_address = ("bench", 0)
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.sent = 0
+
+    async def _iter(self):
+        for m in self.messages:
+            yield m
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def send(self, data):
+        self.sent += 1
+
+
+def bench_websocket():
+    msgs = [json.dumps({"mode": "manual", "manual_pwm": i % 100, "cpu_threshold": 40 + i % 10})
+            for i in range(1000)]
+    pcc.fleet = None
+
+    async def run_round():
+        await pcc.handle_connection(FakeWebSocket(msgs))
+
+    samples = []
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        for _ in range(ROUNDS):
+            t0 = time.perf_counter_ns()
+            asyncio.run(run_round())
+            samples.append((time.perf_counter_ns() - t0) / len(msgs))
+    return {"ws.handle_message": _summary(samples, len(msgs) * ROUNDS)}
+
+
+SUITES = {
+    "step": bench_step,
+    "csv": bench_csv_parse,
+    "send": bench_send,
+    "ws": bench_websocket,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=HERE, stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(new, old_path, threshold):
+    with open(old_path) as f:
+        old = json.load(f)
+    print(f"\n[비교] {old['meta'].get('commit')} -> {new['meta'].get('commit')} (median 기준)")
+    regressions = 0
+    for name, res in new["results"].items():
+        prev = old["results"].get(name)
+        if prev is None:
+            print(f"  {name:<34} (신규)")
+            continue
+        change = (res["median_ns"] - prev["median_ns"]) / prev["median_ns"] * 100
+        flag = "  <-- 느려짐" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"  {name:<34} {prev['median_ns']:>12.0f} -> {res['median_ns']:>12.0f} ns ({change:+6.1f}%){flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--only", nargs="*", choices=sorted(SUITES), help="일부 항목만 실행")
+    ap.add_argument("--compare", help="비교할 이전 결과 JSON")
+    ap.add_argument("--threshold", type=float, default=25.0, help="느려짐 경고 기준(%%)")
+    args = ap.parse_args()
+
+    results = {}
+    for name in args.only or SUITES:
+        results.update(SUITES[name]())
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+    for name, res in results.items():
+        print(f"{name:<34} median={res['median_ns']:>12.0f} ns  p95={res['p95_ns']:>12.0f} ns")
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[저장] {args.out}")
+
+    if args.compare and compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
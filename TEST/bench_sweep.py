@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import random
+import tempfile
+import argparse
+
+import numpy as np
+
+# sweep.py 처리량: 프로세스 수별 후보/s 와 선형 확장 효율, 후보 하나를 스칼라로 재생할 때와 비교
+#   python TEST/bench_sweep.py [--candidates 256] [--hours 6]
+# 프로세스 수는 1, 2, 4, ... CPU 코어 수까지 늘려 가며 측정한다 (32코어 장비에서는 32까지).
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+import sweep
+from replay import replay, write_pwm_trace
+from replay_test import synthetic_trace
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--candidates", type=int, default=256)
+    ap.add_argument("--hours", type=float, default=6)
+    args = ap.parse_args()
+
+    trace = synthetic_trace(int(args.hours * 3600))
+    ranges = {"min_duty": (10, 50), "slew_per_sec": (2, 40), "temp_scale": (50, 80), "pwm_gain": (50, 100)}
+    configs = sweep.random_configs(ranges, args.candidates, random.Random(0), {"mode": "auto"})
+    cores = os.cpu_count() or 1
+    print(f"[입력] 트레이스 {len(trace):,} 샘플 ({args.hours:g}h, 1Hz), 후보 {len(configs)}개, CPU {cores}코어")
+
+    t0 = time.perf_counter()
+    replay(trace, **configs[0])
+    scalar = time.perf_counter() - t0
+    print(f"[스칼라] 후보 1개 replay: {scalar:.2f}s -> {1 / scalar:.2f} 후보/s")
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "trace.csv")
+        write_pwm_trace(path, trace, np.zeros(len(trace), dtype=np.int64))
+        workers = 1
+        base = None
+        while True:
+            t0 = time.perf_counter()
+            sweep.run(configs, [path], sweep.DEFAULT_WEIGHTS, workers)
+            elapsed = time.perf_counter() - t0
+            rate = len(configs) / elapsed
+            base = base or rate
+            print(f"[sweep] 프로세스 {workers:>2}: {elapsed:6.2f}s  {rate:7.2f} 후보/s  "
+                  f"확장 효율 {rate / base / workers * 100:5.1f}%")
+            if workers >= cores:
+                break
+            workers = min(workers * 2, cores)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+
+# 재시작 -> 첫 명령 시간과 첫 명령 값: 스냅샷 없이(콜드) vs 스냅샷 복원(웜)
+#   python TEST/bench_warm_restart.py
+# 1) 서버를 띄워 웹소켓으로 manual 70% 를 설정하고 몇 틱 돌린 뒤 SIGKILL (비정상 종료)
+# 2) 같은 스냅샷 파일로 다시 띄워, 프로세스 시작부터 Pi(루프백 수신기)가 첫 명령을 받기까지 시간을 잰다
+# 3) 스냅샷 없이 띄운 경우와 비교. 온도는 70°C 고정(가짜 InfluxDB), PI_EDGE_RAMP=0 (PWM 값을 그대로 비교)
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER = os.path.join(HERE, "..", "process_control_command.py")
+sys.path.insert(0, os.path.join(HERE, ".."))
+import wire
+
+class HotInflux(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        lines = [",result,table,_time,_value,_field,_measurement"]
+        for i, (m, v) in enumerate((("cpu_temperature", 70), ("gpu_temperature", 70), ("model_result", 0))):
+            lines.append(f",_result,{i},{now},{v},value,{m}")
+        body = ("\r\n".join(lines) + "\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+async def run_server(env, after_first=None, keep=0.0):
+    """서버를 띄우고 (첫 명령까지 걸린 시간, 받은 명령들) 을 돌려준다"""
+    got = []
+    first = asyncio.get_running_loop().create_future()
+
+    async def pi_sink(reader, writer):
+        while line := await reader.readline():
+            if wire.parse_hello(line) is not None:
+                writer.write(wire.hello_reply(0))
+                continue
+            got.append(json.loads(line))
+            if not first.done():
+                first.set_result(time.perf_counter())
+
+    sink = await asyncio.start_server(pi_sink, "127.0.0.1", 0)
+    env = dict(env, PI_HOST="127.0.0.1", PI_PORT=str(sink.sockets[0].getsockname()[1]))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, SERVER], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        elapsed = await asyncio.wait_for(first, 30) - t0
+        if after_first:
+            await after_first()
+        await asyncio.sleep(keep)
+    finally:
+        proc.send_signal(signal.SIGKILL)
+        proc.wait()
+        await asyncio.sleep(0.1)  # 수신기가 연결 종료(EOF)를 처리하도록
+        sink.close()
+    return elapsed, got
+
+async def set_manual():
+    for _ in range(50):
+        try:
+            async with websockets.connect("ws://127.0.0.1:8765") as ws:
+                await ws.send(json.dumps({"mode": "manual", "manual_pwm": 70}))
+                await ws.recv()
+                return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("웹소켓 서버에 연결할 수 없습니다")
+
+async def main():
+    influx = ThreadingHTTPServer(("127.0.0.1", 0), HotInflux)
+    threading.Thread(target=influx.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as d:
+        base = dict(os.environ, INFLUX_URL_BASE=f"http://127.0.0.1:{influx.server_address[1]}",
+                    PI_EDGE_RAMP="0", PI_WIRE_TIMEOUT="0.2", FAN_SNAPSHOT_PATH=os.path.join(d, "fan.snap"))
+
+        # 1) 이전 실행: manual 70% 로 바꾸고 ramp 가 끝날 때까지 돌린 뒤 강제 종료
+        _, before = await run_server(base, set_manual, keep=4.0)
+        print(f"[이전 실행] 마지막 명령 {before[-1]} (SIGKILL 로 종료)")
+
+        # 2) 웜 재시작 / 3) 콜드 시작 (스냅샷 끔)
+        for name, env in (("웜 (스냅샷 복원)", base), ("콜드 (스냅샷 없음)", dict(base, FAN_SNAPSHOT_PATH=""))):
+            elapsed, got = await run_server(env, keep=1.5)
+            pwms = [m["pwm"] for m in got]
+            print(f"[{name}] 시작 -> 첫 명령 {elapsed * 1000:.0f} ms, 첫 명령 PWM {pwms[0]}, 이후 {pwms[1:4]}")
+            if env is base:
+                assert pwms[0] == before[-1]["pwm"], (pwms, before[-1])
+    influx.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
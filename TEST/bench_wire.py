@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+# 제어 명령 인코딩/디코딩 처리량과 명령당 바이트: 줄 단위 JSON vs 이진 프레임(wire.py)
+#   python TEST/bench_wire.py [--commands 200000]
+# 마지막 단계는 루프백으로 PiLink -> Pi 에이전트(FanAgent) 전체 경로를 돌려 명령/s 와 ACK 왕복 시간을 잰다.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+os.environ["PI_SIMULATION"] = "1"
+import wire
+import pi
+import FANCONTROLL_PY as fc
+
+pi.print = fc.print = lambda *a, **k: None
+
+def rate(fn, n):
+    t0 = time.perf_counter()
+    out = fn()
+    return n / (time.perf_counter() - t0), out
+
+def codec(n):
+    cmds = [(i % 4, i, (i * 7) % 101, 25.0) for i in range(n)]
+    for name, enc in (("JSON pwm", lambda: [fc.encode_command(t) for _, _, t, _ in cmds]),
+                      ("JSON target/ramp", lambda: [fc.encode_setpoint(t, r) for _, _, t, r in cmds]),
+                      ("wire", lambda: [wire.pack_setpoint(f, s, t, r, 0) for f, s, t, r in cmds])):
+        enc_rate, frames = rate(enc, n)
+        blob = b"".join(frames)
+        if name == "wire":
+            dec_rate, _ = rate(lambda: [(f.fan, f.target_pct, f.ramp_pct) for f in wire.iter_frames(blob)], n)
+            split_rate, (parsed, _) = rate(lambda: wire.split(blob), n)
+            assert len(parsed) == n
+            extra = f"  (split 묶음 디코딩 {split_rate / 1e6:.2f} M/s)"
+        else:
+            dec_rate, parsed = rate(lambda: [pi.parse_command(l) for l in blob.splitlines()], n)
+            assert None not in parsed
+            extra = ""
+        print(f"  {name:<17} {len(blob) / n:5.1f} B/명령  인코딩 {enc_rate / 1e6:5.2f} M/s  "
+              f"디코딩 {dec_rate / 1e6:5.2f} M/s{extra}")
+
+async def end_to_end(protocol, n):
+    agent = pi.FanAgent(write=lambda level: None, write_interval=0.02)
+    task = asyncio.create_task(agent.run_writer())
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    link = fc.PiLink("127.0.0.1", server.sockets[0].getsockname()[1], protocol=protocol)
+    await link.send(0)
+    t0 = time.perf_counter()
+    for i in range(n):
+        await link.send_setpoint(i % 101, 25.0, deadband=0)
+    while agent.received < n + 1:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - t0
+    rtt = sorted(link.rtts)
+    rtt_txt = (f"  ACK 왕복(최근 {len(rtt)}) p50 {statistics.median(rtt) * 1000:.2f} ms "
+               f"p99 {rtt[int(len(rtt) * 0.99) - 1] * 1000:.2f} ms" if rtt else "")
+    print(f"  {('wire v%d' % link.wire) if link.wire else 'JSON':<8} {n / elapsed:9,.0f} 명령/s  "
+          f"{link.bytes_sent / link.frames_sent:5.1f} B/명령{rtt_txt}")
+    await link.close()
+    while agent.connections:
+        await asyncio.sleep(0.001)
+    server.close()
+    task.cancel()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--commands", type=int, default=200_000)
+    args = ap.parse_args()
+    print(f"[코덱] 명령 {args.commands:,}개")
+    codec(args.commands)
+    print(f"[루프백] PiLink -> FanAgent, 명령 {args.commands // 10:,}개")
+    for protocol in ("json", "auto"):
+        asyncio.run(end_to_end(protocol, args.commands // 10))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import os
+import re
+import sys
+import gzip
+import asyncio
+import tempfile
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 명령 추적(cmdtrace.py, pi.py 의 fan_apply/fan_status) 검증. InfluxDB 와 Pi 는 이 프로세스 안의 대역.
+#   python TEST/cmdtrace_test.py
+# 1) 추적 키 파싱/점 형식
+# 2) 서버 PiLink(이진/JSON) -> 실제 FanAgent -> InfluxReporter, 서버 CommandTracer 가 fan_command 일괄 기록
+#    -> cmdtrace.fetch/analyze 로 모든 명령이 적용 또는 덮어씀으로 짝지어지고 지연 백분위가 나오는지
+# 3) 기록되지 않은 명령(유실)과 서버 기록이 없는 적용(짝 없음)을 어긋남으로 보고하는지
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["PI_SIMULATION"] = "1"
+import pi
+import cmdtrace
+import FANCONTROLL_PY as fc
+from FANCONTROLL_PY import PiLink
+
+pi.print = fc.print = cmdtrace.print = lambda *a, **k: None
+UNESCAPED_SPACE = re.compile(r"(?<!\\) ")
+PRECISION_MS = {"s": 1000, "ms": 1, "ns": 1e-6}
+
+
+def parse_line(line, precision):
+    """Line Protocol 한 줄 -> 행 dict (태그 + 필드 + 시각 ms)"""
+    series, fields, ts = UNESCAPED_SPACE.split(line)
+    measurement, *tags = re.split(r"(?<!\\),", series)
+    row = {"_measurement": measurement}
+    for t in tags:
+        k, v = t.split("=", 1)
+        row[k] = v.replace("\\", "")
+    for f in fields.split(","):
+        k, v = f.split("=", 1)
+        row[k] = int(v[:-1]) if v.endswith("i") else (v == "true" if v in ("true", "false") else float(v))
+    row["_time_ms"] = int(int(ts) * PRECISION_MS[precision])
+    return row
+
+
+class FakeInflux(BaseHTTPRequestHandler):
+    """쓰기(/api/v2/write)는 점을 모아 두고, 조회(/api/v2/query)는 추적 측정값을 pivot 한 CSV 로 돌려준다"""
+    protocol_version = "HTTP/1.1"
+    rows = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        url = urlparse(self.path)
+        if url.path == "/api/v2/write":
+            precision = parse_qs(url.query).get("precision", ["ns"])[0]
+            self.rows.extend(parse_line(l, precision) for l in body.decode().splitlines() if l)
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        cols = cmdtrace.TRACE_COLUMNS
+        lines = [",result,table," + ",".join(cols)]
+        for r in self.rows:
+            if r["_measurement"] == "fan_status" and "seq" not in r:
+                continue
+            cells = ["" if r.get(c) is None else str(r[c]).lower() if isinstance(r[c], bool) else str(r[c])
+                     for c in cols]
+            lines.append(",_result,0," + ",".join(cells))
+        out = ("\r\n".join(lines) + "\r\n").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    def log_message(self, *args):
+        pass
+
+
+def check_format():
+    assert pi.parse_traced_command('{"target": 55, "ramp": 25, "seq": 7, "ts": 1700000000123}') == (55, 25.0, (7, 1700000000123))
+    assert pi.parse_traced_command('{"pwm": 40, "seq": 7}') == (40, None, None)  # 예전 서버 (ts 없음)
+    assert pi.parse_command('{"pwm": 40, "seq": 7, "ts": 1}') == (40, None)
+    row = parse_line(pi.status_line(40, (7, 1700000000123), now_ms=1700000001000), "ms")
+    assert (row["seq"], row["cmd_ms"], row["report_ms"], row["pwm_duty_cycle"]) == (7, 1700000000123, 1700000001000, 40)
+    row = parse_line(pi.apply_line((1, 7, 100, 140, None, 55.5)), "ms")
+    assert row["superseded"] is True and row["fan"] == "1" and "applied_ms" not in row
+    tr = cmdtrace.CommandTracer(url="http://unused")
+    tr.record("rack 1,a", 0, 9, 1700000000000, 55, 25.0)
+    row = parse_line(tr.lines[0], "ms")
+    assert (row["device"], row["seq"], row["target"], row["ramp"]) == ("rack 1,a", 9, 55.0, 25.0)
+    print("[통과] 추적 키 파싱 (ts 없는 예전 명령은 추적 없음), 점 형식")
+
+
+async def run_pipeline(url, tmp, protocol):
+    """FanAgent 하나에 명령을 보내고, Pi 보고와 서버 추적 기록이 끝날 때까지 기다린다"""
+    agent = pi.FanAgent(write=lambda level: None, write_interval=0.01)
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reporter = pi.InfluxReporter(url=f"{url}/api/v2/write?org=o&bucket=b&precision=ms",
+                                 spool_path=os.path.join(tmp, f"spool-{protocol}"), max_points=1)
+    tracer = cmdtrace.CommandTracer(url=f"{url}/api/v2/write?org=o&bucket=b&precision=ms", flush_sec=0.1)
+    link = PiLink("127.0.0.1", port, protocol=protocol)
+    link.on_send = tracer.sender({0: f"dev-{protocol}"})
+    tasks = [asyncio.create_task(agent.run_writer()), asyncio.create_task(tracer.run()),
+             asyncio.create_task(pi.report_to_influxdb(reporter, agent))]
+    try:
+        for target in (20, 35, 50, 80, 10, 60):
+            assert await link.send_setpoint(target, 40.0)
+            await asyncio.sleep(0.05)
+        # 한꺼번에 보낸 명령: writer 가 반영하기 전에 뒤 명령이 덮어쓴다 (latest-wins)
+        for target in (30, 45, 70, 90):
+            assert await link.send(target)
+        await asyncio.sleep(0.3)
+        # 서버 기록 없이 보낸 명령 -> 짝 없는 적용
+        link.on_send = None
+        assert await link.send(5)
+        await asyncio.sleep(0.1)
+        # 보내지 않았는데 서버에 기록된 명령 -> 유실
+        tracer.record(f"dev-{protocol}", 0, 123, fc.wire.now_ms() - 120_000, 42, None)
+        await asyncio.sleep(pi.REPORT_INTERVAL * 2 + 0.3)
+        await tracer.flush()
+    finally:
+        for t in tasks:
+            t.cancel()
+        await link.close()
+        server.close()
+        reporter.close()
+    return agent
+
+
+def main():
+    check_format()
+    pi.REPORT_INTERVAL = 0.2
+    influx = ThreadingHTTPServer(("127.0.0.1", 0), FakeInflux)
+    influx.daemon_threads = True
+    threading.Thread(target=influx.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{influx.server_address[1]}"
+    with tempfile.TemporaryDirectory() as tmp:
+        for protocol in ("auto", "json"):
+            FakeInflux.rows = []
+            agent = asyncio.run(run_pipeline(url, tmp, protocol))
+            commands, applies, statuses = cmdtrace.fetch(url=f"{url}/api/v2/query?org=o")
+            r = cmdtrace.analyze(commands, applies, statuses, until_ms=fc.wire.now_ms())
+            m = r["mismatches"]
+            sent = 10 + 1  # 추적된 10개 + 유실로 넣은 1개
+            assert r["commands"] == sent and r["applied"] + r["superseded"] == sent - 1, r
+            assert r["superseded"] >= 1 and agent.received == 11
+            assert (m["lost"], m["orphan_applies"], m["target"], m["duplicate_commands"]) == (1, 1, 0, 0), m
+            assert r["examples"]["lost"][0]["seq"] == 123
+            assert r["command_to_apply"]["count"] == r["applied"] and r["command_to_apply"]["p99_ms"] < 500
+            assert r["reported"] >= 1 and r["command_to_report"]["p50_ms"] < 2000
+            print(f"[통과] {'이진' if protocol == 'auto' else 'JSON'}: 명령 {r['commands']}개 -> 적용 {r['applied']}, "
+                  f"덮어씀 {r['superseded']}, 유실 1/짝 없음 1 검출, 명령->적용 p50 "
+                  f"{r['command_to_apply']['p50_ms']:.1f} ms, 명령->보고 p50 {r['command_to_report']['p50_ms']:.0f} ms")
+    influx.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import asyncio
+
+# Pi 쪽 ramp 검증 (하드웨어 없이 PI_SIMULATION=1, FakeGPIO 에 기록된 쓰기로 확인)
+#   python TEST/edge_ramp_test.py
+# - {"target", "ramp"} 명령: duty 가 단조 증가/감소하고, 쓰기 한 번의 변화량 <= ramp * 경과 시간
+# - 최종 duty == 목표 (PWM_RANGE 분해능), 기존 255 단계보다 촘촘한 중간 단계
+# - {"pwm"} 명령(기존 형식)은 ramp 없이 바로 적용
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["PI_SIMULATION"] = "1"
+import pi
+
+pi.print = lambda *a, **k: None
+
+async def ramp_to(agent, gpio, target, ramp):
+    start = len(gpio.writes)
+    agent.submit(target, ramp)
+    while agent.current != agent.target:
+        await asyncio.sleep(agent.write_interval)
+    await asyncio.sleep(agent.write_interval * 2)
+    return list(gpio.writes)[start:]
+
+def check_ramp(writes, ramp, interval, rng):
+    levels = [w[2] for w in writes]
+    diffs = [b - a for a, b in zip(levels, levels[1:])]
+    assert all(d > 0 for d in diffs) or all(d < 0 for d in diffs), "ramp 가 단조롭지 않음"
+    for (t0, _, a), (t1, _, b) in zip(writes, writes[1:]):
+        # 쓰기 간격이 밀려도 실제 경과 시간만큼만 움직인다 (+1 은 반올림)
+        assert abs(b - a) <= ramp * (t1 - t0) * rng / 100 + 1, (a, b, t1 - t0)
+    assert min(t1 - t0 for (t0, *_), (t1, *_) in zip(writes, writes[1:])) >= interval * 0.9
+    return levels
+
+async def main():
+    gpio = pi.FakeGPIO()
+    pi.pi = gpio
+    interval, rng = 0.005, 1000
+    agent = pi.FanAgent(write=pi.set_fan_duty, write_interval=interval, pwm_range=rng)
+    writer = asyncio.create_task(agent.run_writer())
+
+    up = check_ramp(await ramp_to(agent, gpio, 10, 20.0), 20.0, interval, rng)
+    assert up[-1] == 100, up[-1]
+    coarse = len({round(lv / rng * 255) for lv in up})
+    print(f"[통과] 0 -> 10% (20%/s): 쓰기 {len(up)}회, 단조 증가, 최종 duty {up[-1]}/{rng} "
+          f"(중간 단계 {len(set(up))}개, 255 단계였다면 {coarse}개)")
+    assert len(set(up)) > 2 * coarse
+
+    down = check_ramp(await ramp_to(agent, gpio, 4.5, 30.0), 30.0, interval, rng)
+    assert down[-1] == 45
+    print(f"[통과] 10 -> 4.5% (30%/s): 쓰기 {len(down)}회, 단조 감소, 최종 duty {down[-1]}/{rng}")
+
+    jump = await ramp_to(agent, gpio, *pi.parse_command(json.dumps({"pwm": 60, "seq": 1})))
+    assert [w[2] for w in jump] == [600], jump
+    print("[통과] 기존 {\"pwm\": 60} 명령은 한 번에 600/1000 으로 설정")
+
+    assert pi.parse_command('{"target": 55, "ramp": 12.5, "seq": 3}') == (55, 12.5)
+    for bad in ('{"target": true, "ramp": 1}', '{"target": 50, "ramp": "x"}', '{"pwm": 1.5}', '[1]', 'x'):
+        assert pi.parse_command(bad) is None, bad
+    print("[통과] 명령 파싱 (target/ramp, 잘못된 값 거절)")
+    writer.cancel()
+
+if __name__ == "__main__":
+    asyncio.run(main())
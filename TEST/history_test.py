@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+# 이력 링 버퍼(history.py) 검증: 덮어쓰기 순서, 구간 조회/추림, EMA/median 필터, 장치당 메모리
+#   python TEST/history_test.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from history import DeviceHistory, memory_per_device, ROW_BYTES
+
+def check_ring():
+    h = DeviceHistory(size=100)
+    for t in range(250):
+        h.push(1000.0 + t, 40 + t % 7, 50.0, t % 2)
+        h.record_pwm(t % 101)
+    assert len(h) == 100 and h.count == 250
+    w = h.window(max_points=0)
+    assert w["ts"] == [1000.0 + t for t in range(150, 250)]
+    assert w["pwm"] == [float(t % 101) for t in range(150, 250)]
+    assert h.window(seconds=9)["ts"] == [1000.0 + t for t in range(240, 250)]
+    assert h.window(since=1245.5)["ts"] == [1246.0, 1247.0, 1248.0, 1249.0]
+    thin = h.window(max_points=30)
+    assert len(thin["ts"]) <= 30 and thin["ts"][-1] == 1249.0
+    assert np.all(np.diff(thin["ts"]) == 4)
+
+    h.push(1250.0, 41, 50, 0)  # 아직 PWM 을 채우지 않은 행 -> null
+    assert h.window(seconds=0)["pwm"] == [None]
+    print("[통과] 링 버퍼 덮어쓰기 순서, seconds/since 구간, 점 추림(최근 행 포함), 빈 PWM -> null")
+
+def check_filters():
+    rng = np.random.default_rng(0)
+    cpu = 50 + rng.normal(0, 3, 500)
+    gpu = 60 + rng.normal(0, 3, 500)
+
+    ema = DeviceHistory(size=64, filter="ema", alpha=0.25)
+    ema_cpu = [ema.push(t, c, g, 0)[0] for t, (c, g) in enumerate(zip(cpu, gpu))]
+    ref = [cpu[0]]
+    for c in cpu[1:]:
+        ref.append(0.25 * c + 0.75 * ref[-1])
+    assert np.allclose(ema_cpu, ref)
+
+    med = DeviceHistory(size=64, filter="median", window=5)
+    got = np.array([med.push(t, c, g, 0) for t, (c, g) in enumerate(zip(cpu, gpu))])
+    ref = [np.median(gpu[max(0, i - 4):i + 1].astype(np.float32)) for i in range(len(gpu))]
+    assert np.allclose(got[:, 1], ref)
+
+    none = DeviceHistory(size=8)
+    assert none.push(0, 51.5, 60.25, 1) == (51.5, 60.25)
+    print(f"[통과] EMA/median 필터 == 기준 계산, CPU 표준편차 {cpu.std():.2f} -> "
+          f"EMA {np.std(ema_cpu):.2f} / median {got[:, 0].std():.2f}")
+
+def check_memory():
+    h = DeviceHistory(size=3600)
+    assert h.nbytes == memory_per_device(3600) == 3600 * ROW_BYTES == 86_400
+    t0 = time.perf_counter()
+    for t in range(100_000):
+        h.push(t, 50.0, 60.0, 0)
+        h.record_pwm(40)
+    per = (time.perf_counter() - t0) / 100_000
+    assert h.nbytes == 86_400  # 계속 추가해도 늘지 않음
+    print(f"[통과] 장치당 {h.nbytes / 1000:.1f} KB (3600행), 1,000대 {h.nbytes * 1000 / 1e6:.1f} MB, "
+          f"push+record_pwm {per * 1e6:.2f} µs")
+
+def check_request():
+    # 웹소켓 {"history": {...}} 요청: 문자열 숫자는 변환, 숫자가 아니거나 음수면 연결을 끊지 않고 오류 응답
+    import process_control_command as pcc
+    pcc.history = h = DeviceHistory(size=100)
+    for t in range(50):
+        h.push(1000.0 + t, 40.0, 50.0, 0)
+    assert pcc.history_response({"seconds": "9"})["history"]["ts"] == [1000.0 + t for t in range(40, 50)]
+    assert pcc.history_response({"since": "1045", "max_points": "2"})["history"]["ts"] == [1046.0, 1049.0]
+    for bad in ({"seconds": "abc"}, {"since": [5]}, {"max_points": "1.5"}, {"seconds": -1}, {"since": "nan"}):
+        assert pcc.history_response(bad)["status"] == "error", bad
+    print("[통과] 이력 요청: 문자열 숫자 변환, 잘못된 seconds/since/max_points 는 오류 응답")
+
+if __name__ == "__main__":
+    check_ring()
+    check_filters()
+    check_memory()
+    check_request()
@@ -0,0 +1,64 @@
+import os
+import sys
+import asyncio
+
+# 센서 push 수신(ingest.py) 검증
+#   python TEST/ingest_test.py
+# 1) JSON / Line Protocol 파싱, 알 수 없는 측정값은 버림
+# 2) nan, inf, 1e999, 숫자가 아닌 값은 줄 전체를 거부 (필터 이력과 step 을 망가뜨리지 않도록)
+# 3) TCP 수신: 잘못된 줄은 errors 로 세고 연결은 유지, 최신 값은 마지막 정상 줄
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ingest
+from ingest import SensorFeed, parse_reading
+
+ingest.print = lambda *a, **k: None
+
+BAD = ('{"cpu_temperature": NaN}', '{"cpu_temperature": Infinity, "gpu_temperature": 50}',
+       '{"gpu_temperature": -Infinity}', '{"cpu_temperature": 1e999}', '{"cpu_temperature": "nan"}',
+       '{"cpu_temperature": [1]}', "cpu_temperature,host=a value=nan", "gpu_temperature value=inf",
+       "cpu_temperature value=1e999", "cpu_temperature value=abc")
+
+
+def check_parse():
+    assert parse_reading('{"cpu_temperature": 55.2, "gpu_temperature": 61, "fan": 3, "model_result": null}') \
+        == {"cpu_temperature": 55.2, "gpu_temperature": 61.0}
+    assert parse_reading("cpu_temperature,host=gpu01 value=55.2 1700000000000000000") == {"cpu_temperature": 55.2}
+    assert parse_reading("model_result value=1i") == {"model_result": 1.0}
+    assert parse_reading("  \n") == {}
+    for line in BAD:
+        try:
+            parse_reading(line)
+            raise AssertionError(f"받아들임: {line}")
+        except (ValueError, TypeError):
+            pass
+    print(f"[통과] JSON/Line Protocol 파싱, 유한하지 않거나 숫자가 아닌 값 {len(BAD)}가지 거부")
+
+
+async def check_stream():
+    feed = SensorFeed()
+    server = await feed.serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    lines = ['{"cpu_temperature": 52.0, "gpu_temperature": 48.0}'] + list(BAD) + ["model_result value=1"]
+    writer.write("".join(line + "\n" for line in lines).encode())
+    await writer.drain()
+    for _ in range(200):
+        if feed.received + feed.errors == len(lines):
+            break
+        await asyncio.sleep(0.01)
+    assert feed.errors == len(BAD) and feed.received == 2, (feed.errors, feed.received)
+    assert feed.values == {"cpu_temperature": 52.0, "gpu_temperature": 48.0, "model_result": 1.0}, feed.values
+    writer.close()
+    await writer.wait_closed()
+    await asyncio.sleep(0.05)  # 서버 쪽 handle 이 EOF 를 받고 끝나도록
+    server.close()
+    print(f"[통과] TCP 수신: 잘못된 줄 {feed.errors}개를 세고 버림, 연결 유지, 값은 정상 줄 그대로")
+
+
+def main():
+    check_parse()
+    asyncio.run(check_stream())
+
+
+if __name__ == "__main__":
+    main()
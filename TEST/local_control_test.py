@@ -0,0 +1,287 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+# Pi 로컬 제어(local_control.py, pi.py 의 wire v2 POLICY) 검증. Pi 는 이 프로세스 안의 FanAgent, 센서는 FakeSource.
+#   python TEST/local_control_test.py
+# 1) POLICY 프레임(헤더 + JSON 본문)이 어디서 잘려 와도 이어 붙여 풀림
+# 2) 상태 전환 (가짜 시계): 정책 전 안전(최소 PWM), 정책, 서버 목표값(override), lease 만료 -> 안전, 센서 실패 -> PI_SAFE_PWM
+# 3) 서버 PiLink.send_policy -> 실제 FanAgent: 온도 계단 변화에 로컬 루프가 수 주기 안에 반응, 정책 변경/중복 억제,
+#    목표값 명령 동안은 로컬 루프가 멈춤, JSON {"policy"} 줄
+# 4) 로컬 제어가 없는 에이전트(v1)와 JSON 연결은 기존처럼 목표값으로 대체
+# 5) predict 모드 + PI_LOCAL_POLICY: 정책 대신 서버 목표값 전송, Pi 는 predict 정책을 거부
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["PI_SIMULATION"] = "1"
+import pi
+import wire
+import local_control
+import FANCONTROLL_PY as fc
+from local_control import LocalControl, FakeSource, FileSource, SAFE_MIN_PWM, SAFE_PWM
+from FANCONTROLL_PY import FanController, PiLink, controller_policy
+
+pi.print = fc.print = local_control.print = lambda *a, **k: None
+
+
+class FakeClock:
+    def __init__(self, t=1000.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def check_split():
+    policy = controller_policy(FanController(mode="range", cpu_thresh=55))
+    ping = wire.FRAME.pack(wire.PING, 0, 0, 3, 0, 0, 0)
+    stream = (wire.pack_setpoint(0, 1, 40) + wire.pack_policy(0, 2, policy) + ping
+              + wire.pack_policy(1, 4, {"mode": "manual", "manual_target": 70}) + wire.pack_setpoint(1, 5, 10))
+    whole, rest = wire.split_messages(stream)
+    assert rest == b"" and [f.seq for f, _ in whole] == [1, 2, 3, 4, 5]
+    assert [f.kind for f, _ in whole] == [wire.SETPOINT, wire.POLICY, wire.PING, wire.POLICY, wire.SETPOINT]
+    assert fc.json.loads(whole[1][1]) == policy and whole[0][1] == b""
+    for cut in range(1, len(stream)):
+        a, buf = wire.split_messages(stream[:cut])
+        b, buf = wire.split_messages(buf + stream[cut:])
+        assert buf == b"" and a + b == whole, cut
+    # 이진 v1 (POLICY 없음) 스트림은 split 과 같은 결과
+    plain = b"".join(wire.pack_setpoint(0, i, i) for i in range(5))
+    assert [f for f, _ in wire.split_messages(plain)[0]] == wire.split(plain)[0]
+    print(f"[통과] POLICY 프레임 ({len(whole[1][1])}바이트 본문): {len(stream) - 1}개 자르는 위치 모두 이어 붙여 풀림")
+
+
+def check_states():
+    clock = FakeClock()
+    src = FakeSource(50, 45)
+    agent = pi.FanAgent(write=lambda level: None)
+    lc = LocalControl(agent, src, period=0.1, lease=5, safe={}, clock=clock)
+    now_ms = lambda: int(clock() * 1000)
+
+    # 정책 전: 안전 정책 (Pi 기본 설정), 최소 PWM 유지
+    assert lc.tick(now_ms()) == SAFE_MIN_PWM and lc.state == "safe" and agent.target == SAFE_MIN_PWM
+
+    lc.on_policy({"mode": "manual", "manual_target": 60, "slew_per_sec": 1000, "min_duty": "x",
+                  "bogus": 1, "lease": 3})
+    assert lc.state == "policy" and lc.lease == 3 and "min_duty" not in lc.policy and "bogus" not in lc.policy
+    clock.t += 0.1
+    assert lc.tick(now_ms()) == 60 and agent.target == 60
+
+    # 서버 목표값: 로컬 루프를 멈추고 그 값을 따름
+    lc.on_setpoint()
+    agent.submit(80)
+    agent.current = 80.0
+    for _ in range(5):
+        clock.t += 0.1
+        assert lc.tick(now_ms()) is None and lc.state == "override"
+    assert agent.target == 80
+    # PING 만 오고 목표값이 끊기면 lease 뒤 정책으로 복귀 (현재 값 80 에서 slew 로 이어감)
+    lc.lease = 5
+    lc.on_policy({"mode": "manual", "manual_target": 20, "slew_per_sec": 50})
+    lc.on_setpoint()
+    for _ in range(6):
+        clock.t += 1.0
+        lc.touch()
+        lc.tick(now_ms())
+    assert lc.state == "policy" and agent.target == 30, agent.target  # 80 - 50 (1s)
+    clock.t += 1.0
+    assert lc.tick(now_ms()) == 20
+
+    # 서버 소식이 lease 를 넘기면 안전 정책, 최소 PWM 이상
+    clock.t += 5.1
+    pwm = lc.tick(now_ms())
+    assert lc.state == "safe" and pwm >= SAFE_MIN_PWM and lc.ctl.mode == "auto"
+
+    # 센서 실패 -> PI_SAFE_PWM, 복구되면 다시 계산
+    src.value = None
+    clock.t += 0.1
+    assert lc.tick(now_ms()) == SAFE_PWM and agent.target == SAFE_PWM and lc.sensor_errors == 1
+    src.set(30, 30)  # 목표 74%: SAFE_PWM 에서 slew 로 내려감
+    clock.t += 0.1
+    assert lc.tick(now_ms()) < SAFE_PWM
+    # 10 ms 주기 x 25%/s: 한 주기 0.25% 는 반올림하면 0 이지만 시간이 누적되어 1초에 약 25% 움직임
+    lc.on_policy({"mode": "manual", "manual_target": 0, "slew_per_sec": 25})
+    start = lc.tick(now_ms())
+    for _ in range(100):
+        clock.t += 0.01
+        lc.tick(now_ms())
+    assert 20 <= start - lc.last_pwm <= 26, (start, lc.last_pwm)
+    try:
+        lc.on_policy([1, 2])
+        raise AssertionError("정책 형식 검사 없음")
+    except ValueError:
+        pass
+    print(f"[통과] 상태: 안전({SAFE_MIN_PWM}% 이상) -> 정책 -> 목표값 동안 정지 -> 정책 복귀(slew 이어감) "
+          f"-> lease 만료 안전 -> 센서 실패 {SAFE_PWM}%")
+
+
+def check_file_source():
+    # 쓰는 프로세스가 멈춰 파일이 stale 초 넘게 그대로면 읽기 실패 -> PI_SAFE_PWM
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "sensors.json")
+        with open(path, "w", encoding="utf-8") as f:
+            fc.json.dump({"cpu_temperature": 15.0, "gpu_temperature": 14.0}, f)
+        now = [time.time()]
+        src = FileSource(path, stale=5, wall=lambda: now[0])
+        assert src.read() == (15.0, 14.0, 0)
+        clock = FakeClock()
+        lc = LocalControl(pi.FanAgent(write=lambda level: None), src, lease=60, safe={}, clock=clock)
+        lc.on_policy({"mode": "manual", "manual_target": 20})
+        assert lc.tick(int(clock() * 1000)) == 20
+        now[0] += 6
+        try:
+            src.read()
+            raise AssertionError("오래된 센서 파일을 받아들임")
+        except OSError:
+            pass
+        clock.t += 0.1
+        assert lc.tick(int(clock() * 1000)) == SAFE_PWM and lc.sensor_errors == 1
+        os.utime(path, (now[0], now[0]))  # 다시 갱신되면 정상
+        assert src.read() == (15.0, 14.0, 0)
+        assert FileSource(path, stale=0, wall=lambda: now[0] + 3600).read() == (15.0, 14.0, 0)  # 0 = 검사 안 함
+    print(f"[통과] file: 센서가 5s 넘게 갱신되지 않으면 읽기 실패 -> {SAFE_PWM}%, 갱신되면 복구")
+
+
+async def wait_for(cond, timeout=2.0):
+    t0 = time.perf_counter()
+    while not cond():
+        if time.perf_counter() - t0 > timeout:
+            raise AssertionError("시간 초과")
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - t0
+
+
+async def check_end_to_end():
+    period = 0.01
+    src = FakeSource(20, 20)
+    agent = pi.FanAgent(write=lambda level: None, write_interval=0.005)
+    agent.attach_local(lambda ch: LocalControl(ch, src, period=period, safe={}))
+    lc = agent.local
+    policies = []
+    on_policy = lc.on_policy
+    lc.on_policy = lambda p: (policies.append(p), on_policy(p))
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    tasks = [asyncio.create_task(agent.run_writer()), asyncio.create_task(lc.run())]
+    link = PiLink("127.0.0.1", port)
+    try:
+        ctl = FanController(slew_per_sec=10000)
+        assert await link.send_policy(controller_policy(ctl), 0, 10000)
+        assert link.wire == 2 and lc.state == "policy"
+        await wait_for(lambda: agent.current == 0)  # 20°C < t_on -> 꺼짐
+
+        # 온도 계단: 서버 왕복 없이 로컬 주기 안에 반응
+        delays = []
+        for cpu, want in ((60, 100), (15, 0), (45, 96), (15, 0)):
+            src.set(cpu, cpu)
+            delays.append(await wait_for(lambda: agent.current == want))
+        assert max(delays) < period * 5 + 0.05, delays
+
+        # 같은 정책은 keepalive 전까지 다시 보내지 않음, 바뀐 정책은 바로 반영
+        n = len(policies)
+        assert await link.send_policy(controller_policy(ctl), 0, 10000) and len(policies) == n
+        ctl.mode, ctl.cpu_thresh, ctl.gpu_thresh = "range", 70, 70
+        src.set(60, 60)
+        assert await link.send_policy(controller_policy(ctl), 0, 10000) and len(policies) == n + 1
+        await wait_for(lambda: agent.current == ctl.min_duty)
+        assert lc.ctl.mode == "range" and lc.ctl.cpu_thresh == 70
+
+        # 서버 목표값 명령 동안 로컬 루프는 값을 바꾸지 않음
+        assert await link.send(45)
+        await wait_for(lambda: agent.current == 45)
+        src.set(90, 90)
+        await asyncio.sleep(period * 10)
+        assert lc.state == "override" and agent.current == 45
+
+        # JSON 연결의 {"policy": ...} 줄도 로컬 제어로
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b'{"policy": {"mode": "manual", "manual_target": 55}}\n')
+        await writer.drain()
+        await wait_for(lambda: agent.current == 55)
+        assert lc.state == "policy" and len(policies) == n + 2
+        writer.close()
+    finally:
+        for t in tasks:
+            t.cancel()
+        await link.close()
+        server.close()
+    print(f"[통과] 정책 전송(wire v2) -> 온도 계단 반응 최대 {max(delays) * 1000:.1f} ms (주기 {period * 1000:.0f} ms), "
+          f"중복 정책 억제, range 정책 반영, 목표값 동안 로컬 정지, JSON 정책 줄")
+
+
+async def check_fallback():
+    agent = pi.FanAgent(write=lambda level: None, write_interval=0.005)
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    writer = asyncio.create_task(agent.run_writer())
+    policy = controller_policy(FanController())
+    try:
+        for protocol, version, target in (("auto", 1, 40), ("json", 0, 65)):
+            link = PiLink("127.0.0.1", port, protocol=protocol)
+            assert await link.send_policy(policy, target, 30.0)
+            assert link.wire == version
+            await wait_for(lambda: agent.target == target)
+            assert agent.ramp == 30.0 and agent.invalid == 0
+            await link.close()
+    finally:
+        writer.cancel()
+        server.close()
+    print("[통과] 로컬 제어가 없는 에이전트(wire v1)와 JSON 연결: 정책 대신 목표값/변화율 전송")
+
+
+async def check_predict():
+    src = FakeSource(20, 20)
+    agent = pi.FanAgent(write=lambda level: None, write_interval=0.005)
+    agent.attach_local(lambda ch: LocalControl(ch, src, period=0.01, safe={}))
+    lc = agent.local
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    tasks = [asyncio.create_task(agent.run_writer()), asyncio.create_task(lc.run())]
+    link = PiLink("127.0.0.1", port)
+    try:
+        # predict 는 Pi 가 돌릴 수 없으므로 서버가 계산한 목표값을 보내고 Pi 는 override 로 따른다
+        ctl = FanController(mode="predict", slew_per_sec=10000)
+        assert await link.send_policy(controller_policy(ctl), 63, 10000) and link.wire == 2
+        await wait_for(lambda: agent.current == 63)
+        assert lc.state == "override" and lc.policy is None
+        await asyncio.sleep(0.05)
+        assert agent.current == 63  # 로컬 루프(20°C -> 꺼짐)가 덮어쓰지 않음
+        # Pi 가 돌릴 수 있는 모드로 돌아오면 다시 정책
+        ctl.mode = "manual"
+        ctl.manual_target = 41
+        assert await link.send_policy(controller_policy(ctl), 41, 10000)
+        await wait_for(lambda: agent.current == 41)
+        assert lc.state == "policy" and lc.policy["mode"] == "manual"
+
+        # Pi 에 predict 정책이 직접 와도 모드를 버리고 돌지 않고 거부 (이진: ACK 오류, JSON: 잘못된 줄, 연결 유지)
+        try:
+            lc.on_policy(controller_policy(FanController(mode="predict")))
+            raise AssertionError("predict 정책을 받아들임")
+        except ValueError:
+            pass
+        assert lc.policy["mode"] == "manual"
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b'{"policy": {"mode": "predict", "manual_target": 90}}\n{"pwm": 52}\n')
+        await writer.drain()
+        await wait_for(lambda: agent.target == 52)
+        assert agent.invalid == 1 and lc.policy["mode"] == "manual"
+        writer.close()
+    finally:
+        for t in tasks:
+            t.cancel()
+        await link.close()
+        server.close()
+    print("[통과] predict + 로컬 정책: 정책 대신 목표값(Pi override), manual 로 바꾸면 다시 정책, Pi 는 predict 정책 거부")
+
+
+def main():
+    check_split()
+    check_states()
+    check_file_source()
+    asyncio.run(check_end_to_end())
+    asyncio.run(check_fallback())
+    asyncio.run(check_predict())
+
+
+if __name__ == "__main__":
+    main()
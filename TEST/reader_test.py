@@ -0,0 +1,74 @@
+import os
+import re
+import sys
+
+# 증분 조회(FANCONTROLL_PY.IncrementalReader) 창 크기 검증. InfluxDB 는 쿼리의 range 만 흉내 내는 함수.
+#   python TEST/reader_test.py
+# 1) 시작 직후(커서 없음): 마지막 센서 기록이 10s 보다 오래되었어도 가장 넓은 창으로 찾음
+# 2) 커서가 생기면 가장 짧은 창으로, 값이 끊기면 한 단계씩 넓힘
+# 3) 한 측정값만 기록이 없으면 그 값의 커서가 생길 때까지 가장 넓은 창
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import FANCONTROLL_PY as fc
+
+RANGE_RE = re.compile(r"range\(start: -(\d+)s\)")
+
+
+def query(points, q, now):
+    """points: [(measurement, ts, value)] 중 range 안의 측정값별 마지막 기록 (Flux last())"""
+    start = now - int(RANGE_RE.search(q).group(1))
+    last = {}
+    for m, ts, v in points:
+        if ts >= start and (m not in last or ts > last[m][1]):
+            last[m] = (m, ts, v)
+    return list(last.values())
+
+
+def check_cold_start():
+    now = 1_700_000_000.0
+    points = [("cpu_temperature", now - 90, 62.0), ("gpu_temperature", now - 7200, 58.0),
+              ("model_result", now - 30, 1.0)]
+    reader = fc.IncrementalReader()
+    q = reader.build_query(now)
+    assert reader.window(now) == fc.WINDOW_STEPS[-1], reader.window(now)
+    samples = reader.ingest_records(query(points, q, now))
+    assert {m: s.value for m, s in samples.items()} == {"cpu_temperature": 62.0, "gpu_temperature": 58.0,
+                                                         "model_result": 1.0}
+    # 찾은 값으로 제어: 0°C 로 읽어 팬을 끄지 않음
+    assert fc.FanController().step(62.0, 58.0, 1, now_ms=int(now * 1000)) > 0
+
+    # 커서가 생긴 뒤: 새 값이 오면 가장 짧은 창, 끊기면 한 단계씩 넓힘 (가장 오래된 커서 + 10s 까지만)
+    now += 1
+    points += [("cpu_temperature", now, 63.0), ("gpu_temperature", now, 59.0), ("model_result", now, 1.0)]
+    reader.ingest_records(query(points, reader.build_query(now), now))
+    assert reader.window(now + 1) == fc.WINDOW_STEPS[0]
+    now += 100
+    windows = []
+    for _ in range(3):
+        now += 1
+        windows.append(reader.window(now))
+        reader.ingest_records(query(points, reader.build_query(now), now))
+    assert windows == [10, 60, 113], windows
+    print(f"[통과] 시작 직후 창 {fc.WINDOW_STEPS[-1]}s: 90s/2시간 전 기록을 찾음, 이후 10s -> 끊기면 {windows}")
+
+
+def check_missing_field():
+    now = 1_700_000_000.0
+    points = [("cpu_temperature", now - 5, 50.0), ("model_result", now - 5, 0.0)]
+    reader = fc.IncrementalReader()
+    for _ in range(3):
+        reader.ingest_records(query(points, reader.build_query(now), now))
+        assert reader.window(now) == fc.WINDOW_STEPS[-1]
+        now += 1
+    points.append(("gpu_temperature", now - 3 * 86400, 45.0))
+    samples = reader.ingest_records(query(points, reader.build_query(now), now))
+    assert samples["gpu_temperature"].value == 45.0
+    print("[통과] gpu_temperature 기록이 없는 동안 가장 넓은 창 유지, 3일 전 기록이 생기면 찾음")
+
+
+def main():
+    check_cold_start()
+    check_missing_field()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+# 재생 엔진 검증: 가짜 시계 주입, 입력 형식(넓은 CSV / Flux CSV), 통계, 1주일(1Hz) 재생 시간
+#   python TEST/replay_test.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from FANCONTROLL_PY import FanController
+from replay import Trace, load_trace, replay
+
+WEEK = 7 * 86400
+
+def synthetic_trace(n, seed=0):
+    """하루 주기 + 작업 부하 스파이크가 있는 1Hz 온도 기록"""
+    rng = np.random.default_rng(seed)
+    t = 1_700_000_000 + np.arange(n, dtype=np.float64)
+    base = 40 + 12 * np.sin(2 * np.pi * t / 86400)
+    spikes = np.repeat(rng.random(n // 600 + 1) < 0.2, 600)[:n] * 20
+    cpu = base + spikes + rng.normal(0, 1.5, n)
+    gpu = base + 5 + rng.normal(0, 1.5, n)
+    model = (rng.random(n) < 0.05).astype(np.int64)
+    return Trace(t, np.round(cpu, 2), np.round(gpu, 2), model)
+
+def check_clock():
+    now = [1000.0]
+    ctl = FanController(clock=lambda: now[0], slew_per_sec=10)
+    ctl.step(50, 50, 0)         # 첫 호출: dt=1s -> 0 에서 10 까지
+    now[0] += 0.5
+    p = ctl.step(50, 50, 0)     # 가짜 시계로 0.5초 -> +5
+    assert p == 15, p
+    assert ctl.last_ts_ms == 1_000_500
+    print("[통과] 주입한 시계로 슬루 레이트 계산")
+
+def check_equivalence():
+    trace = synthetic_trace(5000)
+    res = replay(trace, mode="range", cpu_thresh=45)
+    ctl = FanController(mode="range", cpu_thresh=45)
+    manual = [ctl.step(c, g, m, now_ms=int(t * 1000))
+              for t, c, g, m in zip(trace.ts, trace.cpu, trace.gpu, trace.model)]
+    assert res.pwm.tolist() == manual
+    again = replay(trace, mode="range", cpu_thresh=45)
+    assert again.pwm.tolist() == manual and again.summary["pwm_changes"] == res.summary["pwm_changes"]
+    print("[통과] 재생 결과 == step 직접 호출, 반복 재생 결과 동일")
+
+def check_formats_and_stats():
+    with tempfile.TemporaryDirectory() as d:
+        wide = os.path.join(d, "wide.csv")
+        with open(wide, "w") as f:
+            f.write("time,cpu_temperature,gpu_temperature,model_result\n")
+            f.write("2026-10-17T00:00:00Z,30,30,0\n2026-10-17T00:00:10Z,70,30,0\n"
+                    "2026-10-17T00:00:20Z,30,30,0\n2026-10-17T00:00:30Z,30,,0\n")
+        flux = os.path.join(d, "flux.csv")
+        with open(flux, "w") as f:
+            f.write("#datatype,string,long,dateTime:RFC3339,double,string,string\n"
+                    "#group,false,false,false,false,true,true\n#default,_result,,,,,\n"
+                    ",result,table,_time,_value,_field,_measurement\n")
+            for i, v in enumerate((30, 70, 30, 30)):
+                f.write(f",,0,2026-10-17T00:00:{i * 10:02d}Z,{v},value,cpu_temperature\n")
+            f.write("\n#datatype,string,long,dateTime:RFC3339,double,string,string\n"
+                    "#group,false,false,false,false,true,true\n#default,_result,,,,,\n"
+                    ",result,table,_time,_value,_field,_measurement\n"
+                    ",,1,2026-10-17T00:00:00Z,30,value,gpu_temperature\n"
+                    "\n#datatype,string,long,dateTime:RFC3339,long,string,string\n"
+                    "#group,false,false,false,false,true,true\n#default,_result,,,,,\n"
+                    ",result,table,_time,_value,_field,_measurement\n"
+                    ",,2,2026-10-17T00:00:00Z,0,value,model_result\n")
+        a, b = load_trace(wide), load_trace(flux)
+        for name in ("ts", "cpu", "gpu", "model"):
+            assert np.array_equal(getattr(a, name), getattr(b, name)), name
+        assert a.gpu.tolist() == [30, 30, 30, 30]  # 빈 칸은 직전 값 유지
+
+        s = replay(a, limit=60).summary
+        assert s["duration_sec"] == 40 and s["time_above_limit_sec"] == 10, s
+        assert s["pwm_changes"] >= 2 and s["max_pwm"] > 0
+        print(f"[통과] 넓은 CSV / Flux CSV 입력 일치, 통계: {s['time_above_limit_sec']:.0f}s 초과, "
+              f"duty 적분 {s['duty_integral_sec']:.1f}s, 변경 {s['pwm_changes']}회")
+
+def check_week_speed():
+    trace = synthetic_trace(WEEK)
+    t0 = time.perf_counter()
+    res = replay(trace)
+    elapsed = time.perf_counter() - t0
+    s = res.summary
+    print(f"[속도] 1주일 1Hz ({len(trace):,} 샘플) 재생 {elapsed:.2f}s (실시간 대비 {s['speedup']:,.0f}배), "
+          f"평균 duty {s['mean_duty']:.1f}%, 변경 {s['pwm_changes']:,}회")
+    assert elapsed < 30
+
+if __name__ == "__main__":
+    check_clock()
+    check_equivalence()
+    check_formats_and_stats()
+    check_week_speed()
@@ -0,0 +1,207 @@
+import os
+import sys
+import random
+import asyncio
+import tempfile
+
+# 고정 주기 스케줄러(scheduler.py)와 플릿 위상 그룹 검증 (가짜 시계, 실제로 기다리지 않음)
+#   python TEST/scheduler_test.py
+# 1) 틱 본문이 0.3s 걸려도 예정 시각이 흐르지 않음 ("작업 후 sleep(1.0)" 은 틱마다 0.3s 씩 밀림)
+# 2) 주기를 넘긴 틱: skip 은 지나간 예정 시각을 건너뛰고 격자에 다시 맞춤, catchup 은 최대 N 개 연달아 실행
+# 3) 위상 그룹: 장치가 겹치지 않게 나뉘고 그룹마다 다른 위상, 자기 장치만 조회
+# 4) 예정 시각(wall_ms)을 step 에 넘기면 무작위 실행 지연에도 slew/PWM 순서가 부하 없는 경우와 같음
+# 5) 틱 초과(overrun)는 그 틱을 돌리는 스케줄러의 주기 기준 (0.25s 주기에서 0.3s 틱은 초과, 5s 주기에서 2s 틱은 아님)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from scheduler import FixedRateScheduler, spread_phases
+from FANCONTROLL_PY import FanController
+from fleet import Fleet
+from shard_test import write_config
+
+
+class FakeClock:
+    """sleep 하면 그만큼 시간이 흐르는 가짜 monotonic 시계"""
+
+    def __init__(self, t=100.0):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+    async def sleep(self, sec):
+        self.t += max(0.0, sec)
+
+    def wall(self):
+        return 1_700_000_000.0 + self.t
+
+
+def make(clock, period=1.0, **kw):
+    return FixedRateScheduler(period, clock=clock, wall=clock.wall, sleep=clock.sleep, **kw)
+
+
+async def check_no_drift():
+    clock = FakeClock(100.37)
+    sched = make(clock)
+    starts = []
+    for _ in range(1000):
+        tick = await sched.next()
+        starts.append(clock())
+        clock.t += 0.3  # 틱 본문
+    # 첫 틱은 다음 정수 초, 이후 정확히 1초 간격
+    assert starts[0] == 101.0 and abs(starts[-1] - 1100.0) < 1e-6, (starts[0], starts[-1])
+    assert sched.missed == 0 and sched.skipped == 0 and sched.max_lateness < 1e-6
+    assert tick.index == 1100 and tick.wall_ms == 1_700_000_000_000 + 1100_000
+
+    # 비교: 작업 후 sleep(1.0)
+    clock = FakeClock(101.0)
+    for _ in range(1000):
+        clock.t += 0.3
+        await clock.sleep(1.0)
+    drift = clock() - 101.0 - 1000
+    assert abs(drift - 300) < 1e-6
+    print(f"[통과] 본문 0.3s x 1000틱: 고정 주기 흐름 0.000s (sleep(1.0) 방식은 {drift:.0f}s 밀림)")
+
+
+async def check_skip():
+    clock = FakeClock(0.0)
+    sched = make(clock, policy="skip")
+    t = await sched.next()
+    assert t.index == 0
+    clock.t += 3.4  # 3.4 주기 동안 막힘 -> 1, 2, 3 이 지나감
+    t = await sched.next()
+    assert (t.index, t.skipped, t.missed) == (3, 2, 2), t  # 3 은 다음 예정 시각 전에 시작
+    assert abs(t.lateness - 0.4) < 1e-9
+    t = await sched.next()
+    assert t.index == 4 and clock() == 4.0 and t.lateness == 0 and t.missed == 0
+    # 주기 바로 앞에서 끝나면 놓친 것이 없음
+    clock.t += 0.999
+    t = await sched.next()
+    assert (t.index, t.skipped, t.missed) == (5, 0, 0) and clock() == 5.0
+    assert (sched.ticks, sched.skipped, sched.missed) == (4, 2, 2)
+    print("[통과] skip: 3.4 주기 막힘 -> 예정 2개 건너뛰고 3번 실행(0.4s 늦음), 다음 틱은 격자에 맞춰 4.0s")
+
+
+async def check_catchup():
+    clock = FakeClock(0.0)
+    sched = make(clock, policy="catchup", max_catchup=2)
+    await sched.next()
+    clock.t += 5.5  # 1..5 가 지나감 (passed 5), 최대 1+2 개만 실행
+    ran = []
+    while True:
+        t = await sched.next()
+        ran.append((t.index, t.skipped, t.missed))
+        if t.lateness < sched.period:
+            break
+    # 5.5 시점에 3, 4 를 연달아 (1, 2 는 건너뜀), 5 는 0.5s 늦게, 6 은 제때
+    assert ran == [(3, 2, 3), (4, 0, 1), (5, 0, 0)], ran
+    assert sched.missed == 4 and sched.skipped == 2  # 놓친 예정 시각 = passed - 1
+    t = await sched.next()
+    assert (t.index, t.lateness) == (6, 0.0) and clock() == 6.0
+
+    # max_catchup 안이면 건너뛰지 않고 모두 실행
+    clock = FakeClock(0.0)
+    sched = make(clock, policy="catchup", max_catchup=3)
+    await sched.next()
+    clock.t += 2.2
+    idx = [(await sched.next()).index for _ in range(3)]
+    assert idx == [1, 2, 3] and sched.skipped == 0 and clock() == 3.0
+    print("[통과] catchup: 최대 2개 연달아 따라잡고 오래된 2개 건너뜀, 범위 안이면 빠짐없이 실행")
+
+
+async def check_phase():
+    clock = FakeClock(10.2)
+    scheds = [make(clock, phase=p) for p in spread_phases(1.0, 4)]
+    assert [s.phase for s in scheds] == [0.0, 0.25, 0.5, 0.75]
+    firsts = []
+    for s in scheds:
+        firsts.append((await s.next()).scheduled)
+    assert firsts == [11.0, 11.25, 11.5, 11.75], firsts
+    try:
+        make(clock, policy="bogus")
+        raise AssertionError("정책 검사 없음")
+    except ValueError:
+        pass
+    print("[통과] 위상 0/0.25/0.5/0.75: 같은 격자 위에서 시작 시각이 엇갈림")
+
+
+def check_fleet_groups():
+    with tempfile.TemporaryDirectory() as tmp:
+        config = os.path.join(tmp, "fleet.json")
+        ids = write_config(config, 200, 6000)
+        fleet = Fleet.from_config(config)
+        groups = list(fleet.groups.values())
+        assert len(groups) == fleet.phase_slots
+        assert set().union(*(g.device_ids for g in groups)) == set(ids)
+        assert sum(len(g.device_ids) for g in groups) == len(ids)
+        assert len({g.phase for g in groups}) == len(groups)
+        assert min(len(g.device_ids) for g in groups) > len(ids) / fleet.phase_slots / 2
+        sizes = sorted(len(g.device_ids) for g in groups)
+        g = groups[0]
+        q = g.reader.build_query()
+        assert "contains(value: r.device" in q and all(f'"{d}"' in q for d in g.device_ids)
+        assert not any(f'"{d}"' in q for d in groups[1].device_ids)
+        for d in list(g.device_ids):
+            fleet.remove(d)
+        assert g not in fleet.groups.values() and len(fleet.groups) == len(groups) - 1
+
+        one = Fleet.from_config(config)
+        one.phase_slots = 1
+        one.groups.clear()
+        for dev in one.devices.values():
+            one._join_group(dev)
+        (only,) = one.groups.values()
+        assert len(only.device_ids) == len(ids) and "contains(" not in only.reader.build_query()
+        print(f"[통과] 위상 그룹 {len(groups)}개: 장치 {len(ids)}대를 겹치지 않게 나눔 "
+              f"({sizes}), 그룹마다 자기 장치만 조회")
+
+
+async def pwm_sequence(delays):
+    """센서 값 순서는 같고 실행 지연만 다른 경우의 PWM 순서 (slew 가 dt 에 따라 달라지는지)"""
+    clock = FakeClock(0.0)
+    sched = make(clock, policy="catchup", max_catchup=10)
+    ctl = FanController(clock=clock.wall)
+    rng = random.Random(7)
+    temps = [(rng.uniform(30, 90), rng.uniform(30, 90), rng.randint(0, 1)) for _ in range(len(delays))]
+    out = []
+    for (cpu, gpu, model), delay in zip(temps, delays):
+        tick = await sched.next()
+        clock.t += delay  # 조회 지연
+        out.append(ctl.step(cpu, gpu, model, tick.wall_ms))
+        clock.t += 0.05
+    return out
+
+
+async def check_load_independent():
+    n = 300
+    rng = random.Random(1)
+    idle = await pwm_sequence([0.0] * n)
+    loaded = await pwm_sequence([rng.choice((0.0, 0.2, 0.7, 1.6)) for _ in range(n)])
+    assert idle == loaded
+    assert len(set(idle)) > 10  # slew 가 실제로 동작하는 입력
+    print(f"[통과] 무작위 실행 지연(0~1.6s)에도 {n}틱 PWM 순서가 부하 없을 때와 같음 (예정 시각 기준 slew)")
+
+
+def check_overrun_budget():
+    import process_control_command as pcc
+
+    def overruns(path):
+        return pcc.metrics.snapshot().get(f'fan_tick_overruns_total{{path="{path}"}}', 0)
+
+    for path, period, total, over in (("poll", 0.25, 0.3, 1), ("fleet", 5.0, 2.0, 0), ("push", 0.1, 0.05, 0)):
+        before = overruns(path)
+        pcc.record_tick({}, total, path, period)
+        assert overruns(path) - before == over, (path, period, total)
+    print("[통과] 틱 초과 판정: 0.25s 주기 0.3s 틱은 초과, 5s 주기 2s 틱/0.1s 간격 0.05s 틱은 정상")
+
+
+def main():
+    asyncio.run(check_no_drift())
+    asyncio.run(check_skip())
+    asyncio.run(check_catchup())
+    asyncio.run(check_phase())
+    check_fleet_groups()
+    asyncio.run(check_load_independent())
+    check_overrun_budget()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import asyncio
+import tempfile
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 샤딩(shard.py, fleet.HashRing/reshard/adopt) 검증
+#   python TEST/shard_test.py
+# 1) 해시 링: 고른 분배, 워커 하나 추가/제거 시 약 1/N 만 이동
+# 2) Fleet 샤드: 워커들의 장치가 겹치지 않고 전체를 덮음, reshard -> adopt 로 상태 이동, 장치 필터 쿼리
+# 3) 실제 워커 프로세스 2개 + 게이트웨이: 장치 라우팅, 그룹 응답 합치기, 워커 강제 종료 후 재시작,
+#    워커 3개로 리밸런싱 (InfluxDB 대역과 Pi 싱크는 이 프로세스 안에서 띄운다)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import wire
+from fleet import Fleet, HashRing
+from shard import Supervisor, Gateway, merge_replies, node_names
+
+MEASUREMENTS = ("cpu_temperature", "gpu_temperature", "model_result")
+SET_RE = re.compile(r"set: \[(.*?)\]")
+
+
+class FakeInflux(BaseHTTPRequestHandler):
+    """쿼리의 장치 필터(contains set)에 있는 장치만 CSV 로 돌려준다. 필터가 없으면 전체 (devices 클래스 변수)."""
+    protocol_version = "HTTP/1.1"
+    devices = []
+    queries = 0
+    _cache = {}
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # 워커를 정지하면 keep-alive 연결이 끊긴다
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/api/v2/write"):  # 명령 추적(fan_command) 기록은 받기만 한다
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        query = body.decode()
+        m = SET_RE.search(query)
+        names = json.loads(f"[{m.group(1)}]") if m else self.devices
+        type(self).queries += 1
+        # 같은 장치 집합이면 1초 동안 같은 응답 (워커 여럿이 부르는 대역이 병목이 되지 않도록)
+        key = (m.group(1) if m else "*", int(time.time()))
+        body = self._cache.get(key)
+        if body is None:
+            now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            lines = [",result,table,_time,_value,_field,_measurement,device"]
+            table = 0
+            for name in names:
+                for meas in MEASUREMENTS:
+                    v = random.randint(0, 1) if meas == "model_result" else round(random.uniform(25, 70), 2)
+                    lines.append(f",_result,{table},{now},{v},value,{meas},{name}")
+                    table += 1
+            body = ("\r\n".join(lines) + "\r\n").encode()
+            if len(self._cache) > 256:
+                self._cache.clear()
+            self._cache[key] = body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_influx(devices):
+    FakeInflux.devices = list(devices)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeInflux)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def start_pi_sink(backlog: int = 1024):
+    """JSON 명령을 세기만 하는 Pi 대역. 반환: (서버, 포트, 받은 명령 수를 담은 dict)"""
+    counts = {"commands": 0}
+
+    async def sink(reader, writer):
+        try:
+            while line := await reader.readline():
+                if wire.parse_hello(line) is not None:
+                    writer.write(wire.hello_reply(0))
+                    continue
+                counts["commands"] += 1
+        except ConnectionError:
+            pass  # 워커를 정지하면 연결이 끊긴다
+
+    server = await asyncio.start_server(sink, "127.0.0.1", 0, backlog=backlog)
+    return server, server.sockets[0].getsockname()[1], counts
+
+
+def outside_ip():
+    """이 호스트의 루프백이 아닌 주소 (없으면 None)"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            s.connect(("10.255.255.255", 1))  # 실제로 보내지는 않음, 경로의 출발 주소만 얻는다
+            ip = s.getsockname()[0]
+        except OSError:
+            return None
+    return None if ip.startswith("127.") else ip
+
+
+def write_config(path, n_devices, pi_port, rack_size=10):
+    devices = [{"id": f"dev{i:05d}", "host": "127.0.0.1", "port": pi_port, "groups": [f"rack{i // rack_size:03d}"]}
+               for i in range(n_devices)]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"devices": devices}, f)
+    return [d["id"] for d in devices]
+
+
+def check_ring():
+    keys = [f"dev{i:05d}" for i in range(20_000)]
+    for n in (2, 4, 8):
+        ring = HashRing(node_names(n))
+        counts = {}
+        for k in keys:
+            counts[ring.node_for(k)] = counts.get(ring.node_for(k), 0) + 1
+        spread = max(counts.values()) / (len(keys) / n)
+        assert len(counts) == n and spread < 1.35, (n, counts)
+        grown = HashRing(node_names(n + 1))
+        moved = sum(ring.node_for(k) != grown.node_for(k) for k in keys) / len(keys)
+        # 새 노드로 가는 장치만 움직인다 (기존 노드끼리의 이동 없음)
+        assert all(ring.node_for(k) == grown.node_for(k) or grown.node_for(k) == f"w{n}" for k in keys)
+        assert abs(moved - 1 / (n + 1)) < 0.08, (n, moved)
+        print(f"[통과] 노드 {n}개: 최대 부하 {spread:.2f}x 평균, {n}->{n + 1} 이동 {moved:.1%} "
+              f"(이상적 {1 / (n + 1):.1%})")
+
+
+def check_fleet_shards(config):
+    nodes = node_names(3)
+    shards = [Fleet.from_config(config, n, nodes) for n in nodes]
+    owned = [set(f.devices) for f in shards]
+    all_ids = set(shards[0].configs)
+    assert set().union(*owned) == all_ids and sum(map(len, owned)) == len(all_ids)
+    q = shards[0].reader.build_query()
+    assert "contains(value: r.device" in q and all(f'"{d}"' in q for d in owned[0])
+    # 다른 샤드의 장치가 응답에 섞여도 무시
+    other = next(iter(owned[1]))
+    shards[0].reader.ingest_records([("cpu_temperature", 1.0, 50.0, other)])
+    assert not any(k[0] == other for k in shards[0].reader.samples)
+
+    # w2 를 빼면 w2 장치만 w0/w1 로 옮겨 간다
+    for dev in shards[2].devices.values():
+        dev.ctl.mode, dev.ctl.manual_target, dev.ctl.last_pwm = "manual", 77, 64
+    released = [f.reshard(nodes[:2]) for f in shards]
+    assert not released[0] and not released[1] and set(released[2]) == owned[2]
+    adopted = sum(f.adopt(released[2]) for f in shards[:2])
+    assert adopted == len(owned[2]) and not shards[2].devices
+    moved = next(iter(owned[2]))
+    dev = next(f.devices[moved] for f in shards[:2] if moved in f.devices)
+    assert (dev.ctl.mode, dev.ctl.manual_target, dev.ctl.last_pwm) == ("manual", 77, 64)
+    assert set(shards[0].devices) | set(shards[1].devices) == all_ids
+    print(f"[통과] 샤드 3개 {[len(o) for o in owned]} 장치, w2 제거 -> {len(owned[2])}대 상태 유지한 채 이동")
+
+
+def check_merge():
+    ok = merge_replies([{"status": "ok", "devices": {"a": {}}}, {"status": "error", "error": "no matching device"},
+                        {"status": "ok", "devices": {"b": {}}}])
+    assert ok == {"status": "ok", "devices": {"a": {}, "b": {}}}
+    none = merge_replies([{"status": "error", "error": "no matching device"}] * 2)
+    assert none["error"] == "no matching device"
+    down = merge_replies([{"status": "error", "error": "shard w1 unavailable"}, {"status": "error",
+                                                                                  "error": "no matching device"}])
+    assert down["error"] == "shard w1 unavailable"
+    print("[통과] 그룹 응답 합치기")
+
+
+async def check_workers(tmp):
+    pi_server, pi_port, counts = await start_pi_sink()
+    config = os.path.join(tmp, "fleet.json")
+    ids = write_config(config, 30, pi_port)
+    influx, url = start_influx(ids)
+    base = 20000 + random.randrange(0, 5000, 10)
+    env = dict(os.environ, INFLUX_URL_BASE=url, LOG_LEVEL="WARNING")
+    sup = Supervisor(config, base_port=base, metrics_base_port=base + 5, snapshot_path=os.path.join(tmp, "snap"),
+                     restart_delay=0.2, env=env, stdout=asyncio.subprocess.DEVNULL)
+    gw = Gateway(sup)
+    try:
+        await sup.start(2)
+        # 한 대: 주인 워커에만
+        dev = "dev00007"
+        r = await gw.handle({"device": dev, "mode": "manual", "manual_pwm": 66})
+        assert r["status"] == "ok" and r["device"] == dev and r["current_mode"] == "manual", r
+        ip = outside_ip()
+        if ip is not None:  # 워커는 127.0.0.1 에만 열려 있음
+            try:
+                _, writer = await asyncio.open_connection(ip, sup.owner(dev).port)
+                writer.close()
+                raise AssertionError(f"워커가 {ip} 에서 열림")
+            except OSError:
+                pass
+        # 그룹: 두 워커에 흩어진 장치 응답을 합친다
+        r = await gw.handle({"group": "rack000", "mode": "auto"})
+        assert r["status"] == "ok" and set(r["devices"]) == {f"dev{i:05d}" for i in range(10)}, r
+        owners = {sup.owner(d).id for d in r["devices"]}
+        assert owners == {"w0", "w1"}, owners
+        r = await gw.handle({"stats": True})
+        assert set(r["stats"]) == {"w0", "w1"}
+        # 내부 명령(reshard/adopt)은 클라이언트가 보낼 수 없음: 워커에 닿지 않고 장치도 그대로
+        for msg in ({"reshard": {"nodes": []}}, {"adopt": {}}, {"device": dev, "adopt": {}}):
+            r = await gw.handle(msg)
+            assert r["status"] == "error" and "internal" in r["error"], r
+        r = await gw.handle({"group": "rack000"})
+        assert r["status"] == "ok" and len(r["devices"]) == 10, r
+        print(f"[통과] 게이트웨이 라우팅: 장치 명령은 주인 워커로, rack000 그룹은 워커 {sorted(owners)} 응답 합침, "
+              f"클라이언트의 reshard/adopt 거부")
+
+        # 워커는 살아 있는데 요청/구독 연결만 끊김 -> 다시 연결
+        w = sup.owner(dev)
+        await w.conn.close()
+        r = await gw.handle({"device": dev})
+        assert r["status"] == "ok" and sup.status()[w.id]["up"], r
+        states = []
+        on_state = sup.on_state
+        sup.on_state = lambda data: (states.append(data), on_state(data))
+        old_sub = w.sub
+        await old_sub.close()
+        t0 = time.perf_counter()
+        while w.sub is None or w.sub is old_sub:
+            await asyncio.sleep(0.05)
+            assert time.perf_counter() - t0 < 5, "다시 구독하지 않음"
+        await gw.handle({"device": dev, "manual_pwm": 61})
+        n = len(states)
+        while len(states) == n:
+            await asyncio.sleep(0.05)
+            assert time.perf_counter() - t0 < 10, "다시 구독한 뒤 상태 방송 없음"
+        sup.on_state = on_state
+        print(f"[통과] 워커 {w.id} 연결만 끊김: 다음 요청에서 재연결, 상태 구독 {time.perf_counter() - t0:.2f}s 후 재개")
+
+        # 멈춘 워커(SIGSTOP): 요청은 request_timeout 에 오류, 다른 워커 응답은 그대로, 깨어나면 다시 정상
+        sup.request_timeout = 1.0
+        os.kill(w.pid, signal.SIGSTOP)
+        try:
+            t0 = time.perf_counter()
+            r = await asyncio.gather(gw.handle({"device": dev}), gw.handle({"device": dev}),
+                                     gw.handle({"group": "rack000"}))
+            hung = time.perf_counter() - t0
+            assert r[0]["error"] == r[1]["error"] == f"shard {w.id} timed out", r[:2]
+            assert r[2]["status"] == "ok" and 0 < len(r[2]["devices"]) < 10, r[2]  # 다른 워커 장치만
+            assert hung < 2.5, hung
+        finally:
+            os.kill(w.pid, signal.SIGCONT)
+        r = await gw.handle({"device": dev})
+        assert r["status"] == "ok" and r["device"] == dev, r
+        sup.request_timeout = 10.0
+        print(f"[통과] 워커 {w.id} 정지: 요청 3개(대기 포함) {hung:.2f}s 안에 시간 초과/부분 응답, 재개 후 새 연결로 정상")
+
+        await gw.handle({"device": dev, "mode": "manual", "manual_pwm": 55})
+        victim = sup.owner(dev)
+        await asyncio.sleep(1.5)  # 틱이 돌아 스냅샷에 기록되도록
+        victim.proc.kill()
+        t0 = time.perf_counter()
+        while victim.restarts == 0 or victim.conn is None:
+            await asyncio.sleep(0.05)
+            assert time.perf_counter() - t0 < 15, "재시작되지 않음"
+        r = await gw.handle({"device": dev})
+        assert r["status"] == "ok" and r["current_mode"] == "manual", r
+        print(f"[통과] 워커 {victim.id} 강제 종료 -> {time.perf_counter() - t0:.2f}s 후 재시작, "
+              f"{dev} 의 manual 모드를 스냅샷에서 복원")
+
+        # 리밸런싱으로 옮겨 가는 장치도 웹에서 바꾼 설정을 그대로 가져가야 한다
+        await gw.handle({"group": "rack001", "mode": "manual", "manual_pwm": 44})
+        r = await gw.handle({"shards": {"workers": 3}})
+        assert r["status"] == "ok" and set(r["shards"]) == {"w0", "w1", "w2"}, r
+        assert 0 < r["moved"] == r["shards"]["w2"]["devices"] < len(ids)
+        moved = [f"dev{i:05d}" for i in range(10, 20) if sup.owner(f"dev{i:05d}").id == "w2"]
+        assert moved
+        for d in moved + [dev]:
+            r = await gw.handle({"device": d})
+            assert r["status"] == "ok" and r["current_mode"] == "manual", r
+        r = await gw.handle({"mode": "auto"})
+        assert set(r["devices"]) == set(ids), len(r["devices"])
+        print(f"[통과] 워커 2 -> 3: {sup.status()['w2']['devices']}대 이동, 옮겨 간 rack001 장치 {len(moved)}대의 "
+              f"manual 설정 유지, 전체 명령 {len(ids)}대 응답")
+
+        r = await gw.handle({"shards": {"workers": 2}})
+        assert set(r["shards"]) == {"w0", "w1"} and sum(s["devices"] for s in r["shards"].values()) == len(ids)
+        r = await gw.handle({"mode": "auto"})
+        assert set(r["devices"]) == set(ids)
+        assert counts["commands"] > 0
+        print(f"[통과] 워커 3 -> 2: 전체 {len(ids)}대 유지, Pi 명령 {counts['commands']}개 수신")
+    finally:
+        await sup.stop()
+        pi_server.close()
+        influx.shutdown()
+
+
+def main():
+    check_ring()
+    check_merge()
+    with tempfile.TemporaryDirectory() as tmp:
+        config = os.path.join(tmp, "fleet.json")
+        write_config(config, 300, 6000)
+        check_fleet_shards(config)
+        asyncio.run(check_workers(tmp))
+
+
+if __name__ == "__main__":
+    main()
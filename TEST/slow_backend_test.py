@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import json
+import asyncio
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 느린 InfluxDB / 응답 없는 Pi 상황에서도 웹소켓 명령 지연이 평탄한지 확인하는 테스트
+#   python TEST/slow_backend_test.py
+# InfluxDB 대역: POST 마다 SLOW_SEC 초 동안 응답을 지연하는 로컬 HTTP 서버
+# Pi 대역: 라우팅되지 않는 주소(기본 10.255.255.1)로 연결 시도 -> 연결이 멈춘 채로 대기
+SLOW_SEC = float(os.getenv("SLOW_SEC", "5"))
+COMMANDS = int(os.getenv("COMMANDS", "40"))
+MAX_RTT_MS = float(os.getenv("MAX_RTT_MS", "100"))
+
+class SlowInflux(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(SLOW_SEC)
+        body = b",result,table,_time,_value,_field,_measurement\r\n"
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 클라이언트가 마감 시간으로 먼저 끊은 경우
+
+    def log_message(self, *args):
+        pass
+
+def start_slow_influx():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowInflux)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+async def run():
+    import websockets
+    import process_control_command as pcc
+
+    async with websockets.serve(pcc.handle_connection, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        loop_task = asyncio.create_task(pcc.automation_loop())
+        await asyncio.sleep(0.5)  # 자동 제어 루프가 느린 조회에 들어가도록 잠시 대기
+
+        rtts = []
+        async with websockets.connect(f"ws://127.0.0.1:{port}") as ws:
+            for i in range(COMMANDS):
+                t0 = time.perf_counter()
+                await ws.send(json.dumps({"mode": "manual", "manual_pwm": i % 100}))
+                await ws.recv()
+                rtts.append((time.perf_counter() - t0) * 1000)
+                await asyncio.sleep(0.1)
+        loop_task.cancel()
+    return rtts
+
+def main():
+    influx = start_slow_influx()
+    os.environ["INFLUX_URL_BASE"] = f"http://127.0.0.1:{influx.server_address[1]}"
+    os.environ.setdefault("PI_HOST", "10.255.255.1")
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+    rtts = asyncio.run(run())
+    rtts.sort()
+    print(f"[결과] 명령 {len(rtts)}개, median={statistics.median(rtts):.2f} ms, "
+          f"p95={rtts[int(len(rtts) * 0.95) - 1]:.2f} ms, max={rtts[-1]:.2f} ms "
+          f"(InfluxDB 지연 {SLOW_SEC}s)")
+    if rtts[-1] > MAX_RTT_MS:
+        print(f"[실패] 최대 지연이 {MAX_RTT_MS} ms 를 넘었습니다.")
+        sys.exit(1)
+    print("[통과] 백엔드가 느려도 웹소켓 명령 지연이 평탄합니다.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import tempfile
+
+# 컨트롤러 스냅샷(snapshot.py) 검증: 저장/복원, 쓰는 도중 죽은 경우(깨진 슬롯) 직전 상태 사용,
+# 32바이트보다 긴 장치 ID, 장치 수 증가 시 파일 확장, 틱당 기록 비용
+#   python TEST/snapshot_test.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from FANCONTROLL_PY import FanController
+from snapshot import ControllerSnapshot, HEADER
+
+def check_roundtrip(path):
+    ctl = FanController(min_duty=35)
+    ctl.step(70, 70, 0, now_ms=1_000)
+    ctl.mode, ctl.manual_target, ctl.cpu_thresh, ctl.gpu_thresh = "range", 55, 48, 52
+    snap = ControllerSnapshot(path)
+    snap.save({"default": ctl})
+    snap.close()
+
+    fresh = FanController(min_duty=35)
+    again = ControllerSnapshot(path)
+    assert again.restore({"default": fresh, "missing": FanController()}) == 1
+    assert fresh == ctl, (fresh, ctl)
+    assert again.seq == 1
+    again.close()
+    print(f"[통과] 저장 -> 새 프로세스에서 복원: mode={fresh.mode}, pwm={fresh.last_pwm}, "
+          f"임계값 {fresh.cpu_thresh}/{fresh.gpu_thresh}")
+
+def check_torn_write(path):
+    snap = ControllerSnapshot(path)
+    ctl = FanController()
+    for pwm in (10, 20, 30):
+        ctl.last_pwm = pwm
+        snap.save({"default": ctl})
+    # 마지막 기록(seq) 슬롯의 레코드 일부만 바뀐 채 죽은 상황: CRC 가 맞지 않아 직전 슬롯을 쓴다
+    off = (snap.seq % 2) * snap.slot_size
+    snap._mm[off + HEADER.size + 40] ^= 0xFF
+    assert snap.load()["default"]["last_pwm"] == 20
+    # 헤더까지 깨져도 마찬가지
+    snap._mm[off:off + 4] = b"XXXX"
+    assert snap.load()["default"]["last_pwm"] == 20
+    snap.close()
+    print("[통과] 최신 슬롯이 깨지면 직전 상태(한 틱 전)로 복원")
+
+def check_long_keys(path):
+    # 40바이트 장치 ID 두 개가 앞 32바이트를 공유: 서로 덮어쓰지 않고, 앞부분만 같은 ID 로도 복원되지 않음
+    a, b = "site-seoul-building-07-rack-0001-fan-000", "site-seoul-building-07-rack-0001-fan-001"
+    assert len(a.encode()) == len(b.encode()) == 40 and a[:32] == b[:32]
+    ctls = {a: FanController(last_pwm=11), b: FanController(last_pwm=22), "default": FanController(last_pwm=33)}
+    snap = ControllerSnapshot(path)
+    snap.save(ctls)
+    snap.close()
+    fresh = {k: FanController() for k in (a, b, a[:32], "default")}
+    again = ControllerSnapshot(path)
+    assert again.restore(fresh) == 3
+    assert [fresh[k].last_pwm for k in (a, b, "default")] == [11, 22, 33]
+    assert fresh[a[:32]] == FanController()
+    assert set(again.load()) == {"default"}
+    again.close()
+    print("[통과] 앞 32바이트가 같은 40바이트 장치 ID 2개: 각자 복원, 32바이트 앞부분 ID 는 복원 안 됨")
+
+def check_grow_and_cost(path):
+    snap = ControllerSnapshot(path)
+    ctls = {f"rack{i:04d}-fan": FanController(last_pwm=i % 101) for i in range(1000)}
+    snap.save(ctls)
+    loaded = snap.load()
+    assert len(loaded) == 1000 and loaded["rack0123-fan"]["last_pwm"] == 123 % 101
+    size = os.path.getsize(path)
+
+    one = {"default": FanController()}
+    single = ControllerSnapshot(path + ".1")
+    for name, s, c in (("장치 1대", single, one), ("장치 1,000대", snap, ctls)):
+        n = 20_000 if len(c) == 1 else 200
+        t0 = time.perf_counter()
+        for _ in range(n):
+            s.save(c)
+        print(f"[비용] {name}: save {(time.perf_counter() - t0) / n * 1e6:.1f} µs")
+    assert (time.perf_counter() - t0) / n < 0.05
+    snap.close()
+    single.close()
+    print(f"[통과] 1,000대 저장 시 파일 확장 ({size:,} 바이트), 복원 값 일치")
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        check_roundtrip(os.path.join(d, "a.snap"))
+        check_torn_write(os.path.join(d, "b.snap"))
+        check_long_keys(os.path.join(d, "d.snap"))
+        check_grow_and_cost(os.path.join(d, "c.snap"))
@@ -0,0 +1,503 @@
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import random
+import signal
+import asyncio
+import argparse
+import tempfile
+import threading
+import functools
+import contextlib
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+import websockets
+
+# 전체 시스템 부하/장시간(soak) 시험
+#   python TEST/soak.py [--devices 50] [--clients 4] [--duration 300] [--workers 0]
+# 한 프로세스 그룹 안에서 다음을 띄우고 실제 process_control_command.py (--workers K 면 shard.py)를 돌린다.
+#   - InfluxDB HTTP API 대역: Flux 조회(/api/v2/query)에 장치별 최신 값을 CSV 로 답하고,
+#     Line Protocol 쓰기(/api/v2/write, gzip 포함)를 받는다. 센서 값은 가상 센서가 매초 쓰기로 넣는다.
+#   - 가상 Pi N 대: pi.py 의 FanAgent(SIMULATION_MODE, FakeGPIO) + InfluxReporter 상태 보고
+#   - 웹소켓 클라이언트 M 개: 모드/수동 PWM/임계값 변경을 무작위 간격으로 보낸다
+# 결과:
+#   - 틱 지터: InfluxDB 대역에 조회가 도착한 간격 (틱 시작 간격) 과 1초 일정 대비 누적 지연
+#   - 명령 지연: 웹소켓 응답까지, 그리고 수동 PWM 명령이 해당 Pi 에 목표값으로 도착할 때까지
+#   - 유실 명령: --drop-timeout 초 안에 Pi 에 도착하지 않은 수동 PWM 명령 (그 전에 같은 장치에 다음 명령이
+#     가서 덮어쓴 경우는 superseded 로 따로 센다), 웹소켓 오류/응답 없음
+#   - 메모리: 프로세스 그룹의 프로세스별 RSS 추이와 증가율 (MB/h, 예열 이후 구간의 직선 기울기)
+# 서버와 가상 Pi 의 출력은 --log 파일(기본: 임시 디렉터리)로 보내고, 시험 결과만 화면에 출력한다.
+os.environ.setdefault("PI_SIMULATION", "1")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import pi as pi_agent
+
+MEASUREMENTS = ("cpu_temperature", "gpu_temperature", "model_result")
+SET_RE = re.compile(r"set: \[(.*?)\]")
+RANGE_RE = re.compile(r"range\(start: -(\d+)s\)")
+PRECISION = {"s": 1.0, "ms": 1e-3, "us": 1e-6, "ns": 1e-9}
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") / 1024
+
+
+def say(*args):
+    """시험 결과 출력 (sys.stdout 은 로그 파일로 돌려 놓으므로 원래 표준 출력에 쓴다)"""
+    print(*args, file=sys.__stdout__, flush=True)
+
+
+def percentiles(values, ps=(50, 95, 99)):
+    if not values:
+        return {f"p{p}": None for p in ps} | {"max": None}
+    arr = np.asarray(values) * 1000
+    return {f"p{p}": round(float(np.percentile(arr, p)), 1) for p in ps} | {"max": round(float(arr.max()), 1)}
+
+
+# ---------- InfluxDB 대역 ----------
+class FakeInfluxDB:
+    """Line Protocol 쓰기를 받아 (장치, 측정값) 별 최신 값을 보관하고 Flux 조회에 CSV 로 답한다"""
+
+    def __init__(self, device_tag: str = "device"):
+        self.device_tag = device_tag
+        self.latest = {}          # (장치, 측정값) -> (ts 초, 값)
+        self.lock = threading.Lock()
+        self.lines_written = 0
+        self.write_errors = 0
+        self.queries = {}         # 조회한 장치 집합 -> [도착 시각(monotonic)]
+
+    def write(self, body: str, precision: str = "ns") -> int:
+        scale = PRECISION.get(precision, 1e-9)
+        n = 0
+        with self.lock:
+            for line in body.splitlines():
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    series, fields, *ts = line.split(" ")
+                    measurement, *tags = series.split(",")
+                    tags = dict(t.split("=", 1) for t in tags)
+                    t = int(ts[0]) * scale if ts else time.time()
+                    for f in fields.split(","):
+                        key, value = f.split("=", 1)
+                        value = float(value.rstrip("i"))
+                        name = measurement if key == "value" else f"{measurement}.{key}"
+                        self.latest[(tags.get(self.device_tag, ""), name)] = (t, value)
+                except ValueError:
+                    self.write_errors += 1
+                    continue
+                n += 1
+            self.lines_written += n
+        return n
+
+    def query(self, flux: str) -> bytes:
+        m = SET_RE.search(flux)
+        wanted = set(json.loads(f"[{m.group(1)}]")) if m else None
+        w = RANGE_RE.search(flux)
+        since = time.time() - int(w.group(1)) if w else 0.0
+        measurements = [x for x in MEASUREMENTS if f'"{x}"' in flux]
+        self.queries.setdefault(m.group(1) if m else "*", []).append(time.monotonic())
+        lines = [f",result,table,_time,_value,_field,_measurement,{self.device_tag}"]
+        with self.lock:
+            items = [(k, v) for k, v in self.latest.items()
+                     if k[1] in measurements and v[0] >= since and (wanted is None or k[0] in wanted)]
+        for table, ((device, meas), (ts, value)) in enumerate(items):
+            stamp = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            lines.append(f",_result,{table},{stamp},{value},value,{meas},{device}")
+        return ("\r\n".join(lines) + "\r\n").encode()
+
+    def serve(self):
+        db = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                url = urlparse(self.path)
+                if url.path == "/api/v2/write":
+                    db.write(body.decode(), parse_qs(url.query).get("precision", ["ns"])[0])
+                    self.send_response(204)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                out = db.query(body.decode())
+                self.send_response(200)
+                self.send_header("Content-Type", "text/csv")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_sensors(url: str, devices, stop: threading.Event, interval: float = 1.0):
+    """가상 센서: 장치마다 CPU/GPU 온도(무작위 보행)와 model_result 를 매초 Line Protocol 로 쓴다"""
+    state = {d: [random.uniform(35, 60), random.uniform(35, 60), 0] for d in devices}
+    session = requests.Session()
+    while not stop.wait(interval):
+        ts = int(time.time() * 1000)
+        lines = []
+        for d, s in state.items():
+            s[0] = min(90.0, max(25.0, s[0] + random.gauss(0, 1.5)))
+            s[1] = min(90.0, max(25.0, s[1] + random.gauss(0, 1.5)))
+            if random.random() < 0.05:
+                s[2] = 1 - s[2]
+            lines += [f"cpu_temperature,device={d} value={s[0]:.2f} {ts}",
+                      f"gpu_temperature,device={d} value={s[1]:.2f} {ts}",
+                      f"model_result,device={d} value={s[2]} {ts}"]
+        try:
+            session.post(f"{url}/api/v2/write?org=soak&bucket=soak&precision=ms", data="\n".join(lines), timeout=2)
+        except requests.RequestException:
+            pass
+
+
+# ---------- 가상 Pi ----------
+class VirtualPi(pi_agent.FanAgent):
+    """pi.py 의 FanAgent 그대로 (FakeGPIO 에 쓰기), 받은 목표값을 시험 기록기로도 넘긴다"""
+
+    def __init__(self, device_id: str, on_submit):
+        self.gpio = pi_agent.FakeGPIO(maxlen=1000)
+        super().__init__(write=functools.partial(self.gpio.set_PWM_dutycycle, pi_agent.FAN_PIN))
+        self.device_id = device_id
+        self.on_submit = on_submit
+
+    def submit(self, target, ramp=None, trace=None):
+        super().submit(target, ramp, trace)
+        self.on_submit(self, float(target))
+
+
+async def report_status(agents, url: str, tmp: str, interval: float = pi_agent.REPORT_INTERVAL):
+    """가상 Pi 별 상태 보고 (pi.py 의 InfluxReporter 로 fan_status 를 일괄 전송)"""
+    reporters = [pi_agent.InfluxReporter(url=f"{url}/api/v2/write?org=soak&bucket=soak&precision=s",
+                                         spool_path=os.path.join(tmp, f"spool.{a.device_id}")) for a in agents]
+
+    def once():
+        ts = int(time.time())
+        for a, r in zip(agents, reporters):
+            with r._lock:
+                r.add(f"fan_status,device={a.device_id} pwm_duty_cycle={int(round(a.current))} {ts}")
+            r.flush_if_due()
+
+    try:
+        while True:
+            await asyncio.to_thread(once)
+            await asyncio.sleep(interval)
+    finally:
+        for r in reporters:
+            r.close()
+
+
+# ---------- 명령 기록 ----------
+class CommandLog:
+    """웹소켓 명령의 응답 지연과, 수동 PWM 명령이 Pi 에 도착하기까지의 지연/유실"""
+
+    def __init__(self, drop_timeout: float):
+        self.drop_timeout = drop_timeout
+        self.ack_latency = []
+        self.e2e_latency = []
+        self.pending = {}         # 장치 -> (목표 PWM, 보낸 시각)
+        self.sent = 0
+        self.observed = 0
+        self.superseded = 0
+        self.dropped = 0
+        self.ws_errors = 0
+
+    def before_send(self, device: str, target=None) -> float:
+        if self.pending.pop(device, None) is not None:
+            self.superseded += 1  # 도착하기 전에 같은 장치로 다음 명령이 감
+        now = time.monotonic()
+        if target is not None:
+            self.pending[device] = (target, now)
+        self.sent += 1
+        return now
+
+    def on_submit(self, agent: VirtualPi, target: float):
+        p = self.pending.get(agent.device_id)
+        if p is not None and abs(p[0] - target) < 0.5:
+            del self.pending[agent.device_id]
+            self.e2e_latency.append(time.monotonic() - p[1])
+            self.observed += 1
+
+    def expire(self, final: bool = False):
+        now = time.monotonic()
+        for device, (_, at) in list(self.pending.items()):
+            if final or now - at > self.drop_timeout:
+                del self.pending[device]
+                self.dropped += 1
+
+
+async def web_client(ws_url: str, devices, agents, log: CommandLog, interval: float, stop: asyncio.Event):
+    """장치 일부를 맡아 무작위 간격으로 명령을 보낸다 (수동 PWM 60%, 임계값 20%, 모드 20%)"""
+    async with websockets.connect(ws_url, max_size=None) as ws:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), random.expovariate(1 / interval))
+                break
+            except asyncio.TimeoutError:
+                pass
+            device = random.choice(devices)
+            kind = random.random()
+            target = None
+            if kind < 0.6:
+                # 현재 목표와 데드밴드(기본 3%) 이상 차이 나는 값이어야 서버가 Pi 로 보낸다
+                current = agents[device].target or 0
+                target = random.choice([v for v in range(20, 101, 5) if abs(v - current) >= 10])
+                cmd = {"device": device, "mode": "manual", "manual_pwm": target}
+            elif kind < 0.8:
+                cmd = {"device": device, "cpu_threshold": random.randint(40, 70),
+                       "gpu_threshold": random.randint(40, 70)}
+            else:
+                cmd = {"device": device, "mode": random.choice(["auto", "range"])}
+            t0 = log.before_send(device, target)
+            try:
+                await ws.send(json.dumps(cmd))
+                reply = json.loads(await asyncio.wait_for(ws.recv(), 5))
+            except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+                log.ws_errors += 1
+                log.pending.pop(device, None)
+                return
+            log.ack_latency.append(time.monotonic() - t0)
+            if reply.get("status") != "ok":
+                log.ws_errors += 1
+                log.pending.pop(device, None)
+
+
+# ---------- 프로세스 그룹 ----------
+def group_members():
+    """이 프로세스 그룹의 (pid, 이름, RSS MB) (시험 프로세스 자신 포함)"""
+    pgid = os.getpgid(0)
+    out = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{name}/cmdline", "rb") as f:
+                cmd = f.read().split(b"\0")
+        except OSError:
+            continue
+        fields = stat.rsplit(")", 1)[1].split()
+        if int(fields[2]) != pgid:
+            continue
+        script = next((os.path.basename(c.decode()) for c in cmd[1:] if c.endswith(b".py")), "python")
+        rss_mb = int(fields[21]) * PAGE_KB / 1024
+        out.append((int(name), script, rss_mb))
+    return out
+
+
+def stop_group(procs):
+    """남은 하위 프로세스를 모두 정리 (자신은 제외)"""
+    for p in procs:
+        if p.returncode is None:
+            p.terminate()
+    me = os.getpid()
+    for pid, _, _ in group_members():
+        if pid != me:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+
+
+def memory_slope(samples, warmup: float):
+    """(경과 초, MB) 표본에서 예열 이후 구간의 직선 기울기 (MB/h)"""
+    pts = [(t, mb) for t, mb in samples if t >= warmup]
+    if len(pts) < 3:
+        return None
+    t, mb = np.array(pts).T
+    return float(np.polyfit(t, mb, 1)[0] * 3600)
+
+
+# ---------- 실행 ----------
+async def start_server(args, config, url, tmp, log_file):
+    env = dict(os.environ, FLEET_CONFIG=config, INFLUX_URL_BASE=url, LOG_LEVEL="WARNING",
+               FAN_SNAPSHOT_PATH=os.path.join(tmp, "snap"), METRICS_PORT=str(args.port + 1))
+    if args.workers:
+        script = "shard.py"
+        env.update(SHARD_WORKERS=str(args.workers), SHARD_GATEWAY_PORT=str(args.port),
+                   SHARD_BASE_PORT=str(args.port + 100), SHARD_METRICS_BASE_PORT=str(args.port + 200))
+    else:
+        script = "process_control_command.py"
+        env["WS_PORT"] = str(args.port)
+    proc = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT, script), env=env,
+                                                stdout=log_file, stderr=log_file)
+    ws_url = f"ws://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            async with websockets.connect(ws_url):
+                return proc, ws_url
+        except OSError:
+            if proc.returncode is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"{script} 가 시작되지 않았습니다 (로그: {args.log})")
+            await asyncio.sleep(0.2)
+
+
+async def run(args, tmp, log_file):
+    db = FakeInfluxDB()
+    influx, url = db.serve()
+    log = CommandLog(args.drop_timeout)
+    devices = [f"dev{i:05d}" for i in range(args.devices)]
+
+    agents = {d: VirtualPi(d, log.on_submit) for d in devices}
+    servers, tasks = [], []
+    config = {"devices": []}
+    for d, agent in agents.items():
+        srv = await agent.serve("127.0.0.1", 0)
+        servers.append(srv)
+        tasks.append(asyncio.create_task(agent.run_writer()))
+        config["devices"].append({"id": d, "host": "127.0.0.1", "port": srv.sockets[0].getsockname()[1],
+                                  "groups": [f"rack{int(d[3:]) // 10:03d}"]})
+    config_path = os.path.join(tmp, "fleet.json")
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+    sensor_stop = threading.Event()
+    threading.Thread(target=run_sensors, args=(url, devices, sensor_stop), daemon=True).start()
+    tasks.append(asyncio.create_task(report_status(list(agents.values()), url, tmp)))
+    await asyncio.sleep(1.5)  # 첫 센서 값이 들어간 뒤 서버 시작
+
+    procs = []
+    memory = {}
+    try:
+        proc, ws_url = await start_server(args, config_path, url, tmp, log_file)
+        procs.append(proc)
+        t_start = time.monotonic()
+        say(f"[Soak] 서버 pid {proc.pid} ({'shard.py x' + str(args.workers) if args.workers else 'single'}), "
+            f"장치 {args.devices}대, 클라이언트 {args.clients}개, {args.duration:.0f}s")
+
+        stop = asyncio.Event()
+        shares = [devices[i::args.clients] for i in range(args.clients)]
+        clients = [asyncio.create_task(web_client(ws_url, s, agents, log, args.command_interval, stop))
+                   for s in shares if s]
+        next_report = args.report_interval
+        while (elapsed := time.monotonic() - t_start) < args.duration:
+            await asyncio.sleep(min(args.sample_interval, args.duration - elapsed))
+            elapsed = time.monotonic() - t_start
+            log.expire()
+            for pid, name, rss in group_members():
+                key = f"{name}[{pid}]" if pid != os.getpid() else "soak.py (Influx/Pi 대역)"
+                memory.setdefault(key, []).append((elapsed, rss))
+            if proc.returncode is not None:
+                say(f"[Soak] 서버가 종료되었습니다 (code {proc.returncode})")
+                break
+            if elapsed >= next_report:
+                next_report += args.report_interval
+                say(f"[Soak] {elapsed:6.0f}s: 명령 {log.sent}, Pi 도착 {log.observed}, 유실 {log.dropped}, "
+                    f"웹소켓 오류 {log.ws_errors}, 서버 RSS "
+                    + ", ".join(f"{v[-1][1]:.1f}MB" for k, v in memory.items() if not k.startswith("soak")))
+        stop.set()
+        await asyncio.gather(*clients, return_exceptions=True)
+        await asyncio.sleep(args.drop_timeout if log.pending else 0)
+        log.expire(final=True)
+        duration = time.monotonic() - t_start
+    finally:
+        sensor_stop.set()
+        stop_group(procs)
+        # 서버가 끊은 연결을 가상 Pi 가 모두 정리한 뒤 닫는다
+        for _ in range(40):
+            if not any(a.connections for a in agents.values()):
+                break
+            await asyncio.sleep(0.05)
+        for t in tasks:
+            t.cancel()
+        for srv in servers:
+            srv.close()
+        influx.shutdown()
+
+    return summarize(args, db, log, agents, memory, duration)
+
+
+def summarize(args, db, log, agents, memory, duration):
+    ticks = {}
+    for key, arrivals in db.queries.items():
+        gaps = np.diff(arrivals[1:])  # 첫 조회(연결 수립 포함)는 제외
+        if len(gaps) == 0:
+            continue
+        # 1초 일정 대비 누적 지연: i 번째 틱이 (첫 틱 + i 초) 보다 얼마나 늦었나
+        lateness = np.asarray(arrivals[1:]) - arrivals[1] - np.arange(len(arrivals) - 1)
+        ticks[key[:40]] = dict(ticks=len(arrivals), interval_ms=percentiles(list(gaps)),
+                               jitter_ms=round(float(np.std(gaps) * 1000), 1),
+                               drift_ms=round(float(lateness[-1] * 1000), 1))
+    return {
+        "duration_s": round(duration, 1),
+        "devices": args.devices, "clients": args.clients, "workers": args.workers,
+        "ticks": ticks,
+        "commands": {"sent": log.sent, "observed_at_pi": log.observed, "superseded": log.superseded,
+                     "dropped": log.dropped, "ws_errors": log.ws_errors,
+                     "ack_latency_ms": percentiles(log.ack_latency),
+                     "pi_latency_ms": percentiles(log.e2e_latency)},
+        "pi": {"received": sum(a.received for a in agents.values()),
+               "invalid": sum(a.invalid for a in agents.values()),
+               "gpio_writes": sum(a.writes for a in agents.values())},
+        "influx": {"lines_written": db.lines_written, "write_errors": db.write_errors,
+                   "queries": sum(len(q) for q in db.queries.values())},
+        "memory": {k: {"start_mb": round(v[0][1], 1), "end_mb": round(v[-1][1], 1),
+                       "growth_mb_per_h": (None if (s := memory_slope(v, args.warmup)) is None else round(s, 2))}
+                   for k, v in memory.items()},
+    }
+
+
+def print_summary(r):
+    say(f"\n[Soak] 결과 ({r['duration_s']}s, 장치 {r['devices']}대, 클라이언트 {r['clients']}개)")
+    for key, t in r["ticks"].items():
+        iv = t["interval_ms"]
+        say(f"  틱 [{key}]: {t['ticks']}회, 간격 p50 {iv['p50']} / p99 {iv['p99']} / 최대 {iv['max']} ms, "
+            f"지터(표준편차) {t['jitter_ms']} ms, 1초 일정 대비 누적 지연 {t['drift_ms']} ms")
+    c = r["commands"]
+    say(f"  명령: 보냄 {c['sent']}, Pi 도착 {c['observed_at_pi']}, 덮어씀 {c['superseded']}, "
+        f"유실 {c['dropped']}, 웹소켓 오류 {c['ws_errors']}")
+    for name, key in (("웹소켓 응답", "ack_latency_ms"), ("Pi 도착", "pi_latency_ms")):
+        p = c[key]
+        say(f"  {name} 지연: p50 {p['p50']} / p95 {p['p95']} / p99 {p['p99']} / 최대 {p['max']} ms")
+    say(f"  Pi: 명령 수신 {r['pi']['received']}, 잘못된 명령 {r['pi']['invalid']}, GPIO 쓰기 {r['pi']['gpio_writes']}")
+    say(f"  InfluxDB 대역: 쓰기 {r['influx']['lines_written']}줄 (오류 {r['influx']['write_errors']}), "
+        f"조회 {r['influx']['queries']}회")
+    for name, m in r["memory"].items():
+        growth = "-" if m["growth_mb_per_h"] is None else f"{m['growth_mb_per_h']:+.2f} MB/h"
+        say(f"  메모리 {name}: {m['start_mb']} -> {m['end_mb']} MB ({growth})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="전체 시스템 부하/장시간 시험")
+    ap.add_argument("--devices", type=int, default=50, help="가상 Pi(장치) 수")
+    ap.add_argument("--clients", type=int, default=4, help="웹소켓 클라이언트 수")
+    ap.add_argument("--duration", type=float, default=300, help="시험 시간(초)")
+    ap.add_argument("--workers", type=int, default=0, help="0 이면 단일 서버, K 면 shard.py 워커 K 개")
+    ap.add_argument("--command-interval", type=float, default=2.0, help="클라이언트별 평균 명령 간격(초)")
+    ap.add_argument("--drop-timeout", type=float, default=5.0, help="이 시간 안에 Pi 에 도착하지 않으면 유실")
+    ap.add_argument("--sample-interval", type=float, default=5.0, help="메모리 표본 간격(초)")
+    ap.add_argument("--report-interval", type=float, default=60.0, help="진행 상황 출력 간격(초)")
+    ap.add_argument("--warmup", type=float, default=30.0, help="메모리 증가율 계산에서 뺄 처음 구간(초)")
+    ap.add_argument("--port", type=int, default=18765, help="서버(또는 게이트웨이) 웹소켓 포트")
+    ap.add_argument("--log", help="서버/가상 Pi 출력 파일 (기본: 임시 디렉터리)")
+    ap.add_argument("--json", help="결과를 JSON 으로 저장할 경로")
+    args = ap.parse_args()
+
+    # 이 시험의 프로세스 그룹을 따로 만든다 (정리할 때 그룹 안의 프로세스만 종료)
+    if os.getpgid(0) != os.getpid():
+        os.setpgid(0, 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        args.log = args.log or os.path.join(tmp, "soak.log")
+        with open(args.log, "w") as log_file, contextlib.redirect_stdout(log_file):
+            result = asyncio.run(run(args, tmp, log_file))
+        print_summary(result)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import gzip
+import tempfile
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Pi 보고 스풀(pi.py InfluxReporter) 검증. InfluxDB 는 이 프로세스 안의 대역 (켜고 끌 수 있음).
+#   python TEST/spool_test.py
+# 1) DB 가 죽어 있으면 버퍼를 스풀에 보관, 재시도 때마다 스풀 첫 묶음만 읽음 (5 MB 스풀에서 메모리 최대치 확인)
+# 2) 재전송 도중 실패하면 보낸 앞부분만 빼고 스풀에 남김 (유실/중복 없음, 순서 유지)
+# 3) DB 가 복구되면 스풀 -> 버퍼 순서로 모두 전송
+# 4) 스풀이 SPOOL_MAX_BYTES 를 넘으면 오래된 줄부터 버림 (파일을 통째로 읽지 않음)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["PI_SIMULATION"] = "1"
+import pi
+
+pi.print = lambda *a, **k: None
+
+
+class FakeInflux(BaseHTTPRequestHandler):
+    """accept 번 요청까지만 204 로 받고 그 뒤로는 503 (accept=None 이면 항상 받음)"""
+    protocol_version = "HTTP/1.1"
+    lines = []
+    requests = 0
+    accept = None
+
+    def do_POST(self):
+        body = gzip.decompress(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        cls = type(self)
+        cls.requests += 1
+        ok = cls.accept is None or cls.accept > 0
+        if ok:
+            if cls.accept is not None:
+                cls.accept -= 1
+            cls.lines.extend(body.decode().splitlines())
+        self.send_response(204 if ok else 503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def point(i):
+    return f"fan_status,device=pi pwm_duty_cycle={i % 100} {1_700_000_000_000 + i}"
+
+
+def reset(accept):
+    FakeInflux.lines, FakeInflux.requests, FakeInflux.accept = [], 0, accept
+
+
+def spooled(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def main():
+    influx = ThreadingHTTPServer(("127.0.0.1", 0), FakeInflux)
+    influx.daemon_threads = True
+    threading.Thread(target=influx.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{influx.server_address[1]}/api/v2/write?org=o&bucket=b&precision=ms"
+    pi.BACKFILL_CHUNK = 500
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "spool")
+        rep = pi.InfluxReporter(url=url, spool_path=path, max_points=1)
+
+        # 1) DB 다운: 큰 스풀이 있어도 재시도마다 첫 묶음 하나만 읽고 보냄
+        expected = [point(i) for i in range(80_000)]
+        rep._spool(expected)
+        size = os.path.getsize(path)
+        reset(accept=0)
+        rep.add(point(80_000))
+        expected.append(point(80_000))
+        tracemalloc.start()
+        assert not rep.flush()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert FakeInflux.requests == 1 and spooled(path) == expected
+        assert peak < size / 4, (peak, size)
+
+        # 2) 재전송 중 실패: 3 묶음 보낸 뒤 다운 -> 나머지만 스풀에
+        reset(accept=3)
+        assert not rep.flush()
+        assert FakeInflux.lines == expected[:1500] and spooled(path) == expected[1500:]
+
+        # 3) 복구: 스풀 -> 버퍼 순서로 모두
+        rep.add(point(90_000))
+        reset(accept=None)
+        assert rep.flush() and not os.path.exists(path)
+        assert FakeInflux.lines == expected[1500:] + [point(90_000)]
+
+        # 4) 용량 한도: 앞쪽 1/4 (바이트) 삭제, 줄 단위로 자르고 메모리는 파일 크기와 무관
+        lines = [point(i) for i in range(80_000)]
+        rep._spool(lines)
+        pi.SPOOL_MAX_BYTES = os.path.getsize(path) - 1
+        tracemalloc.start()
+        rep._spool([point(80_000)])
+        trim_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        left = spooled(path)
+        assert left == lines[len(lines) - len(left) + 1:] + [point(80_000)]
+        assert 0.7 < len(left) / len(lines) < 0.8 and trim_peak < size / 20, (len(left), trim_peak)
+        rep.close()
+    influx.shutdown()
+    print(f"[통과] DB 다운: 스풀 {size / 1e6:.1f} MB 재시도에 요청 1개, 메모리 최대 {peak / 1e6:.2f} MB / "
+          f"중간 실패 시 남은 줄만 보관 / 복구 후 순서대로 전송 / 용량 초과 시 오래된 줄 삭제 "
+          f"({len(left)}줄 남음, 메모리 최대 {trim_peak / 1e6:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
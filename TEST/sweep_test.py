@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import tempfile
+
+import numpy as np
+
+# sweep.py 검증: 묶음(batch) 평가 지표 == 후보별 스칼라 재생(replay.summarize) 결과,
+# 결과 JSON 을 서버 설정(load_controller_config)으로 읽을 수 있는지
+#   python TEST/sweep_test.py
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+import sweep
+from FANCONTROLL_PY import FanController, load_controller_config
+from replay import replay, write_pwm_trace
+from replay_test import synthetic_trace
+
+def main():
+    trace = synthetic_trace(3 * 3600, seed=1)
+    configs = [{"mode": "auto"},
+               {"mode": "auto", "min_duty": 20, "slew_per_sec": 5, "temp_scale": 55.0, "pwm_gain": 90.0},
+               {"mode": "range", "cpu_thresh": 45, "t_on": 35.0, "t_off": 30.0, "pwm_base": 20.0}]
+    sweep._traces, sweep._limit = [trace], 60.0
+    got = sweep.evaluate(configs)
+
+    for c, m in zip(configs, got):
+        res = replay(trace, limit=60.0, **c)
+        s = res.summary
+        hours = s["duration_sec"] / 3600
+        assert abs(m["mean_duty"] - s["mean_duty"]) < 1e-9, (m, s)
+        assert abs(m["changes_per_hour"] - s["pwm_changes"] / hours) < 1e-9
+        gaps = np.diff(trace.ts)
+        dt = np.append(gaps, np.median(gaps))
+        excess = np.maximum(0.0, np.maximum(trace.cpu, trace.gpu) - 60.0)
+        deficit = float((excess * (1 - res.pwm / 100.0) * dt).sum() / dt.sum())
+        assert abs(m["heat_deficit"] - deficit) < 1e-9
+    print(f"[통과] 후보 {len(configs)}개: 묶음 평가 지표 == 스칼라 재생 결과")
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "trace.csv")
+        write_pwm_trace(path, trace, np.zeros(len(trace), dtype=np.int64))
+        out = os.path.join(d, "best.json")
+        sweep.main([path, "--grid", "min_duty=20,40", "slew_per_sec=5,25", "--workers", "2",
+                    "--top", "3", "--out", out])
+        with open(out) as f:
+            best = json.load(f)
+        ctl = FanController(**load_controller_config(out))
+        assert ctl == FanController(**best["controller"])
+        assert best["cost"] <= best["baseline_cost"]
+    print(f"[통과] 결과 JSON -> FanController({ctl.min_duty=}, {ctl.slew_per_sec=})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+# 열 모델(thermal_model.py)과 FanController predict 모드 검증. 온도는 계수를 아는 1차 설비로 만든 1Hz 기록.
+#   python TEST/thermal_model_test.py
+# 1) lstsq 한 번으로 설비 계수를 되찾음, 샘플별 누적(잊지 않음)이 같은 해, 설비가 바뀌면(팬 열화) 누적 모델이 따라감
+# 2) auto 공식만으로 돈 기록(PWM 이 온도에 비례)은 조건수 검사에서 거절 -> predict 모드는 auto 공식과 같은 출력
+# 3) model_result 가 켜지는 틱에 온도가 오르기 전 PWM 을 올림, DeviceHistory 로 처음 쓸 때 학습
+# 4) 오프라인 평가: 기록된 PWM 을 넣으면 기록 온도 재현, predict 가 현재 공식보다 최고 온도가 낮음, CSV/CLI 경로
+# 5) 구조가 다른 설비(칩 + 방열판 2차, 팬 효과 u^0.6): evaluate 의 예상과 그 설비에서 실제로 predict 를 돌린 결과 비교
+#    (모두 합성 데이터. 실제 장치 기록으로는 아직 평가하지 않았다)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import thermal_model
+from FANCONTROLL_PY import FanController
+from history import DeviceHistory
+from replay import Trace, write_pwm_trace, load_trace
+from thermal_model import ThermalModel, evaluate
+
+TRUE = np.array([0.25, -1 / 120, -25 / 120, 0.25])  # 주변 30°C, 시정수 120s, 팬 최대 -25°C, 부하 +30°C
+T0 = 1_700_000_000.0
+
+
+def load_pattern(n, rng):
+    """60~600초 부하 구간이 2~15분 간격으로 켜지는 model_result"""
+    load = np.zeros(n, dtype=np.int64)
+    k = 300
+    while k < n:
+        d = int(rng.integers(60, 600))
+        load[k:k + d] = 1
+        k += d + int(rng.integers(120, 900))
+    return load
+
+
+def plant_trace(n, seed=0, theta=TRUE, ctl=None):
+    """ctl(기본 auto 공식)로 제어한 설비의 1Hz 기록 (측정 잡음 0.05°C, 공정 잡음 0.02°C/s)"""
+    rng = np.random.default_rng(seed)
+    ctl = ctl or FanController()
+    ts = T0 + np.arange(n, dtype=np.float64)
+    load = load_pattern(n, rng)
+    temp, pwm = np.empty(n), np.empty(n)
+    t = 35.0
+    for i in range(n):
+        temp[i] = t + rng.normal(0, 0.05)
+        pwm[i] = ctl.step(temp[i], temp[i], int(load[i]), int(ts[i] * 1000))
+        t += theta[0] + theta[1] * t + theta[2] * pwm[i] / 100 + theta[3] * load[i] + rng.normal(0, 0.02)
+    return Trace(ts, temp, temp, load, pwm)
+
+
+def two_mass_trace(n, seed=0, ctl=None, switch=None):
+    """
+    1차 모델과 구조가 다른 설비: 칩(측정 온도)과 방열판 두 질량, 팬 냉각은 PWM^0.6 에 비례.
+    switch=(k, ctl2) 이면 k 번째 샘플부터 ctl2 로 바꾼다 (잡음/부하는 seed 가 같으면 동일).
+    """
+    rng = np.random.default_rng(seed)
+    ctl = ctl or FanController()
+    ts = T0 + np.arange(n, dtype=np.float64)
+    load = load_pattern(n, rng)
+    temp, pwm = np.empty(n), np.empty(n)
+    die, sink = 35.0, 34.0
+    for i in range(n):
+        if switch is not None and i == switch[0]:
+            ctl2 = switch[1]
+            ctl2.last_pwm, ctl2.last_ts_ms = ctl.last_pwm, ctl.last_ts_ms
+            ctl = ctl2
+        temp[i] = die + rng.normal(0, 0.05)
+        pwm[i] = u = ctl.step(temp[i], temp[i], int(load[i]), int(ts[i] * 1000))
+        die, sink = (die + (sink - die) / 15 + 0.5 * load[i] + 0.1 + rng.normal(0, 0.02),
+                     sink + (die - sink) / 40 - (sink - 30) * (1 / 300 + (u / 100) ** 0.6 / 40))
+    return Trace(ts, temp, temp, load, pwm)
+
+
+def check_fit():
+    tr = plant_trace(7200)
+    m = ThermalModel()
+    t0 = time.perf_counter()
+    assert m.fit(tr.ts, tr.cpu, tr.pwm, tr.model)
+    fit_ms = (time.perf_counter() - t0) * 1000
+    d = m.describe()
+    assert abs(d["time_constant_sec"] - 120) < 12 and abs(d["fan_full_cooling_c"] - 25) < 2.5
+    assert abs(d["load_heating_c"] - 30) < 3, d
+
+    # 샘플별 누적 (forget=1) == 한 번에 푼 해
+    inc = ThermalModel(forget=1.0, refit_every=1)
+    for i in range(len(tr)):
+        inc.observe(tr.cpu[i], tr.pwm[i - 1] if i else 0, tr.model[i], int(tr.ts[i] * 1000))
+    online = ThermalModel()  # 기본 설정 (PREDICT_REFIT_EVERY 샘플마다 풀이) 의 샘플당 비용
+    t0 = time.perf_counter()
+    for i in range(len(tr)):
+        online.observe(tr.cpu[i], tr.pwm[i - 1] if i else 0, tr.model[i], int(tr.ts[i] * 1000))
+    per_sample_us = (time.perf_counter() - t0) / len(tr) * 1e6
+    assert np.allclose(inc.xtx, m.xtx) and np.allclose(inc.theta, m.theta, rtol=1e-6), (inc.theta, m.theta)
+
+    # 팬이 절반만 식히게 되면(열화) 잊는 누적 모델이 새 계수로 옮겨감
+    worn = TRUE * np.array([1, 1, 0.5, 1])
+    later = plant_trace(3600, seed=1, theta=worn)
+    track = ThermalModel(forget=0.99)
+    track.fit(tr.ts, tr.cpu, tr.pwm, tr.model)
+    for i in range(len(later)):
+        track.observe(later.cpu[i], later.pwm[i - 1] if i else 0, later.model[i], int(later.ts[i] * 1000))
+    cooling = track.describe()["fan_full_cooling_c"]
+    assert abs(cooling - 12.5) < 2.5, cooling
+    print(f"[통과] 7200 샘플 lstsq {fit_ms:.1f} ms: 시정수 {d['time_constant_sec']:.0f}s, 팬 {d['fan_full_cooling_c']:.1f}°C, "
+          f"부하 {d['load_heating_c']:.1f}°C / 샘플 누적 {per_sample_us:.1f} µs 로 같은 해 / 팬 열화 추적 25 -> {cooling:.1f}°C")
+
+
+def check_collinear_fallback():
+    # 부하 없이 auto 공식만: PWM 이 온도의 일차식이라 θ1, θ2 를 가를 수 없음
+    rng = np.random.default_rng(3)
+    temp = 45 + np.cumsum(rng.normal(0, 0.2, 3000))
+    pwm = 30 + 88 * temp / 60
+    ts = T0 + np.arange(len(temp), dtype=np.float64)
+    m = ThermalModel()
+    assert not m.fit(ts, temp, pwm, np.zeros(len(temp))) and not m.ready
+    assert m.condition() > thermal_model.PREDICT_MAX_COND
+    auto, pred = FanController(), FanController(mode="predict", predictor=m)
+    out_a = [auto.step(t, t, 0, int(s * 1000)) for s, t in zip(ts[:300], temp[:300])]
+    out_p = [pred.step(t, t, 0, int(s * 1000)) for s, t in zip(ts[:300], temp[:300])]
+    # predict 는 게이트가 없지만 이 구간은 항상 t_on 위이므로 auto 와 같아야 한다
+    assert out_a == out_p
+    print(f"[통과] PWM 이 온도에 비례하기만 한 기록: 조건수 {m.condition():.0e} 로 거절, predict 는 auto 공식 출력")
+
+
+def check_feed_forward():
+    tr = plant_trace(7200)
+    hist = DeviceHistory(size=3600)
+    for i in range(len(tr)):
+        hist.push(tr.ts[i], tr.cpu[i], tr.gpu[i], tr.model[i])
+        hist.record_pwm(int(tr.pwm[i]))
+    ctl = FanController(mode="predict", predict_setpoint=38, predict_horizon=30, predictor=ThermalModel(hist))
+    now = int(tr.ts[-1] * 1000) + 1000
+    idle = [ctl.step(36.0, 36.0, 0, now + i * 1000) for i in range(30)]
+    assert ctl.predictor.ready and ctl.predictor.samples >= 3000
+    assert idle[-1] == ctl.min_duty  # 모델은 끄라고 하지만 36°C 는 t_on 위이므로 min_duty 유지
+    first = ctl.step(36.0, 36.0, 1, now + 30_000)  # 같은 온도, 부하만 켜짐
+    auto = FanController()
+    before = auto._target_by_formula(36.0, 36.0, 0)
+    after = auto._target_by_formula(36.0, 36.0, 1)
+    assert ctl.last_target >= idle[-1] + 15 and first > idle[-1], (idle[-1], ctl.last_target, first)
+    print(f"[통과] 부하 시작 틱 (온도 36°C 그대로): predict 목표 {idle[-1]} -> {ctl.last_target}% "
+          f"(auto 공식은 {before} -> {after}%), 이력 {len(hist)}행으로 첫 사용 때 학습")
+
+
+def check_safety():
+    # 모델이 틀려서(팬이 실제보다 훨씬 잘 식힌다고 믿음) 낮은 PWM 을 내도: 게이트 온도에서는 min_duty 이상,
+    # predict_max_temp 이상이면 100%
+    wrong = ThermalModel()
+    wrong.theta = TRUE * np.array([1, 1, 20, 1])
+    ctl = FanController(mode="predict", predict_setpoint=60, predictor=wrong, slew_per_sec=1000)
+    now = int(T0 * 1000)
+    assert wrong.target(50.0, 0, 0, now, 60, 30) < 0
+    assert ctl.step(50.0, 50.0, 0, now) == ctl.min_duty
+    assert ctl.step(ctl.predict_max_temp, 40.0, 0, now + 1000) == 100
+    assert ctl.step(15.0, 15.0, 0, now + 2000) == 0  # t_off 아래에서 모델이 끄라고 하면 끔
+    for bad in (0, -5, float("nan")):
+        try:
+            FanController(predict_horizon=bad)
+            raise AssertionError(f"predict_horizon={bad} 허용")
+        except ValueError:
+            pass
+    print(f"[통과] 틀린 모델: 50°C 에서 min_duty {ctl.min_duty}%, {ctl.predict_max_temp:g}°C 이상 100%, "
+          f"t_off 아래에서만 정지 / predict_horizon <= 0 거절")
+
+
+def check_offline():
+    tr = plant_trace(14400, seed=5)
+    r = evaluate(tr, {}, setpoint=45, horizon=30)
+    assert r["replay_error_c"] < 1e-6, r["replay_error_c"]
+    f, p = r["formula"], r["predict"]
+    assert p["max_temp"] < f["max_temp"] - 3 and p["max_temp"] < 47, (f["max_temp"], p["max_temp"])
+    # 같은 트레이스의 CSV 두 형식: pwm 열이 있으면 사용, 없으면 기록 당시 설정으로 재생 -> 같은 결과
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "trace.csv")
+        write_pwm_trace(path, tr, tr.pwm.astype(np.int64))
+        loaded = load_trace(path)
+        assert loaded.pwm is not None and np.array_equal(loaded.pwm, tr.pwm)
+        loaded.pwm = None
+        again = evaluate(loaded, {}, setpoint=45, horizon=30)
+        assert again["predict"]["max_temp"] == p["max_temp"]
+        thermal_model.print = lambda *a, **k: None
+        thermal_model.main([path, "--setpoint", "45", "--train", "0.4"])
+    print(f"[통과] 오프라인 평가 (설비도 1차라 자기 일치 검사, 뒤 7200s): 최고 온도 {f['max_temp']:.1f} -> {p['max_temp']:.1f}°C, "
+          f"duty 적분 {f['duty_integral_sec']:.0f} -> {p['duty_integral_sec']:.0f}s, "
+          f"팬 전력(duty³) {f['power_integral_sec']:.0f} -> {p['power_integral_sec']:.0f}s")
+
+
+def check_mismatch():
+    n = 14400
+    tr = two_mass_trace(n, seed=3)
+    r = evaluate(tr, {}, setpoint=45, horizon=30)
+    p = r["predict"]
+    # 같은 잡음/부하로, 뒷부분을 실제로 predict(앞부분으로 학습한 모델)로 돌린 결과
+    model = ThermalModel()
+    model.fit(tr.ts[:n // 2], tr.cpu[:n // 2], tr.pwm[:n // 2], tr.model[:n // 2])
+    true = two_mass_trace(n, seed=3, switch=(n // 2, FanController(mode="predict", predict_setpoint=45,
+                                                                   predictor=model)))
+    held = slice(n // 2, None)
+    true_max, true_duty = float(true.cpu[held].max()), float(true.pwm[held].sum() / 100)
+    assert abs(p["max_temp"] - true_max) < 1.0, (p["max_temp"], true_max)
+    assert abs(p["duty_integral_sec"] - true_duty) < 0.05 * true_duty, (p["duty_integral_sec"], true_duty)
+    assert true_max < r["formula"]["max_temp"] - 3
+    print(f"[통과] 구조가 다른 설비 (1차 모델 시정수 {r['model']['time_constant_sec']:.0f}s 로 근사): evaluate 예상 "
+          f"최고 {p['max_temp']:.1f}°C/duty {p['duty_integral_sec']:.0f}s, 실제 {true_max:.1f}°C/{true_duty:.0f}s "
+          f"(현재 공식 {r['formula']['max_temp']:.1f}°C/{r['formula']['duty_integral_sec']:.0f}s)")
+
+
+def main():
+    check_fit()
+    check_collinear_fallback()
+    check_feed_forward()
+    check_safety()
+    check_offline()
+    check_mismatch()
+
+
+if __name__ == "__main__":
+    main()
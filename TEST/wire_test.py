@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import asyncio
+
+# 이진 제어 프로토콜(wire.py) 검증: 프레임 왕복, 협상/JSON 대체, 연결 하나로 여러 팬, ACK 왕복 시간
+#   python TEST/wire_test.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ["PI_SIMULATION"] = "1"
+import wire
+import pi
+import FANCONTROLL_PY as fc
+from FANCONTROLL_PY import PiLink
+
+pi.print = fc.print = lambda *a, **k: None
+
+def check_codec():
+    b = wire.pack_setpoint(3, 0x1_0000_0005, 55.555, 12.5, ts_ms=1_760_000_000_000)
+    assert len(b) == wire.FRAME_SIZE == 20
+    f = wire.unpack(b)
+    assert (f.kind, f.fan, f.seq, f.target, f.ramp, f.ts_ms) == (wire.SETPOINT, 3, 5, 5556, 1250, 1_760_000_000_000)
+    assert f.target_pct == 55.56 and f.ramp_pct == 12.5
+    assert wire.unpack(wire.pack_setpoint(0, 1, 150, None)).target_pct == 100  # 범위 밖은 잘라냄
+    assert wire.unpack(wire.pack_setpoint(0, 1, 40)).ramp_pct is None         # ramp 0 = 즉시
+
+    stream = b"".join(wire.pack_setpoint(i % 4, i, i % 101) for i in range(10))
+    frames, rest = wire.split(stream[:-7])
+    assert len(frames) == 9 and rest == stream[9 * 20:-7]
+    frames2, rest2 = wire.split(rest + stream[-7:])
+    assert [f.seq for f in frames + frames2] == list(range(10)) and rest2 == b""
+
+    assert wire.parse_hello(wire.hello()) == [1, 2] and wire.parse_hello(b'{"pwm": 3}') is None
+    assert wire.choose([1, 2]) == 2 and wire.choose([1, 2], (1,)) == 1 and wire.choose([7]) == 0
+    assert wire.parse_hello_reply(wire.hello_reply(1)) == 1 and wire.parse_hello_reply(b"junk") == 0
+    print("[통과] 프레임 20바이트 인코딩/디코딩, 잘린 수신 버퍼 이어 붙이기, 협상 메시지")
+
+async def wait_for(cond, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if cond():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("시간 초과")
+
+async def check_binary_multi_fan():
+    writes = {0: [], 1: []}
+    agent = pi.FanAgent(write=writes[0].append, write_interval=0.005)
+    agent.channels[1] = pi.FanAgent(write=writes[1].append, write_interval=0.005, fan=1)
+    tasks = [asyncio.create_task(ch.run_writer()) for ch in agent.channels.values()]
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    link = PiLink("127.0.0.1", server.sockets[0].getsockname()[1])
+
+    assert await link.send_setpoint(40, 0.0, fan=0)
+    assert link.wire == 1
+    assert await link.send(70, fan=1)
+    assert await link.send_setpoint(10, 5.0, fan=7)  # Pi 에 없는 팬 -> NACK
+    await wait_for(lambda: link.acked == 3 and writes[1])
+    assert agent.connections == 1
+    assert writes[0][-1] == 400 and writes[1][-1] == 700, writes
+    assert link.nacked == 1 and agent.invalid == 1
+    assert len(link.rtts) == 3 and not link._inflight
+    print(f"[통과] 연결 하나로 팬 2개 제어 (fan0=400, fan1=700/1000), 없는 팬은 NACK, "
+          f"ACK 왕복 {max(link.rtts) * 1000:.2f} ms 이하, 프레임 {link.bytes_sent // link.frames_sent}바이트")
+
+    await link.close()
+    server.close()
+    for t in tasks:
+        t.cancel()
+
+async def check_legacy_fallback():
+    """예전 Pi 에이전트: 줄마다 JSON 을 읽기만 하고 답하지 않는다"""
+    lines = []
+
+    async def legacy(reader, writer):
+        while line := await reader.readline():
+            lines.append(line)
+        writer.close()
+
+    server = await asyncio.start_server(legacy, "127.0.0.1", 0)
+    link = PiLink("127.0.0.1", server.sockets[0].getsockname()[1])
+    assert await link.send(55)
+    assert link.wire == 0 and link.legacy
+    assert await link.send_setpoint(60, 10.0, pwm=57)  # 예전 에이전트는 {"pwm"} 만 읽는다
+    assert not await link.send(30, fan=1)  # JSON 으로는 팬 0 만
+    await wait_for(lambda: len(lines) == 3)
+    msgs = [json.loads(l) for l in lines]
+    assert msgs[0]["hello"] == "fanwire"
+    assert msgs[1]["pwm"] == 55 and msgs[2]["pwm"] == 57 and "target" not in msgs[2]
+    # 재연결도 협상 없이 JSON
+    link._drop()
+    assert await link.send(45)
+    await wait_for(lambda: len(lines) == 4)
+    assert json.loads(lines[3])["pwm"] == 45 and link.reconnects == 1
+    print("[통과] 답하지 않는 예전 에이전트 -> 새 연결에서 JSON {\"pwm\"} 명령으로 대체, 재연결도 JSON")
+
+    json_link = PiLink("127.0.0.1", server.sockets[0].getsockname()[1], protocol="json")
+    assert await json_link.send(20) and json_link.wire == 0
+    await wait_for(lambda: len(lines) == 5)
+    assert json.loads(lines[4])["pwm"] == 20
+    print("[통과] PI_WIRE=json 이면 협상 없이 JSON")
+    await link.close()
+    await json_link.close()
+    server.close()
+
+async def check_slow_hello():
+    """새 에이전트의 hello 답이 PI_WIRE_TIMEOUT 보다 늦으면: 에이전트는 이진으로 바뀌었으므로 그 연결은 버리고 JSON 으로 새로"""
+    writes = []
+    agent = pi.FanAgent(write=writes.append, write_interval=0.005)
+    task = asyncio.create_task(agent.run_writer())
+    first = []
+
+    async def slow(reader, writer):
+        if not first:
+            first.append(1)
+            await asyncio.sleep(fc.PI_WIRE_TIMEOUT * 2)
+        await agent.handle_client(reader, writer)
+        first.append(2)
+
+    server = await asyncio.start_server(slow, "127.0.0.1", 0)
+    link = PiLink("127.0.0.1", server.sockets[0].getsockname()[1])
+    assert await link.send(35)
+    assert link.legacy and link.wire == 0
+    await wait_for(lambda: writes and writes[-1] == 350)
+    assert await link.send_setpoint(50, 10.0, pwm=41)
+    await wait_for(lambda: writes[-1] == 410)
+    await wait_for(lambda: first.count(2) == 1)  # 늦게 답한 첫 연결도 잘못된 프레임 없이 끝남
+    assert agent.invalid == 0 and agent.ramp is None
+    print("[통과] hello 답이 늦은 에이전트 -> 새 연결에서 JSON, 이진으로 바뀐 연결에는 보내지 않음")
+    await link.close()
+    server.close()
+    task.cancel()
+
+async def check_fleet_links():
+    """Fleet: 같은 host:port 라도 fan 이 겹치는 장치는 연결(과 fan 별 중복 억제)을 따로 쓴다"""
+    import fleet
+    fleet.print = lambda *a, **k: None
+    agent = pi.FanAgent(write=lambda level: None, write_interval=0.005)
+    agent.channels[1] = pi.FanAgent(write=lambda level: None, write_interval=0.005, fan=1)
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    f = fleet.Fleet()
+    a, b = f.add("a", "127.0.0.1", port), f.add("b", "127.0.0.1", port)
+    c = f.add("c", "127.0.0.1", port, fan=1)
+    assert a.link is not b.link and c.link is a.link and len(f.links[("127.0.0.1", port)]) == 2
+    # 두 장치가 같은 값을 보내도 각자 전송 (한 연결이었다면 b 의 값이 a 의 중복으로 생략됨)
+    assert await f.send_all({"a": 40, "b": 40, "c": 70}) == 0
+    assert a.link.frames_sent == 2 and b.link.frames_sent == 1
+    f.remove("a")
+    assert c.link.connected and len(f.links[("127.0.0.1", port)]) == 2
+    f.remove("c")
+    assert not c.link.connected and len(f.links[("127.0.0.1", port)]) == 1
+    f.remove("b")
+    server.close()
+    print("[통과] Fleet: 같은 host:port 에서 fan 이 겹치면 연결을 나누고, 다르면 공유 (마지막 사용자가 빠질 때 닫음)")
+
+async def check_new_agent_json():
+    """새 에이전트에 예전 서버(협상 없음)가 붙어도 JSON 명령이 그대로 동작"""
+    writes = []
+    agent = pi.FanAgent(write=writes.append, write_interval=0.005)
+    task = asyncio.create_task(agent.run_writer())
+    server = await asyncio.start_server(agent.handle_client, "127.0.0.1", 0)
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+    writer.write(b'{"pwm": 33, "seq": 1}\n')
+    await writer.drain()
+    await wait_for(lambda: writes and writes[-1] == 330)
+    print("[통과] 새 에이전트가 기존 JSON 명령도 처리")
+    writer.close()
+    await wait_for(lambda: agent.connections == 0)
+    server.close()
+    task.cancel()
+
+async def main():
+    check_codec()
+    await check_binary_multi_fan()
+    await check_legacy_fallback()
+    fc.PI_WIRE_TIMEOUT = 0.1
+    await check_slow_hello()
+    await check_fleet_links()
+    await check_new_agent_json()
+
+if __name__ == "__main__":
+    asyncio.run(main())
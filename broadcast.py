@@ -0,0 +1,147 @@
+import os
+import json
+import asyncio
+from collections import deque
+from typing import Dict, Optional
+
+# =========================
+# 웹소켓 구독자에게 제어 상태 방송 (push)
+# =========================
+# 클라이언트가 {"subscribe": true} 를 보내면 처음에 전체 상태를, 이후에는 바뀐 필드만 보낸다.
+#   {"type": "state", "full": true, "data": {"mode": "auto", "pwm": 40, "cpu": 52.1, ...}}
+#   {"type": "state", "data": {"pwm": 45}}
+# 플릿 모드에서는 data 가 {"devices": {"<id>": {...}}} 형태이며, 역시 바뀐 장치/필드만 포함된다.
+BROADCAST_MAX_RATE = float(os.getenv("BROADCAST_MAX_RATE", "5"))  # 초당 최대 방송 횟수 (그 사이 변경은 합침)
+SUBSCRIBER_QUEUE = int(os.getenv("SUBSCRIBER_QUEUE", "4"))       # 클라이언트별 대기 프레임 수 상한
+
+
+def diff_state(old: dict, new: dict) -> dict:
+    """new 중 old 와 다른 필드만 (중첩 dict 는 재귀적으로 비교)"""
+    out = {}
+    for k, v in new.items():
+        prev = old.get(k)
+        if isinstance(v, dict) and isinstance(prev, dict):
+            sub = diff_state(prev, v)
+            if sub:
+                out[k] = sub
+        elif k not in old or prev != v:
+            out[k] = v
+    return out
+
+
+def merge_state(base: dict, diff: dict) -> dict:
+    """diff 를 base 에 덮어쓴다 (중첩 dict 는 재귀적으로). base 를 바꾸고 돌려준다."""
+    for k, v in diff.items():
+        prev = base.get(k)
+        if isinstance(v, dict) and isinstance(prev, dict):
+            merge_state(prev, v)
+        else:
+            base[k] = _copy(v)
+    return base
+
+
+def _copy(v):
+    return {k: _copy(x) for k, x in v.items()} if isinstance(v, dict) else v
+
+
+def _frame(data: dict, full: bool = False) -> str:
+    msg = {"type": "state", "full": True, "data": data} if full else {"type": "state", "data": data}
+    return json.dumps(msg)
+
+
+class Subscriber:
+    """
+    클라이언트 하나의 송신 대기열.
+    느린 클라이언트의 대기열이 가득 차면, 밀린 프레임을 모두 하나로 합쳐 최신 상태만 남긴다
+    (diff 를 합친 결과는 마지막으로 받은 상태 -> 현재 상태의 diff 와 같으므로 빠지는 필드가 없다).
+    """
+
+    def __init__(self, websocket, maxsize: int = SUBSCRIBER_QUEUE):
+        self.websocket = websocket
+        self.maxsize = max(1, maxsize)
+        self.queue = deque()  # (diff, 인코딩된 문자열 또는 None, full)
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0  # 합쳐지면서 따로 보내지지 않은 프레임 수
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, diff: dict, text: Optional[str] = None, full: bool = False):
+        if len(self.queue) >= self.maxsize:
+            merged, full_any = {}, full
+            for d, _, f in self.queue:
+                merge_state(merged, d)
+                full_any = full_any or f
+            merge_state(merged, diff)
+            self.dropped += len(self.queue)
+            self.queue.clear()
+            diff, text, full = merged, None, full_any
+        self.queue.append((diff, text, full))
+        self.ready.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.queue:
+                    diff, text, full = self.queue.popleft()
+                    await self.websocket.send(text if text is not None else _frame(diff, full))
+                    self.sent += 1
+        except Exception:
+            pass  # 연결 종료 등: 구독 해제는 handle_connection 쪽에서 처리
+
+
+class StateBroadcaster:
+    """
+    update() 로 들어온 변경을 모아 두었다가 max_rate 이하로 모든 구독자에게 diff 를 보낸다.
+    프레임 JSON 은 방송마다 한 번만 만들어 모든 구독자가 공유한다.
+    """
+
+    def __init__(self, max_rate: float = BROADCAST_MAX_RATE, queue_size: int = SUBSCRIBER_QUEUE):
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.queue_size = queue_size
+        self.state: dict = {}     # 최신 전체 상태 (새 구독자의 첫 프레임)
+        self._pending: dict = {}  # 아직 방송하지 않은 변경분
+        self._changed = asyncio.Event()
+        self.subscribers: Dict[object, Subscriber] = {}
+        self.frames = 0
+        self._dropped_gone = 0    # 구독을 끝낸 클라이언트의 합쳐진 프레임 수 (dropped() 가 줄지 않도록)
+
+    def update(self, fields: dict):
+        """제어 루프에서 호출: 바뀐 필드만 대기 변경분에 합친다 (전송은 하지 않음)"""
+        diff = diff_state(self.state, fields)
+        if diff:
+            merge_state(self.state, diff)
+            merge_state(self._pending, diff)
+            self._changed.set()
+
+    def subscribe(self, websocket) -> Subscriber:
+        sub = self.subscribers.get(websocket)
+        if sub is None:
+            sub = self.subscribers[websocket] = Subscriber(websocket, self.queue_size)
+            sub.offer(_copy(self.state), full=True)
+            sub.task = asyncio.create_task(sub.run())
+        return sub
+
+    def unsubscribe(self, websocket):
+        sub = self.subscribers.pop(websocket, None)
+        if sub is not None:
+            self._dropped_gone += sub.dropped
+            if sub.task is not None:
+                sub.task.cancel()
+
+    def dropped(self) -> int:
+        """지금까지 합쳐진 프레임 수 (끊긴 구독자 포함, 줄지 않는 카운터)"""
+        return self._dropped_gone + sum(s.dropped for s in self.subscribers.values())
+
+    async def run(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            diff, self._pending = self._pending, {}
+            if self.subscribers:
+                text = _frame(diff)
+                for sub in self.subscribers.values():
+                    sub.offer(diff, text)
+            self.frames += 1
+            await asyncio.sleep(self.interval)
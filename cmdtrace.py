@@ -0,0 +1,264 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import requests
+
+from FANCONTROLL_PY import BASE, ORG, BUCKET, TOKEN, QUERY_URL, headers as query_headers
+from flux_csv import AnnotatedCSVParser, iter_lines
+
+# =========================
+# 명령 추적: 서버 결정 -> Pi GPIO 적용 -> Pi 상태 보고
+# =========================
+# 서버가 Pi 로 보내는 명령마다 추적 키 (seq, 보낸 시각 ms) 가 붙는다 (이진 프레임의 seq/ts_ms, JSON 의 "seq"/"ts").
+#   서버  fan_command,device=<장치>,fan=<n>  seq, cmd_ms, target, ramp            (이 모듈이 일괄 기록)
+#   Pi    fan_apply,device=<Pi>,fan=<n>      seq, cmd_ms, recv_ms, applied_ms | superseded, target
+#   Pi    fan_status,device=<Pi>             pwm_duty_cycle, seq, cmd_ms, report_ms (마지막으로 적용한 명령)
+# analyze() 가 세 측정값을 (seq, cmd_ms) 로 맞춰 명령 -> 적용, 명령 -> 보고 지연과 어긋난 기록을 센다.
+# 서버와 Pi 의 시계 차이가 지연에 그대로 더해지므로 (NTP 오차 수준) 음수 지연은 따로 센다.
+TRACE_ENABLED = os.getenv("FAN_TRACE", "1") == "1"
+TRACE_BATCH_MAX_POINTS = int(os.getenv("FAN_TRACE_BATCH_MAX_POINTS", "500"))
+TRACE_FLUSH_SEC = float(os.getenv("FAN_TRACE_FLUSH_SEC", "5"))
+TRACE_BUFFER = int(os.getenv("FAN_TRACE_BUFFER", "20000"))  # 기록하지 못한 점 보관 한도 (넘치면 오래된 것부터 버림)
+WRITE_URL = f"{BASE}/api/v2/write?org={ORG}&bucket={BUCKET}&precision=ms"
+
+SETTLE_MS = 60_000  # Pi 는 점을 최대 BATCH_MAX_AGE(30s) 모았다가 보내므로, 이보다 최근 명령은 판정하지 않는다
+
+
+def _tag(value) -> str:
+    """Line Protocol 태그 값 이스케이프"""
+    return str(value).replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+class CommandTracer:
+    """
+    보낸 명령을 fan_command 점으로 모았다가 일괄 기록한다.
+    - PiLink.on_send 에 sender() 를 걸면 실제로 보낸 명령만 기록된다 (deadband 로 생략한 값은 없음)
+    - HTTP 는 워커 스레드에서, TRACE_BATCH_MAX_POINTS 개가 모이거나 TRACE_FLUSH_SEC 가 지나면 보낸다
+    - 추적은 진단용이므로 기록에 실패한 묶음은 다시 보내지 않고 dropped 로 센다
+    """
+
+    def __init__(self, url: str = WRITE_URL, max_points: int = TRACE_BATCH_MAX_POINTS,
+                 flush_sec: float = TRACE_FLUSH_SEC, buffer: int = TRACE_BUFFER):
+        self.url = url
+        self.max_points = max_points
+        self.flush_sec = flush_sec
+        self.lines = deque()
+        self.buffer = buffer
+        self.written = 0
+        self.dropped = 0
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Token {TOKEN}",
+                                     "Content-Type": "text/plain; charset=utf-8",
+                                     "Content-Encoding": "gzip"})
+        self._wake = asyncio.Event()
+
+    def record(self, device: str, fan: int, seq: int, ts_ms: int, target, ramp=None):
+        ramp_field = f",ramp={float(ramp):g}" if ramp is not None else ""
+        self.lines.append(f"fan_command,device={_tag(device)},fan={fan} seq={seq}i,cmd_ms={ts_ms}i,"
+                          f"target={float(target):g}{ramp_field} {ts_ms}")
+        if len(self.lines) > self.buffer:
+            self.lines.popleft()
+            self.dropped += 1
+        if len(self.lines) >= self.max_points:
+            self._wake.set()
+
+    def sender(self, devices: Dict[int, str]):
+        """PiLink.on_send 용 콜백 (devices: 이 연결의 fan 번호 -> 장치 ID)"""
+        def on_send(fan, seq, ts_ms, target, ramp):
+            self.record(devices.get(fan, str(fan)), fan, seq, ts_ms, target, ramp)
+        return on_send
+
+    def _post(self, lines: List[str]):
+        body = gzip.compress("\n".join(lines).encode("utf-8"))
+        r = self.session.post(self.url, data=body, timeout=3)
+        if r.status_code != 204:
+            raise requests.RequestException(f"HTTP {r.status_code}: {r.text[:200]}")
+
+    async def flush(self) -> int:
+        """모인 점을 한 번에 기록하고 보낸 점 수를 돌려준다"""
+        n = 0
+        while self.lines:
+            batch = [self.lines.popleft() for _ in range(min(len(self.lines), self.max_points))]
+            try:
+                await asyncio.to_thread(self._post, batch)
+            except requests.RequestException as e:
+                self.dropped += len(batch)
+                print(f"[Trace] fan_command {len(batch)}개 기록 실패: {e}")
+                break
+            self.written += len(batch)
+            n += len(batch)
+        return n
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_sec)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+
+def open_tracer() -> Optional[CommandTracer]:
+    return CommandTracer() if TRACE_ENABLED else None
+
+
+# ---------- 분석 ----------
+def _percentiles(values) -> dict:
+    if not values:
+        return {"count": 0}
+    a = np.asarray(values, dtype=float)
+    p50, p95, p99 = np.percentile(a, (50, 95, 99))
+    return {"count": len(a), "p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1), "max_ms": round(float(a.max()), 1)}
+
+
+def analyze(commands: Iterable[dict], applies: Iterable[dict], statuses: Iterable[dict],
+            until_ms: Optional[int] = None, settle_ms: int = SETTLE_MS) -> dict:
+    """
+    commands: fan_command 행 (device, seq, cmd_ms, target)
+    applies : fan_apply 행 (seq, cmd_ms, recv_ms, applied_ms 또는 superseded, target)
+    statuses: fan_status 행 (seq, cmd_ms, report_ms), 추적 키가 없는 예전 점은 무시
+    until_ms: 이 시각에서 settle_ms 보다 최근 명령은 아직 보고 전일 수 있으므로 유실로 세지 않는다
+    """
+    cmds = {}
+    duplicates = 0
+    for c in commands:
+        key = (int(c["seq"]), int(c["cmd_ms"]))
+        duplicates += key in cmds
+        cmds[key] = c
+    until_ms = until_ms if until_ms is not None else max((k[1] for k in cmds), default=0) + settle_ms
+    cutoff = until_ms - settle_ms
+
+    network, apply_lat, report_lat = [], [], []
+    applied, superseded, orphans, target_mismatch, skew = set(), set(), 0, [], 0
+    for a in applies:
+        key = (int(a["seq"]), int(a["cmd_ms"]))
+        cmd = cmds.get(key)
+        if cmd is None:
+            orphans += 1
+            continue
+        if a.get("superseded"):
+            superseded.add(key)
+            continue
+        applied.add(key)
+        net, lat = a["recv_ms"] - key[1], a["applied_ms"] - key[1]
+        skew += net < 0 or lat < 0
+        network.append(net)
+        apply_lat.append(lat)
+        if abs(float(a["target"]) - float(cmd["target"])) > 0.5:
+            target_mismatch.append({"device": cmd.get("device"), "seq": key[0], "sent": cmd["target"],
+                                    "applied": a["target"]})
+
+    reported = {}
+    for s in statuses:
+        if s.get("seq") is None or s.get("cmd_ms") is None or s.get("report_ms") is None:
+            continue
+        key = (int(s["seq"]), int(s["cmd_ms"]))
+        if key in cmds:
+            reported[key] = min(reported.get(key, s["report_ms"]), s["report_ms"])
+    for key, report_ms in reported.items():
+        report_lat.append(report_ms - key[1])
+        skew += report_ms < key[1]
+
+    lost = [{"device": c.get("device"), "seq": k[0], "cmd_ms": k[1]} for k, c in cmds.items()
+            if k not in applied and k not in superseded and k[1] <= cutoff]
+    return {
+        "commands": len(cmds),
+        "applied": len(applied),
+        "superseded": len(superseded),
+        "reported": len(reported),
+        "command_to_pi": _percentiles(network),
+        "command_to_apply": _percentiles(apply_lat),
+        "command_to_report": _percentiles(report_lat),
+        "mismatches": {
+            "lost": len(lost),
+            "orphan_applies": orphans,
+            "target": len(target_mismatch),
+            "duplicate_commands": duplicates,
+            "negative_latency": skew,
+        },
+        "examples": {"lost": lost[:5], "target": target_mismatch[:5]},
+    }
+
+
+TRACE_COLUMNS = ("_measurement", "device", "fan", "seq", "cmd_ms", "recv_ms", "applied_ms", "report_ms",
+                 "superseded", "target")
+_INT = lambda v: int(float(v))
+_FALLBACK = {"seq": _INT, "cmd_ms": _INT, "recv_ms": _INT, "applied_ms": _INT, "report_ms": _INT,
+             "target": float, "superseded": lambda v: v == "true"}
+
+
+def trace_query(bucket: str = BUCKET, start: str = "-1h") -> str:
+    return f'''
+from(bucket: "{bucket}")
+  |> range(start: {start})
+  |> filter(fn: (r) => r._measurement == "fan_command" or r._measurement == "fan_apply" or
+                       (r._measurement == "fan_status" and r._field != "pwm_duty_cycle"))
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+'''
+
+
+def split_rows(records: Iterable[tuple]):
+    """pivot 한 쿼리 결과를 (commands, applies, statuses) 행 목록으로"""
+    out = {"fan_command": [], "fan_apply": [], "fan_status": []}
+    for rec in records:
+        row = dict(zip(TRACE_COLUMNS, rec))
+        rows = out.get(row.pop("_measurement"))
+        if rows is not None:
+            rows.append(row)
+    return out["fan_command"], out["fan_apply"], out["fan_status"]
+
+
+def fetch(start: str = "-1h", url: str = QUERY_URL, timeout: float = 30):
+    parser = AnnotatedCSVParser(TRACE_COLUMNS, _FALLBACK)
+    with requests.post(url, headers=query_headers, data=trace_query(start=start), timeout=timeout, stream=True) as r:
+        r.raise_for_status()
+        return split_rows(parser.records(iter_lines(r.iter_content(64 * 1024))))
+
+
+def print_report(result: dict):
+    print(f"[Trace] 명령 {result['commands']}개: 적용 {result['applied']}, 적용 전 덮어씀 {result['superseded']}, "
+          f"상태 보고에 나타남 {result['reported']}")
+    for name, label in (("command_to_pi", "명령 -> Pi 수신"), ("command_to_apply", "명령 -> GPIO 적용"),
+                        ("command_to_report", "명령 -> 상태 보고")):
+        p = result[name]
+        if p["count"]:
+            print(f"  {label}: p50 {p['p50_ms']:.1f} / p95 {p['p95_ms']:.1f} / p99 {p['p99_ms']:.1f} / "
+                  f"최대 {p['max_ms']:.1f} ms ({p['count']}개)")
+        else:
+            print(f"  {label}: 기록 없음")
+    m = result["mismatches"]
+    print(f"  어긋남: 유실 {m['lost']}, 짝 없는 적용 {m['orphan_applies']}, 목표 불일치 {m['target']}, "
+          f"중복 명령 {m['duplicate_commands']}, 음수 지연(시계 차이) {m['negative_latency']}")
+    for kind, rows in result["examples"].items():
+        for row in rows:
+            print(f"    {kind}: {row}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="fan_command / fan_apply / fan_status 를 맞춰 명령 지연을 보고")
+    ap.add_argument("--start", default="-1h", help="Flux range 시작 (예: -1h, -24h)")
+    ap.add_argument("--settle", type=float, default=SETTLE_MS / 1000, help="이보다 최근 명령은 유실로 세지 않음(초)")
+    ap.add_argument("--json", action="store_true", help="결과를 JSON 으로 출력")
+    args = ap.parse_args()
+    t0 = time.perf_counter()
+    commands, applies, statuses = fetch(args.start)
+    result = analyze(commands, applies, statuses, until_ms=int(time.time() * 1000),
+                     settle_ms=int(args.settle * 1000))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+        print(f"[Trace] 조회+분석 {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
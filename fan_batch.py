@@ -0,0 +1,106 @@
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from FANCONTROLL_PY import FanController
+
+# =========================
+# N대의 팬을 한 번에 계산하는 벡터화 엔진
+# =========================
+# FanController 의 상태 필드를 필드별 NumPy 배열(열)로 보관하고,
+# 목표값 계산 / 히스테리시스 게이트 / 슬루 레이트 제한을 한 번의 호출로 처리한다.
+# 결과는 FanController.step 과 정확히 같아야 한다 (TEST/batch_equivalence_test.py).
+
+MODE_CODES = {"auto": 0, "manual": 1, "range": 2}
+MODE_NAMES = {v: k for k, v in MODE_CODES.items()}
+
+
+def _mode_code(mode: str) -> int:
+    # predict 는 장치마다 열 모델(predictor)이 있어야 하므로 벡터화하지 않는다 (FanController.step 으로 돌린다)
+    if mode not in MODE_CODES:
+        raise ValueError(f"BatchFanController 는 {mode!r} 모드를 지원하지 않습니다 ({', '.join(MODE_CODES)} 만 가능)")
+    return MODE_CODES[mode]
+
+_INT_FIELDS = ("min_duty", "slew_per_sec", "last_pwm", "last_ts_ms", "last_target",
+               "manual_target", "cpu_thresh", "gpu_thresh")
+_FLOAT_FIELDS = ("t_on", "t_off", "temp_scale", "pwm_base", "pwm_gain")
+
+
+class BatchFanController:
+    """
+    FanController N개의 상태를 열(column) 단위 배열로 보관한다.
+    mode 는 MODE_CODES 의 정수 코드로 저장한다.
+    """
+
+    def __init__(self, n: int, **defaults):
+        proto = FanController(**defaults)
+        self.n = n
+        for name in _INT_FIELDS:
+            setattr(self, name, np.full(n, getattr(proto, name), dtype=np.int64))
+        for name in _FLOAT_FIELDS:
+            setattr(self, name, np.full(n, getattr(proto, name), dtype=np.float64))
+        self.mode = np.full(n, _mode_code(proto.mode), dtype=np.int8)
+        self.clock = proto.clock
+
+    @classmethod
+    def from_controllers(cls, ctls: Iterable[FanController]) -> "BatchFanController":
+        ctls = list(ctls)
+        batch = cls(len(ctls))
+        for name in _INT_FIELDS + _FLOAT_FIELDS:
+            getattr(batch, name)[:] = [getattr(c, name) for c in ctls]
+        batch.mode[:] = [_mode_code(c.mode) for c in ctls]
+        return batch
+
+    def to_controllers(self) -> List[FanController]:
+        out = []
+        for i in range(self.n):
+            kw = {name: int(getattr(self, name)[i]) for name in _INT_FIELDS}
+            kw.update({name: float(getattr(self, name)[i]) for name in _FLOAT_FIELDS})
+            kw["mode"] = MODE_NAMES[int(self.mode[i])]
+            out.append(FanController(**kw))
+        return out
+
+    def _target_by_formula(self, cpu, gpu, model):
+        f_cpu = np.clip(cpu / self.temp_scale, 0.0, 1.0)
+        f_gpu = np.clip(gpu / self.temp_scale, 0.0, 1.0)
+        f_model = np.where(model > 0, 1.0, 0.0)
+        pwm = self.pwm_base + (self.pwm_gain * np.maximum(f_cpu, f_gpu) * (1 - f_model))
+        return np.rint(np.clip(pwm, 0.0, 100.0)).astype(np.int64)
+
+    def targets(self, cpu, gpu, model):
+        """모드별 목표 PWM (게이트/슬루 적용 전)"""
+        auto = self._target_by_formula(cpu, gpu, model)
+        manual = np.clip(self.manual_target, 0, 100)
+        # range: 임계값 이하이면 min_duty, 초과하면 model_result=1 로 공식 적용 (스칼라 구현과 동일)
+        below = (cpu <= self.cpu_thresh) & (gpu <= self.gpu_thresh)
+        over = self._target_by_formula(cpu, gpu, np.ones_like(model))
+        rng = np.clip(np.where(below, self.min_duty, over), 0, 100)
+        return np.select([self.mode == 1, self.mode == 2], [manual, rng], default=auto)
+
+    def step(self, cpu_temp, gpu_temp, model_result, now_ms: Optional[int] = None) -> np.ndarray:
+        """
+        cpu_temp, gpu_temp, model_result: 길이 N 배열 (또는 스칼라, 브로드캐스트)
+        now_ms: 현재 시각(ms). 스칼라 또는 길이 N 배열, 없으면 self.clock()
+        """
+        cpu = np.asarray(cpu_temp, dtype=np.float64)
+        gpu = np.asarray(gpu_temp, dtype=np.float64)
+        model = np.asarray(model_result, dtype=np.int64)
+        target = self.targets(cpu, gpu, model)
+
+        # 히스테리시스 게이트 (auto/range 에서만 적용)
+        T = np.maximum(cpu, gpu)
+        gate_on = ((self.last_pwm == 0) & (T >= self.t_on)) | ((self.last_pwm > 0) & (T >= self.t_off))
+        target = np.where((self.mode != 1) & ~gate_on, 0, target)
+        self.last_target = target.astype(np.int64)
+
+        # 슬루 레이트 제한
+        now = int(self.clock() * 1000) if now_ms is None else now_ms
+        now = np.broadcast_to(np.asarray(now, dtype=np.int64), (self.n,))
+        dt = np.where(self.last_ts_ms == 0, 1.0,
+                      np.maximum(0.001, (now - self.last_ts_ms) / 1000.0))
+        max_delta = np.rint(self.slew_per_sec * dt).astype(np.int64)
+        delta = np.maximum(-max_delta, np.minimum(max_delta, target - self.last_pwm))
+
+        self.last_pwm = np.clip(self.last_pwm + delta, 0, 100)
+        self.last_ts_ms = now.copy()
+        return self.last_pwm
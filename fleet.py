@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import bisect
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from FANCONTROLL_PY import (FanController, IncrementalReader, PiLink, PI_PORT,
+                            MEASUREMENTS, load_controller_config, PI_EDGE_RAMP, PI_LOCAL_POLICY,
+                            controller_policy)
+from history import DeviceHistory
+from snapshot import STATE_FIELDS
+from scheduler import spread_phases
+from thermal_model import ThermalModel
+
+# =========================
+# 플릿(fleet) 모드 설정
+# =========================
+# FLEET_CONFIG 가 지정되면 서버 하나가 여러 Pi(장치)를 동시에 제어한다.
+#   {"devices": [{"id": "rack01-fan", "host": "10.0.0.11", "port": 6000,
+#                 "groups": ["rack01"], "controller": {"min_duty": 35}}, ...]}
+# 같은 host/port 에 "fan"(채널 번호, 기본 0)이 다른 장치들은 Pi 연결 하나를 공유한다
+# (Pi 가 이진 프로토콜을 지원해야 하며, PI_FAN_PINS 에 팬 수만큼 PIN 을 지정). fan 까지 같으면 별도 연결.
+FLEET_CONFIG = os.getenv("FLEET_CONFIG")
+DEVICE_TAG = os.getenv("FLEET_DEVICE_TAG", "device")  # 센서 측정값의 장치 태그 이름
+# 장치가 많으면 죽은 장치 하나 때문에 매 틱 긴 구간을 스캔하지 않도록 창을 10분으로 제한
+FLEET_WINDOW_STEPS = (10, 60, 600)
+# 위상 그룹 수: 같은 주기의 장치를 이만큼으로 나눠 주기 안에서 시작 시각을 엇갈리게 한다
+# (그룹마다 자기 장치만 조회/전송하므로 Influx 쿼리와 Pi 전송이 한 순간에 몰리지 않는다). 1 이면 한 번에 전체.
+FLEET_PHASE_SLOTS = int(os.getenv("FLEET_PHASE_SLOTS", "4"))
+
+# 샤드 워커 (shard.py 가 설정): 설정 파일의 장치 중 일관 해시로 이 워커에 배정된 장치만 맡는다.
+FLEET_SHARD_ID = os.getenv("FLEET_SHARD_ID")                 # 이 워커의 노드 이름 (예: "w0")
+FLEET_SHARD_NODES = [n for n in os.getenv("FLEET_SHARD_NODES", "").split(",") if n]  # 전체 노드 목록
+SHARD_VNODES = int(os.getenv("FLEET_SHARD_VNODES", "64"))    # 노드당 가상 노드 수 (분배 고르기)
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    일관 해시 링: 장치 ID -> 노드.
+    노드가 하나 늘거나 줄면 약 1/N 의 장치만 주인이 바뀐다 (나머지는 그대로라 상태 이동이 적다).
+    """
+
+    def __init__(self, nodes, vnodes: int = SHARD_VNODES):
+        self.nodes = tuple(nodes)
+        points = sorted((_ring_hash(f"{n}#{i}"), n) for n in self.nodes for i in range(vnodes))
+        self._keys = [h for h, _ in points]
+        self._nodes = [n for _, n in points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _ring_hash(key)) % len(self._keys)
+        return self._nodes[i]
+
+
+@dataclass
+class Device:
+    device_id: str
+    link: PiLink
+    ctl: FanController = field(default_factory=FanController)
+    groups: Tuple[str, ...] = ()
+    fan: int = 0
+    history: DeviceHistory = field(default_factory=DeviceHistory)
+
+
+@dataclass
+class PhaseGroup:
+    """같은 주기·같은 위상으로 함께 틱하는 장치 묶음 (자기 장치만 조회하는 reader 를 따로 가진다)"""
+    period: float
+    phase: float
+    reader: IncrementalReader
+    device_ids: set = field(default_factory=set)
+    last_timings: dict = field(default_factory=dict)
+    last_failed: int = 0
+
+
+class Fleet:
+    """장치 ID -> (FanController, Pi 연결) 레지스트리와 틱 처리"""
+
+    def __init__(self, reader: Optional[IncrementalReader] = None, shard_id: Optional[str] = None,
+                 nodes=(), phase_slots: int = FLEET_PHASE_SLOTS):
+        self.devices: Dict[str, Device] = {}
+        self.links: Dict[Tuple[str, int], List[Tuple[PiLink, set]]] = {}  # (host, port) -> [(연결, 사용 중인 fan)]
+        self.shard_id = shard_id
+        self.ring = HashRing(nodes) if shard_id else None
+        self.configs: Dict[str, dict] = {}  # 설정 파일의 전체 장치 (리샤딩 때 새로 맡을 장치를 만든다)
+        # 샤드 워커는 자기 장치만 조회하도록 쿼리에 장치 필터를 넣는다
+        self.reader = reader or IncrementalReader(steps=FLEET_WINDOW_STEPS, group_tag=DEVICE_TAG,
+                                                  filter_group=shard_id is not None)
+        self.phase_slots = max(1, phase_slots)
+        self.groups: Dict[Tuple[float, int], PhaseGroup] = {}  # (주기, 위상 번호) -> 그룹
+        self.last_timings = {}  # 마지막 틱의 단계별 소요 시간(초)
+        self.last_failed = 0    # 마지막 틱에서 전송에 실패한 장치 수
+
+    def add(self, device_id: str, host: str, port: int = PI_PORT, groups=(), fan: int = 0,
+            **ctl_kwargs) -> Device:
+        # 같은 host:port 의 장치들은 fan 번호가 다를 때만 연결 하나를 나눠 쓴다. PiLink 의 중복 억제(sent)와
+        # keepalive 는 fan 번호별이므로, 같은 fan 을 쓰는 단일 팬 장치 둘이 한 연결을 쓰면 서로의 값을 덮어쓴다
+        shared = self.links.setdefault((host, port), [])
+        link, fans = next(((l, f) for l, f in shared if fan not in f), (None, None))
+        if link is None:
+            link, fans = PiLink(host, port), set()
+            shared.append((link, fans))
+        fans.add(fan)
+        dev = Device(device_id, link, FanController(**ctl_kwargs), tuple(groups), fan)
+        dev.ctl.predictor = ThermalModel(dev.history)
+        self.devices[device_id] = dev
+        self.reader.expect(self.devices)
+        self._join_group(dev)
+        return dev
+
+    def remove(self, device_id: str):
+        dev = self.devices.pop(device_id, None)
+        if dev is not None:
+            self._release_link(dev)
+            self._leave_group(dev)
+        self.reader.expect(self.devices)
+
+    def _group_key(self, dev: Device) -> Tuple[float, int]:
+        # 장치 ID 해시로 위상을 정하므로 장치가 늘거나 리샤딩돼도 다른 장치의 위상은 그대로다
+        return float(dev.ctl.period), _ring_hash(dev.device_id) % self.phase_slots
+
+    def _join_group(self, dev: Device):
+        key = self._group_key(dev)
+        group = self.groups.get(key)
+        if group is None:
+            # 그룹이 여럿이면 그룹마다 자기 장치만 조회한다 (하나면 기존처럼 필터 없이 전체 조회)
+            split = self.phase_slots > 1 or self.shard_id is not None
+            reader = IncrementalReader(steps=FLEET_WINDOW_STEPS, group_tag=DEVICE_TAG, filter_group=split)
+            group = self.groups[key] = PhaseGroup(key[0], spread_phases(key[0], self.phase_slots)[key[1]], reader)
+        group.device_ids.add(dev.device_id)
+        group.reader.expect(group.device_ids)
+
+    def _leave_group(self, dev: Device):
+        key = self._group_key(dev)
+        group = self.groups.get(key)
+        if group is not None:
+            group.device_ids.discard(dev.device_id)
+            group.reader.expect(group.device_ids)
+            if not group.device_ids:
+                del self.groups[key]
+
+    def _release_link(self, dev: Device):
+        """장치가 쓰던 fan 을 연결에서 빼고, 더 쓰는 장치가 없으면 연결을 닫는다"""
+        shared = self.links.get((dev.link.host, dev.link.port), [])
+        for i, (link, fans) in enumerate(shared):
+            if link is dev.link:
+                fans.discard(dev.fan)
+                if not fans:
+                    del shared[i]
+                    link._drop()
+                return
+
+    def owns(self, device_id: str) -> bool:
+        return self.ring is None or self.ring.node_for(device_id) == self.shard_id
+
+    def add_config(self, d: dict, base: Optional[dict] = None) -> Optional[Device]:
+        """설정 파일의 장치 항목 하나를 기억하고, 이 샤드 담당이면 추가한다"""
+        dev_id = str(d["id"])
+        self.configs[dev_id] = d
+        if not self.owns(dev_id):
+            return None
+        base = load_controller_config() if base is None else base
+        return self.add(dev_id, d["host"], int(d.get("port", PI_PORT)), d.get("groups", ()),
+                        int(d.get("fan", 0)), **dict(base, **d.get("controller", {})))
+
+    @classmethod
+    def from_config(cls, path: str, shard_id: Optional[str] = None, nodes=()) -> "Fleet":
+        with open(path, encoding="utf-8") as f:
+            conf = json.load(f)
+        fleet = cls(shard_id=shard_id, nodes=nodes)
+        base = load_controller_config()  # FAN_CONTROLLER_CONFIG 가 장치 공통 기본값, 장치별 값이 우선
+        for d in conf.get("devices", []):
+            fleet.add_config(d, base)
+        return fleet
+
+    def reshard(self, nodes) -> Dict[str, dict]:
+        """
+        노드 목록이 바뀌었을 때 담당 장치를 다시 고른다.
+        더 이상 맡지 않는 장치는 빼고 그 컨트롤러 상태를 돌려주며(새 주인이 adopt 한다),
+        새로 맡게 된 장치는 설정으로 만든다 (상태는 이전 주인이 넘겨줄 때까지 초기값).
+        """
+        if self.shard_id is None:
+            return {}
+        self.ring = HashRing(nodes)
+        released = {}
+        for dev_id in [d for d in self.devices if not self.owns(d)]:
+            ctl = self.devices[dev_id].ctl
+            released[dev_id] = {k: getattr(ctl, k) for k in STATE_FIELDS}
+            self.remove(dev_id)
+        base = load_controller_config()
+        for dev_id, d in self.configs.items():
+            if dev_id not in self.devices and self.owns(dev_id):
+                self.add_config(d, base)
+        return released
+
+    def adopt(self, states: Dict[str, dict]) -> int:
+        """다른 워커가 넘겨준 컨트롤러 상태를 맡고 있는 장치에 덮어쓰고, 반영한 수를 돌려준다"""
+        n = 0
+        for dev_id, state in states.items():
+            dev = self.devices.get(dev_id)
+            if dev is not None:
+                for k in STATE_FIELDS:
+                    if k in state:
+                        setattr(dev.ctl, k, state[k])
+                n += 1
+        return n
+
+    def select(self, device: Optional[str] = None, group: Optional[str] = None) -> List[Device]:
+        """device 또는 group 으로 대상 장치를 고른다. 둘 다 없으면 전체."""
+        if device is not None:
+            dev = self.devices.get(str(device))
+            return [dev] if dev else []
+        if group is not None:
+            return [d for d in self.devices.values() if group in d.groups]
+        return list(self.devices.values())
+
+    def step_all(self, samples: dict, device_ids=None, now_ms: Optional[int] = None) -> Dict[str, int]:
+        """
+        그룹 쿼리 결과((장치, 측정값) -> Sample)로 장치들의 PWM 을 계산 (device_ids 가 없으면 전체).
+        now_ms 는 스케줄러의 예정 시각: 실행이 늦어져도 slew 의 dt 가 주기대로 유지된다.
+        """
+        out = {}
+        for dev_id in (self.devices if device_ids is None else device_ids):
+            dev = self.devices.get(dev_id)
+            if dev is None:
+                continue
+            vals = []
+            for m in MEASUREMENTS:
+                s = samples.get((dev_id, m))
+                vals.append(s.value if s is not None and s.value is not None else 0)
+            cpu, gpu, model = vals
+            ts = dev.ctl.clock() if now_ms is None else now_ms / 1000
+            cpu, gpu = dev.history.push(ts, cpu, gpu, model)  # 원시 값 기록 + 필터
+            out[dev_id] = pwm = dev.ctl.step(cpu, gpu, int(model), now_ms)
+            dev.history.record_pwm(pwm)
+        return out
+
+    async def send_all(self, pwms: Dict[str, int]) -> int:
+        """모든 Pi 로 동시에 전송하고, 실패한 장치 수를 돌려준다"""
+        devs = [self.devices[d] for d in pwms if d in self.devices]
+        if PI_LOCAL_POLICY:
+            sends = (dev.link.send_policy(controller_policy(dev.ctl), dev.ctl.last_target, dev.ctl.slew_per_sec,
+                                          fan=dev.fan, pwm=pwms[dev.device_id]) for dev in devs)
+        elif PI_EDGE_RAMP:
+            sends = (dev.link.send_setpoint(dev.ctl.last_target, dev.ctl.slew_per_sec, fan=dev.fan,
+                                            pwm=pwms[dev.device_id]) for dev in devs)
+        else:
+            sends = (dev.link.send(pwms[dev.device_id], fan=dev.fan) for dev in devs)
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        return sum(1 for r in results if r is not True)
+
+    async def tick(self) -> Dict[str, int]:
+        samples = await self.reader.async_read()
+        t0 = time.perf_counter()
+        pwms = self.step_all(samples)
+        t1 = time.perf_counter()
+        self.last_failed = await self.send_all(pwms)
+        self.last_timings = dict(self.reader.last_timings, step=t1 - t0,
+                                 pi_send=time.perf_counter() - t1)
+        return pwms
+
+    async def tick_group(self, group: PhaseGroup, now_ms: Optional[int] = None) -> Dict[str, int]:
+        """위상 그룹 하나만 조회 -> step -> 전송"""
+        samples = await group.reader.async_read()
+        t0 = time.perf_counter()
+        pwms = self.step_all(samples, list(group.device_ids), now_ms)
+        t1 = time.perf_counter()
+        group.last_failed = await self.send_all(pwms)
+        group.last_timings = dict(group.reader.last_timings, step=t1 - t0,
+                                  pi_send=time.perf_counter() - t1)
+        return pwms
+
+
+def load_fleet() -> Optional[Fleet]:
+    if not FLEET_CONFIG:
+        return None
+    if FLEET_SHARD_ID:
+        return Fleet.from_config(FLEET_CONFIG, FLEET_SHARD_ID, FLEET_SHARD_NODES or [FLEET_SHARD_ID])
+    return Fleet.from_config(FLEET_CONFIG)
@@ -0,0 +1,166 @@
+import re
+import csv
+import codecs
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+# =========================
+# Flux annotated CSV 스트리밍 파서
+# =========================
+# 응답 본문을 통째로 메모리에 올리지 않고 청크 단위로 읽으면서,
+# 필요한 열만 골라 #datatype 에 맞는 타입으로 변환한 튜플을 내보낸다.
+#
+#   #datatype,string,long,dateTime:RFC3339,double,string      <- 주석(annotation) 행 (선택)
+#   #group,false,false,false,false,true
+#   #default,_result,,,,
+#   ,result,table,_time,_value,_measurement                    <- 헤더 행
+#   ,,0,2026-10-17T00:00:00Z,55.2,cpu_temperature              <- 데이터 행
+#                                                              <- 빈 줄: 표(table) 블록 구분
+#   #datatype,...                                              <- 다음 블록 (스키마가 다를 수 있음)
+#
+# 주석 행이 없으면(서버 기본 응답) 모든 값이 문자열이므로 fallback 변환기를 사용한다.
+
+CHUNK_SIZE = 64 * 1024
+
+
+class FluxQueryError(Exception):
+    """쿼리 결과 대신 Flux 오류 표(error, reference 열)가 돌아온 경우"""
+
+
+_RFC3339 = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:\d{2})$")
+
+
+def parse_time(s: str) -> float:
+    """RFC3339 문자열(_time)을 epoch 초로 변환 (나노초는 마이크로초로 절삭)"""
+    m = _RFC3339.match(s.strip())
+    if not m:
+        raise ValueError(f"invalid _time: {s!r}")
+    head, frac, tz = m.groups()
+    tz = "+00:00" if tz == "Z" else tz
+    frac = (frac or "")[:6].ljust(6, "0")
+    return datetime.fromisoformat(f"{head}.{frac}{tz}").timestamp()
+
+
+def _parse_bool(s: str) -> bool:
+    return s == "true"
+
+
+DATATYPES: Dict[str, Callable[[str], object]] = {
+    "string": str,
+    "double": float,
+    "long": int,
+    "unsignedLong": int,
+    "boolean": _parse_bool,
+    "dateTime:RFC3339": parse_time,
+    "dateTime:RFC3339Nano": parse_time,
+    "duration": str,
+    "base64Binary": str,
+}
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """바이트 청크 -> 줄 (줄바꿈 포함). 청크 경계에서 잘린 줄/멀티바이트 문자도 처리한다."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    rest = ""
+    for chunk in chunks:
+        if not chunk:
+            continue
+        lines = (rest + decoder.decode(chunk)).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    rest += decoder.decode(b"", final=True)
+    if rest:
+        yield rest
+
+
+class AnnotatedCSVParser:
+    """
+    columns: 뽑아낼 열 이름 순서. records() 는 이 순서의 튜플을 내보낸다 (없는 열은 None).
+    fallback: #datatype 주석이 없을 때 열별 변환기 (없으면 문자열 그대로)
+    """
+
+    def __init__(self, columns: Sequence[str], fallback: Optional[Dict[str, Callable]] = None):
+        self.columns = tuple(columns)
+        self.fallback = fallback or {}
+
+    def _plan(self, header, annotations):
+        """헤더/주석으로 (열 위치, 변환기, 기본값) 목록을 만든다"""
+        datatypes = annotations.get("#datatype")
+        defaults = annotations.get("#default")
+        plan = []
+        for name in self.columns:
+            if name not in header:
+                plan.append((None, None, None))
+                continue
+            i = header.index(name)
+            if datatypes is not None and i < len(datatypes):
+                conv = DATATYPES.get(datatypes[i], str)
+            else:
+                conv = self.fallback.get(name)
+            default = defaults[i] if defaults is not None and i < len(defaults) and defaults[i] else None
+            plan.append((i, conv, default))
+        return plan
+
+    def records(self, lines: Iterable[str]) -> Iterator[tuple]:
+        header = None
+        annotations = {}
+        plan = ()
+        error_col = None
+        for row in csv.reader(lines):
+            if not row or (len(row) == 1 and not row[0]):
+                header, annotations = None, {}  # 표 블록 끝
+                continue
+            first = row[0]
+            if first.startswith("#"):
+                annotations[first] = row
+                header = None
+                continue
+            if header is None:
+                header = row
+                plan = self._plan(header, annotations)
+                error_col = header.index("error") if "error" in header and "_value" not in header else None
+                continue
+            if error_col is not None:
+                raise FluxQueryError(row[error_col] if error_col < len(row) else ",".join(row))
+
+            out = []
+            for i, conv, default in plan:
+                if i is None or i >= len(row):
+                    out.append(None)
+                    continue
+                cell = row[i]
+                if cell == "":
+                    cell = default
+                    if cell is None:
+                        out.append(None)
+                        continue
+                if conv is None:
+                    out.append(cell)
+                    continue
+                try:
+                    out.append(conv(cell))
+                except ValueError:
+                    out.append(None)
+            yield tuple(out)
+
+    def records_from_chunks(self, chunks: Iterable[bytes]) -> Iterator[tuple]:
+        return self.records(iter_lines(chunks))
+
+    def fill(self, records: Iterator[tuple], arrays: Sequence, start: int = 0) -> int:
+        """
+        미리 할당한 숫자 배열들(열 순서와 같은 개수, 예: NumPy 배열)에 start 위치부터 채운다.
+        값이 없는 칸은 NaN 으로 채운다.
+        배열이 가득 차면 멈추고, 채운 행 수를 돌려준다 (records 는 이어서 다시 쓸 수 있다).
+        """
+        cap = min(len(a) for a in arrays)
+        n = start
+        if n >= cap:
+            return 0
+        for rec in records:
+            for a, v in zip(arrays, rec):
+                a[n] = v if v is not None else float("nan")
+            n += 1
+            if n >= cap:
+                break
+        return n - start
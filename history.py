@@ -0,0 +1,108 @@
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# =========================
+# 장치별 센서/PWM 이력 (메모리 링 버퍼) 과 step 전 평활 필터
+# =========================
+# 장치 하나 = 고정 크기 NumPy 배열 한 벌 (시각 float64 + 신호 COLUMNS 개 float32, 행 하나 24 바이트).
+# 행은 제어 틱마다 하나씩 덮어쓰며 추가하므로(O(1)) 메모리는 처음 할당한 크기에서 늘지 않는다.
+#   장치당 HISTORY_SIZE * 24 바이트: 3600행(1Hz 1시간) = 86.4 KB, 1,000대 = 86.4 MB
+# 웹소켓 {"history": {...}} 요청은 InfluxDB 를 조회하지 않고 이 버퍼에서 바로 응답한다.
+HISTORY_SIZE = int(os.getenv("HISTORY_SIZE", "3600"))           # 장치당 보관 행 수 (틱 수)
+# step 에 넣기 전 온도 필터: none | ema | median
+HISTORY_FILTER = os.getenv("HISTORY_FILTER", "none")
+HISTORY_EMA_ALPHA = float(os.getenv("HISTORY_EMA_ALPHA", "0.3"))  # 새 값의 가중치 (1 이면 필터 없음)
+HISTORY_MEDIAN_WINDOW = int(os.getenv("HISTORY_MEDIAN_WINDOW", "5"))
+HISTORY_MAX_POINTS = 1000  # history 응답 하나에 담는 최대 점 수 (넘으면 간격을 두고 추림)
+
+COLUMNS = ("cpu_temperature", "gpu_temperature", "model_result", "pwm")
+CPU, GPU, MODEL, PWM = range(len(COLUMNS))
+ROW_BYTES = 8 + 4 * len(COLUMNS)
+FILTERS = ("none", "ema", "median")
+
+
+class DeviceHistory:
+    """장치 하나의 링 버퍼. push 로 원시 값을 기록하고 필터를 거친 온도를 돌려준다."""
+
+    def __init__(self, size: int = HISTORY_SIZE, filter: str = HISTORY_FILTER,
+                 alpha: float = HISTORY_EMA_ALPHA, window: int = HISTORY_MEDIAN_WINDOW):
+        if filter not in FILTERS:
+            raise ValueError(f"알 수 없는 필터: {filter} (가능: {', '.join(FILTERS)})")
+        self.size = size
+        self.filter = filter
+        self.alpha = alpha
+        self.median_window = max(1, min(window, size))
+        self.ts = np.zeros(size, dtype=np.float64)
+        self.values = np.full((size, len(COLUMNS)), np.nan, dtype=np.float32)
+        self.count = 0          # 지금까지 기록한 행 수 (size 를 넘으면 오래된 행부터 덮어씀)
+        self._ema = None        # (cpu, gpu) EMA 상태
+
+    def __len__(self) -> int:
+        return min(self.count, self.size)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.values.nbytes
+
+    def push(self, ts: float, cpu: float, gpu: float, model: float) -> Tuple[float, float]:
+        """원시 값을 한 행으로 기록하고 필터를 거친 (cpu, gpu) 를 돌려준다 (pwm 은 record_pwm 으로)"""
+        i = self.count % self.size
+        self.ts[i] = ts
+        row = self.values[i]
+        row[CPU], row[GPU], row[MODEL], row[PWM] = cpu, gpu, model, np.nan
+        self.count += 1
+
+        if self.filter == "ema":
+            if self._ema is None:
+                self._ema = (cpu, gpu)
+            else:
+                a = self.alpha
+                self._ema = (a * cpu + (1 - a) * self._ema[0], a * gpu + (1 - a) * self._ema[1])
+            return self._ema
+        if self.filter == "median":
+            k = min(self.median_window, self.count)
+            idx = np.arange(i - k + 1, i + 1) % self.size
+            med = np.median(self.values[idx, CPU:GPU + 1], axis=0)
+            return float(med[0]), float(med[1])
+        return cpu, gpu
+
+    def record_pwm(self, pwm: int):
+        """마지막으로 push 한 행에 그 틱의 PWM 을 채운다"""
+        if self.count:
+            self.values[(self.count - 1) % self.size, PWM] = pwm
+
+    def _ordered(self) -> Tuple[np.ndarray, np.ndarray]:
+        """시간 순서로 정렬한 (시각, 값) 뷰. 버퍼가 한 바퀴 돌았으면 두 조각을 이어 붙인다."""
+        if self.count <= self.size:
+            return self.ts[:self.count], self.values[:self.count]
+        i = self.count % self.size
+        return np.concatenate((self.ts[i:], self.ts[:i])), np.concatenate((self.values[i:], self.values[:i]))
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """시간 순서의 (시각, 값[행, COLUMNS]) 배열 전체 (열 모델 학습 등 벡터 연산용)"""
+        return self._ordered()
+
+    def window(self, seconds: Optional[float] = None, since: Optional[float] = None,
+               max_points: int = HISTORY_MAX_POINTS) -> Dict[str, list]:
+        """최근 seconds 초(또는 since 이후) 구간을 열 별 목록으로. 점이 많으면 고르게 추린다."""
+        ts, values = self._ordered()
+        if seconds is not None and len(ts):
+            since = max(since or -np.inf, ts[-1] - seconds)
+        if since is not None:
+            start = int(np.searchsorted(ts, since, side="left"))
+            ts, values = ts[start:], values[start:]
+        if max_points and len(ts) > max_points:
+            stride = -(-len(ts) // max_points)
+            ts, values = ts[::-stride][::-1], values[::-stride][::-1]  # 가장 최근 행은 항상 포함
+        out = {"ts": ts.tolist()}
+        for c, name in enumerate(COLUMNS):
+            col = values[:, c].astype(np.float64)
+            out[name] = [None if v != v else round(v, 2) for v in col.tolist()]  # NaN -> null
+        return out
+
+
+def memory_per_device(size: int = HISTORY_SIZE) -> int:
+    """장치 하나의 버퍼 크기(바이트)"""
+    return size * ROW_BYTES
@@ -0,0 +1,96 @@
+import os
+import json
+import math
+import time
+import asyncio
+from typing import Dict, Optional
+
+from FANCONTROLL_PY import MEASUREMENTS
+
+# =========================
+# 센서 값 직접 수신(push) 설정
+# =========================
+# 센서 생산자가 InfluxDB 를 거치지 않고 제어 서버로 값을 바로 보낸다.
+# TCP 한 줄에 측정값 하나 이상:
+#   JSON          {"cpu_temperature": 55.2, "gpu_temperature": 61.0, "model_result": 1}
+#   Line Protocol cpu_temperature,host=gpu01 value=55.2 1700000000000000000
+# (Line Protocol 을 받으므로 InfluxDB 로 쓰던 줄을 그대로 복사해 보내도 된다)
+INGEST_PORT = int(os.getenv("INGEST_PORT", "8766"))
+CONTROL_MIN_INTERVAL = float(os.getenv("CONTROL_MIN_INTERVAL", "0.2"))  # step 사이 최소 간격(초)
+PUSH_STALE_SEC = float(os.getenv("PUSH_STALE_SEC", "3.0"))  # 이 시간 동안 수신이 없으면 폴링으로 복귀
+
+
+def _parse_line_protocol(line: str) -> Dict[str, float]:
+    head, _, rest = line.partition(" ")
+    measurement = head.split(",", 1)[0]
+    fields = rest.split(" ", 1)[0]
+    for kv in fields.split(","):
+        k, _, v = kv.partition("=")
+        if k == "value":
+            return {measurement: float(v.rstrip("iu"))}
+    return {}
+
+
+def parse_reading(line: str) -> Dict[str, float]:
+    """
+    수신한 한 줄을 {측정값: 값} 으로 변환. 알 수 없는 측정값은 버린다.
+    nan/inf(1e999 포함)는 필터 이력과 step 비교를 망가뜨리므로 ValueError (줄 전체를 버림).
+    """
+    line = line.strip()
+    if not line:
+        return {}
+    if line.startswith("{"):
+        data = json.loads(line)
+        readings = {k: float(v) for k, v in data.items() if v is not None and k in MEASUREMENTS}
+    else:
+        readings = _parse_line_protocol(line)
+    readings = {k: v for k, v in readings.items() if k in MEASUREMENTS}
+    for k, v in readings.items():
+        if not math.isfinite(v):
+            raise ValueError(f"{k} 값이 유한하지 않습니다: {v}")
+    return readings
+
+
+class SensorFeed:
+    """push 로 받은 최신 센서 값과, 새 값 도착을 알리는 이벤트"""
+
+    def __init__(self, measurements=MEASUREMENTS):
+        self.values: Dict[str, Optional[float]] = {m: None for m in measurements}
+        self.last_push: Optional[float] = None  # time.monotonic()
+        self.event = asyncio.Event()
+        self.received = 0
+        self.errors = 0
+
+    def push(self, readings: Dict[str, float]):
+        if not readings:
+            return
+        self.values.update(readings)
+        self.last_push = time.monotonic()
+        self.received += 1
+        self.event.set()
+
+    def fresh(self, stale_sec: float = PUSH_STALE_SEC) -> bool:
+        """최근 stale_sec 초 안에 push 가 있었으면 True (이때는 InfluxDB 폴링 생략)"""
+        return self.last_push is not None and time.monotonic() - self.last_push < stale_sec
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        print(f"[Ingest] 생산자 연결됨: {peer}")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.push(parse_reading(line.decode("utf-8")))
+                except (ValueError, AttributeError, TypeError) as e:  # TypeError: {"cpu_temperature": [1]} 등
+                    self.errors += 1
+                    print(f"[Ingest] 잘못된 데이터: {line!r} ({e})")
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            print(f"[Ingest] 생산자 연결 종료: {peer}")
+
+    async def serve(self, host: str = "0.0.0.0", port: int = INGEST_PORT):
+        return await asyncio.start_server(self.handle, host, port)
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+from typing import Callable, Optional, Tuple
+
+from FANCONTROLL_PY import FanController, LOCAL_POLICY_MODES, POLICY_FIELDS, load_controller_config
+from scheduler import FixedRateScheduler
+
+# =========================
+# Pi 로컬 제어 루프 (pi.py 에서 PI_LOCAL_CONTROL=1 일 때 사용)
+# =========================
+# 서버가 틱마다 PWM 을 보내는 대신 정책(모드, 임계값, min_duty, slew ...)만 보내고, Pi 가 자기 센서 값으로
+# PI_LOCAL_PERIOD 초마다 FanController.step 을 돌린다 (InfluxDB 왕복/VPN 지연 없이 ms 단위로 반응).
+#   policy   : 서버 정책으로 로컬 제어
+#   override : 서버가 목표값(SETPOINT / {"pwm"})을 직접 보내는 동안은 로컬 루프를 멈추고 그 값을 따른다
+#   safe     : 서버 소식(정책, 목표값, PING)이 lease 초 넘게 없거나 아직 정책을 받지 못했으면
+#              Pi 자체 설정(FAN_CONTROLLER_CONFIG, 없으면 기본값)으로 제어하고 PWM 을 PI_SAFE_MIN_PWM 이상으로 유지
+# 센서를 읽지 못하면 PI_SAFE_PWM 으로 돌린다.
+# Pi 에는 pi.py, wire.py 와 함께 이 파일, FANCONTROLL_PY.py, flux_csv.py, scheduler.py 를 복사한다.
+LOCAL_PERIOD = float(os.getenv("PI_LOCAL_PERIOD", "0.1"))
+DEFAULT_LEASE = float(os.getenv("PI_POLICY_LEASE", "15"))
+SAFE_MIN_PWM = int(os.getenv("PI_SAFE_MIN_PWM", "30"))
+SAFE_PWM = int(os.getenv("PI_SAFE_PWM", "100"))
+
+# 센서 소스: "thermal" (SoC 온도 파일), "file:<경로>" (다른 프로세스가 쓰는 JSON), "fake" (시험용)
+SENSOR_SOURCE = os.getenv("PI_SENSOR_SOURCE", "thermal")
+CPU_TEMP_PATH = os.getenv("PI_CPU_TEMP_PATH", "/sys/class/thermal/thermal_zone0/temp")
+GPU_TEMP_PATH = os.getenv("PI_GPU_TEMP_PATH", CPU_TEMP_PATH)  # 라즈베리파이는 CPU/GPU 가 한 SoC
+MODEL_RESULT_PATH = os.getenv("PI_MODEL_RESULT_PATH")         # 없으면 model_result = 0
+SENSOR_STALE_SEC = float(os.getenv("PI_SENSOR_STALE_SEC", "5"))  # file: 소스가 이보다 오래 안 바뀌면 읽기 실패 (0 = 검사 안 함)
+
+Reading = Tuple[float, float, int]  # (cpu 온도, gpu 온도, model_result)
+MODES = LOCAL_POLICY_MODES
+
+
+class ThermalSource:
+    """sysfs 온도 파일(밀리도 단위)을 읽는다"""
+
+    def __init__(self, cpu_path: str = CPU_TEMP_PATH, gpu_path: str = GPU_TEMP_PATH,
+                 model_path: Optional[str] = MODEL_RESULT_PATH):
+        self.cpu_path, self.gpu_path, self.model_path = cpu_path, gpu_path, model_path
+
+    @staticmethod
+    def _read(path: str) -> str:
+        with open(path, encoding="ascii") as f:
+            return f.read().strip()
+
+    def read(self) -> Reading:
+        cpu = int(self._read(self.cpu_path)) / 1000
+        gpu = cpu if self.gpu_path == self.cpu_path else int(self._read(self.gpu_path)) / 1000
+        model = int(float(self._read(self.model_path))) if self.model_path else 0
+        return cpu, gpu, model
+
+
+class FileSource:
+    """
+    다른 프로세스가 쓰는 JSON 파일 {"cpu_temperature": 51.2, "gpu_temperature": 48.0, "model_result": 0}.
+    파일이 바뀌었을 때만(mtime) 다시 읽는다. stale 초 넘게 바뀌지 않았으면 쓰는 프로세스가 멈춘 것으로 보고
+    OSError 를 낸다 (LocalControl 이 PI_SAFE_PWM 으로 돌린다).
+    """
+
+    def __init__(self, path: str, stale: float = SENSOR_STALE_SEC, wall: Callable[[], float] = time.time):
+        self.path = path
+        self.stale = stale
+        self.wall = wall
+        self._mtime = None
+        self._value = None
+
+    def read(self) -> Reading:
+        mtime = os.stat(self.path).st_mtime_ns
+        age = self.wall() - mtime / 1e9
+        if self.stale > 0 and age > self.stale:
+            raise OSError(f"{self.path}: {age:.1f}s 동안 갱신 없음 (PI_SENSOR_STALE_SEC={self.stale:g})")
+        if mtime != self._mtime:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._value = (float(data["cpu_temperature"]), float(data["gpu_temperature"]),
+                           int(data.get("model_result", 0)))
+            self._mtime = mtime
+        return self._value
+
+
+class FakeSource:
+    """시험용: set() 으로 넣은 값을 돌려준다 (None 이면 읽기 실패)"""
+
+    def __init__(self, cpu: float = 40.0, gpu: float = 40.0, model: int = 0):
+        self.value = (cpu, gpu, model)
+
+    def set(self, cpu: float, gpu: float, model: int = 0):
+        self.value = (cpu, gpu, model)
+
+    def read(self) -> Reading:
+        if self.value is None:
+            raise OSError("fake sensor unavailable")
+        return self.value
+
+
+def open_source(spec: str = SENSOR_SOURCE):
+    if spec == "thermal":
+        return ThermalSource()
+    if spec == "fake":
+        return FakeSource()
+    if spec.startswith("file:"):
+        return FileSource(spec[len("file:"):])
+    raise ValueError(f"알 수 없는 센서 소스: {spec} (thermal, file:<경로>, fake)")
+
+
+class LocalControl:
+    """
+    FanAgent 채널 하나의 로컬 제어 루프. FanAgent 가 서버 메시지마다 on_policy / on_setpoint / touch 를 부르고,
+    run() 은 PI_LOCAL_PERIOD 마다 센서 -> step -> agent.submit 을 한다.
+    """
+
+    def __init__(self, agent, source, period: float = LOCAL_PERIOD, lease: float = DEFAULT_LEASE,
+                 safe: Optional[dict] = None, clock: Callable[[], float] = time.monotonic):
+        self.agent = agent
+        self.source = source
+        self.period = period
+        self.lease = lease
+        self.clock = clock
+        # 안전 정책: Pi 자체 설정 (서버 정책이 없을 때 쓰는 값)
+        self.safe = {k: v for k, v in (safe if safe is not None else load_controller_config()).items()
+                     if k in POLICY_FIELDS}
+        self.ctl = FanController(**self.safe)
+        self.baseline = {k: getattr(self.ctl, k) for k in POLICY_FIELDS}
+        self.policy = None         # 서버가 마지막으로 보낸 정책
+        self.last_contact = None   # 마지막 서버 메시지 시각 (clock)
+        self.override_at = None    # 마지막 서버 목표값 명령 시각
+        self.state = "safe"
+        self.steps = 0
+        self.sensor_errors = 0
+        self.last_pwm = None
+
+    # ---- 서버 메시지 ----
+    def touch(self):
+        self.last_contact = self.clock()
+
+    def on_policy(self, policy: dict):
+        if not isinstance(policy, dict):
+            raise ValueError("policy 는 객체여야 합니다")
+        if "mode" in policy and policy["mode"] not in MODES:
+            # 모드를 버리고 기본 모드로 돌면 서버와 Pi 가 서로 다른 모드로 제어하게 되므로 정책 전체를 거부한다
+            raise ValueError(f"로컬 제어가 지원하지 않는 모드: {policy['mode']!r} (지원: {', '.join(MODES)})")
+        lease = policy.get("lease", self.lease)
+        if isinstance(lease, (int, float)) and lease > 0:
+            self.lease = float(lease)
+        # 모르는 필드와 잘못된 값은 버린다 (정책 하나가 잘못되어도 step 이 깨지지 않도록)
+        self.policy = {k: v for k, v in policy.items() if k in POLICY_FIELDS and
+                       (v in MODES if k == "mode" else isinstance(v, (int, float)) and not isinstance(v, bool))}
+        self.override_at = None  # 정책을 보내면 직접 명령(override)은 끝난 것으로 본다
+        self.touch()
+        self._set_state("policy", force=True)
+
+    def on_setpoint(self):
+        self.touch()
+        self.override_at = self.last_contact
+        self._set_state("override")
+
+    # ---- 상태 ----
+    def current_state(self, now: Optional[float] = None) -> str:
+        now = self.clock() if now is None else now
+        if self.last_contact is None or now - self.last_contact > self.lease:
+            return "safe"
+        if self.override_at is not None and now - self.override_at <= self.lease:
+            return "override"
+        return "policy" if self.policy is not None else "safe"
+
+    def _set_state(self, state: str, force: bool = False):
+        if state == self.state and not force:
+            return
+        fields = dict(self.baseline, **self.policy) if state == "policy" else self.baseline
+        for k, v in fields.items():
+            setattr(self.ctl, k, v)
+        if state != self.state:
+            print(f"[로컬 제어] 팬 {self.agent.fan}: {self.state} -> {state}")
+        self.state = state
+
+    # ---- 루프 ----
+    def tick(self, now_ms: Optional[int] = None) -> Optional[int]:
+        """한 주기: 로컬로 정한 PWM 을 에이전트에 넣고 돌려준다 (override 중이면 None)"""
+        self._set_state(self.current_state())
+        if self.state == "override":
+            # 서버 값을 따르는 동안 슬루 기준을 맞춰 두어, 로컬로 돌아올 때 현재 값에서 이어서 움직인다
+            self.ctl.last_pwm = int(round(self.agent.current))
+            self.ctl.last_ts_ms = 0 if now_ms is None else int(now_ms)
+            self.last_pwm = None
+            return None
+        try:
+            cpu, gpu, model = self.source.read()
+            prev_pwm, prev_ts = self.ctl.last_pwm, self.ctl.last_ts_ms
+            pwm = self.ctl.step(cpu, gpu, model, now_ms)
+            if pwm != self.ctl.last_target and prev_ts and self.ctl.slew_per_sec > 0:
+                # 짧은 주기에서는 slew_per_sec * dt 가 1% 단위로 반올림되므로(25%/s, 10 ms -> 0), 실제로 움직인 만큼만
+                # 시간 기준을 옮겨 남은 시간을 다음 주기로 넘긴다
+                used_ms = abs(pwm - prev_pwm) * 1000 / self.ctl.slew_per_sec
+                self.ctl.last_ts_ms = prev_ts + int(round(used_ms))
+            if self.state == "safe":
+                pwm = max(pwm, SAFE_MIN_PWM)
+        except (OSError, ValueError, KeyError) as e:
+            self.sensor_errors += 1
+            if self.sensor_errors == 1 or self.sensor_errors % 100 == 0:
+                print(f"[로컬 제어] 센서 읽기 실패 ({self.sensor_errors}회): {e} -> {SAFE_PWM}%")
+            pwm = SAFE_PWM
+        self.steps += 1
+        if pwm != self.last_pwm:
+            self.agent.submit_local(pwm)
+            self.last_pwm = pwm
+        return pwm
+
+    async def run(self):
+        sched = FixedRateScheduler(self.period)
+        while True:
+            tick = await sched.next()
+            self.tick(tick.wall_ms)
@@ -0,0 +1,192 @@
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Tuple
+
+# =========================
+# 제어 루프 계측 (Prometheus 텍스트 형식) 및 구조화 로그
+# =========================
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+LOG_INTERVAL = float(os.getenv("LOG_INTERVAL", "10"))  # 같은 종류의 로그는 이 간격(초)에 한 번만 출력
+
+# 초 단위 버킷: 1ms 미만의 step 부터 수 초짜리 Influx 시간 초과까지
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """고정 버킷 누적 히스토그램 (observe 는 O(log 버킷 수))"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 마지막 칸은 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """버킷 상한으로 근사한 분위수"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class Registry:
+    def __init__(self):
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._hist: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._collectors = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def observe(self, name: str, value: float, **labels):
+        series = self._hist.setdefault(name, {})
+        key = _label_key(labels)
+        h = series.get(key)
+        if h is None:
+            h = series[key] = Histogram()
+        h.observe(value)
+
+    def inc(self, name: str, n: float = 1, **labels):
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + n
+
+    def add_collector(self, fn: Callable[[], Iterable[Tuple[str, dict, float]]]):
+        """render/snapshot 시점에 값을 읽어 오는 카운터/게이지 (예: Pi 재연결 횟수)"""
+        self._collectors.append(fn)
+
+    def _collected(self):
+        out: Dict[str, Dict[LabelKey, float]] = {}
+        for fn in self._collectors:
+            for name, labels, value in fn():
+                series = out.setdefault(name, {})
+                key = _label_key(labels)
+                series[key] = series.get(key, 0) + value
+        return out
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines = []
+        counters = dict(self._counters)
+        counters.update(self._collected())
+        for name, series in sorted(counters.items()):
+            kind, help_text = self._help.get(name, ("counter", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, v in sorted(series.items()):
+                lines.append(f"{name}{_fmt_labels(key)} {v:g}")
+        for name, series in sorted(self._hist.items()):
+            _, help_text = self._help.get(name, ("histogram", ""))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, h in sorted(series.items()):
+                acc = 0
+                for le, c in zip(h.buckets, h.counts):
+                    acc += c
+                    bucket_labels = _fmt_labels(key, 'le="%g"' % le)
+                    lines.append(f"{name}_bucket{bucket_labels} {acc}")
+                inf_labels = _fmt_labels(key, 'le="+Inf"')
+                lines.append(f"{name}_bucket{inf_labels} {h.count}")
+                lines.append(f"{name}_sum{_fmt_labels(key)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """웹소켓 {"stats": true} 응답용 요약 (히스토그램은 ms 단위 분위수)"""
+        out = {}
+        counters = dict(self._counters)
+        counters.update(self._collected())
+        for name, series in counters.items():
+            for key, v in series.items():
+                out[name + _fmt_labels(key)] = v
+        for name, series in self._hist.items():
+            for key, h in series.items():
+                q = {f"p{int(p * 100)}_ms": h.quantile(p) * 1000 for p in (0.5, 0.95, 0.99)}
+                out[name + _fmt_labels(key)] = dict(
+                    count=h.count,
+                    mean_ms=round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                    # 가장 큰 버킷을 넘는 값은 JSON 에 Infinity 를 쓰지 않도록 None 으로
+                    **{k: (None if v == float("inf") else v) for k, v in q.items()},
+                )
+        return out
+
+
+async def _handle_http(registry: Registry, reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()).strip():
+            pass  # 헤더는 사용하지 않음
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            body = registry.render().encode()
+            status = "200 OK"
+        else:
+            body, status = b"not found\n", "404 Not Found"
+        writer.write(f"HTTP/1.1 {status}\r\n"
+                     "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(registry: Registry, host: str = "0.0.0.0", port: int = METRICS_PORT):
+    """GET /metrics 만 처리하는 최소 HTTP 서버"""
+    return await asyncio.start_server(lambda r, w: _handle_http(registry, r, w), host, port)
+
+
+class RateLimitedLog:
+    """
+    이벤트 종류(event)별로 interval 초에 한 번만 logfmt 형식으로 기록한다.
+    그 사이에 생략된 횟수는 다음 기록의 suppressed 필드로 남긴다.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = LOG_INTERVAL):
+        self.logger = logger
+        self.interval = interval
+        self._last: Dict[str, float] = {}
+        self._suppressed: Dict[str, int] = {}
+
+    def log(self, event: str, level: int = logging.INFO, **fields):
+        now = time.monotonic()
+        last = self._last.get(event)
+        if last is not None and now - last < self.interval:
+            self._suppressed[event] = self._suppressed.get(event, 0) + 1
+            return
+        self._last[event] = now
+        suppressed = self._suppressed.pop(event, 0)
+        if suppressed:
+            fields["suppressed"] = suppressed
+        if self.logger.isEnabledFor(level):
+            kv = " ".join(f"{k}={v}" for k, v in fields.items())
+            self.logger.log(level, f"event={event} {kv}".rstrip())
@@ -1,13 +1,21 @@
-import socket
+import os
+import math
+import asyncio
 import threading
 import json
 import time
+import gzip
+import functools
+import itertools
+import shutil
+from collections import deque
 import requests
+import wire
 
 # --- 설정 (사용자 환경에 맞게 수정) ---
 
 # InfluxDB 2.x 기준
-INFLUXDB_URL="http://localhost:8086/api/v2/write?org=ORG&bucket=BUCKET&precision=s"
+INFLUXDB_URL="http://localhost:8086/api/v2/write?org=ORG&bucket=BUCKET&precision=ms"
 INFLUXDB_TOKEN = "TOKEN" 
 
 headers = {
@@ -18,17 +26,44 @@ headers = {
 # 데이터 식별을 위한 태그 (Tag) 설정
 DEVICE_ID = "raspberrypi-fan-01"
 
+# 상태 보고 설정: REPORT_INTERVAL 초마다 점 하나를 버퍼에 쌓고,
+# BATCH_MAX_POINTS 개가 모이거나 가장 오래된 점이 BATCH_MAX_AGE 초를 넘으면 gzip 으로 한 번에 전송
+REPORT_INTERVAL = 3
+BATCH_MAX_POINTS = int(os.getenv("FAN_BATCH_MAX_POINTS", "10"))
+BATCH_MAX_AGE = float(os.getenv("FAN_BATCH_MAX_AGE", "30"))
+RING_SIZE = 1000  # 메모리 버퍼 최대 점 수 (넘치면 오래된 점부터 스풀 파일로)
+# InfluxDB 에 닿지 않는 동안 점을 보관하는 스풀 파일 (복구되면 순서대로 재전송)
+SPOOL_PATH = os.getenv("FAN_SPOOL_PATH", "/var/tmp/fan_status.spool")
+SPOOL_MAX_BYTES = 10 * 1024 * 1024
+BACKFILL_CHUNK = 5000  # 스풀 재전송 시 요청 하나에 담을 최대 줄 수
+
+# 명령 추적: 서버가 명령마다 붙인 (seq, 보낸 시각 ms) 를 받아, 적용하면 fan_apply 점으로 남기고
+# fan_status 점에는 마지막으로 적용한 명령을 싣는다 (cmdtrace.py 가 서버의 fan_command 와 맞춰 본다)
+TRACE_EVENTS = int(os.getenv("PI_TRACE_EVENTS", "1000"))  # 보고 전까지 보관할 적용 기록 수 (넘치면 오래된 것부터)
+
 # 제어 서버로부터 명령을 수신할 포트 [VPN]
 CONTROL_SERVER_HOST = '0.0.0.0' 
-CONTROL_SERVER_PORT = 6000 
+CONTROL_SERVER_PORT = int(os.getenv("PI_CONTROL_PORT", "6000"))
+MAX_CONNECTIONS = int(os.getenv("PI_MAX_CONNECTIONS", "4"))  # 동시에 받을 제어 연결 수 상한
+# 로컬 제어: 서버 정책(wire v2 POLICY)으로 Pi 가 자기 센서 값으로 FanController 를 돌린다 (local_control.py)
+LOCAL_CONTROL = os.getenv("PI_LOCAL_CONTROL", "0") == "1"
+# GPIO 쓰기 최소 간격(초) = ramp 시간 단위. 그 사이 들어온 명령은 마지막 값만 반영 (latest-wins)
+GPIO_WRITE_INTERVAL = float(os.getenv("PI_GPIO_WRITE_INTERVAL", "0.02"))
 
 # PI 기본 설정(21번핀, 25kHz)
 pi= None
-FAN_PIN = 21  # 임의의 GPIO PIN
+# 팬 PIN 목록: 이진 프로토콜의 fan 번호 0, 1, ... 에 순서대로 대응 (JSON 명령은 항상 0번)
+FAN_PINS = tuple(int(p) for p in os.getenv("PI_FAN_PINS", "21").split(","))
+FAN_PIN = FAN_PINS[0]  # 임의의 GPIO PIN
 PWM_FREQUENCY = 25000 # 25kHz
+# duty 분해능: 0~100% 를 0~PWM_RANGE 로 매핑 (기존 255 단계 -> set_PWM_range 로 확장)
+# 하드웨어 PWM 핀(12, 13, 18, 19)이면 hardware_PWM(0~1,000,000)으로 쓴다
+PWM_RANGE = int(os.getenv("PI_PWM_RANGE", "1000"))
+HARDWARE_PWM_PINS = (12, 13, 18, 19)
 
 # --- 시뮬레이션 모드 설정 ---.
-SIMULATION_MODE = False
+# 하드웨어 없이(일반 Linux 에서) 부하 시험을 할 때는 PI_SIMULATION=1
+SIMULATION_MODE = os.getenv("PI_SIMULATION", "0") == "1"
 
 if not SIMULATION_MODE:
     try:
@@ -37,146 +72,544 @@ if not SIMULATION_MODE:
         print("[오류] pigpio 라이브러리를 찾을 수 없습니다. 시뮬레이션 모드로 전환합니다.")
         SIMULATION_MODE = True
 
-# --- 전역 변수 및 동기화 ---
+# --- 전역 변수 ---
 
-# 현재 PWM 값을 저장할 변수 (여러 스레드에서 접근)
-# 초기값은 0 (팬 정지)
+# 현재 팬 PWM 값 (0~100, 상태 보고용). 초기값은 0 (팬 정지)
+# 이벤트 루프 하나에서만 바뀌므로 Lock 이 필요 없다.
 current_pwm_value = 0
 
-# 스레드 간의 안전한 데이터 공유를 위한 Lock
-lock = threading.Lock()
-
 # --- 코드 본문 ---
 
+class FakeGPIO:
+    """SIMULATION_MODE 용 pigpio.pi 대역. duty 쓰기를 모두 (monotonic 시각, 핀, duty) 로 기록한다."""
+    OUTPUT = 1
+
+    def __init__(self, maxlen=None):
+        self.connected = True
+        self.writes = deque(maxlen=maxlen)
+        self.ranges = {}
+
+    def set_mode(self, gpio, mode):
+        pass
+
+    def set_PWM_frequency(self, gpio, frequency):
+        return frequency
+
+    def set_PWM_range(self, gpio, range_):
+        self.ranges[gpio] = range_
+        return range_
+
+    def get_PWM_real_range(self, gpio):
+        return self.ranges.get(gpio, 255)
+
+    def set_PWM_dutycycle(self, gpio, duty):
+        self.writes.append((time.monotonic(), gpio, duty))
+
+    def hardware_PWM(self, gpio, frequency, duty):
+        self.writes.append((time.monotonic(), gpio, duty))
+
+    def stop(self):
+        self.connected = False
+
 def setup_gpio():
     global pi
 
-    pi=pigpio.pi()
+    if SIMULATION_MODE:
+        pi = FakeGPIO(maxlen=100_000)
+        output = FakeGPIO.OUTPUT
+    else:
+        pi = pigpio.pi()
+        output = pigpio.OUTPUT
     if not pi.connected:
         print("[INFO] sudo systemctl start pigpiod.")
-    pi.set_mode(FAN_PIN, pigpio.OUTPUT)
-    pi.set_PWM_frequency(FAN_PIN, PWM_FREQUENCY)
-    pi.set_PWM_dutycycle(FAN_PIN, 0)
+    for pin in FAN_PINS:
+        pi.set_mode(pin, output)
+        pi.set_PWM_frequency(pin, PWM_FREQUENCY)
+        pi.set_PWM_range(pin, PWM_RANGE)
+        pi.set_PWM_dutycycle(pin, 0)
 
-    print(f"[GPIO] 핀 {FAN_PIN}을 PWM 모드로 설정했습니다.")
+        print(f"[GPIO] 핀 {pin}을 PWM 모드로 설정했습니다. "
+              f"(range {PWM_RANGE}, 실제 분해능 {pi.get_PWM_real_range(pin)})")
     return pi
 
-def set_fan_speed(pwm_value, fan_controller):
-    global current_pwm_value, pi # 전역변수 사용
-    
-    pwm_value = max(0, min(100, pwm_value)) # 0~100
+def set_fan_duty(level, pin=FAN_PIN):
+    """GPIO 에 실제로 쓰는 유일한 곳 (FanAgent 의 writer 에서만 호출). level: 0~PWM_RANGE"""
+    if pi is None:
+        return
+    try:
+        if pin in HARDWARE_PWM_PINS:
+            pi.hardware_PWM(pin, PWM_FREQUENCY, level * 1_000_000 // PWM_RANGE)
+        else:
+            pi.set_PWM_dutycycle(pin, level)
+    except Exception as e:
+        print(f"[제어] PWM 설정 중 오류: {e}")
 
-    with lock:
-        current_pwm_value = pwm_value
-    
-    if not SIMULATION_MODE and pi is not None:
-        duty_255 = int(255 * pwm_value / 100)  # 0~100 -> 0~255 매핑
-        try:
-            pi.set_PWM_dutycycle(FAN_PIN, duty_255)
-        except Exception as e:
-            print(f"[제어] PWM 설정 중 오류: {e}")
-    
-    print(f"[제어] 팬 PWM이 {current_pwm_value}%로 설정되었습니다.")
-
-# 제어서버로 부터 pwm 제어신호 수신
-def handle_control_client(conn, addr, fan_controller):
-    print(f"[제어 서버] 연결됨: {addr}")
+def _number(v):
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+
+def _trace_of(data):
+    """명령의 추적 키 (seq, 서버가 보낸 시각 ms). 둘 중 하나라도 없으면(예전 서버) None"""
+    seq, ts = data.get("seq"), data.get("ts")
+    if isinstance(seq, int) and isinstance(ts, int) and not isinstance(seq, bool) and not isinstance(ts, bool):
+        return seq, ts
+    return None
+
+def parse_traced_command(line):
+    """parse_command 와 같고 추적 키를 덧붙인다: (목표, 변화율, (seq, ts) 또는 None)"""
     try:
-        with conn, conn.makefile('r') as rf:
-            for line in rf:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    if "target" in data:
+        target, ramp = data.get("target"), data.get("ramp")
+        if _number(target) and (ramp is None or _number(ramp)):
+            return target, (float(ramp) if ramp else None), _trace_of(data)
+        return None
+    new_pwm = data.get('pwm')
+    if isinstance(new_pwm, int) and not isinstance(new_pwm, bool):
+        return new_pwm, None, _trace_of(data)
+    return None
+
+def parse_policy(line):
+    """{"policy": {...}} 줄이면 정책 dict, 아니면 None"""
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    policy = data.get("policy") if isinstance(data, dict) else None
+    return policy if isinstance(policy, dict) else None
+
+def parse_command(line):
+    """
+    (목표 PWM, 변화율 %/s 또는 None) 으로 변환. 잘못된 줄이면 None
+      {"pwm": 55, "seq": 12, "ts": 1700000000000}                 -> (55, None)   즉시 설정 (기존 형식)
+      {"target": 55, "ramp": 25, "seq": 12, "ts": 1700000000000}  -> (55, 25.0)   Pi 에서 초당 25% 씩 ramp
+    """
+    cmd = parse_traced_command(line)
+    return cmd[:2] if cmd is not None else None
+
+class FanAgent:
+    """
+    스레드 하나(이벤트 루프)에서 제어 연결과 GPIO 쓰기를 모두 처리한다.
+    - 수신한 명령은 목표값 슬롯 하나에 덮어쓰고(latest-wins), writer 가 write_interval 마다 최대 한 번 GPIO 에 쓴다
+    - 변화율(ramp)이 있으면 write_interval 단위로 목표값까지 잘게 나눠 이동한다 (pwm_range 분해능)
+    - 마지막으로 쓴 duty 와 같으면 쓰지 않는다
+    - 동시 연결은 max_connections 개까지만 받는다
+    - 연결 첫 줄이 wire hello 면 이진 프레임으로 전환하고, 프레임마다 seq 를 돌려주는 ACK 를 보낸다
+    - 팬이 여러 개면 채널(fan 번호)마다 FanAgent 하나가 ramp/쓰기를 맡고, 연결은 0번 에이전트가 받는다
+    - 추적 키가 있는 명령은 writer 가 처음 반영한 시각(적용) 또는 적용 전에 덮어쓰인 사실을 events 에 남긴다
+    - 로컬 제어를 붙이면(attach_local) wire v2 를 골라 정책을 받고, 서버 목표값은 로컬 루프를 잠시 덮어쓴다
+    """
+
+    def __init__(self, write=set_fan_duty, write_interval=GPIO_WRITE_INTERVAL,
+                 max_connections=MAX_CONNECTIONS, pwm_range=PWM_RANGE, fan=0):
+        self.fan = fan
+        self.channels = {fan: self}  # fan 번호 -> 해당 팬의 FanAgent
+        self.write = write
+        self.write_interval = write_interval
+        self.max_connections = max_connections
+        self.pwm_range = pwm_range
+        self.target = None      # 최신 목표 PWM (%)
+        self.ramp = None        # 변화율 (%/s), None 이면 즉시
+        self.current = 0.0      # ramp 중인 현재 PWM (%)
+        self.applied = None     # 마지막으로 GPIO 에 쓴 duty (0~pwm_range)
+        self.connections = 0
+        self.received = 0       # 수신한 올바른 명령 수
+        self.invalid = 0
+        self.acks = 0           # 보낸 ACK 수 (이진 모드)
+        self.writes = 0         # 실제 GPIO 쓰기 수
+        self.rejected = 0       # 연결 수 상한으로 거절한 연결 수
+        self.trace = None       # 아직 적용하지 않은 명령: (seq, 보낸 시각 ms, 받은 시각 ms, 목표 %)
+        self.last_trace = None  # 마지막으로 적용한 명령: (seq, 보낸 시각 ms) -> fan_status 에 싣는다
+        # 적용/덮어쓴 명령 기록: (fan, seq, 보낸 시각, 받은 시각, 적용 시각 또는 None(덮어씀), 목표 %)
+        self.events = deque(maxlen=TRACE_EVENTS)
+        self.local = None       # LocalControl (로컬 제어를 켰을 때)
+        self.versions = (1,)    # 협상에서 고를 수 있는 wire 버전 (로컬 제어가 있으면 POLICY 가 있는 2 까지)
+        self._wake = asyncio.Event()
+
+    def attach_local(self, make):
+        """채널마다 make(채널) 로 만든 로컬 제어 루프를 붙인다"""
+        for ch in self.channels.values():
+            ch.local = make(ch)
+        self.versions = wire.SUPPORTED_VERSIONS
+
+    def submit(self, target, ramp=None, trace=None):
+        target = max(0.0, min(100.0, float(target)))
+        ramp = ramp if ramp is not None and ramp > 0 else None
+        if (target, ramp) != (self.target, self.ramp):
+            print(f"[제어] 목표 PWM {target:g}%" + (f" (ramp {ramp:g}%/s)" if ramp else ""))
+        if self.trace is not None:  # writer 가 반영하기 전에 새 명령이 덮어씀 (latest-wins)
+            self.events.append((self.fan, *self.trace[:3], None, self.trace[3]))
+        self.trace = (trace[0], trace[1], wire.now_ms(), target) if trace is not None else None
+        self.target, self.ramp = target, ramp
+        self.received += 1
+        self._wake.set()
+
+    def submit_local(self, target):
+        """로컬 제어 루프가 정한 값 (서버 명령이 아니므로 수신 수/추적에 넣지 않음)"""
+        self.target, self.ramp = max(0.0, min(100.0, float(target))), None
+        self._wake.set()
+
+    def _settle(self):
+        """대기 중인 추적 명령을 지금 적용한 것으로 기록"""
+        if self.trace is not None:
+            seq, cmd_ms, recv_ms, target = self.trace
+            self.events.append((self.fan, seq, cmd_ms, recv_ms, wire.now_ms(), target))
+            self.last_trace = (seq, cmd_ms)
+            self.trace = None
+
+    def take_events(self):
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+    def _advance(self, dt):
+        """current 를 target 쪽으로 ramp * dt 만큼 옮긴다 (ramp 가 없으면 바로 목표값)"""
+        delta = self.target - self.current
+        if self.ramp is None or abs(delta) <= self.ramp * dt:
+            self.current = self.target
+        else:
+            self.current += math.copysign(self.ramp * dt, delta)
+
+    def _apply(self):
+        global current_pwm_value
+        if self.fan == 0:  # 상태 보고는 0번 팬 기준
+            current_pwm_value = int(round(self.current))
+        level = int(round(self.current * self.pwm_range / 100))
+        if level != self.applied:
+            self.write(level)
+            self.applied = level
+            self.writes += 1
+
+    async def run_writer(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            last = loop.time() - self.write_interval
+            while self.target is not None and (self.current != self.target or self.applied is None):
+                now = loop.time()
+                self._advance(now - last)  # 실제 경과 시간 기준 (루프가 밀려도 변화율 유지)
+                last = now
+                self._apply()
+                self._settle()
+                # 간격 동안 들어온 명령은 슬롯에 덮어써지고, 다음 단계는 마지막 목표를 향한다
+                await asyncio.sleep(self.write_interval)
+            self._settle()  # 이미 목표값이라 쓸 것이 없던 명령 (keepalive 재전송 등)
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            print(f"[제어 서버] 연결 수 상한({self.max_connections}) 초과, 거절: {addr}")
+            writer.close()
+            return
+        self.connections += 1
+        print(f"[제어 서버] 연결됨: {addr}")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
                 line = line.strip()
                 if not line:
                     continue
-                
-                try:
-                    # JSON 데이터 파싱
-                    data = json.loads(line)
-                    new_pwm = data.get('pwm')
-                    
-                    if new_pwm is not None and isinstance(new_pwm, int):
-                        set_fan_speed(new_pwm, fan_controller)
-                    else:
-                        print(f"[제어 서버] 잘못된 데이터 수신: {line}")
-                        
-                except json.JSONDecodeError:
-                    print(f"[제어 서버] JSON 파싱 실패: {line}")
-    except Exception as e:
-        print(f"[제어 서버] 클라이언트 처리 중 오류: {e}")
-    finally:
-        print(f"[제어 서버] 연결 종료: {addr}")
-
-# DB 서버 대기 후 전송
-def start_control_server(fan_controller):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-        server_socket.bind((CONTROL_SERVER_HOST, CONTROL_SERVER_PORT))
-        server_socket.listen()
-        print(f"[제어 서버] {CONTROL_SERVER_HOST}:{CONTROL_SERVER_PORT}에서 제어 명령 대기 중...")
-        
+                offered = wire.parse_hello(line)
+                if offered is not None:
+                    version = wire.choose(offered, self.versions)
+                    writer.write(wire.hello_reply(version))
+                    await writer.drain()
+                    if version:
+                        print(f"[제어 서버] 이진 프로토콜 v{version}: {addr}")
+                        await self._serve_frames(reader, writer)
+                        break
+                    continue
+                if self.local is not None:
+                    policy = parse_policy(line)
+                    if policy is not None:
+                        try:
+                            self.local.on_policy(policy)
+                        except ValueError as e:
+                            self.invalid += 1
+                            print(f"[제어 서버] 정책 처리 실패: {e}")
+                        continue
+                cmd = parse_traced_command(line)
+                if cmd is None:
+                    self.invalid += 1
+                    print(f"[제어 서버] 잘못된 데이터 수신: {line[:80]!r}")
+                    continue
+                if self.local is not None:
+                    self.local.on_setpoint()
+                self.submit(*cmd)
+        except (ConnectionError, ValueError) as e:
+            print(f"[제어 서버] 클라이언트 처리 중 오류: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+            print(f"[제어 서버] 연결 종료: {addr}")
+
+    def _handle_frame(self, frame, payload=b""):
+        """프레임 하나를 처리하고 돌려줄 ACK 를 만든다"""
+        if frame.kind not in (wire.SETPOINT, wire.PING, wire.POLICY):
+            self.invalid += 1
+            return wire.pack_ack(frame, wire.ACK_BAD_FRAME)
+        channel = self.channels.get(frame.fan)
+        if channel is None:
+            self.invalid += 1
+            return wire.pack_ack(frame, wire.ACK_UNKNOWN_FAN)
+        local = channel.local
+        if frame.kind == wire.POLICY:
+            try:
+                local.on_policy(json.loads(payload))
+            except (AttributeError, ValueError) as e:  # 로컬 제어 없음 / 잘못된 본문
+                self.invalid += 1
+                print(f"[제어 서버] 정책 처리 실패: {e}")
+                return wire.pack_ack(frame, wire.ACK_BAD_FRAME, applied=channel.current)
+        elif frame.kind == wire.SETPOINT:
+            if local is not None:
+                local.on_setpoint()
+            channel.submit(frame.target_pct, frame.ramp_pct, (frame.seq, frame.ts_ms))
+        elif local is not None:
+            local.touch()
+        return wire.pack_ack(frame, applied=channel.current)
+
+    async def _serve_frames(self, reader, writer):
+        """이진 프레임 수신: 읽은 묶음 안의 프레임을 모두 처리하고 ACK 는 한 번에 쓴다"""
+        buf = b""
         while True:
-            conn, addr = server_socket.accept()
-            # 각 연결을 별도의 스레드로 처리
-            threading.Thread(target=handle_control_client, args=(conn, addr, fan_controller), daemon=True).start()
+            data = await reader.read(64 * 1024)
+            if not data:
+                return
+            frames, buf = wire.split_messages(buf + data)
+            acks = [self._handle_frame(f, payload) for f, payload in frames]
+            if acks:
+                writer.write(b"".join(acks))
+                self.acks += len(acks)
+                await writer.drain()
 
-def report_to_influxdb():
-    """1초마다 현재 PWM 값을 InfluxDB로 전송하는 함수"""
-    while True:
-        with lock:
-            pwm_to_report = current_pwm_value
-        
-        # InfluxDB Line Protocol 페이로드 생성
-        payload = f"fan_status,device={DEVICE_ID} pwm_duty_cycle={pwm_to_report}"
-        
+    async def serve(self, host=CONTROL_SERVER_HOST, port=CONTROL_SERVER_PORT):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        print(f"[제어 서버] {host}:{port}에서 제어 명령 대기 중...")
+        return server
+
+class InfluxReporter:
+    """
+    타임스탬프가 붙은 Line Protocol 점을 메모리 링 버퍼에 모았다가 일괄 전송한다.
+    - HTTP 연결은 requests.Session 으로 재사용하고, 본문은 gzip 으로 압축
+    - 전송에 실패하면 버퍼 내용을 스풀 파일에 덧붙이고, DB 가 복구되면
+      스풀 -> 메모리 버퍼 순서로 재전송하여 시간 순서를 유지한다
+    """
+
+    def __init__(self, url=INFLUXDB_URL, spool_path=SPOOL_PATH,
+                 max_points=BATCH_MAX_POINTS, max_age=BATCH_MAX_AGE, ring_size=RING_SIZE):
+        self.url = url
+        self.spool_path = spool_path
+        self.max_points = max_points
+        self.max_age = max_age
+        self.ring = deque()
+        self.ring_size = ring_size
+        self.oldest_at = None  # 버퍼에서 가장 오래된 점이 들어온 시각 (monotonic)
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.headers["Content-Encoding"] = "gzip"
+        self._lock = threading.Lock()  # 보고 스레드와 종료 처리(close) 사이 보호
+
+    def add(self, line):
+        if not self.ring:
+            self.oldest_at = time.monotonic()
+        self.ring.append(line)
+        if len(self.ring) >= self.ring_size:
+            # 메모리 한도 초과: 오래된 절반을 스풀로 옮겨 유실 없이 메모리를 제한
+            self._spool([self.ring.popleft() for _ in range(self.ring_size // 2)])
+
+    def due(self):
+        if not self.ring:
+            return False
+        return len(self.ring) >= self.max_points or time.monotonic() - self.oldest_at >= self.max_age
+
+    def _post(self, lines):
+        body = gzip.compress("\n".join(lines).encode("utf-8"))
+        response = self.session.post(self.url, data=body, timeout=3)
+        if response.status_code != 204:
+            raise requests.exceptions.RequestException(
+                f"HTTP {response.status_code}: {response.text}")
+
+    def _spool(self, lines):
+        if not lines:
+            return
         try:
-            response = requests.post(
-                INFLUXDB_URL, 
-                headers=headers, 
-                data=payload.encode('utf-8'), 
-                timeout=3 # 3초간 기다림
-            )
-            
-            if response.status_code != 204:
-                print(f"[DB 전송] 실패 (HTTP {response.status_code}): {response.text}")
-            else:
-                print(f"[DB 전송] 성공: PWM={pwm_to_report}%") # 성공 로그
-                pass
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            if os.path.getsize(self.spool_path) > SPOOL_MAX_BYTES:
+                self._trim_spool()
+        except OSError as e:
+            print(f"[DB 전송] 스풀 기록 실패, {len(lines)}개 유실: {e}")
+
+    def _trim_spool(self):
+        """
+        스풀 파일이 한도를 넘으면 앞쪽(가장 오래된) 1/4 바이트만큼의 줄을 버린다.
+        버릴 줄은 읽어 넘기고 나머지는 임시 파일로 복사해 바꿔치기 (파일을 통째로 메모리에 올리지 않음).
+        """
+        drop_bytes = os.path.getsize(self.spool_path) // 4
+        dropped = skipped = 0
+        tmp = self.spool_path + ".tmp"
+        with open(self.spool_path, "rb") as src:
+            while skipped < drop_bytes:
+                line = src.readline()
+                if not line:
+                    break
+                skipped += len(line)
+                dropped += 1
+            with open(tmp, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        os.replace(tmp, self.spool_path)
+        print(f"[DB 전송] 스풀 용량 초과, 오래된 점 {dropped}개 삭제")
 
+    def _write_tmp(self, lines):
+        """줄들을 임시 파일에 쓰고 경로를 돌려준다 (os.replace 로 스풀과 바꿔치기)"""
+        tmp = self.spool_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line + "\n")
+        return tmp
+
+    def _backfill(self):
+        """
+        스풀 파일을 BACKFILL_CHUNK 줄씩 읽으며 순서대로 재전송. 전부 보내면 True.
+        DB 가 아직 안 되면 첫 묶음만 읽고 멈추므로, 스풀(최대 SPOOL_MAX_BYTES)을 통째로 메모리에 올리지 않는다.
+        """
+        if not os.path.exists(self.spool_path):
+            return True
+        sent, error, tmp = 0, None, None
+        with open(self.spool_path, encoding="utf-8") as f:
+            lines = (l for l in (raw.rstrip("\n") for raw in f) if l)
+            while True:
+                chunk = list(itertools.islice(lines, BACKFILL_CHUNK))
+                if not chunk:
+                    break
+                try:
+                    self._post(chunk)
+                except requests.exceptions.RequestException as e:
+                    error = e
+                    if sent:  # 보낸 앞부분만 빼고 나머지를 새 스풀로
+                        tmp = self._write_tmp(itertools.chain(chunk, lines))
+                    break
+                sent += len(chunk)
+        if error is None:
+            os.remove(self.spool_path)
+            print(f"[DB 전송] 스풀 재전송 완료: {sent}개")
+            return True
+        if tmp is not None:
+            os.replace(tmp, self.spool_path)
+        print(f"[DB 전송] 스풀 재전송 중단 ({sent}개 보냄): {error}")
+        return False
+
+    def flush(self):
+        """스풀 -> 버퍼 순으로 전송. 실패하면 버퍼 내용을 스풀로 옮긴다."""
+        lines = list(self.ring)
+        self.ring.clear()
+        try:
+            if not self._backfill():
+                raise requests.exceptions.RequestException("spool backfill pending")
+            if lines:
+                self._post(lines)
+                print(f"[DB 전송] 성공: {len(lines)}개")
+            return True
         except requests.exceptions.RequestException as e:
-            print(f"[DB 전송] 오류: {e}")
+            print(f"[DB 전송] 오류: {e} -> {len(lines)}개 스풀에 보관")
+            self._spool(lines)
+            return False
+
+    def flush_if_due(self):
+        with self._lock:
+            if self.due():
+                self.flush()
 
-        # 3초 대기
-        time.sleep(3)
+    def close(self):
+        """종료 시 남은 점을 네트워크 대신 스풀에 보관 (다음 실행 때 재전송)"""
+        with self._lock:
+            if self.ring:
+                self._spool(list(self.ring))
+                self.ring.clear()
+            self.session.close()
+
+def status_line(pwm, trace=None, now_ms=None):
+    """fan_status 점. trace 가 있으면 마지막으로 적용한 명령의 seq/보낸 시각과 보고 시각을 싣는다"""
+    now_ms = wire.now_ms() if now_ms is None else now_ms
+    fields = f"pwm_duty_cycle={pwm}"
+    if trace is not None:
+        fields += f",seq={trace[0]}i,cmd_ms={trace[1]}i,report_ms={now_ms}i"
+    return f"fan_status,device={DEVICE_ID} {fields} {now_ms}"
+
+def apply_line(event):
+    """fan_apply 점: 명령 하나가 적용(applied_ms)되었거나 적용 전에 덮어쓰였음(superseded)"""
+    fan, seq, cmd_ms, recv_ms, applied_ms, target = event
+    fields = f"seq={seq}i,cmd_ms={cmd_ms}i,recv_ms={recv_ms}i,target={target:g}"
+    if applied_ms is None:
+        return f"fan_apply,device={DEVICE_ID},fan={fan} {fields},superseded=true {recv_ms}"
+    return f"fan_apply,device={DEVICE_ID},fan={fan} {fields},applied_ms={applied_ms}i {applied_ms}"
+
+def report_once(reporter, pwm_to_report, trace=None, events=()):
+    """점들을 버퍼에 쌓고 조건이 되면 일괄 전송 (HTTP 가 있으므로 워커 스레드에서 실행)"""
+    # InfluxDB Line Protocol (precision=ms 이므로 ms 단위 타임스탬프)
+    with reporter._lock:
+        for event in events:
+            reporter.add(apply_line(event))
+        reporter.add(status_line(pwm_to_report, trace))
+    reporter.flush_if_due()
+
+async def report_to_influxdb(reporter, agent=None):
+    """REPORT_INTERVAL 초마다 현재 PWM 값(과 그동안의 명령 적용 기록)을 보고. 전송이 느려도 제어 명령 처리는 막지 않는다."""
+    while True:
+        trace, events = None, []
+        if agent is not None:
+            trace = agent.last_trace
+            for ch in agent.channels.values():
+                events.extend(ch.take_events())
+        await asyncio.to_thread(report_once, reporter, current_pwm_value, trace, events)
+        await asyncio.sleep(REPORT_INTERVAL)
+
+async def run_agent(agent, reporter):
+    server = await agent.serve()
+    tasks = [asyncio.create_task(ch.run_writer()) for ch in agent.channels.values()]
+    tasks += [asyncio.create_task(ch.local.run()) for ch in agent.channels.values() if ch.local is not None]
+    tasks.append(asyncio.create_task(report_to_influxdb(reporter, agent)))
+    print("[메인] 초기화 완료. 제어 서버 및 보고 루프 시작됨.")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        for t in tasks:
+            t.cancel()
 
 def main():
-    fan_controller = None
-    if not SIMULATION_MODE:
-        fan_controller = setup_gpio()
-
-    # 1. 제어 명령을 수신하는 서버 스레드 시작
-    control_thread = threading.Thread(target=start_control_server, args=(fan_controller,), daemon=True)
-    control_thread.start()
-    
-    # 2. InfluxDB로 상태를 보고하는 스레드 시작
-    report_thread = threading.Thread(target=report_to_influxdb, daemon=True)
-    report_thread.start()
-    
-    print("[메인] 초기화 완료. 제어 및 보고 스레드 시작됨.")
-    
-    # 메인 스레드는 스레드들이 종료되지 않도록 대기
+    setup_gpio()  # SIMULATION_MODE 이면 FakeGPIO
+
+    agent = FanAgent()
+    for fan, pin in enumerate(FAN_PINS[1:], 1):
+        agent.channels[fan] = FanAgent(write=functools.partial(set_fan_duty, pin=pin), fan=fan)
+    if LOCAL_CONTROL:
+        from local_control import LocalControl, open_source
+        source = open_source()
+        agent.attach_local(lambda ch: LocalControl(ch, source))
+        print(f"[로컬 제어] 켜짐: 센서 {type(source).__name__}, 서버 정책이 올 때까지 안전 정책")
+    reporter = InfluxReporter()
     try:
-        while True:
-            time.sleep(3600) # 메인 스레드는 할 일이 없으므로 길게 대기
+        asyncio.run(run_agent(agent, reporter))
     except KeyboardInterrupt:
         print("\n[종료] 프로그램을 종료합니다.")
     finally:
-        if not SIMULATION_MODE and fan_controller:
-            global pi
-            if not SIMULATION_MODE and pi is not None:
-                try:
-                    pi.set_PWM_dutycycle(FAN_PIN, 0)
-                except Exception:
-                    pass
-                pi.stop()
-                print("[GPIO] pigpio PWM 리소스를 정리했습니다.")
+        reporter.close()
+        if pi is not None:
+            try:
+                for pin in FAN_PINS:
+                    pi.set_PWM_dutycycle(pin, 0)
+            except Exception:
+                pass
+            pi.stop()
+            print("[GPIO] pigpio PWM 리소스를 정리했습니다.")
                 
 if __name__ == '__main__':
     main()
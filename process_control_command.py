@@ -1,108 +1,370 @@
+import os
+import time
 import asyncio
+import functools
+import logging
+import requests
 import websockets
 import json
-from FANCONTROLL_PY import FanController, read_latest_values, send_to_pi
+from FANCONTROLL_PY import (FanController, PiLink, async_read_latest_values, last_read_timings,
+                            load_controller_config, PI_EDGE_RAMP, PI_LOCAL_POLICY, controller_policy)
+from fleet import load_fleet, FLEET_SHARD_ID
+from ingest import SensorFeed, CONTROL_MIN_INTERVAL, INGEST_PORT
+from metrics import Registry, RateLimitedLog, serve_metrics, METRICS_PORT
+from broadcast import StateBroadcaster
+from history import DeviceHistory, HISTORY_MAX_POINTS
+from snapshot import open_snapshot
+from scheduler import FixedRateScheduler
+from cmdtrace import open_tracer
+from thermal_model import ThermalModel
 
-from websockets import http11
+import ws_compat  # noqa: F401  (Content-Length 헤더가 있는 웹소켓 요청 허용)
 
-class PatchedRequest(http11.Request):
-    @classmethod
-    def parse(cls, read_line):
-        """
-        websockets.http11.Request.parse 를 그대로 가져오되,
-        'Content-Length' 체크만 제거한 버전.
 
-        제너레이터 기반 코루틴이어야 해서 async def 가 아니라
-        그냥 def + yield from 을 사용한다.
-        """
-        try:
-            # 원래 코드: parse_line 호출
-            request_line = yield from http11.parse_line(read_line)
-        except EOFError as exc:
-            raise EOFError(
-                "connection closed while reading HTTP request line"
-            ) from exc
+global_ctl = FanController(**load_controller_config())  # FAN_CONTROLLER_CONFIG 가 있으면 튜닝 값 사용
+pi_link = PiLink()
+fleet = load_fleet()  # FLEET_CONFIG 가 있으면 여러 장치를 제어 (없으면 None)
+feed = SensorFeed()   # 센서 생산자가 직접 보내는(push) 최신 값
+broadcaster = StateBroadcaster()  # {"subscribe": true} 클라이언트에게 상태 변경을 push
+history = DeviceHistory()  # 센서/PWM 이력 링 버퍼 ({"history": ...} 요청에 InfluxDB 없이 응답)
+global_ctl.predictor = ThermalModel(history)  # predict 모드: 처음 쓸 때 이력으로 열 모델을 맞추고 틱마다 갱신
+snapshot = None  # main() 에서 FAN_SNAPSHOT_PATH 를 열면 틱/명령마다 컨트롤러 상태를 기록
+tracer = open_tracer()  # 보낸 명령을 fan_command 점으로 일괄 기록 (FAN_TRACE=0 이면 None)
 
-        try:
-            # method, path, HTTP/1.1
-            method, raw_path, version = request_line.split(b" ", 2)
-        except ValueError:
-            # not enough values to unpack (expected 3, got 1-2)
-            raise ValueError(
-                f"invalid HTTP request line: {http11.d(request_line)}"
-            ) from None
+BIND_HOST = os.getenv("BIND_HOST", "0.0.0.0")  # 웹소켓/metrics/ingest 를 열 주소 (샤드 워커는 127.0.0.1)
+WS_PORT = int(os.getenv("WS_PORT", "8765"))  # 샤드 워커는 shard.py 가 워커마다 다른 포트를 준다
+
+# 틱마다 print 하던 로그 대신, 종류별로 LOG_INTERVAL 초에 한 번만 남기는 구조화 로그
+log = RateLimitedLog(logging.getLogger("fan.loop"))
+
+metrics = Registry()
+metrics.describe("fan_stage_seconds", "histogram", "Control tick stage duration (influx_query, csv_parse, step, pi_send)")
+metrics.describe("fan_tick_seconds", "histogram", "Whole control tick duration")
+metrics.describe("fan_ticks_total", "counter", "Control ticks run")
+metrics.describe("fan_device_ticks_total", "counter", "Device controller steps completed (fleet)")
+metrics.describe("fan_tick_overruns_total", "counter", "Ticks that took longer than their period (schedule or push min interval)")
+metrics.describe("fan_tick_lateness_seconds", "histogram", "Tick start minus its fixed-rate scheduled time")
+metrics.describe("fan_tick_missed_total", "counter", "Scheduled ticks that did not start before the next deadline")
+metrics.describe("fan_tick_skipped_total", "counter", "Scheduled ticks dropped by the skip/catch-up policy")
+metrics.describe("fan_errors_total", "counter", "Errors by kind")
+metrics.describe("fan_pi_reconnects_total", "counter", "Pi TCP reconnects")
+metrics.describe("fan_ingest_rejected_total", "counter", "Malformed pushed sensor lines")
+metrics.describe("fan_ws_subscribers", "gauge", "Websocket clients subscribed to state updates")
+metrics.describe("fan_ws_frames_coalesced_total", "counter", "State frames merged away for slow subscribers")
+metrics.describe("fan_pi_ack_rtt_seconds", "histogram", "Command -> Pi ack round trip (binary wire protocol)")
+metrics.describe("fan_pi_bytes_sent_total", "counter", "Bytes of commands sent to Pi agents")
+metrics.describe("fan_trace_points_total", "counter", "fan_command trace points by result (written, dropped)")
+
+def _pi_links():
+    return [l for shared in fleet.links.values() for l, _ in shared] if fleet is not None else [pi_link]
+
+def _link_devices():
+    """연결 -> {fan 번호: 장치 ID} (fan_command 점의 device 태그, 단일 서버는 "default")"""
+    if fleet is None:
+        return {id(pi_link): {0: "default"}}
+    out = {}
+    for d in fleet.devices.values():
+        out.setdefault(id(d.link), {})[d.fan] = d.device_id
+    return out
 
-        if method != b"GET":
-            raise ValueError(
-                f"unsupported HTTP method: {http11.d(method)}"
-            )
-        if version != b"HTTP/1.1":
-            raise ValueError(
-                f"unsupported HTTP version: {http11.d(version)}"
-            )
+def _watch_links():
+    devices = _link_devices()
+    for link in _pi_links():
+        link.on_ack = functools.partial(metrics.observe, "fan_pi_ack_rtt_seconds", host=link.host)
+        if tracer is not None:
+            link.on_send = tracer.sender(devices.get(id(link), {}))
 
-        # 경로 디코딩
-        path = raw_path.decode("ascii", "surrogateescape")
+_watch_links()
 
-        # 헤더 파싱
-        headers = yield from http11.parse_headers(read_line)
+def _collect_counters():
+    links = _pi_links()
+    yield "fan_pi_reconnects_total", {}, sum(l.reconnects for l in links)
+    yield "fan_pi_bytes_sent_total", {}, sum(l.bytes_sent for l in links)
+    yield "fan_ingest_rejected_total", {}, feed.errors
+    yield "fan_ws_subscribers", {}, len(broadcaster.subscribers)
+    yield "fan_ws_frames_coalesced_total", {}, broadcaster.dropped()
+    if tracer is not None:
+        yield "fan_trace_points_total", {"result": "written"}, tracer.written
+        yield "fan_trace_points_total", {"result": "dropped"}, tracer.dropped
 
-        # 여기까지가 http11.Request.parse 원본과 동일
-        # ---------------------------------------------------
-        # 아래 두 줄 중 'Content-Length' 체크만 제거한 상태
+metrics.add_collector(_collect_counters)
 
-        if "Transfer-Encoding" in headers:
-            raise NotImplementedError("transfer codings aren't supported")
+def record_tick(timings, total, path, budget):
+    """budget: 틱 하나에 허용되는 시간(초) = 그 틱을 돌리는 스케줄러의 주기 (push 는 step 최소 간격)"""
+    for stage, sec in timings.items():
+        metrics.observe("fan_stage_seconds", sec, stage=stage)
+    metrics.observe("fan_tick_seconds", total, path=path)
+    metrics.inc("fan_ticks_total", path=path)
+    if total > budget:
+        metrics.inc("fan_tick_overruns_total", path=path)
+        log.log("tick_overrun", logging.WARNING, path=path, seconds=f"{total:.3f}", budget=f"{budget:g}")
 
-        # 원래 있던 코드:
-        # if "Content-Length" in headers:
-        #     raise ValueError("unsupported request body")
+def record_schedule(tick, path):
+    """스케줄러 틱의 시작 지연과 놓친/건너뛴 예정 시각"""
+    metrics.observe("fan_tick_lateness_seconds", tick.lateness, path=path)
+    if tick.missed:
+        metrics.inc("fan_tick_missed_total", tick.missed, path=path)
+        log.log("tick_missed", logging.WARNING, path=path, missed=tick.missed, skipped=tick.skipped,
+                late=f"{tick.lateness:.3f}")
+    if tick.skipped:
+        metrics.inc("fan_tick_skipped_total", tick.skipped, path=path)
 
-        # 이제는 Content-Length 헤더가 있어도 그대로 통과시킨다.
-        return cls(path, headers)
+def record_error(kind, e, n=1):
+    metrics.inc("fan_errors_total", n, kind=kind)
+    log.log(f"error.{kind}", logging.WARNING, error=repr(e))
+
+def controller_state(ctl):
+    """구독자에게 방송하는 컨트롤러 상태 (설정값 + 마지막 PWM)"""
+    return {"mode": ctl.mode, "pwm": ctl.last_pwm, "manual_pwm": ctl.manual_target,
+            "cpu_threshold": ctl.cpu_thresh, "gpu_threshold": ctl.gpu_thresh}
+
+def controllers():
+    """스냅샷 키 -> 컨트롤러 (단일 서버는 "default", 플릿은 장치 ID)"""
+    if fleet is not None:
+        return {d.device_id: d.ctl for d in fleet.devices.values()}
+    return {"default": global_ctl}
+
+def save_state():
+    if snapshot is not None:
+        snapshot.save(controllers())
+
+async def resume_from_snapshot():
+    """
+    저장된 상태(마지막 PWM, 웹에서 바꾼 모드/임계값)를 복원하고, 첫 센서 조회를 기다리지 않고
+    마지막 명령을 바로 Pi 로 보낸다 (0 에서 다시 슬루하며 팬이 느려지는 것을 막음).
+    """
+    global snapshot
+    snapshot = open_snapshot()
+    if snapshot is None:
+        return
+    n = snapshot.restore(controllers())
+    if not n:
+        print(f"[Snapshot] 저장된 상태 없음, 기본값으로 시작 ({snapshot.path})")
+        return
+    ctl = next(iter(controllers().values()))
+    age = time.time() - ctl.last_ts_ms / 1000
+    print(f"[Snapshot] 컨트롤러 {n}개 상태 복원 ({age:.1f}s 전): mode={ctl.mode}, pwm={ctl.last_pwm}")
+    if fleet is not None:
+        await fleet.send_all({d.device_id: d.ctl.last_pwm for d in fleet.devices.values()})
+    elif PI_LOCAL_POLICY:
+        await pi_link.send_policy(controller_policy(global_ctl), global_ctl.last_target, global_ctl.slew_per_sec,
+                                  pwm=global_ctl.last_pwm)
+    elif PI_EDGE_RAMP:
+        await pi_link.send_setpoint(global_ctl.last_target, global_ctl.slew_per_sec, pwm=global_ctl.last_pwm)
+    else:
+        await pi_link.send(global_ctl.last_pwm)
 
-# websockets 모듈이 사용하는 Request 클래스를 패치 버전으로 교체
-http11.Request = PatchedRequest
+async def control_tick(vals, now_ms=None):
+    """
+    센서 값 -> PWM 계산 -> Pi 전송 (폴링/푸시 경로 공통). 단계별 소요 시간을 돌려준다.
+    now_ms: 스케줄러의 예정 시각 (없으면 현재 시각, push 경로)
+    """
+    cpu = vals.get("cpu_temperature", 0)
+    gpu = vals.get("gpu_temperature", 0)
+    model = vals.get("model_result", 0)
+    
+    if cpu is None: cpu = 0
+    if gpu is None: gpu = 0
+    if model is None: model = 0
 
-from FANCONTROLL_PY import FanController, read_latest_values, send_to_pi
+    # PWM 계산 (global_ctl의 현재 모드(auto/manual)에 따라 내부에서 계산)
+    # 원시 값은 이력에 기록하고, step 에는 HISTORY_FILTER 를 거친 온도를 넣는다
+    t0 = time.perf_counter()
+    cpu_f, gpu_f = history.push(global_ctl.clock() if now_ms is None else now_ms / 1000, cpu, gpu, model)
+    pwm_value = global_ctl.step(cpu_f, gpu_f, int(model), now_ms)
+    history.record_pwm(pwm_value)
+    t1 = time.perf_counter()
+    
+    # 라즈베리파이로 전송 (장기 연결 재사용, 값이 바뀔 때와 keepalive 주기에만 실제 전송)
+    # PI_EDGE_RAMP 이면 목표값/변화율만 보내고 ramp 는 Pi 가 수행 (목표가 바뀔 때만 전송)
+    # PI_LOCAL_POLICY 이면 정책만 보내고 Pi 가 자기 센서로 제어 (정책이 바뀔 때와 keepalive 에만 전송)
+    if PI_LOCAL_POLICY:
+        ok = await pi_link.send_policy(controller_policy(global_ctl), global_ctl.last_target,
+                                       global_ctl.slew_per_sec, pwm=pwm_value)
+    elif PI_EDGE_RAMP:
+        ok = await pi_link.send_setpoint(global_ctl.last_target, global_ctl.slew_per_sec, pwm=pwm_value)
+    else:
+        ok = await pi_link.send(pwm_value)
+    if not ok:
+        record_error("pi_send", f"{pi_link.host}:{pi_link.port} unreachable")
+    t2 = time.perf_counter()
+    
+    # 재시작 대비 상태 기록 (메모리 맵 파일에 memcpy, 디스크 동기화는 FAN_SNAPSHOT_SYNC_SEC 마다)
+    save_state()
 
+    # 구독자 방송용 상태 갱신 (실제 전송은 broadcaster 가 합쳐서 처리)
+    broadcaster.update(dict(controller_state(global_ctl), cpu=cpu, gpu=gpu, model=model))
 
-global_ctl = FanController()
+    # 로그 출력 (rate-limited)
+    log.log("tick", mode=global_ctl.mode, pwm=pwm_value, cpu=cpu, gpu=gpu, model=model)
+    return {"step": t1 - t0, "pi_send": t2 - t1}
 
 async def automation_loop():
     """
     기존 FANCONTROLL_PY.py의 main()에 있던 역할을 여기서 수행합니다.
-    웹소켓 통신과 상관없이 1초마다 계속 돕니다.
+    웹소켓 통신과 상관없이 global_ctl.period(기본 1초) 고정 주기로 계속 돕니다.
+    (작업 시간만큼 주기가 밀리지 않으며, 늦어진 틱은 FAN_TICK_POLICY 에 따라 건너뛰거나 따라잡음)
+    센서 값이 push 로 들어오고 있는 동안에는 InfluxDB 조회를 건너뜁니다 (폴링은 대체 경로).
     """
-    print("[System] 자동 제어 루프 시작")
+    print(f"[System] 자동 제어 루프 시작 (주기 {global_ctl.period:g}s)")
+    sched = FixedRateScheduler(global_ctl.period)
     while True:
+        # 1. 다음 예정 시각까지 대기 (다른 작업들에게 양보)
+        tick = await sched.next()
+        if feed.fresh():
+            continue
+        record_schedule(tick, "poll")
+        t0 = time.perf_counter()
         try:
-            # 1. 센서 값 읽기
-            vals = read_latest_values()
-            cpu = vals.get("cpu_temperature", 0)
-            gpu = vals.get("gpu_temperature", 0)
-            model = vals.get("model_result", 0)
-            
-            if cpu is None: cpu = 0
-            if gpu is None: gpu = 0
-            if model is None: model = 0
+            # 2. 센서 값 읽기 (마감 시간 내 비동기 조회, 웹소켓 처리를 막지 않음)
+            vals = await async_read_latest_values()
+            timings = dict(last_read_timings())
+            # 3~4. PWM 계산 및 전송 (slew 는 예정 시각 기준)
+            timings.update(await control_tick(vals, tick.wall_ms))
+            record_tick(timings, time.perf_counter() - t0, "poll", sched.period)
 
-            # 2. PWM 계산 (global_ctl의 현재 모드(auto/manual)에 따라 내부에서 계산)
-            pwm_value = global_ctl.step(cpu, gpu, int(model))
-            
-            # 3. 라즈베리파이로 전송
-            # (send_to_pi도 동기 함수이므로 짧게 실행됨)
-            send_to_pi(pwm_value)
-            
-            # 로그 출력
-            print(f"[Loop] Mode={global_ctl.mode}, PWM={pwm_value}, CPU={cpu}, GPU={gpu}")
+        except asyncio.TimeoutError as e:
+            record_error("influx_timeout", e)
+        except requests.RequestException as e:
+            record_error("influx", e)
+        except Exception as e:
+            record_error("loop", e)
 
+async def push_control_loop(min_interval: float = CONTROL_MIN_INTERVAL):
+    """
+    센서 값이 push 로 도착하면 바로 step 을 실행한다.
+    단, step 사이 간격은 min_interval 이상으로 유지하고, 그 사이 도착한 값들은 합쳐서 한 번에 처리한다.
+    """
+    loop = asyncio.get_running_loop()
+    last_step = -min_interval
+    while True:
+        await feed.event.wait()
+        wait = last_step + min_interval - loop.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        feed.event.clear()
+        last_step = loop.time()
+        t0 = time.perf_counter()
+        try:
+            timings = await control_tick(feed.values)
+            record_tick(timings, time.perf_counter() - t0, "push", min_interval)
         except Exception as e:
-            print(f"[Loop Error] {e}")
+            record_error("loop", e)
 
-        # 4. 1초 대기 (다른 작업들에게 양보)
+async def fleet_group_loop(key, group):
+    """위상 그룹 하나: 고정 주기로 자기 장치만 조회하고 그 Pi 들로 전송. 그룹이 없어지면(리샤딩) 끝난다."""
+    sched = FixedRateScheduler(group.period, group.phase)
+    while True:
+        tick = await sched.next()
+        if fleet.groups.get(key) is not group:
+            return
+        record_schedule(tick, "fleet")
+        t0 = time.perf_counter()
+        try:
+            pwms = await fleet.tick_group(group, tick.wall_ms)
+            metrics.inc("fan_device_ticks_total", len(pwms), path="fleet")
+            save_state()
+            broadcaster.update({"devices": {d: controller_state(fleet.devices[d].ctl)
+                                            for d in group.device_ids if d in fleet.devices}})
+            record_tick(group.last_timings, time.perf_counter() - t0, "fleet", sched.period)
+            if group.last_failed:
+                record_error("pi_send", f"{group.last_failed}/{len(group.device_ids)} devices", group.last_failed)
+        except asyncio.TimeoutError as e:
+            record_error("influx_timeout", e)
+        except requests.RequestException as e:
+            record_error("influx", e)
+        except Exception as e:
+            record_error("loop", e)
+
+async def fleet_loop():
+    """
+    플릿 모드: 장치를 (주기, 위상) 그룹으로 나눠 그룹마다 고정 주기 루프를 돌린다.
+    그룹의 시작 시각이 주기 안에서 엇갈리므로 조회/전송이 한 순간에 몰리지 않는다.
+    리샤딩으로 새 그룹이 생기면 1초 안에 루프를 시작한다.
+    """
+    print(f"[System] 플릿 제어 루프 시작 ({len(fleet.devices)}대, 위상 그룹 {len(fleet.groups)}개)")
+    tasks = {}
+    while True:
+        for key, group in list(fleet.groups.items()):
+            task = tasks.get(key)
+            if task is None or task.done():
+                tasks[key] = asyncio.create_task(fleet_group_loop(key, group))
         await asyncio.sleep(1.0)
 
+def apply_command(ctl, data):
+    """웹에서 온 명령을 컨트롤러 하나에 반영"""
+    if "mode" in data:
+        m = str(data["mode"]).lower()
+        if m in ("auto", "manual", "range", "predict"):
+            ctl.mode = m
+
+    if "manual_pwm" in data:
+        ctl.manual_target = int(data["manual_pwm"])
+
+    if "cpu_threshold" in data:
+        ctl.cpu_thresh = int(data["cpu_threshold"])
+
+    if "gpu_threshold" in data:
+        ctl.gpu_thresh = int(data["gpu_threshold"])
+
+def handle_fleet_command(data):
+    """플릿 모드 명령: "device" 로 한 대, "group" 으로 여러 대, 둘 다 없으면 전체"""
+    targets = fleet.select(data.get("device"), data.get("group"))
+    if not targets:
+        return {"status": "error", "error": "no matching device"}
+    for dev in targets:
+        apply_command(dev.ctl, data)
+    save_state()
+    broadcaster.update({"devices": {d.device_id: controller_state(d.ctl) for d in targets}})
+    if "device" in data:
+        dev = targets[0]
+        return {"status": "ok", "device": dev.device_id,
+                "current_mode": dev.ctl.mode, "current_pwm": dev.ctl.last_pwm}
+    return {"status": "ok",
+            "devices": {d.device_id: {"current_mode": d.ctl.mode, "current_pwm": d.ctl.last_pwm}
+                        for d in targets}}
+
+def handle_shard_command(data):
+    """
+    shard.py 의 리밸런싱 명령 (샤드 워커 전용)
+      {"reshard": {"nodes": ["w0", "w1", ...]}} -> 담당 장치를 다시 고르고 내보낸 장치 상태를 released 로
+      {"adopt": {장치 ID: 상태}}                 -> 이전 주인이 넘겨준 상태를 이어받음
+    """
+    if fleet is None or fleet.shard_id is None:
+        return {"status": "error", "error": "not a shard worker"}
+    if "reshard" in data:
+        nodes = data["reshard"].get("nodes", []) if isinstance(data["reshard"], dict) else []
+        released = fleet.reshard([str(n) for n in nodes])
+        _watch_links()
+        save_state()
+        print(f"[Shard] {fleet.shard_id}: 노드 {len(nodes)}개로 리샤딩, "
+              f"{len(released)}대 내보냄, {len(fleet.devices)}대 담당")
+        return {"status": "ok", "shard": fleet.shard_id, "devices": len(fleet.devices), "released": released}
+    adopted = fleet.adopt(data["adopt"] if isinstance(data["adopt"], dict) else {})
+    save_state()
+    return {"status": "ok", "shard": fleet.shard_id, "adopted": adopted}
+
+def history_response(req):
+    """{"history": {"seconds": 600, "since": <unix s>, "max_points": 600, "device": "..."}} 응답"""
+    req = req if isinstance(req, dict) else {}
+    try:
+        seconds = None if req.get("seconds") is None else float(req["seconds"])
+        since = None if req.get("since") is None else float(req["since"])
+        max_points = int(req.get("max_points", HISTORY_MAX_POINTS))
+    except (TypeError, ValueError):
+        return {"status": "error", "error": "seconds, since and max_points must be numbers"}
+    if max_points < 0 or any(v is not None and not v >= 0 for v in (seconds, since)):  # 음수, NaN
+        return {"status": "error", "error": "seconds, since and max_points must not be negative"}
+    if fleet is not None:
+        dev = fleet.devices.get(str(req.get("device")))
+        if dev is None:
+            return {"status": "error", "error": "no matching device"}
+        hist, name = dev.history, dev.device_id
+    else:
+        hist, name = history, None
+    data = hist.window(seconds, since, max_points)
+    return {"status": "ok", "history": dict(data, device=name, filter=hist.filter)}
+
 async def handle_connection(websocket, path=None):
     """웹 클라이언트 연결 처리"""
     print(f"[Web] Client connected: {websocket.remote_address}")
@@ -111,20 +373,37 @@ async def handle_connection(websocket, path=None):
             data = json.loads(message)
             print(f"[Web] Received: {data}")
 
-            # 1. 웹에서 온 명령을 'global_ctl'에 반영
-            if "mode" in data:
-                m = str(data["mode"]).lower()
-                if m in ("auto", "manual", "range"):
-                    global_ctl.mode = m
-            
-            if "manual_pwm" in data:
-                global_ctl.manual_target = int(data["manual_pwm"])
-            
-            if "cpu_threshold" in data:
-                global_ctl.cpu_thresh = int(data["cpu_threshold"])
+            # 계측 조회: {"stats": true}
+            if data.get("stats"):
+                await websocket.send(json.dumps({"status": "ok", "stats": metrics.snapshot()}))
+                continue
 
-            if "gpu_threshold" in data:
-                global_ctl.gpu_thresh = int(data["gpu_threshold"])
+            # 이력 조회: {"history": {"seconds": 600}} (메모리 링 버퍼, InfluxDB 조회 없음)
+            if "history" in data:
+                await websocket.send(json.dumps(history_response(data["history"])))
+                continue
+
+            # 상태 구독: {"subscribe": true} 이후 변경분을 push, {"subscribe": false} 로 해제
+            if "subscribe" in data:
+                if data["subscribe"]:
+                    broadcaster.subscribe(websocket)
+                else:
+                    broadcaster.unsubscribe(websocket)
+                await websocket.send(json.dumps({"status": "ok", "subscribed": bool(data["subscribe"])}))
+                continue
+
+            if "reshard" in data or "adopt" in data:
+                await websocket.send(json.dumps(handle_shard_command(data)))
+                continue
+
+            if fleet is not None:
+                await websocket.send(json.dumps(handle_fleet_command(data)))
+                continue
+
+            # 1. 웹에서 온 명령을 'global_ctl'에 반영
+            apply_command(global_ctl, data)
+            save_state()
+            broadcaster.update(controller_state(global_ctl))
             
             # 2. 현재 상태를 바로 응답 (옵션)
             response = {
@@ -136,12 +415,31 @@ async def handle_connection(websocket, path=None):
             
     except websockets.exceptions.ConnectionClosed:
         print("[Web] Client disconnected")
+    finally:
+        broadcaster.unsubscribe(websocket)
         
 async def main():
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                        format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    # 재시작이면 이전 상태로 바로 이어서 제어 (서버를 여는 것보다 먼저)
+    await resume_from_snapshot()
     # Web과 8765포트로 연결(host)
-    async with websockets.serve(handle_connection, "0.0.0.0", 8765):
-        print("WebSocket server started at ws://0.0.0.0:8765")
-        asyncio.create_task(automation_loop())
+    async with websockets.serve(handle_connection, BIND_HOST, WS_PORT):
+        print(f"WebSocket server started at ws://{BIND_HOST}:{WS_PORT}"
+              + (f" (shard {FLEET_SHARD_ID}, {len(fleet.devices)} devices)" if FLEET_SHARD_ID and fleet else ""))
+        await serve_metrics(metrics, BIND_HOST, METRICS_PORT)
+        print(f"Metrics endpoint started at http://{BIND_HOST}:{METRICS_PORT}/metrics")
+        asyncio.create_task(broadcaster.run())
+        if tracer is not None:
+            asyncio.create_task(tracer.run())
+        if fleet is not None:
+            asyncio.create_task(fleet_loop())
+        else:
+            # 센서 push 수신 (웹소켓 서버와 함께 동작), InfluxDB 폴링은 대체 경로로 유지
+            await feed.serve(BIND_HOST, INGEST_PORT)
+            print(f"Sensor ingest server started at tcp://{BIND_HOST}:{INGEST_PORT}")
+            asyncio.create_task(push_control_loop())
+            asyncio.create_task(automation_loop())
         await asyncio.Future()  # 서버가 종료되지 않도록 대기
 
 if __name__ == "__main__":
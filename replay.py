@@ -0,0 +1,202 @@
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import numpy as np
+
+from FANCONTROLL_PY import FanController, MEASUREMENTS
+from flux_csv import AnnotatedCSVParser, parse_time
+
+# =========================
+# 기록된 온도 시계열을 FanController 로 재생 (실제 시간을 기다리지 않음)
+# =========================
+#   python replay.py trace.csv [--mode range] [--set min_duty=35 slew_per_sec=10] [--out pwm.csv]
+# 입력 CSV 는 두 가지 형식을 받는다.
+#   1) 넓은 형식: time,cpu_temperature,gpu_temperature,model_result
+#      (time 은 epoch 초/ms 또는 RFC3339)
+#   2) InfluxDB 내보내기(Flux CSV, annotated 여부 무관): _time,_value,_measurement 의 긴 형식
+#      측정값별 시계열을 시각 합집합에 맞춰 정렬하고, 실제 제어 루프처럼 직전 값을 유지(forward-fill)한다.
+REPLAY_LIMIT = float(os.getenv("REPLAY_LIMIT", "60"))  # "임계 온도 초과 시간" 통계의 기준(°C)
+
+
+@dataclass
+class Trace:
+    ts: np.ndarray     # epoch 초 (오름차순)
+    cpu: np.ndarray
+    gpu: np.ndarray
+    model: np.ndarray  # int
+    pwm: Optional[np.ndarray] = None  # 기록된 PWM (넓은 형식에 pwm 열이 있을 때, write_pwm_trace 출력 등)
+
+    def __len__(self):
+        return len(self.ts)
+
+
+def _to_epoch(s: str) -> float:
+    try:
+        v = float(s)
+    except ValueError:
+        return parse_time(s)
+    return v / 1000.0 if v > 1e11 else v  # ms 단위면 초로
+
+
+def _forward_fill(ts: np.ndarray, series_ts: np.ndarray, series_val: np.ndarray) -> np.ndarray:
+    """각 ts 시점의 직전(같거나 이전) 값. 첫 값 이전은 0 (control_tick 의 None -> 0 과 같음)"""
+    if len(series_ts) == 0:
+        return np.zeros(len(ts))
+    order = np.argsort(series_ts, kind="stable")
+    series_ts, series_val = series_ts[order], series_val[order]
+    idx = np.searchsorted(series_ts, ts, side="right") - 1
+    return np.where(idx >= 0, series_val[np.maximum(idx, 0)], 0.0)
+
+
+def _load_long(lines) -> Trace:
+    parser = AnnotatedCSVParser(("_time", "_measurement", "_value"),
+                                fallback={"_time": parse_time, "_value": float})
+    cols: Dict[str, tuple] = {m: ([], []) for m in MEASUREMENTS}
+    for t, m, v in parser.records(lines):
+        if m in cols and t is not None and v is not None:
+            cols[m][0].append(t)
+            cols[m][1].append(float(v))
+    series = {m: (np.asarray(t, dtype=np.float64), np.asarray(v, dtype=np.float64))
+              for m, (t, v) in cols.items()}
+    ts = np.unique(np.concatenate([t for t, _ in series.values()]))
+    cpu, gpu, model = (_forward_fill(ts, *series[m]) for m in MEASUREMENTS)
+    return Trace(ts, cpu, gpu, model.astype(np.int64))
+
+
+def _load_wide(rows, header) -> Trace:
+    tcol = next(c for c in ("time", "_time", "timestamp", "ts") if c in header)
+    ti = header.index(tcol)
+    names = MEASUREMENTS + (("pwm",) if "pwm" in header else ())
+    mi = [header.index(m) if m in header else None for m in names]
+    ts, vals = [], tuple([] for _ in names)
+    for row in rows:
+        if not row or not row[ti]:
+            continue
+        ts.append(_to_epoch(row[ti]))
+        for out, i in zip(vals, mi):
+            out.append(float(row[i]) if i is not None and i < len(row) and row[i] != "" else np.nan)
+    ts = np.asarray(ts, dtype=np.float64)
+    order = np.argsort(ts, kind="stable")
+    filled = []
+    for v in vals:
+        v = np.asarray(v, dtype=np.float64)[order]
+        ok = ~np.isnan(v)
+        filled.append(_forward_fill(ts[order], ts[order][ok], v[ok]))
+    return Trace(ts[order], filled[0], filled[1], filled[2].astype(np.int64),
+                 filled[3] if len(filled) > 3 else None)
+
+
+def load_trace(path: str) -> Trace:
+    """CSV 파일(넓은 형식 또는 Flux CSV 내보내기)을 Trace 로 읽는다"""
+    with open(path, newline="", encoding="utf-8") as f:
+        first = f.readline()
+        f.seek(0)
+        header = next(csv.reader([first]), [])
+        if first.startswith("#") or "_measurement" in header:
+            return _load_long(f)
+        reader = csv.reader(f)
+        return _load_wide(reader, next(reader))
+
+
+@dataclass
+class ReplayResult:
+    ts: np.ndarray
+    pwm: np.ndarray
+    summary: dict
+
+
+def summarize(trace: Trace, pwm: np.ndarray, limit: float = REPLAY_LIMIT) -> dict:
+    """
+    time_above_limit_sec: max(cpu, gpu) 가 limit 를 넘은 시간
+    duty_integral_sec   : ∫ pwm/100 dt (100% 로 환산한 팬 가동 시간, 에너지 대용)
+    pwm_changes         : PWM 값이 바뀐 횟수 (잦을수록 소음/마모)
+    각 샘플은 다음 샘플까지 유지된 것으로 본다 (마지막 샘플은 샘플 간격의 중앙값).
+    """
+    n = len(trace)
+    if n == 0:
+        return {"samples": 0}
+    gaps = np.diff(trace.ts)
+    dt = np.append(gaps, np.median(gaps) if n > 1 else 1.0)
+    temp = np.maximum(trace.cpu, trace.gpu)
+    duration = float(dt.sum())
+    duty = float((pwm / 100.0 * dt).sum())
+    return {
+        "samples": n,
+        "duration_sec": duration,
+        "time_above_limit_sec": float(dt[temp > limit].sum()),
+        "limit": limit,
+        "duty_integral_sec": duty,
+        "mean_duty": duty / duration * 100 if duration else 0.0,
+        "pwm_changes": int(np.count_nonzero(np.diff(pwm))),
+        "max_pwm": int(pwm.max()),
+        "max_temp": float(temp.max()),
+    }
+
+
+def replay(trace: Trace, ctl: Optional[FanController] = None, limit: float = REPLAY_LIMIT,
+           **ctl_kwargs) -> ReplayResult:
+    """
+    trace 를 처음부터 끝까지 ctl.step 에 통과시킨다. 시각은 기록된 타임스탬프를 그대로 쓰므로
+    슬루 레이트/히스테리시스가 실제 운용과 같게 동작하고, 결과는 항상 같다(결정적).
+    """
+    ctl = ctl or FanController(**ctl_kwargs)
+    step = ctl.step
+    ts_ms = (trace.ts * 1000).astype(np.int64).tolist()
+    pwm = np.empty(len(trace), dtype=np.int64)
+    t0 = time.perf_counter()
+    for i, (now, c, g, m) in enumerate(zip(ts_ms, trace.cpu.tolist(), trace.gpu.tolist(),
+                                           trace.model.tolist())):
+        pwm[i] = step(c, g, m, now_ms=now)
+    elapsed = time.perf_counter() - t0
+    summary = summarize(trace, pwm, limit)
+    summary["replay_sec"] = elapsed
+    summary["speedup"] = summary.get("duration_sec", 0.0) / elapsed if elapsed > 0 else float("inf")
+    return ReplayResult(trace.ts, pwm, summary)
+
+
+def write_pwm_trace(path: str, trace: Trace, pwm: np.ndarray):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(("time",) + MEASUREMENTS + ("pwm",))
+        for row in zip(trace.ts.tolist(), trace.cpu.tolist(), trace.gpu.tolist(),
+                       trace.model.tolist(), pwm.tolist()):
+            w.writerow(row)
+
+
+def _parse_set(items):
+    """--set name=value ... -> FanController 인자 (필드 타입에 맞춰 변환)"""
+    proto = FanController()
+    out = {}
+    for item in items or ():
+        name, _, value = item.partition("=")
+        if not hasattr(proto, name) or name == "clock":
+            raise SystemExit(f"[Replay] 알 수 없는 설정: {name}")
+        out[name] = type(getattr(proto, name))(value)
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="기록된 온도 시계열을 FanController 로 재생")
+    ap.add_argument("trace", help="CSV (넓은 형식 또는 InfluxDB Flux CSV 내보내기)")
+    ap.add_argument("--mode", choices=("auto", "manual", "range"), default="auto")
+    ap.add_argument("--set", nargs="*", metavar="NAME=VALUE", help="FanController 필드 값")
+    ap.add_argument("--limit", type=float, default=REPLAY_LIMIT, help="임계 온도 초과 시간 기준(°C)")
+    ap.add_argument("--out", help="PWM 트레이스를 저장할 CSV 경로")
+    args = ap.parse_args(argv)
+
+    trace = load_trace(args.trace)
+    res = replay(trace, limit=args.limit, mode=args.mode, **_parse_set(args.set))
+    if args.out:
+        write_pwm_trace(args.out, trace, res.pwm)
+        print(f"[Replay] PWM 트레이스 저장: {args.out}", file=sys.stderr)
+    print(json.dumps(res.summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
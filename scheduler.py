@@ -0,0 +1,94 @@
+import os
+import math
+import time
+import asyncio
+from typing import Awaitable, Callable, NamedTuple
+
+# =========================
+# 고정 주기 틱 스케줄러 (monotonic 시계, 누적 지연 없음)
+# =========================
+# k 번째 틱의 예정 시각 = k * period + phase (monotonic 시계 기준 절대 시각).
+# "작업 후 sleep(1.0)" 과 달리 작업 시간이 다음 틱을 밀지 않으므로 주기가 흐르지 않는다.
+# 같은 period 의 스케줄러들은 같은 격자를 쓰므로, phase 를 period 안에서 나눠 주면
+# 여러 제어 그룹의 Influx 조회/Pi 전송이 같은 순간에 몰리지 않는다.
+#
+# 틱이 길어져 다음 예정 시각을 넘기면(missed deadline) 정책에 따라
+#   skip    : 지나간 예정 시각 중 가장 최근 것 하나만 바로 실행하고 나머지는 건너뛴다 (기본)
+#   catchup : 지나간 예정 시각을 최대 TICK_MAX_CATCHUP 개까지 연달아 실행하고, 그보다 오래된 것은 건너뛴다
+# 어느 쪽이든 격자는 그대로라 다음 틱부터 원래 위상으로 돌아온다.
+# 틱마다 예정 시각을 벽시계 ms 로 바꾼 값(wall_ms)을 step(now_ms=...) 에 넘기면,
+# 실행이 늦어져도 dt 가 주기의 정수배가 되어 slew 동작이 부하와 무관해진다.
+TICK_POLICY = os.getenv("FAN_TICK_POLICY", "skip")
+TICK_MAX_CATCHUP = int(os.getenv("FAN_TICK_MAX_CATCHUP", "3"))
+POLICIES = ("skip", "catchup")
+
+
+class Tick(NamedTuple):
+    index: int        # 격자 위 번호 (예정 시각 = index * period + phase)
+    scheduled: float  # 예정 시각 (monotonic 초)
+    wall_ms: int      # 예정 시각의 벽시계 시각 (ms) -> step(now_ms=...)
+    lateness: float   # 실제 시작 - 예정 시각 (초)
+    missed: int       # 제때(다음 예정 시각 전) 시작하지 못한 예정 시각 수: 건너뛴 것 + 이 틱이 한 주기 이상 늦었으면 1
+    skipped: int      # 실행하지 않고 건너뛴 예정 시각 수
+
+
+class FixedRateScheduler:
+    """
+    await next() 로 다음 틱까지 기다린다.
+        sched = FixedRateScheduler(1.0, phase=0.25)
+        while True:
+            tick = await sched.next()
+            ... step(now_ms=tick.wall_ms) ...
+    """
+
+    def __init__(self, period: float, phase: float = 0.0, policy: str = TICK_POLICY,
+                 max_catchup: int = TICK_MAX_CATCHUP, clock: Callable[[], float] = time.monotonic,
+                 wall: Callable[[], float] = time.time,
+                 sleep: Callable[[float], Awaitable] = asyncio.sleep):
+        if period <= 0:
+            raise ValueError(f"주기는 0보다 커야 합니다: {period}")
+        if policy not in POLICIES:
+            raise ValueError(f"알 수 없는 정책: {policy} (가능: {', '.join(POLICIES)})")
+        self.period = float(period)
+        self.phase = float(phase) % self.period
+        self.policy = policy
+        self.max_catchup = max(0, int(max_catchup))
+        self.clock = clock
+        self.sleep = sleep
+        self._wall_offset = wall() - clock()  # monotonic -> 벽시계 (시작 시 한 번 고정, 틱 간격이 정확히 period)
+        self._next = None                     # 다음에 실행할 격자 번호
+        self.ticks = 0
+        self.missed = 0
+        self.skipped = 0
+        self.max_lateness = 0.0
+
+    def at(self, index: int) -> float:
+        return index * self.period + self.phase
+
+    async def next(self) -> Tick:
+        now = self.clock()
+        if self._next is None:
+            self._next = math.ceil((now - self.phase) / self.period)
+        due = self.at(self._next)
+        if now < due:
+            await self.sleep(due - now)
+            now = max(self.clock(), due)  # sleep 이 시계 해상도만큼 일찍 깨는 경우
+        passed = int((now - due) // self.period) + 1  # 예정 시각이 지난 격자 수 (due 포함)
+        run = 1 if self.policy == "skip" else min(passed, 1 + self.max_catchup)
+        skipped = passed - run
+        index = self._next + skipped
+        self._next = index + 1
+
+        scheduled = self.at(index)
+        lateness = max(0.0, now - scheduled)
+        missed = skipped + (1 if lateness >= self.period else 0)  # catchup 으로 늦게 실행한 틱도 놓친 것
+        self.ticks += 1
+        self.missed += missed
+        self.skipped += skipped
+        self.max_lateness = max(self.max_lateness, lateness)
+        return Tick(index, scheduled, int(round((scheduled + self._wall_offset) * 1000)), lateness, missed, skipped)
+
+
+def spread_phases(period: float, n: int):
+    """n 개 그룹의 위상을 period 안에 고르게 (0, period/n, 2*period/n, ...)"""
+    return [i * period / n for i in range(n)]
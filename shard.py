@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import signal
+import asyncio
+from typing import Dict, List, Optional
+
+import websockets
+from websockets.protocol import State
+
+import ws_compat  # noqa: F401  (Content-Length 헤더가 있는 웹소켓 요청 허용)
+from broadcast import StateBroadcaster
+from fleet import HashRing, FLEET_CONFIG
+from snapshot import SNAPSHOT_PATH
+
+# =========================
+# 샤드 감독자(supervisor) + 라우팅 웹소켓 게이트웨이
+# =========================
+# 플릿 제어 서버(process_control_command.py)를 워커 프로세스 N개로 띄우고, 장치는 일관 해시로 나눈다.
+# 워커마다 자기 장치만 InfluxDB 에서 읽고(장치 필터 쿼리) 자기 Pi 로만 보내므로, 틱 작업이 코어 수만큼 나뉜다.
+#
+#   웹 --ws:8765--> 게이트웨이 --ws:SHARD_BASE_PORT+i--> 워커 w{i} (FLEET_SHARD_ID=w{i})
+#
+# - "device" 가 있는 명령/history 는 그 장치의 주인 워커로만 보낸다.
+# - "group" 이나 전체 명령, {"stats": true} 는 모든 워커로 보내고 응답을 합친다.
+# - {"subscribe": true} 는 게이트웨이가 직접 받는다 (게이트웨이가 워커마다 구독해 합친 상태를 다시 방송).
+# - {"shards": true} 는 워커 목록, {"shards": {"workers": 3}} 은 워커 수 변경(리밸런싱).
+# 워커가 죽으면 SHARD_RESTART_DELAY 초 후 같은 샤드로 다시 띄운다 (워커별 스냅샷 파일에서 상태 복원).
+# 워커는 살아 있는데 웹소켓만 끊기면 요청 연결은 다음 요청 때, 상태 구독은 SHARD_RESTART_DELAY 초 뒤 다시 연결한다.
+# 응답이 SHARD_REQUEST_TIMEOUT 초 안에 없으면(멈춘 워커) 그 요청은 오류로 돌려주고 연결을 버린다.
+# 워커 수를 바꾸면 새 워커를 먼저 띄우고, 기존 워커에 reshard 를 보내 내보낸 장치 상태를 새 주인에게 adopt 시킨다.
+# 일관 해시라 워커 하나를 더하거나 빼면 약 1/N 의 장치만 주인이 바뀐다.
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", str(len(os.sched_getaffinity(0)))))  # 기본: 쓸 수 있는 코어 수
+GATEWAY_PORT = int(os.getenv("SHARD_GATEWAY_PORT", "8765"))
+SHARD_BASE_PORT = int(os.getenv("SHARD_BASE_PORT", "8800"))                # 워커 w{i} 웹소켓 = BASE + i
+SHARD_METRICS_BASE_PORT = int(os.getenv("SHARD_METRICS_BASE_PORT", "9200"))  # 워커 w{i} /metrics = BASE + i
+INTERNAL_COMMANDS = ("reshard", "adopt")  # Supervisor.resize 만 워커에 보내는 명령 (게이트웨이 클라이언트는 못 보냄)
+SHARD_RESTART_DELAY = float(os.getenv("SHARD_RESTART_DELAY", "1"))
+SHARD_START_TIMEOUT = float(os.getenv("SHARD_START_TIMEOUT", "30"))       # 워커가 웹소켓을 열 때까지 기다리는 시간
+SHARD_REQUEST_TIMEOUT = float(os.getenv("SHARD_REQUEST_TIMEOUT", "10"))   # 워커 요청 하나(차례 대기 포함)의 응답 한도
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "process_control_command.py")
+
+
+def node_names(n: int) -> List[str]:
+    return [f"w{i}" for i in range(n)]
+
+
+class Worker:
+    """워커 프로세스 하나와 게이트웨이 -> 워커 요청 연결"""
+
+    def __init__(self, index: int, base_port: int = SHARD_BASE_PORT,
+                 metrics_base_port: int = SHARD_METRICS_BASE_PORT):
+        self.index = index
+        self.id = f"w{index}"
+        self.port = base_port + index
+        self.metrics_port = metrics_base_port + index
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.conn = None                # 요청/응답용 웹소켓 (lock 으로 한 번에 요청 하나)
+        self.sub = None                 # 상태 구독 웹소켓
+        self.lock = asyncio.Lock()
+        self.restarts = 0
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.proc.pid if self.proc is not None else None
+
+
+class Supervisor:
+    """워커를 띄우고 감시하며, 장치 ID 로 주인 워커를 찾아 요청을 전달한다"""
+
+    def __init__(self, config_path: str, base_port: int = SHARD_BASE_PORT,
+                 metrics_base_port: int = SHARD_METRICS_BASE_PORT, snapshot_path: str = SNAPSHOT_PATH,
+                 restart_delay: float = SHARD_RESTART_DELAY, env: Optional[dict] = None, stdout=None,
+                 request_timeout: float = SHARD_REQUEST_TIMEOUT):
+        self.config_path = config_path
+        self.base_port = base_port
+        self.metrics_base_port = metrics_base_port
+        self.snapshot_path = snapshot_path
+        self.restart_delay = restart_delay
+        self.request_timeout = request_timeout
+        self.env = dict(os.environ if env is None else env)
+        self.stdout = stdout
+        with open(config_path, encoding="utf-8") as f:
+            self.device_ids = [str(d["id"]) for d in json.load(f).get("devices", [])]
+        self.workers: Dict[str, Worker] = {}
+        self.nodes: List[str] = []      # 워커를 띄울 때 넘기는 노드 목록 (리샤딩 중에는 새 목록)
+        self.ring = HashRing(())        # 라우팅에 쓰는 링 (리샤딩이 끝난 뒤 바뀐다)
+        self.on_state = None            # 워커가 방송한 상태 변경 콜백 (data dict)
+        self._resize_lock = asyncio.Lock()
+        self._stopping = False
+
+    # ---------- 프로세스 ----------
+    def _env(self, w: Worker) -> dict:
+        env = dict(self.env, FLEET_CONFIG=self.config_path, FLEET_SHARD_ID=w.id,
+                   FLEET_SHARD_NODES=",".join(self.nodes), WS_PORT=str(w.port), METRICS_PORT=str(w.metrics_port),
+                   BIND_HOST="127.0.0.1")  # 워커는 게이트웨이를 거쳐서만 (외부에서 직접 붙지 못하게)
+        env["FAN_SNAPSHOT_PATH"] = f"{self.snapshot_path}.{w.id}" if self.snapshot_path else ""
+        return env
+
+    async def _spawn(self, w: Worker):
+        w.proc = await asyncio.create_subprocess_exec(sys.executable, SERVER_SCRIPT, env=self._env(w),
+                                                      stdout=self.stdout, stderr=self.stdout)
+        w._tasks = [asyncio.create_task(self._watch(w, w.proc))]
+        async with w.lock:  # 기동 중 들어온 요청이 따로 연결하지 않도록
+            w.conn = await self._connect(w)
+        w._tasks.append(asyncio.create_task(self._subscribe(w)))
+        print(f"[Shard] 워커 {w.id} 시작 (pid {w.pid}, ws:{w.port})")
+
+    async def _connect(self, w: Worker):
+        """워커가 웹소켓을 열 때까지 재시도 (그 전에 프로세스가 죽으면 실패)"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + SHARD_START_TIMEOUT
+        proc = w.proc
+        while True:
+            try:
+                return await websockets.connect(f"ws://127.0.0.1:{w.port}", max_size=None)
+            except OSError:
+                if proc.returncode is not None or loop.time() > deadline:
+                    raise RuntimeError(f"워커 {w.id} 가 시작되지 않았습니다 (code {proc.returncode})")
+                await asyncio.sleep(0.1)
+
+    async def _subscribe(self, w: Worker):
+        """워커의 상태 방송을 받아 on_state 로 넘긴다 (끊기면 워커 프로세스가 살아 있는 동안 다시 구독)"""
+        proc = w.proc
+        while True:
+            try:
+                async with websockets.connect(f"ws://127.0.0.1:{w.port}", max_size=None) as ws:
+                    w.sub = ws
+                    await ws.send(json.dumps({"subscribe": True}))
+                    async for message in ws:
+                        msg = json.loads(message)
+                        if msg.get("type") == "state" and self.on_state is not None:
+                            self.on_state(msg.get("data", {}))
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.ConnectionClosed):
+                pass
+            w.sub = None
+            if self._stopping or proc.returncode is not None:
+                return  # 워커가 죽으면 _watch 가 다시 띄우고 새로 구독한다
+            await asyncio.sleep(self.restart_delay)
+
+    async def _watch(self, w: Worker, proc):
+        code = await proc.wait()
+        if self._stopping or self.workers.get(w.id) is not w:
+            return
+        w.restarts += 1
+        print(f"[Shard] 워커 {w.id} 종료 (code {code}), {self.restart_delay}s 후 재시작 ({w.restarts}회째)")
+        await self._disconnect(w, keep=asyncio.current_task())
+        await asyncio.sleep(self.restart_delay)
+        if self._stopping or self.workers.get(w.id) is not w:
+            return
+        try:
+            await self._spawn(w)
+        except Exception as e:
+            print(f"[Shard] 워커 {w.id} 재시작 실패: {e}")  # 새 프로세스의 _watch 가 다시 시도
+
+    async def _disconnect(self, w: Worker, keep=None):
+        for t in w._tasks:
+            if t is not keep:
+                t.cancel()
+        if w.conn is not None:
+            conn, w.conn = w.conn, None
+            await conn.close()
+
+    async def _terminate(self, w: Worker, timeout: float = 5.0):
+        await self._disconnect(w)
+        if w.proc is not None and w.proc.returncode is None:
+            w.proc.terminate()
+            try:
+                await asyncio.wait_for(w.proc.wait(), timeout)
+            except asyncio.TimeoutError:
+                w.proc.kill()
+                await w.proc.wait()
+        print(f"[Shard] 워커 {w.id} 정지")
+
+    async def start(self, n: int = SHARD_WORKERS):
+        self.nodes = node_names(n)
+        self.ring = HashRing(self.nodes)
+        self.workers = {w.id: w for w in (Worker(i, self.base_port, self.metrics_base_port) for i in range(n))}
+        await asyncio.gather(*(self._spawn(w) for w in self.workers.values()))
+
+    async def stop(self):
+        self._stopping = True
+        await asyncio.gather(*(self._terminate(w) for w in self.workers.values()))
+
+    # ---------- 요청 전달 ----------
+    def owner(self, device_id) -> Optional[Worker]:
+        node = self.ring.node_for(str(device_id))
+        return self.workers.get(node) if node else None
+
+    async def request(self, w: Worker, msg: dict) -> dict:
+        """워커에 요청 하나를 보내고 응답을 기다린다 (차례 대기 포함 request_timeout 초 한도)"""
+        try:
+            return await asyncio.wait_for(self._request(w, msg), self.request_timeout)
+        except asyncio.TimeoutError:
+            print(f"[Shard] 워커 {w.id} 응답 없음 ({self.request_timeout}s)")
+            return {"status": "error", "error": f"shard {w.id} timed out"}
+
+    async def _request(self, w: Worker, msg: dict) -> dict:
+        unavailable = {"status": "error", "error": f"shard {w.id} unavailable"}
+        async with w.lock:
+            if w.conn is not None and w.conn.state is not State.OPEN:  # 지난 요청 뒤 끊긴 연결
+                w.conn = None
+            if w.conn is None:
+                # 프로세스는 살아 있는데 연결만 끊긴 경우 다시 연결 (죽었으면 _watch 가 재시작한다)
+                if w.proc is None or w.proc.returncode is not None:
+                    return unavailable
+                try:
+                    w.conn = await websockets.connect(f"ws://127.0.0.1:{w.port}", max_size=None)
+                except (OSError, asyncio.TimeoutError):
+                    return unavailable
+            conn = w.conn
+            try:
+                await conn.send(json.dumps(msg))
+                return json.loads(await conn.recv())
+            except websockets.exceptions.ConnectionClosed:
+                w.conn = None
+                return unavailable
+            except asyncio.CancelledError:
+                # 시간 초과: 늦게 온 응답이 다음 요청의 응답으로 읽히지 않도록 이 연결은 버린다
+                if w.conn is conn:
+                    w.conn = None
+                asyncio.ensure_future(conn.close())
+                raise
+
+    async def broadcast(self, msg: dict) -> Dict[str, dict]:
+        workers = list(self.workers.values())
+        replies = await asyncio.gather(*(self.request(w, msg) for w in workers))
+        return {w.id: r for w, r in zip(workers, replies)}
+
+    async def route(self, data: dict) -> dict:
+        """게이트웨이로 들어온 명령 하나를 주인 워커(또는 전체)로 보내고 응답을 돌려준다"""
+        device = data.get("device")
+        if device is None and isinstance(data.get("history"), dict):
+            device = data["history"].get("device")
+        if device is not None:
+            w = self.owner(device)
+            if w is None:
+                return {"status": "error", "error": "no shard available"}
+            return await self.request(w, data)
+        replies = await self.broadcast(data)
+        if data.get("stats"):
+            return {"status": "ok", "stats": {wid: r.get("stats") for wid, r in replies.items()}}
+        return merge_replies(replies.values())
+
+    def status(self) -> dict:
+        counts = {wid: 0 for wid in self.workers}
+        for dev_id in self.device_ids:
+            node = self.ring.node_for(dev_id)
+            if node in counts:
+                counts[node] += 1
+        return {wid: {"pid": w.pid, "port": w.port, "metrics_port": w.metrics_port,
+                      "restarts": w.restarts, "devices": counts[wid],
+                      "up": w.conn is not None and w.proc is not None and w.proc.returncode is None,
+                      "subscribed": w.sub is not None}
+                for wid, w in self.workers.items()}
+
+    # ---------- 리밸런싱 ----------
+    async def resize(self, n: int) -> dict:
+        """
+        워커 수를 n 으로 바꾼다.
+        1) 늘어나는 워커를 새 노드 목록으로 먼저 띄운다 (맡을 장치는 초기 상태로 시작)
+        2) 기존 워커 모두에 reshard -> 주인이 바뀐 장치의 상태를 돌려받는다
+        3) 라우팅 링을 바꾸고, 돌려받은 상태를 새 주인에게 adopt
+        4) 줄어드는 워커를 정지
+        1) 과 2) 사이의 잠깐(워커 기동 시간) 동안은 옮겨 갈 장치를 두 워커가 함께 제어할 수 있다
+        (Pi 는 마지막 명령을 따르므로 다음 틱에 정리된다).
+        """
+        if n < 1:
+            raise ValueError("워커 수는 1 이상이어야 합니다")
+        async with self._resize_lock:
+            old = list(self.workers.values())
+            if n == len(old):
+                return {"moved": 0}
+            self.nodes = node_names(n)
+            added = [Worker(i, self.base_port, self.metrics_base_port) for i in range(len(old), n)]
+            for w in added:
+                self.workers[w.id] = w
+            await asyncio.gather(*(self._spawn(w) for w in added))
+
+            replies = await asyncio.gather(*(self.request(w, {"reshard": {"nodes": self.nodes}}) for w in old))
+            self.ring = HashRing(self.nodes)
+            moved: Dict[str, Dict[str, dict]] = {}
+            for r in replies:
+                for dev_id, state in (r.get("released") or {}).items():
+                    moved.setdefault(self.ring.node_for(dev_id), {})[dev_id] = state
+
+            removed = [w for w in old if w.id not in self.nodes]
+            for w in removed:
+                del self.workers[w.id]
+            await asyncio.gather(*(self.request(self.workers[node], {"adopt": states})
+                                   for node, states in moved.items() if node in self.workers))
+            await asyncio.gather(*(self._terminate(w) for w in removed))
+            total = sum(len(s) for s in moved.values())
+            print(f"[Shard] 워커 {len(old)} -> {n}: 장치 {total}/{len(self.device_ids)}대 이동")
+            return {"moved": total}
+
+
+def merge_replies(replies) -> dict:
+    """그룹/전체 명령에 대한 워커 응답들의 "devices" 를 합친다 (장치가 없는 워커의 오류는 무시)"""
+    devices, errors = {}, []
+    for r in replies:
+        if r.get("status") == "ok":
+            devices.update(r.get("devices", {}))
+        else:
+            errors.append(r.get("error"))
+    if devices:
+        return {"status": "ok", "devices": devices}
+    unavailable = [e for e in errors if e and e != "no matching device"]
+    return {"status": "error", "error": unavailable[0] if unavailable else "no matching device"}
+
+
+class Gateway:
+    """웹 클라이언트용 웹소켓. 명령은 Supervisor 로 라우팅하고, 구독은 직접 처리한다."""
+
+    def __init__(self, supervisor: Supervisor):
+        self.sup = supervisor
+        self.broadcaster = StateBroadcaster()
+        supervisor.on_state = self.broadcaster.update
+
+    async def handle(self, data: dict) -> dict:
+        internal = [k for k in INTERNAL_COMMANDS if k in data]
+        if internal:
+            return {"status": "error", "error": f"{', '.join(internal)} is internal to the shard supervisor"}
+        if "shards" in data:
+            req = data["shards"]
+            if isinstance(req, dict) and "workers" in req:
+                try:
+                    result = await self.sup.resize(int(req["workers"]))
+                except ValueError as e:
+                    return {"status": "error", "error": str(e)}
+                return dict(result, status="ok", shards=self.sup.status())
+            return {"status": "ok", "shards": self.sup.status()}
+        return await self.sup.route(data)
+
+    async def handle_connection(self, websocket, path=None):
+        print(f"[Gateway] Client connected: {websocket.remote_address}")
+        try:
+            async for message in websocket:
+                data = json.loads(message)
+                if "subscribe" in data:
+                    if data["subscribe"]:
+                        self.broadcaster.subscribe(websocket)
+                    else:
+                        self.broadcaster.unsubscribe(websocket)
+                    await websocket.send(json.dumps({"status": "ok", "subscribed": bool(data["subscribe"])}))
+                    continue
+                await websocket.send(json.dumps(await self.handle(data)))
+        except websockets.exceptions.ConnectionClosed:
+            print("[Gateway] Client disconnected")
+        finally:
+            self.broadcaster.unsubscribe(websocket)
+
+
+async def main():
+    if not FLEET_CONFIG:
+        print("[Shard] FLEET_CONFIG 를 지정해야 합니다 (샤딩은 플릿 모드 전용)")
+        return
+    sup = Supervisor(FLEET_CONFIG)
+    await sup.start(SHARD_WORKERS)
+    gateway = Gateway(sup)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    async with websockets.serve(gateway.handle_connection, "0.0.0.0", GATEWAY_PORT):
+        print(f"Gateway started at ws://0.0.0.0:{GATEWAY_PORT} ({len(sup.workers)} workers, "
+              f"{len(sup.device_ids)} devices)")
+        asyncio.create_task(gateway.broadcaster.run())
+        await stop.wait()
+    await sup.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
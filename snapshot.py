@@ -0,0 +1,158 @@
+import os
+import functools
+import mmap
+import time
+import zlib
+import struct
+from typing import Dict, Mapping, Tuple
+
+# =========================
+# 컨트롤러 상태 스냅샷 (재시작 시 바로 이어서 제어)
+# =========================
+# FanController 의 상태(last_pwm, last_ts_ms, last_target)와 웹에서 바꾼 설정(mode, manual_target,
+# cpu_thresh, gpu_thresh)을 메모리 맵 파일에 틱마다 기록하고, 서버가 시작할 때 복원한다.
+# 튜닝 값(min_duty, slew_per_sec, ...)은 FAN_CONTROLLER_CONFIG 가 결정하므로 저장하지 않는다.
+#
+# 파일 = 같은 크기의 슬롯 2개. 매번 오래된 슬롯에 [레코드 -> 헤더] 순서로 쓴다.
+#   헤더: magic, 레코드 수, seq, crc32(레코드 수 + seq + 레코드)
+# 키는 앞 32바이트와 함께 전체 길이, crc32 를 저장하고 복원할 때 셋 다 맞아야 같은 키로 본다
+# (32바이트보다 긴 장치 ID, 앞 32바이트가 같은 두 장치 ID 도 구별된다).
+# 읽을 때는 CRC 가 맞는 슬롯 중 seq 가 큰 것을 쓰므로, 쓰는 도중 프로세스가 죽어도 직전 상태가 남는다.
+# 기록은 페이지 캐시에 대한 memcpy 이고(시스템 콜 없음), 디스크 동기화(msync)는
+# FAN_SNAPSHOT_SYNC_SEC 초에 한 번만 한다 -> 전원이 나가면 그 시간만큼의 상태를 잃을 수 있다.
+SNAPSHOT_PATH = os.getenv("FAN_SNAPSHOT_PATH", "/var/tmp/fan_controller.snap")  # 빈 값이면 사용 안 함
+SNAPSHOT_SYNC_SEC = float(os.getenv("FAN_SNAPSHOT_SYNC_SEC", "5"))
+
+MAGIC = b"FSN2"
+HEADER = struct.Struct("<4sIQI")          # magic, count, seq, crc
+RECORD = struct.Struct("<32sIIqiiBiii")   # key 앞부분, key 길이, key crc32, last_ts_ms, last_pwm, last_target,
+                                          # mode, manual, cpu, gpu
+KEY_BYTES = 32
+MODES = ("auto", "manual", "range", "predict")  # 저장 코드 = 순서 (뒤에만 추가)
+STATE_FIELDS = ("last_pwm", "last_ts_ms", "last_target", "mode", "manual_target", "cpu_thresh", "gpu_thresh")
+MIN_SLOT = 512
+
+
+def _crc(count: int, seq: int, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(struct.pack("<IQ", count, seq)))
+
+
+@functools.lru_cache(maxsize=65536)  # 키는 틱마다 같으므로 인코딩/crc 는 한 번만
+def _key_id(key: str) -> Tuple[bytes, int, int]:
+    raw = key.encode()
+    return raw[:KEY_BYTES], len(raw), zlib.crc32(raw)
+
+
+def _pack(key: str, ctl) -> bytes:
+    mode = MODES.index(ctl.mode) if ctl.mode in MODES else 0
+    return RECORD.pack(*_key_id(key), int(ctl.last_ts_ms), int(ctl.last_pwm), int(ctl.last_target),
+                       mode, int(ctl.manual_target), int(ctl.cpu_thresh), int(ctl.gpu_thresh))
+
+
+def _unpack(raw: bytes):
+    """((key 앞부분, 길이, crc32), 상태)"""
+    prefix, size, key_crc, ts, pwm, target, mode, manual, cpu, gpu = RECORD.unpack(raw)
+    return (prefix[:size], size, key_crc), dict(
+        last_pwm=pwm, last_ts_ms=ts, last_target=target, mode=MODES[mode] if mode < len(MODES) else "auto",
+        manual_target=manual, cpu_thresh=cpu, gpu_thresh=gpu)
+
+
+class ControllerSnapshot:
+    """키(장치 ID, 단일 서버는 "default") -> FanController 상태를 두 슬롯에 번갈아 기록한다"""
+
+    def __init__(self, path: str = SNAPSHOT_PATH, sync_interval: float = SNAPSHOT_SYNC_SEC):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.seq = 0
+        self.saves = 0
+        self._synced_at = time.monotonic()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size < 2 * MIN_SLOT:
+            os.ftruncate(self._fd, 2 * MIN_SLOT)
+            size = 2 * MIN_SLOT
+        self._map(size)
+        best = self._latest()
+        self.seq = best[0] if best else 0
+
+    def _map(self, size: int):
+        self.slot_size = size // 2
+        self._mm = mmap.mmap(self._fd, 2 * self.slot_size)
+
+    def _read_slot(self, i: int):
+        """(seq, 레코드 바이트) 또는 깨진/빈 슬롯이면 None"""
+        off = i * self.slot_size
+        magic, count, seq, crc = HEADER.unpack_from(self._mm, off)
+        end = HEADER.size + count * RECORD.size
+        if magic != MAGIC or end > self.slot_size:
+            return None
+        payload = self._mm[off + HEADER.size:off + end]
+        return (seq, count, payload) if _crc(count, seq, payload) == crc else None
+
+    def _latest(self):
+        slots = [s for s in (self._read_slot(0), self._read_slot(1)) if s is not None]
+        return max(slots, key=lambda s: s[0]) if slots else None
+
+    def _records(self) -> Dict[Tuple[bytes, int, int], dict]:
+        best = self._latest()
+        if best is None:
+            return {}
+        _, count, payload = best
+        return dict(_unpack(payload[i * RECORD.size:(i + 1) * RECORD.size]) for i in range(count))
+
+    def load(self) -> Dict[str, dict]:
+        """키 -> 저장된 상태 (32바이트보다 긴 키는 이름을 되살릴 수 없으므로 restore 로만 찾는다)"""
+        return {prefix.decode(errors="replace"): state for (prefix, size, key_crc), state in self._records().items()
+                if size <= KEY_BYTES and zlib.crc32(prefix) == key_crc}
+
+    def restore(self, controllers: Mapping[str, object]) -> int:
+        """저장된 상태를 같은 키(앞부분, 길이, crc32 모두 일치)의 컨트롤러에 덮어쓰고, 복원한 수를 돌려준다"""
+        saved = self._records()
+        n = 0
+        for key, ctl in controllers.items():
+            state = saved.get(_key_id(key))
+            if state is not None:
+                for k, v in state.items():
+                    setattr(ctl, k, v)
+                n += 1
+        return n
+
+    def save(self, controllers: Mapping[str, object]):
+        payload = b"".join(_pack(k, c) for k, c in controllers.items())
+        need = HEADER.size + len(payload)
+        if need > self.slot_size:
+            # 장치가 늘어 슬롯이 모자라면 파일을 키운다 (슬롯 위치가 바뀌므로 바로 아래에서 새로 기록)
+            self._mm.close()
+            slot = max(need, 2 * self.slot_size)
+            os.ftruncate(self._fd, 2 * slot)
+            self._map(2 * slot)
+        self.seq += 1
+        off = (self.seq % 2) * self.slot_size
+        count = len(controllers)
+        self._mm[off + HEADER.size:off + need] = payload
+        self._mm[off:off + HEADER.size] = HEADER.pack(MAGIC, count, self.seq, _crc(count, self.seq, payload))
+        self.saves += 1
+        if self.sync_interval >= 0 and time.monotonic() - self._synced_at >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        self._mm.flush()
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        if self._mm is not None:
+            self.sync()
+            self._mm.close()
+            self._mm = None
+            os.close(self._fd)
+
+
+def open_snapshot(path: str = SNAPSHOT_PATH):
+    """경로가 비어 있거나 열 수 없으면 None (스냅샷 없이 동작)"""
+    if not path:
+        return None
+    try:
+        return ControllerSnapshot(path)
+    except OSError as e:
+        print(f"[Snapshot] 스냅샷 파일을 열 수 없습니다 ({path}): {e}")
+        return None
@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from FANCONTROLL_PY import FanController
+from fan_batch import BatchFanController
+from replay import REPLAY_LIMIT, Trace, load_trace
+
+# =========================
+# 기록된 온도 트레이스로 FanController 파라미터 탐색
+# =========================
+#   python sweep.py trace1.csv trace2.csv --grid min_duty=20,30,40 slew_per_sec=5,10,25 --out best.json
+#   python sweep.py trace.csv --random 512 --range t_on=20:35 t_off=15:30 temp_scale=50:75 --refine 2
+# 후보 설정을 묶음(chunk) 단위로 프로세스 풀에 나눠 주고, 각 프로세스는 BatchFanController 로
+# 묶음 전체를 한 번에 재생한다 (트레이스는 프로세스마다 한 번만 읽는다).
+# 결과 JSON 의 "controller" 는 서버가 FAN_CONTROLLER_CONFIG 로 그대로 읽을 수 있다.
+#
+# 비용 = w_heat * 열 부족 + w_energy * 평균 duty(%) + w_churn * 시간당 PWM 변경 횟수
+#   열 부족: ∫ max(0, T - limit) * (1 - pwm/100) dt / 시간  (°C, 한계를 넘었는데 팬이 덜 돈 정도)
+# 기록된 온도는 후보 PWM 에 반응하지 않으므로(개루프), 열 부족은 실제 온도 대신 쓰는 대용 지표다.
+SWEEP_CHUNK = int(os.getenv("SWEEP_CHUNK", "64"))  # 프로세스 작업 하나에 묶는 후보 수
+DEFAULT_WEIGHTS = {"heat": 10.0, "energy": 1.0, "churn": 0.05}
+
+# 탐색 가능한 필드 (last_pwm 등 상태 필드와 clock 은 제외)
+TUNABLE = ("min_duty", "slew_per_sec", "t_on", "t_off", "cpu_thresh", "gpu_thresh",
+           "temp_scale", "pwm_base", "pwm_gain")
+
+_traces: List[Trace] = []
+_limit = REPLAY_LIMIT
+
+
+def _coerce(name: str, value):
+    if name not in TUNABLE:
+        raise SystemExit(f"[Sweep] 탐색할 수 없는 필드: {name} (가능: {', '.join(TUNABLE)})")
+    kind = type(getattr(FanController(), name))
+    return int(round(float(value))) if kind is int else round(float(value), 2)
+
+
+def valid(config: dict) -> bool:
+    """t_off 가 t_on 보다 크면 히스테리시스가 뒤집히므로 제외"""
+    base = FanController()
+    return config.get("t_off", base.t_off) <= config.get("t_on", base.t_on)
+
+
+# ---------- 후보 생성 ----------
+def grid(space: Dict[str, Sequence]) -> List[dict]:
+    names = list(space)
+    return [c for c in (dict(zip(names, vals)) for vals in itertools.product(*space.values())) if valid(c)]
+
+
+def random_configs(ranges: Dict[str, tuple], n: int, rnd: random.Random, fixed=None) -> List[dict]:
+    out = []
+    while len(out) < n:
+        c = dict(fixed or {})
+        c.update({k: _coerce(k, rnd.uniform(lo, hi)) for k, (lo, hi) in ranges.items()})
+        if valid(c):
+            out.append(c)
+    return out
+
+
+def refine(ranked: List[dict], ranges: Dict[str, tuple], n: int, rnd: random.Random, shrink: float) -> List[dict]:
+    """상위 후보 주변(범위를 shrink 배로 줄인 구간)에서 다시 무작위 표본을 뽑는다"""
+    top = ranked[:max(1, min(5, len(ranked)))]
+    out = []
+    for i in range(n):
+        center = top[i % len(top)]["controller"]
+        local = {}
+        for k, (lo, hi) in ranges.items():
+            half = (hi - lo) * shrink / 2
+            c = center.get(k, (lo + hi) / 2)
+            local[k] = (max(lo, c - half), min(hi, c + half))
+        out += random_configs(local, 1, rnd, fixed={k: v for k, v in center.items() if k not in ranges})
+    return out
+
+
+# ---------- 평가 (작업 프로세스) ----------
+def _init_worker(paths: Sequence[str], limit: float):
+    global _traces, _limit
+    _traces = [load_trace(p) for p in paths]
+    _limit = limit
+
+
+def _eval_trace(configs: List[dict], trace: Trace, limit: float) -> dict:
+    batch = BatchFanController.from_controllers([FanController(**c) for c in configs])
+    k = len(configs)
+    n = len(trace)
+    gaps = np.diff(trace.ts)
+    dt = np.append(gaps, np.median(gaps) if n > 1 else 1.0)
+    excess = np.maximum(0.0, np.maximum(trace.cpu, trace.gpu) - limit)
+
+    duty = np.zeros(k)
+    deficit = np.zeros(k)
+    changes = np.zeros(k, dtype=np.int64)
+    prev = None
+    step = batch.step
+    for now, c, g, m, d, e in zip((trace.ts * 1000).astype(np.int64).tolist(), trace.cpu.tolist(),
+                                  trace.gpu.tolist(), trace.model.tolist(), dt.tolist(), excess.tolist()):
+        pwm = step(c, g, m, now_ms=now)
+        duty += pwm * d
+        if e:
+            deficit += (100 - pwm) * (e * d / 100.0)
+        if prev is not None:
+            changes += pwm != prev
+        prev = pwm
+    return {"duration": float(dt.sum()), "duty": duty / 100.0, "deficit": deficit, "changes": changes}
+
+
+def evaluate(configs: List[dict]) -> List[dict]:
+    """후보 묶음을 모든 트레이스에 대해 재생하고 후보별 지표를 돌려준다"""
+    duration = 0.0
+    duty = deficit = changes = 0
+    for trace in _traces:
+        r = _eval_trace(configs, trace, _limit)
+        duration += r["duration"]
+        duty = duty + r["duty"]
+        deficit = deficit + r["deficit"]
+        changes = changes + r["changes"]
+    hours = duration / 3600.0
+    return [{"mean_duty": float(duty[i] / duration * 100),
+             "heat_deficit": float(deficit[i] / duration),
+             "changes_per_hour": float(changes[i] / hours)} for i in range(len(configs))]
+
+
+def full_config(config: dict) -> dict:
+    """탐색하지 않은 필드도 기본값으로 채워, 저장된 설정만 보고 컨트롤러를 재현할 수 있게 한다"""
+    ctl = FanController(**config)
+    return dict({"mode": ctl.mode}, **{k: getattr(ctl, k) for k in TUNABLE})
+
+
+def cost(metrics: dict, weights: dict) -> float:
+    return (weights["heat"] * metrics["heat_deficit"] + weights["energy"] * metrics["mean_duty"]
+            + weights["churn"] * metrics["changes_per_hour"])
+
+
+def run(configs: List[dict], paths: Sequence[str], weights: dict, workers: int = None,
+        limit: float = REPLAY_LIMIT, chunk: int = SWEEP_CHUNK) -> List[dict]:
+    """모든 후보를 평가해 비용 오름차순으로 정렬한 결과 목록을 돌려준다"""
+    # 묶음 하나의 비용은 후보 수보다 트레이스 길이에 비례하므로, 모든 프로세스가 일하도록 고르게 나눈다
+    chunk = max(1, min(chunk, -(-len(configs) // (workers or os.cpu_count() or 1))))
+    chunks = [configs[i:i + chunk] for i in range(0, len(configs), chunk)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(list(paths), limit)) as pool:
+        results = [m for part in pool.map(evaluate, chunks) for m in part]
+    ranked = [{"controller": c, "cost": cost(m, weights), "metrics": m} for c, m in zip(configs, results)]
+    ranked.sort(key=lambda r: r["cost"])
+    return ranked
+
+
+def _parse_grid(items) -> Dict[str, list]:
+    space = {}
+    for item in items or ():
+        name, _, values = item.partition("=")
+        space[name] = [_coerce(name, v) for v in values.split(",")]
+    return space
+
+
+def _parse_ranges(items) -> Dict[str, tuple]:
+    ranges = {}
+    for item in items or ():
+        name, _, span = item.partition("=")
+        lo, _, hi = span.partition(":")
+        _coerce(name, lo)
+        ranges[name] = (float(lo), float(hi))
+    return ranges
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="기록된 트레이스로 FanController 파라미터 탐색")
+    ap.add_argument("traces", nargs="+", help="replay.py 가 읽을 수 있는 CSV 트레이스")
+    ap.add_argument("--mode", choices=("auto", "range"), default="auto")
+    ap.add_argument("--grid", nargs="*", metavar="NAME=V1,V2,...", help="격자 탐색 값")
+    ap.add_argument("--random", type=int, default=0, help="무작위 탐색 후보 수 (--range 구간에서)")
+    ap.add_argument("--range", nargs="*", metavar="NAME=LO:HI", help="무작위 탐색 구간")
+    ap.add_argument("--refine", type=int, default=0, help="상위 후보 주변 재탐색 라운드 수")
+    ap.add_argument("--workers", type=int, default=None, help="프로세스 수 (기본: CPU 코어 수)")
+    ap.add_argument("--limit", type=float, default=REPLAY_LIMIT, help="열 부족 기준 온도(°C)")
+    ap.add_argument("--weights", nargs="*", metavar="heat=|energy=|churn=", help="비용 가중치")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--out", default="best_controller.json")
+    args = ap.parse_args(argv)
+
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in args.weights or ():
+        k, _, v = item.partition("=")
+        if k not in weights:
+            raise SystemExit(f"[Sweep] 알 수 없는 가중치: {k}")
+        weights[k] = float(v)
+    rnd = random.Random(args.seed)
+    ranges = _parse_ranges(args.range)
+    fixed = {"mode": args.mode}
+
+    baseline_config = dict(fixed)  # 현재 기본값: 같은 묶음에서 함께 평가해 비교 기준으로 쓴다
+    configs = [baseline_config]
+    if args.grid:
+        configs += [dict(fixed, **c) for c in grid(_parse_grid(args.grid))]
+    if args.random:
+        configs += random_configs(ranges, args.random, rnd, fixed)
+
+    t0 = time.perf_counter()
+    ranked = run(configs, args.traces, weights, args.workers, args.limit)
+    evaluated = len(configs)
+    shrink = 0.5
+    for _ in range(args.refine if ranges else 0):
+        more = refine(ranked, ranges, max(8, args.random // 2), rnd, shrink)
+        ranked = sorted(ranked + run(more, args.traces, weights, args.workers, args.limit),
+                        key=lambda r: r["cost"])
+        evaluated += len(more)
+        shrink /= 2
+    elapsed = time.perf_counter() - t0
+
+    baseline = next(r for r in ranked if r["controller"] is baseline_config)
+    print(f"[Sweep] 후보 {evaluated}개, {elapsed:.1f}s ({evaluated / elapsed:.1f} 후보/s)", file=sys.stderr)
+    print(f"{'cost':>9} {'duty%':>7} {'heat':>7} {'chg/h':>8}  설정")
+    for r in [baseline] + [r for r in ranked[:args.top] if r is not baseline]:
+        m = r["metrics"]
+        tag = "  (기본값)" if r is baseline else ""
+        params = " ".join(f"{k}={v}" for k, v in r["controller"].items() if k != "mode")
+        print(f"{r['cost']:9.3f} {m['mean_duty']:7.2f} {m['heat_deficit']:7.3f} {m['changes_per_hour']:8.1f}  "
+              f"{params or '-'}{tag}")
+
+    best = ranked[0]
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"controller": full_config(best["controller"]), "cost": best["cost"], "metrics": best["metrics"],
+                   "baseline_cost": baseline["cost"], "weights": weights, "limit": args.limit,
+                   "traces": [os.path.basename(p) for p in args.traces]}, f, indent=2)
+    print(f"[Sweep] 최적 설정 저장: {args.out} (FAN_CONTROLLER_CONFIG={args.out} 로 서버에 적용)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import math
+import argparse
+from typing import Optional, Tuple
+
+import numpy as np
+
+from FANCONTROLL_PY import FanController, load_controller_config
+from history import CPU, GPU, MODEL, PWM
+from replay import REPLAY_LIMIT, Trace, load_trace, replay, summarize, _parse_set
+
+# =========================
+# 장치별 1차 열 모델과 예측 제어 (FanController mode="predict")
+# =========================
+# dT/dt = θ0 + θ1·T + θ2·u + θ3·load
+#   T = max(cpu, gpu) (°C), u = PWM/100 (그 구간에 걸려 있던 값), load = model_result > 0
+#   θ1 < 0 (주변으로 식음), θ2 < 0 (팬이 식힘), θ3 = 부하가 걸렸을 때 더해지는 발열
+# 기록 전체는 최소자승(lstsq)으로 한 번에 맞추고, 운용 중에는 샘플마다 정규방정식(XᵀX, Xᵀy)에 누적해
+# PREDICT_REFIT_EVERY 샘플마다 다시 푼다. predict 모드는 horizon 초 뒤 예측 온도가 setpoint 가 되는 PWM 을 고르므로
+# model_result 가 켜지는 순간(온도가 오르기 전) PWM 을 올린다.
+#
+# 오프라인 평가 (기록된 트레이스, 실제 시간을 기다리지 않음):
+#   python thermal_model.py trace.csv [--set min_duty=35] [--setpoint 55] [--horizon 30] [--train 0.5]
+# 기록된 온도는 다른 PWM 에 반응하지 않으므로, 트레이스 전체로 맞춘 모델을 "설비"로 두고 기록 당시의 잔차를
+# 그대로 더해 폐루프로 다시 돌린다 (기록된 PWM 을 넣으면 기록된 온도가 그대로 나온다). 제어용 모델은 앞부분
+# (--train)만으로 맞추고, 뒷부분에서 현재 공식(설정의 mode)과 predict 의 최고 온도/팬 에너지를 비교한다.
+# 한계: PWM 을 바꿨을 때의 반응은 1차 설비 모델이 정하고 잔차는 기록 그대로 더하므로, 실제 장치가 1차 모델에서
+# 멀수록(큰 방열판, 비선형 팬) 결과가 어긋난다. 지금까지의 검증은 합성 데이터뿐이다 (TEST/thermal_model_test.py:
+# 2질량 + 비선형 팬 설비에서 예상 최고 온도/duty 가 실제 폐루프와 0.2°C/0.5% 차이). 실제 장치 기록으로 평가한 적은 없다.
+PREDICT_FORGET = float(os.getenv("PREDICT_FORGET", "0.999"))      # 샘플마다 이전 누적에 곱하는 값 (1 이면 잊지 않음)
+PREDICT_REFIT_EVERY = int(os.getenv("PREDICT_REFIT_EVERY", "10"))  # 몇 샘플마다 다시 풀지
+PREDICT_MIN_SAMPLES = int(os.getenv("PREDICT_MIN_SAMPLES", "60"))  # 이보다 적으면 모델을 쓰지 않음 (auto 공식)
+PREDICT_MAX_GAP = float(os.getenv("PREDICT_MAX_GAP", "10"))        # 이보다 벌어진 샘플 쌍은 학습에서 뺌 (초)
+# 정규화한 XᵀX 의 조건수 상한. auto 공식만으로 돈 기록은 u 가 T 에 거의 비례해 θ1/θ2 를 가를 수 없다.
+PREDICT_MAX_COND = float(os.getenv("PREDICT_MAX_COND", "1e6"))
+ONSET_WINDOW = 10.0  # 평가: 부하 시작 뒤 이 시간(초) 동안의 평균 PWM
+
+FEATURES = ("bias", "temp", "pwm", "load")
+
+
+def design(ts, temp, pwm, load, max_gap: float = PREDICT_MAX_GAP) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    연속 샘플 쌍 -> (X, y). X 행 = [1, T_k, u_k, load_k], y = (T_k+1 - T_k) / dt.
+    u_k 는 k 와 k+1 사이에 걸려 있던 PWM. 간격이 0 이하/max_gap 초과이거나 NaN 이 있는 쌍은 뺀다.
+    """
+    ts, temp, pwm, load = (np.asarray(a, dtype=np.float64) for a in (ts, temp, pwm, load))
+    dt = np.diff(ts)
+    X = np.column_stack((np.ones(len(dt)), temp[:-1], pwm[:-1] / 100.0, (load[:-1] > 0).astype(np.float64)))
+    y = np.diff(temp) / np.where(dt > 0, dt, 1.0)
+    ok = (dt > 0) & (dt <= max_gap) & np.isfinite(X).all(axis=1) & np.isfinite(y)
+    return X[ok], y[ok]
+
+
+class ThermalModel:
+    """
+    장치 하나의 열 모델. FanController.predictor 로 붙이면 predict 모드의 step 마다 target() 이 불린다.
+    history 를 주면 처음 쓸 때 그 이력으로 한 번 fit 한다 (서버 재시작 직후에도 바로 예측).
+    """
+
+    def __init__(self, history=None, forget: float = PREDICT_FORGET, refit_every: int = PREDICT_REFIT_EVERY,
+                 min_samples: int = PREDICT_MIN_SAMPLES, max_gap: float = PREDICT_MAX_GAP,
+                 max_cond: float = PREDICT_MAX_COND):
+        self.history = history
+        self.forget = forget
+        self.refit_every = refit_every
+        self.min_samples = min_samples
+        self.max_gap = max_gap
+        self.max_cond = max_cond
+        self.xtx = np.zeros((len(FEATURES), len(FEATURES)))
+        self.xty = np.zeros(len(FEATURES))
+        self.samples = 0
+        self.theta: Optional[np.ndarray] = None
+        self.fits = 0          # 받아들인 풀이 수
+        self.rejected = 0      # 조건수/부호 검사에서 버린 풀이 수
+        self._prev = None      # (시각 s, T, load): 직전 observe
+        self._since_fit = 0
+
+    # ---- 학습 ----
+    def fit(self, ts, temp, pwm, load) -> bool:
+        """기록 전체를 한 번에 맞춘다 (누적 정규방정식도 이 기록으로 바꾼다)"""
+        X, y = design(ts, temp, pwm, load, self.max_gap)
+        self.xtx, self.xty, self.samples = X.T @ X, X.T @ y, len(y)
+        self._prev, self._since_fit = None, 0
+        if len(y) < self.min_samples:
+            return False
+        theta = np.linalg.lstsq(X, y, rcond=None)[0]
+        return self._accept(theta)
+
+    def fit_history(self, history) -> bool:
+        """DeviceHistory 링 버퍼 전체로 fit"""
+        ts, values = history.arrays()
+        return self.fit(ts, np.fmax(values[:, CPU], values[:, GPU]), values[:, PWM], values[:, MODEL])
+
+    def observe(self, temp: float, pwm: float, load: float, now_ms: int):
+        """
+        샘플 하나를 누적한다. pwm 은 직전 observe 부터 지금까지 걸려 있던 값 (step 직전의 last_pwm).
+        """
+        ts = now_ms / 1000.0
+        load = 1.0 if load > 0 else 0.0
+        prev, self._prev = self._prev, (ts, temp, load)
+        if prev is None or not 0 < ts - prev[0] <= self.max_gap:
+            return
+        x = np.array((1.0, prev[1], pwm / 100.0, prev[2]))
+        self.xtx *= self.forget
+        self.xty *= self.forget
+        self.xtx += np.outer(x, x)
+        self.xty += (temp - prev[1]) / (ts - prev[0]) * x
+        self.samples += 1
+        self._since_fit += 1
+        if self._since_fit >= self.refit_every and self.samples >= self.min_samples:
+            self._since_fit = 0
+            self._accept(np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0])
+
+    def condition(self) -> float:
+        """열 크기를 맞춘 XᵀX 의 조건수 (클수록 입력이 서로 비례해 계수를 가르기 어렵다)"""
+        d = np.sqrt(np.diag(self.xtx))
+        if not d.all():
+            return math.inf
+        return float(np.linalg.cond(self.xtx / np.outer(d, d)))
+
+    def _accept(self, theta: np.ndarray) -> bool:
+        if not (np.isfinite(theta).all() and theta[1] < 0 and theta[2] < 0) or self.condition() > self.max_cond:
+            self.rejected += 1
+            return False
+        self.theta = theta
+        self.fits += 1
+        return True
+
+    # ---- 예측 ----
+    @property
+    def ready(self) -> bool:
+        return self.theta is not None
+
+    def predict(self, temp: float, pwm: float, load: float, horizon: float) -> float:
+        """PWM 을 horizon 초 동안 유지했을 때의 온도 (1차 모델의 닫힌 해)"""
+        c0, c1, c2, c3 = self.theta
+        steady = -(c0 + c2 * pwm / 100.0 + c3 * (load > 0)) / c1
+        return steady + (temp - steady) * math.exp(c1 * horizon)
+
+    def required_pwm(self, temp: float, load: float, setpoint: float, horizon: float) -> float:
+        """horizon 초 뒤 온도가 setpoint 가 되는 PWM (%, 범위를 넘을 수 있음)"""
+        c0, c1, c2, c3 = self.theta
+        decay = math.exp(c1 * horizon)
+        steady = (setpoint - temp * decay) / (1.0 - decay)  # 이 정상 온도를 향해 가야 horizon 에 setpoint
+        return (-c1 * steady - c0 - c3 * (load > 0)) / c2 * 100.0
+
+    def target(self, temp: float, last_pwm: float, load: float, now_ms: int, setpoint: float,
+               horizon: float) -> Optional[float]:
+        """FanController predict 모드: 샘플을 누적하고 목표 PWM 을 돌려준다 (모델이 없으면 None)"""
+        if self.history is not None:
+            history, self.history = self.history, None
+            self.fit_history(history)
+        self.observe(temp, last_pwm, load, now_ms)
+        if self.theta is None:
+            return None
+        return self.required_pwm(temp, load, setpoint, horizon)
+
+    def describe(self) -> dict:
+        out = {"samples": int(self.samples), "condition": self.condition(), "fits": self.fits,
+               "rejected": self.rejected}
+        if self.theta is not None:
+            c0, c1, c2, c3 = self.theta.tolist()
+            out.update(zip(FEATURES, (c0, c1, c2, c3)))
+            out["time_constant_sec"] = -1.0 / c1
+            out["fan_full_cooling_c"] = c2 / c1  # u 0 -> 1 일 때 정상 온도 변화 (°C)
+            out["load_heating_c"] = -c3 / c1     # 부하가 올리는 정상 온도 (°C)
+        return out
+
+
+# =========================
+# 오프라인 평가
+# =========================
+def recorded_pwm(trace: Trace, config: dict) -> np.ndarray:
+    """트레이스의 PWM 열, 없으면 기록 당시 설정(config)으로 재생한 PWM"""
+    if trace.pwm is not None:
+        return np.nan_to_num(trace.pwm)
+    return replay(trace, **config).pwm.astype(np.float64)
+
+
+class _Recorded:
+    """simulate 검증용: 기록된 PWM 을 순서대로 돌려주는 컨트롤러"""
+
+    def __init__(self, pwm):
+        self._it = iter(np.asarray(pwm).tolist())
+
+    def step(self, cpu, gpu, model, now_ms=None):
+        return next(self._it)
+
+
+def simulate(plant: ThermalModel, ts, temp, load, residual, ctl: FanController) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    plant 모델 + 기록된 잔차로 온도를 진행시키며 ctl 로 PWM 을 정한다 (폐루프).
+    residual[k] 는 기록에서 모델이 설명하지 못한 dT/dt 이므로, 기록된 PWM 을 넣으면 기록된 온도가 그대로 나온다.
+    """
+    c0, c1, c2, c3 = plant.theta.tolist()
+    n = len(ts)
+    temps, pwm = np.empty(n), np.empty(n)
+    t = float(temp[0])
+    ts_ms = (np.asarray(ts) * 1000).astype(np.int64).tolist()
+    dts = np.append(np.diff(ts), 0.0).tolist()
+    for k, (now, dt, l, r) in enumerate(zip(ts_ms, dts, load.tolist(), residual.tolist())):
+        temps[k] = t
+        pwm[k] = u = ctl.step(t, t, l, now_ms=now)
+        t += dt * (c0 + c1 * t + c2 * u / 100.0 + c3 * (l > 0) + r)
+    return temps, pwm
+
+
+def residuals(plant: ThermalModel, ts, temp, pwm, load) -> np.ndarray:
+    """기록의 dT/dt - 모델 예측 (마지막 샘플은 0)"""
+    dt = np.diff(ts)
+    x = np.column_stack((np.ones(len(dt)), temp[:-1], pwm[:-1] / 100.0, (load[:-1] > 0).astype(np.float64)))
+    r = np.diff(temp) / np.where(dt > 0, dt, 1.0) - x @ plant.theta
+    return np.append(np.where(dt > 0, r, 0.0), 0.0)
+
+
+def onset_pwm(ts, load, pwm, window: float = ONSET_WINDOW) -> Optional[float]:
+    """부하가 켜진 시점부터 window 초 동안의 평균 PWM (부하 시작에 얼마나 빨리 반응하는지)"""
+    on = np.flatnonzero((load[1:] > 0) & (load[:-1] <= 0)) + 1
+    if not len(on):
+        return None
+    ends = np.searchsorted(ts, ts[on] + window, side="left")
+    return float(np.mean([pwm[s:e].mean() for s, e in zip(on, ends)]))
+
+
+def evaluate(trace: Trace, config: Optional[dict] = None, setpoint: float = 55.0, horizon: float = 30.0,
+             train: float = 0.5, limit: float = REPLAY_LIMIT) -> dict:
+    """
+    트레이스 앞부분(train 비율)으로 제어용 모델을 맞추고, 뒷부분에서 config 의 공식과 predict 를 폐루프로 비교한다.
+    """
+    config = dict(config or {})
+    ts, load = trace.ts, trace.model
+    temp = np.maximum(trace.cpu, trace.gpu)
+    pwm = recorded_pwm(trace, config)
+    split = int(len(trace) * train)
+
+    plant = ThermalModel(max_cond=math.inf)
+    if not plant.fit(ts, temp, pwm, load):
+        raise ValueError(f"트레이스로 설비 모델을 맞출 수 없습니다: {plant.describe()}")
+    model = ThermalModel()
+    model.fit(ts[:split], temp[:split], pwm[:split], load[:split])
+    if not model.ready:
+        raise ValueError(f"학습 구간으로 제어 모델을 맞출 수 없습니다 (PWM 이 온도에 비례하기만 하면 계수를 가를 수 "
+                         f"없음): {model.describe()}")
+
+    held = slice(split, None)
+    ts_h, temp_h, pwm_h, load_h = ts[held], temp[held], pwm[held], load[held]
+    res = residuals(plant, ts, temp, pwm, load)[held]
+    # 제어 모델의 검증 구간 한 단계 예측 오차 (°C/s)
+    X, y = design(ts_h, temp_h, pwm_h, load_h, model.max_gap)
+    out = {"plant": plant.describe(), "model": model.describe(),
+           "model_rmse_c_per_sec": float(np.sqrt(np.mean((X @ model.theta - y) ** 2))) if len(y) else None,
+           "setpoint": setpoint, "horizon_sec": horizon}
+
+    check, _ = simulate(plant, ts_h, temp_h, load_h, res, _Recorded(pwm_h))
+    out["replay_error_c"] = float(np.max(np.abs(check - temp_h)))  # 기록된 PWM -> 기록된 온도 (0 에 가까워야 함)
+
+    runs = {"formula": FanController(**config),
+            "predict": FanController(**dict(config, mode="predict", predict_setpoint=setpoint,
+                                            predict_horizon=horizon), predictor=model)}
+    for name, ctl in runs.items():
+        temps, pwms = simulate(plant, ts_h, temp_h, load_h, res, ctl)
+        s = summarize(Trace(ts_h, temps, temps, load_h), pwms, limit)
+        dt = np.append(np.diff(ts_h), np.median(np.diff(ts_h)) if len(ts_h) > 1 else 1.0)
+        s["power_integral_sec"] = float(((pwms / 100.0) ** 3 * dt).sum())  # 팬 전력 ∝ 회전수³
+        s["onset_pwm"] = onset_pwm(ts_h, load_h, pwms)
+        out[name] = s
+    f, p = out["formula"], out["predict"]
+    out["delta"] = {"max_temp_c": p["max_temp"] - f["max_temp"],
+                    "time_above_limit_sec": p["time_above_limit_sec"] - f["time_above_limit_sec"],
+                    "duty_integral_sec": p["duty_integral_sec"] - f["duty_integral_sec"],
+                    "power_integral_sec": p["power_integral_sec"] - f["power_integral_sec"]}
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="열 모델 학습과 predict 모드 오프라인 평가")
+    ap.add_argument("trace", help="CSV (넓은 형식, pwm 열이 있으면 사용 / 없으면 --set 설정으로 재생)")
+    ap.add_argument("--mode", choices=("auto", "manual", "range"), help="비교할 현재 공식 (기본: 설정 파일의 값)")
+    ap.add_argument("--set", nargs="*", metavar="NAME=VALUE", help="FanController 필드 값 (기록 당시 설정)")
+    ap.add_argument("--setpoint", type=float, default=FanController.predict_setpoint, help="목표 온도 (°C)")
+    ap.add_argument("--horizon", type=float, default=FanController.predict_horizon, help="예측 구간 (초)")
+    ap.add_argument("--train", type=float, default=0.5, help="제어 모델 학습에 쓸 앞부분 비율")
+    ap.add_argument("--limit", type=float, default=REPLAY_LIMIT, help="임계 온도 초과 시간 기준(°C)")
+    args = ap.parse_args(argv)
+
+    config = dict(load_controller_config(), **_parse_set(args.set))
+    if args.mode:
+        config["mode"] = args.mode
+    try:
+        result = evaluate(load_trace(args.trace), config, args.setpoint, args.horizon, args.train, args.limit)
+    except ValueError as e:
+        raise SystemExit(f"[Predict] {e}")
+    f, p, d = result["formula"], result["predict"], result["delta"]
+    print(f"[Predict] 최고 온도 {f['max_temp']:.1f} -> {p['max_temp']:.1f}°C, "
+          f"팬 duty 적분 {f['duty_integral_sec']:.0f} -> {p['duty_integral_sec']:.0f}s "
+          f"({d['duty_integral_sec']:+.0f}s)", file=sys.stderr)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import json
+import struct
+import time
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+# =========================
+# 서버 <-> Pi 이진 제어 프로토콜 (버전 1, 2)
+# =========================
+# 연결 직후 서버가 JSON 한 줄로 협상을 시작한다.
+#   서버 -> Pi : {"hello": "fanwire", "versions": [1]}\n
+#   Pi -> 서버 : {"wire": 1}\n        (이후 양방향 모두 고정 길이 이진 프레임)
+#                {"wire": 0}\n        (공통 버전 없음 -> 기존 줄 단위 JSON 유지)
+# 예전 Pi 에이전트는 hello 를 잘못된 명령으로 버리고 답하지 않으므로, 서버는 답이 없으면
+# 같은 연결에서 기존 JSON({"pwm"} / {"target", "ramp"}) 으로 계속 보낸다.
+#
+# 프레임 (little-endian, 20 바이트)
+#   kind   B   SETPOINT / ACK / PING
+#   flags  B   ACK 의 결과 코드 (ACK_OK, ACK_UNKNOWN_FAN, ACK_BAD_FRAME)
+#   fan    H   팬(채널) 번호: 연결 하나로 Pi 의 여러 팬을 제어
+#   seq    I   일련번호 (32bit 순환). ACK 는 받은 프레임의 seq 를 그대로 돌려준다 -> 왕복 시간 측정
+#   target H   목표 PWM, 0.01% 단위 (0~10000). ACK 에서는 Pi 가 현재 적용 중인 값
+#   ramp   H   변화율, 0.01%/s 단위 (0 이면 즉시 적용, 최대 655.35%/s)
+#   ts_ms  Q   보낸 쪽의 벽시계 시각 (Unix ms)
+#
+# 버전 2: POLICY 프레임 추가 (Pi 로컬 제어 루프에 정책을 보냄, local_control.py)
+#   같은 20 바이트 헤더 (kind=POLICY, target = 뒤따르는 JSON 본문 길이) + UTF-8 JSON 본문
+#   Pi 는 로컬 제어를 켠 경우에만 버전 2 를 고르므로, 그 외에는 헤더 길이가 항상 고정이다.
+WIRE_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+POLICY_VERSION = 2  # POLICY 프레임을 주고받을 수 있는 최소 버전
+HELLO = "fanwire"
+
+FRAME = struct.Struct("<BBHIHHQ")
+FRAME_SIZE = FRAME.size
+
+SETPOINT, ACK, PING, POLICY = 1, 2, 3, 4
+ACK_OK, ACK_UNKNOWN_FAN, ACK_BAD_FRAME = 0, 1, 2
+
+SCALE = 100       # 0.01 단위
+MAX_TARGET = 100 * SCALE
+MAX_RAMP = 0xFFFF
+MAX_PAYLOAD = 0xFFFF  # POLICY 본문 최대 길이 (헤더의 target 필드)
+
+
+class Frame(NamedTuple):
+    kind: int
+    flags: int
+    fan: int
+    seq: int
+    target: int   # 0.01% 단위
+    ramp: int     # 0.01%/s 단위, 0 = 즉시
+    ts_ms: int
+
+    @property
+    def target_pct(self) -> float:
+        return self.target / SCALE
+
+    @property
+    def ramp_pct(self) -> Optional[float]:
+        return self.ramp / SCALE if self.ramp else None
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def pack(kind: int, fan: int, seq: int, target: float = 0.0, ramp: Optional[float] = None,
+         ts_ms: Optional[int] = None, flags: int = 0) -> bytes:
+    """퍼센트 단위 값을 받아 프레임 하나를 만든다 (범위를 넘는 값은 잘라낸다)"""
+    t = min(MAX_TARGET, max(0, int(round(target * SCALE))))
+    r = min(MAX_RAMP, max(0, int(round(ramp * SCALE)))) if ramp else 0
+    return FRAME.pack(kind, flags, fan, seq & 0xFFFFFFFF, t, r, now_ms() if ts_ms is None else ts_ms)
+
+
+def pack_setpoint(fan: int, seq: int, target: float, ramp: Optional[float] = None,
+                  ts_ms: Optional[int] = None) -> bytes:
+    return pack(SETPOINT, fan, seq, target, ramp, ts_ms)
+
+
+def pack_ack(frame: Frame, flags: int = ACK_OK, applied: Optional[float] = None) -> bytes:
+    """받은 프레임의 fan/seq 를 그대로 돌려주는 ACK (applied: Pi 가 현재 적용 중인 PWM %)"""
+    return pack(ACK, frame.fan, frame.seq, frame.target_pct if applied is None else applied, None, None, flags)
+
+
+def pack_policy(fan: int, seq: int, policy: dict, ts_ms: Optional[int] = None) -> bytes:
+    """POLICY 프레임 (버전 2): 헤더 + JSON 본문"""
+    body = json.dumps(policy, separators=(",", ":")).encode()
+    if len(body) > MAX_PAYLOAD:
+        raise ValueError(f"정책이 너무 깁니다: {len(body)} 바이트")
+    return FRAME.pack(POLICY, 0, fan, seq & 0xFFFFFFFF, len(body), 0,
+                      now_ms() if ts_ms is None else ts_ms) + body
+
+
+def unpack(buf: bytes) -> Frame:
+    return Frame(*FRAME.unpack(buf))
+
+
+def split(buf: bytes) -> Tuple[List[Frame], bytes]:
+    """수신 버퍼에서 완전한 프레임을 모두 꺼내고, 남은(잘린) 바이트를 돌려준다"""
+    end = len(buf) - len(buf) % FRAME_SIZE
+    frames = [Frame(*f) for f in FRAME.iter_unpack(buf[:end])] if end else []
+    return frames, buf[end:]
+
+
+def split_messages(buf: bytes) -> Tuple[List[Tuple[Frame, bytes]], bytes]:
+    """
+    split 과 같고 POLICY 프레임의 본문까지 꺼낸다: ([(프레임, 본문)], 남은 바이트). 본문이 없는 프레임은 b"".
+    POLICY 가 없으면(고정 길이 프레임만) split 으로 한 번에 푼다.
+    """
+    end = len(buf) - len(buf) % FRAME_SIZE
+    if POLICY not in buf[:end:FRAME_SIZE]:
+        frames, rest = split(buf)
+        return [(f, b"") for f in frames], rest
+    out, pos = [], 0
+    while len(buf) - pos >= FRAME_SIZE:
+        f = Frame(*FRAME.unpack_from(buf, pos))
+        size = f.target if f.kind == POLICY else 0
+        if len(buf) - pos < FRAME_SIZE + size:
+            break  # 본문이 아직 다 오지 않음
+        out.append((f, bytes(buf[pos + FRAME_SIZE:pos + FRAME_SIZE + size])))
+        pos += FRAME_SIZE + size
+    return out, buf[pos:]
+
+
+def iter_frames(buf: bytes) -> Iterator[Frame]:
+    """길이가 FRAME_SIZE 의 배수인 버퍼를 프레임으로 (튜플 그대로, 복사 없이)"""
+    return map(Frame._make, FRAME.iter_unpack(buf))
+
+
+# ---------- 협상 (JSON 한 줄) ----------
+def hello(versions: Sequence[int] = SUPPORTED_VERSIONS) -> bytes:
+    return (json.dumps({"hello": HELLO, "versions": list(versions)}) + "\n").encode()
+
+
+def parse_hello(line: bytes) -> Optional[List[int]]:
+    """협상 요청이면 제시된 버전 목록, 아니면 None (일반 JSON 명령)"""
+    try:
+        data = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict) or data.get("hello") != HELLO:
+        return None
+    versions = data.get("versions")
+    return [v for v in versions if isinstance(v, int)] if isinstance(versions, list) else []
+
+
+def choose(offered: Sequence[int], supported: Sequence[int] = SUPPORTED_VERSIONS) -> int:
+    """양쪽이 지원하는 가장 높은 버전, 없으면 0 (JSON 유지)"""
+    common = set(offered) & set(supported)
+    return max(common) if common else 0
+
+
+def hello_reply(version: int) -> bytes:
+    return (json.dumps({"wire": version}) + "\n").encode()
+
+
+def parse_hello_reply(line: bytes) -> int:
+    try:
+        data = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return 0
+    version = data.get("wire") if isinstance(data, dict) else None
+    return version if isinstance(version, int) and version in SUPPORTED_VERSIONS else 0
@@ -0,0 +1,68 @@
+from websockets import http11
+
+# =========================
+# websockets 핸드셰이크 호환 패치
+# =========================
+# 일부 웹 클라이언트는 GET 업그레이드 요청에 Content-Length 헤더를 붙여 보낸다.
+# websockets 는 이를 거부하므로, 이 모듈을 import 하면 해당 검사만 뺀 Request 로 바꿔 끼운다.
+# (제어 서버 process_control_command.py 와 샤드 게이트웨이 shard.py 가 함께 사용)
+
+
+class PatchedRequest(http11.Request):
+    @classmethod
+    def parse(cls, read_line):
+        """
+        websockets.http11.Request.parse 를 그대로 가져오되,
+        'Content-Length' 체크만 제거한 버전.
+
+        제너레이터 기반 코루틴이어야 해서 async def 가 아니라
+        그냥 def + yield from 을 사용한다.
+        """
+        try:
+            # 원래 코드: parse_line 호출
+            request_line = yield from http11.parse_line(read_line)
+        except EOFError as exc:
+            raise EOFError(
+                "connection closed while reading HTTP request line"
+            ) from exc
+
+        try:
+            # method, path, HTTP/1.1
+            method, raw_path, version = request_line.split(b" ", 2)
+        except ValueError:
+            # not enough values to unpack (expected 3, got 1-2)
+            raise ValueError(
+                f"invalid HTTP request line: {http11.d(request_line)}"
+            ) from None
+
+        if method != b"GET":
+            raise ValueError(
+                f"unsupported HTTP method: {http11.d(method)}"
+            )
+        if version != b"HTTP/1.1":
+            raise ValueError(
+                f"unsupported HTTP version: {http11.d(version)}"
+            )
+
+        # 경로 디코딩
+        path = raw_path.decode("ascii", "surrogateescape")
+
+        # 헤더 파싱
+        headers = yield from http11.parse_headers(read_line)
+
+        # 여기까지가 http11.Request.parse 원본과 동일
+        # ---------------------------------------------------
+        # 아래 두 줄 중 'Content-Length' 체크만 제거한 상태
+
+        if "Transfer-Encoding" in headers:
+            raise NotImplementedError("transfer codings aren't supported")
+
+        # 원래 있던 코드:
+        # if "Content-Length" in headers:
+        #     raise ValueError("unsupported request body")
+
+        # 이제는 Content-Length 헤더가 있어도 그대로 통과시킨다.
+        return cls(path, headers)
+
+# websockets 모듈이 사용하는 Request 클래스를 패치 버전으로 교체
+http11.Request = PatchedRequest